@@ -22,6 +22,33 @@ else
   exit 1
 fi
 
+# The progress Lambdas publish JSON compressed (lambda/json_publisher.py), so
+# downloads are decoded before grep/jq and copies are uploaded compressed again
+download_json() {
+  local bucket="$1"
+  local key="$2"
+  local target="$3"
+  local encoding
+  encoding=$(run_aws s3api head-object --bucket "$bucket" --key "$key" --query ContentEncoding --output text 2>/dev/null || true)
+  run_aws s3 cp "s3://${bucket}/${key}" "$target"
+  case "$encoding" in
+    gzip)
+      gzip -dc "$target" > "$target.decoded" && mv "$target.decoded" "$target"
+      ;;
+    br)
+      brotli -dc "$target" > "$target.decoded" && mv "$target.decoded" "$target"
+      ;;
+  esac
+}
+
+upload_json() {
+  local source="$1"
+  local destination="$2"
+  gzip -6 -n -c "$source" > "$source.gz"
+  run_aws s3 cp "$source.gz" "$destination" --content-type "application/json" \
+    --content-encoding gzip --cache-control "no-cache"
+}
+
 # Get dashboard bucket name
 # Use the main bucket with dashboard subdirectory
 DASHBOARD_BUCKET="$BUCKET_NAME"
@@ -50,7 +77,7 @@ run_aws s3api put-object --bucket "$DASHBOARD_BUCKET" --key "monitoring/" --cont
 echo "Checking for real progress data in data bucket..."
 if run_aws s3 ls "s3://${BUCKET_NAME}/status/progress.json" 2>/dev/null; then
   echo "Real progress data found! Copying from data bucket..."
-  run_aws s3 cp "s3://${BUCKET_NAME}/status/progress.json" /tmp/progress.json
+  download_json "$BUCKET_NAME" "status/progress.json" /tmp/progress.json
   
   # Ensure the progress.json has a job_id to enable dashboard reset detection
   if ! grep -q '"job_id"' /tmp/progress.json; then
@@ -140,8 +167,8 @@ EOF
     echo "Clean initial state uploaded successfully"
   fi
   
-  run_aws s3 cp /tmp/progress.json "s3://${DASHBOARD_BUCKET}/data/progress.json" --content-type "application/json"
-  run_aws s3 cp /tmp/progress.json "s3://${DASHBOARD_BUCKET}/status/progress.json" --content-type "application/json"
+  upload_json /tmp/progress.json "s3://${DASHBOARD_BUCKET}/data/progress.json"
+  upload_json /tmp/progress.json "s3://${DASHBOARD_BUCKET}/status/progress.json"
 else
   echo "No real progress data found. Creating sample progress data..."
   # Create a realistic time-based progress.json with proper timestamp
@@ -200,6 +227,9 @@ if run_aws s3 ls "s3://${BUCKET_NAME}/results/summary/microbiome_summary.json" 2
   run_aws s3 cp "s3://${BUCKET_NAME}/results/summary/microbiome_summary.json" /tmp/summary/microbiome_summary.json
   run_aws s3 cp /tmp/summary/microbiome_summary.json "s3://${DASHBOARD_BUCKET}/data/summary.json" --content-type "application/json"
   run_aws s3 cp /tmp/summary/microbiome_summary.json "s3://${DASHBOARD_BUCKET}/results/summary/microbiome_summary.json" --content-type "application/json"
+  # Tiered overview and detail shards; sync only transfers shards that changed
+  run_aws s3 sync "s3://${BUCKET_NAME}/results/summary/dashboard/" "s3://${DASHBOARD_BUCKET}/data/dashboard/" --delete || true
+  run_aws s3 sync "s3://${BUCKET_NAME}/results/summary/dashboard/" "s3://${DASHBOARD_BUCKET}/results/summary/dashboard/" --delete || true
 else
   echo "No real summary data found. Using test data from dashboard/data/test_microbiome_summary.json"
   mkdir -p /tmp/summary
@@ -217,9 +247,9 @@ fi
 echo "Checking for real resources data in data bucket..."
 if run_aws s3 ls "s3://${BUCKET_NAME}/monitoring/resources.json" 2>/dev/null; then
   echo "Real resource data found! Copying from data bucket..."
-  run_aws s3 cp "s3://${BUCKET_NAME}/monitoring/resources.json" /tmp/resources.json
-  run_aws s3 cp /tmp/resources.json "s3://${DASHBOARD_BUCKET}/data/resources.json" --content-type "application/json"
-  run_aws s3 cp /tmp/resources.json "s3://${DASHBOARD_BUCKET}/monitoring/resources.json" --content-type "application/json"
+  download_json "$BUCKET_NAME" "monitoring/resources.json" /tmp/resources.json
+  upload_json /tmp/resources.json "s3://${DASHBOARD_BUCKET}/data/resources.json"
+  upload_json /tmp/resources.json "s3://${DASHBOARD_BUCKET}/monitoring/resources.json"
 else
   echo "No real resource data found. Generating realistic resource metrics..."
   # Get time_elapsed from progress.json to align resource data
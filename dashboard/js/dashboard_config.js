@@ -5,15 +5,21 @@
 
 // Dashboard configuration
 const DASHBOARD_CONFIG = {
-  // Refresh interval in milliseconds
+  // Refresh interval in milliseconds, used when polling the data files
   refreshInterval: 1000,
   
+  // URL of dashboard_feed.py (e.g. 'http://localhost:8765'). When set, changes
+  // are pushed over Server-Sent Events instead of polling every refreshInterval;
+  // browsers without EventSource poll the feed with conditional GETs
+  feedUrl: '',
+  
   // Data paths - these will be dynamically replaced during deployment
   dataPaths: {
     // Use relative paths for local development
     localDevelopment: {
       progress: 'data/progress.json',
       summary: 'data/summary.json',
+      overview: 'data/dashboard/overview.json',
       resources: 'data/resources.json'
     },
     
@@ -26,6 +32,7 @@ const DASHBOARD_CONFIG = {
       // Real data paths from Nextflow workflow
       progress: 'status/progress.json',
       summary: 'results/summary/microbiome_summary.json',
+      overview: 'results/summary/dashboard/overview.json',
       resources: 'monitoring/resources.json'
     }
   },
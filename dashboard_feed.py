@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# dashboard_feed.py - Push dashboard data to browsers as it changes
+#
+# Every open dashboard used to GET the progress, summary and resources JSON
+# once a second, so request volume grew with viewers x seconds. This service
+# is the only reader of the published documents: it watches them (by polling
+# with conditional GETs, or from S3 event notifications on an SQS queue) and
+# pushes a JSON merge patch of each change to the connected browsers over
+# Server-Sent Events. Browsers without EventSource poll /data/<channel>.json,
+# which answers 304 until the document changes. With --data-dir the feed
+# serves files from a directory instead of S3, for running it locally.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+# The shared publisher lives in lambda/ in the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+
+from json_publisher import decompress, dumps, load_json_body
+
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+    from dashboard_sync import parse_queue_message
+except ImportError:  # Only the S3 store needs boto3
+    boto3 = None
+
+logger = logging.getLogger('dashboard_feed')
+
+# Keys behind each channel, as in dashboard/js/dashboard_config.js; the first
+# key that exists is published (the bounded overview before the full summary)
+LAYOUTS = {
+    'production': {
+        'progress': ['status/progress.json'],
+        'summary': ['results/summary/dashboard/overview.json', 'results/summary/microbiome_summary.json'],
+        'resources': ['monitoring/resources.json'],
+    },
+    'local': {
+        'progress': ['data/progress.json'],
+        'summary': ['data/dashboard/overview.json', 'data/summary.json'],
+        'resources': ['data/resources.json'],
+    },
+}
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_RECONCILE_INTERVAL = 60.0
+DEFAULT_PORT = 8765
+HEARTBEAT_SECONDS = 15.0
+HISTORY_EVENTS = 256
+CLIENT_QUEUE_EVENTS = 64
+RETRY_MILLISECONDS = 3000
+
+# Returned by a store when the object still has the given version token
+NOT_MODIFIED = object()
+
+def merge_patch(old, new):
+    """JSON merge patch (RFC 7396) that turns old into new"""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    patch = {key: None for key in old.keys() - new.keys()}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif old[key] != value:
+            patch[key] = merge_patch(old[key], value)
+    return patch
+
+def apply_merge_patch(target, patch):
+    """Apply a JSON merge patch, as the dashboard does"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+def diff(old, new):
+    """
+    Event for a document change.
+
+    A merge patch cannot set a value to null, so the whole document is sent
+    whenever the patch would not reproduce it (or would not be smaller).
+
+    Returns:
+        Tuple of (event name, payload): ('patch', merge patch) or ('replace', new)
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = merge_patch(old, new)
+        if apply_merge_patch(old, patch) == new and len(dumps(patch)) < len(dumps(new)):
+            return 'patch', patch
+    return 'replace', new
+
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {dumps(data).decode('utf-8')}\n\n".encode('utf-8')
+
+class FileStore:
+    """Published documents as files under a directory, for running the feed without AWS"""
+
+    def __init__(self, root):
+        self.root = root
+        self.requests = Counter()
+
+    def read(self, key, token=None):
+        """
+        Read a document unless it still has the version token.
+
+        Returns:
+            NOT_MODIFIED, None if the key does not exist, or (token, document)
+        """
+        self.requests['stat'] += 1
+        path = os.path.join(self.root, key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        current = f"{stat.st_mtime_ns}-{stat.st_size}"
+        if current == token:
+            return NOT_MODIFIED
+        self.requests['read'] += 1
+        with open(path, 'rb') as f:
+            body = f.read()
+        try:
+            # Files downloaded from the bucket keep the publisher's gzip encoding
+            return current, json.loads(decompress(body, 'gzip' if body[:2] == b'\x1f\x8b' else None))
+        except ValueError:
+            # Caught mid-write; the next poll sees a new token and reads it again
+            return NOT_MODIFIED
+
+class S3Store:
+    """Published documents in a bucket, read with conditional GETs"""
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+        self.requests = Counter()
+
+    def read(self, key, token=None):
+        """Same contract as FileStore.read, with the ETag as the token"""
+        self.requests['get_object'] += 1
+        arguments = {'IfNoneMatch': token} if token else {}
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key, **arguments)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code in ('304', 'NotModified'):
+                return NOT_MODIFIED
+            if code in ('404', 'NoSuchKey'):
+                return None
+            raise
+        return response['ETag'], load_json_body(response)
+
+class DashboardFeed:
+    """
+    Latest document per channel, and the clients to push changes to.
+
+    Events carry increasing IDs and the most recent ones are kept, so a
+    browser that reconnects with Last-Event-ID only receives what it missed;
+    one that fell further behind gets a fresh snapshot.
+    """
+
+    def __init__(self, store, channels, history=HISTORY_EVENTS):
+        self.store = store
+        self.channels = channels
+        self.documents = {}
+        self.bodies = {}
+        self.etags = {}
+        self.versions = {}
+        self.event_id = 0
+        self.history = deque(maxlen=history)
+        self.clients = set()
+        self.counters = Counter()
+        self.executor = ThreadPoolExecutor(max_workers=len(channels))
+
+    async def refresh(self, names=None):
+        """Re-read the given channels (default: all) and publish the ones that changed"""
+        names = [name for name in (names or self.channels) if name in self.channels]
+        results = await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(
+            self.executor, partial(self.read_channel, name)) for name in names))
+        for name, result in zip(names, results):
+            if result is not NOT_MODIFIED:
+                self.publish(name, *result)
+
+    def read_channel(self, name):
+        """NOT_MODIFIED or (key, token, document) for the first key of the channel that exists"""
+        current_key, token = self.versions.get(name, (None, None))
+        for key in self.channels[name]:
+            result = self.store.read(key, token if key == current_key else None)
+            if result is NOT_MODIFIED:
+                return NOT_MODIFIED
+            if result is not None:
+                return (key,) + result
+        return NOT_MODIFIED if current_key is None else (None, None, None)
+
+    def publish(self, name, key, token, document):
+        self.versions[name] = (key, token)
+        old = self.documents.get(name)
+        if document == old and name in self.documents:
+            # Rewritten with the same content
+            self.counters['unchanged_writes'] += 1
+            return
+        self.documents[name] = document
+        self.bodies[name] = dumps(document)
+        self.etags[name] = '"' + hashlib.sha1(self.bodies[name]).hexdigest()[:20] + '"'
+        event, payload = diff(old, document)
+        self.event_id += 1
+        message = format_event(self.event_id, event, {'channel': name, 'data': payload})
+        self.history.append((self.event_id, message))
+        self.counters[f"{event}_events"] += 1
+        self.counters['document_bytes'] += len(self.bodies[name])
+        self.counters['event_bytes'] += len(message)
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind: it reconnects and catches up from the history or a snapshot
+                self.end_stream(queue)
+                self.counters['clients_dropped'] += 1
+
+    def end_stream(self, queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+        self.clients.discard(queue)
+
+    def close_streams(self):
+        for queue in list(self.clients):
+            self.end_stream(queue)
+
+    def snapshot(self):
+        return format_event(self.event_id, 'snapshot', {'channels': self.documents})
+
+    def catch_up(self, last_event_id):
+        """Events a client that saw last_event_id has missed, or a snapshot"""
+        if last_event_id is not None and last_event_id <= self.event_id:
+            if last_event_id == self.event_id:
+                return []
+            if self.history and self.history[0][0] <= last_event_id + 1:
+                return [message for event_id, message in self.history if event_id > last_event_id]
+        return [self.snapshot()]
+
+    def metrics(self):
+        return dict(sorted(self.counters.items()), clients=len(self.clients), event_id=self.event_id,
+                    store_requests=dict(self.store.requests))
+
+    async def poll(self, interval):
+        """Re-read the channels every interval seconds, however many clients are connected"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.counters['errors'] += 1
+                logger.error(f"Refreshing the feed failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    async def follow_queue(self, sqs, queue_url, bucket, reconcile_interval):
+        """Refresh only the channels named by S3 event notifications, with an occasional full refresh"""
+        loop = asyncio.get_running_loop()
+        watched = {key: name for name, keys in self.channels.items() for key in keys}
+        last_reconcile = None
+        while True:
+            try:
+                if last_reconcile is None or time.monotonic() - last_reconcile >= reconcile_interval:
+                    await self.refresh()
+                    last_reconcile = time.monotonic()
+                response = await loop.run_in_executor(self.executor, partial(
+                    sqs.receive_message, QueueUrl=queue_url, MaxNumberOfMessages=10, WaitTimeSeconds=20))
+                messages = response.get('Messages', [])
+                names = {watched[key] for message in messages
+                         for event_bucket, key, _ in parse_queue_message(message.get('Body'))
+                         if key in watched and event_bucket in (None, bucket)}
+                self.counters['queue_messages'] += len(messages)
+                if names:
+                    await self.refresh(sorted(names))
+                if messages:
+                    await loop.run_in_executor(self.executor, partial(
+                        sqs.delete_message_batch, QueueUrl=queue_url, Entries=[
+                            {'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']}
+                            for i, message in enumerate(messages)]))
+            except Exception as e:
+                self.counters['errors'] += 1
+                logger.error(f"Following the queue failed: {str(e)}")
+                await asyncio.sleep(5)
+
+async def read_request(reader):
+    """Method, path, query and lower-cased headers of an HTTP request"""
+    request_line = (await reader.readline()).decode('latin-1').split()
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1')
+        if line in ('\r\n', '\n', ''):
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if len(request_line) < 2:
+        return None, None, None, headers
+    url = urlsplit(request_line[1])
+    return request_line[0], url.path, url.query, headers
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status}", 'Access-Control-Allow-Origin: *'] + [f"{k}: {v}" for k, v in headers.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+def last_event_id(headers, query):
+    # EventSource sends the header on reconnects; the query parameter covers the first connection
+    value = headers.get('last-event-id')
+    for part in query.split('&'):
+        if part.startswith('lastEventId='):
+            value = value or part.split('=', 1)[1]
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+async def stream_events(feed, writer, headers, query, heartbeat):
+    queue = asyncio.Queue(maxsize=CLIENT_QUEUE_EVENTS)
+    writer.write(response_head('200 OK', {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                          'Connection': 'keep-alive', 'X-Accel-Buffering': 'no'}))
+    writer.write(f"retry: {RETRY_MILLISECONDS}\n\n".encode('utf-8'))
+    for message in feed.catch_up(last_event_id(headers, query)):
+        writer.write(message)
+    feed.clients.add(queue)
+    feed.counters['connections'] += 1
+    try:
+        await writer.drain()
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                message = b": keepalive\n\n"
+            if message is None:
+                return
+            writer.write(message)
+            await writer.drain()
+    finally:
+        feed.clients.discard(queue)
+
+def channel_response(feed, name, headers):
+    """Conditional GET of one channel's latest document"""
+    if name not in feed.documents:
+        return response_head('404 Not Found', {'Content-Length': 0}), b''
+    cache = {'ETag': feed.etags[name], 'Cache-Control': 'no-cache', 'Access-Control-Expose-Headers': 'ETag'}
+    if headers.get('if-none-match') == feed.etags[name]:
+        feed.counters['not_modified_responses'] += 1
+        return response_head('304 Not Modified', cache), b''
+    feed.counters['document_responses'] += 1
+    body = feed.bodies[name]
+    return response_head('200 OK', dict(cache, **{'Content-Type': 'application/json',
+                                                  'Content-Length': len(body)})), body
+
+async def serve_feed(feed, host, port, heartbeat=HEARTBEAT_SECONDS):
+    """
+    HTTP server for the feed.
+
+    GET /events streams Server-Sent Events, GET /data/<channel>.json answers
+    conditional GETs and GET /metrics.json reports the counters.
+    """
+    async def handle(reader, writer):
+        try:
+            method, path, query, headers = await read_request(reader)
+            if method == 'OPTIONS':
+                writer.write(response_head('204 No Content', {
+                    'Access-Control-Allow-Methods': 'GET', 'Access-Control-Max-Age': 86400,
+                    'Access-Control-Allow-Headers': 'If-None-Match, Last-Event-ID, Cache-Control'}))
+            elif path == '/events':
+                await stream_events(feed, writer, headers, query, heartbeat)
+            elif path and path.startswith('/data/') and path.endswith('.json'):
+                head, body = channel_response(feed, path[len('/data/'):-len('.json')], headers)
+                writer.write(head + body)
+            elif path == '/metrics.json':
+                body = json.dumps(feed.metrics()).encode('utf-8')
+                writer.write(response_head('200 OK', {'Content-Type': 'application/json',
+                                                      'Content-Length': len(body)}) + body)
+            else:
+                writer.write(response_head('404 Not Found', {'Content-Length': 0}))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(handle, host, port)
+
+async def run_service(args):
+    channels = LAYOUTS[args.layout or ('local' if args.data_dir else 'production')]
+    sqs = None
+    if args.data_dir:
+        store = FileStore(args.data_dir)
+    else:
+        if boto3 is None:
+            raise SystemExit("Reading from S3 requires boto3; use --data-dir to serve local files")
+        session = boto3.Session(profile_name=args.profile or None, region_name=args.region)
+        config = Config(max_pool_connections=len(channels) + 1, tcp_keepalive=True,
+                        retries={'mode': 'standard', 'max_attempts': 5})
+        store = S3Store(session.client('s3', config=config), args.bucket)
+        sqs = session.client('sqs', config=config) if args.queue_url else None
+    feed = DashboardFeed(store, channels)
+    await feed.refresh()
+    server = await serve_feed(feed, args.host, args.port)
+    logger.info(f"Serving the dashboard feed on http://{args.host}:{args.port}/events")
+    try:
+        if sqs is not None:
+            await feed.follow_queue(sqs, args.queue_url, args.bucket, args.reconcile_interval)
+        else:
+            await feed.poll(args.interval)
+    finally:
+        feed.close_streams()
+        server.close()
+        feed.executor.shutdown(wait=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Push dashboard data changes to browsers over Server-Sent Events')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help='Bucket the pipeline and Lambdas publish to')
+    source.add_argument('--data-dir', help='Serve documents from this directory instead of S3 (e.g. dashboard)')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS),
+                        help='Keys to watch (default: production for S3, local for --data-dir)')
+    parser.add_argument('--region', help='AWS region')
+    parser.add_argument('--profile', help='AWS CLI profile')
+    parser.add_argument('--queue-url', help='SQS queue receiving S3 event notifications for the bucket')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f"Seconds between conditional reads without a queue (default: {DEFAULT_INTERVAL})")
+    parser.add_argument('--reconcile-interval', type=float, default=DEFAULT_RECONCILE_INTERVAL,
+                        help=f"Seconds between full reads with a queue (default: {DEFAULT_RECONCILE_INTERVAL})")
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(run_service(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# dashboard_sync.py - Keep the dashboard copies of pipeline outputs in sync
+#
+# Long-running replacement for the continuous_data_update.sh loop. One S3
+# client with a pooled set of connections is shared by all transfers; each
+# pass lists the source keys once, compares ETags against what is already in
+# the dashboard location and copies only changed objects with a server-side
+# copy_object. With --queue-url the service waits for S3 event notifications
+# from SQS instead of polling, and reconciles with a full listing every few
+# minutes in case an event was missed. Copies performed and skipped (and the
+# requests made) are served as metrics over HTTP.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import unquote_plus
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+# The shared publisher lives in lambda/ in the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+
+from json_publisher import encode_body, load_json_body
+
+logger = logging.getLogger('dashboard_sync')
+
+# Source key (or prefix, ending in "/") in the data bucket and where the
+# dashboard reads it; prefixes are mirrored, including deletions
+SYNC_RULES = [
+    {'source': 'status/progress.json', 'destinations': ['data/progress.json', 'status/progress.json']},
+    {'source': 'results/summary/microbiome_summary.json',
+     'destinations': ['data/summary.json', 'results/summary/microbiome_summary.json'],
+     'fallback': 'dashboard/data/test_microbiome_summary.json'},
+    {'source': 'results/summary/dashboard/', 'destinations': ['data/dashboard/', 'results/summary/dashboard/']},
+    {'source': 'monitoring/resources.json', 'destinations': ['data/resources.json', 'monitoring/resources.json']},
+]
+PROGRESS_KEY = 'status/progress.json'
+
+# Empty charts published while a run initializes (or after it failed) so the
+# dashboard does not show data from the previous run
+RESET_STATUSES = ('INITIALIZING', 'FAILED')
+EMPTY_RESOURCES = {'utilization': [], 'instances': {'cpu': 8, 'gpu': 2}}
+EMPTY_SUMMARY = {
+    'taxonomic_profile': {'phylum_distribution': [], 'sample_count': 0},
+    'diversity': {'shannon_index': 0, 'simpson_index': 0, 'by_site': {}}
+}
+RESET_DOCUMENTS = {
+    'data/resources.json': EMPTY_RESOURCES,
+    'monitoring/resources.json': EMPTY_RESOURCES,
+    'data/summary.json': EMPTY_SUMMARY,
+    'results/summary/microbiome_summary.json': EMPTY_SUMMARY,
+}
+RESET_DELETES = ['data/backup_summary.json', 'data/backup_resources.json']
+
+JOB_ID_FILE = '/tmp/job_id.txt'
+DEFAULT_CONCURRENCY = 10
+DEFAULT_INTERVAL = 2.0
+DEFAULT_RECONCILE_INTERVAL = 300.0
+
+ObjectInfo = namedtuple('ObjectInfo', ['etag', 'size', 'last_modified'])
+
+def object_info(item):
+    """ObjectInfo from a list_objects_v2 entry or a head/copy response"""
+    return ObjectInfo(item.get('ETag', '').strip('"'), item.get('Size', item.get('ContentLength')),
+                      item.get('LastModified'))
+
+def is_prefix(key):
+    return key.endswith('/')
+
+def parse_queue_message(body):
+    """
+    S3 keys and event names from an SQS message body.
+
+    Accepts S3 event notifications delivered directly or wrapped in an SNS
+    envelope; keys arrive URL-encoded.
+
+    Returns:
+        List of (bucket, key, event name)
+    """
+    try:
+        message = json.loads(body)
+        if 'Message' in message and isinstance(message['Message'], str):
+            message = json.loads(message['Message'])
+    except (TypeError, ValueError):
+        return []
+    events = []
+    for record in message.get('Records', []):
+        s3 = record.get('s3', {})
+        key = s3.get('object', {}).get('key')
+        if key is not None:
+            events.append((s3.get('bucket', {}).get('name'), unquote_plus(key), record.get('eventName', '')))
+    return events
+
+class SyncMetrics:
+    """Counters for the sync service, exported as JSON and Prometheus text"""
+
+    def __init__(self):
+        self.counters = Counter()
+        self.started = time.time()
+        self.last_pass_seconds = 0.0
+        self.status = None
+
+    def snapshot(self):
+        return dict(sorted(self.counters.items()), uptime_seconds=round(time.time() - self.started, 1),
+                    last_pass_seconds=round(self.last_pass_seconds, 3), pipeline_status=self.status)
+
+    def prometheus(self):
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE dashboard_sync_{name}_total counter")
+            lines.append(f"dashboard_sync_{name}_total {value}")
+        lines.append("# TYPE dashboard_sync_last_pass_seconds gauge")
+        lines.append(f"dashboard_sync_last_pass_seconds {self.last_pass_seconds:.6f}")
+        return '\n'.join(lines) + '\n'
+
+class BucketSync:
+    """
+    Mirror the SYNC_RULES sources into the dashboard location.
+
+    Destination ETags are listed once and then tracked as copies are made,
+    so a pass that finds nothing changed costs one LIST per rule and no
+    transfers. Blocking boto3 calls run on a thread pool sized like the
+    client's connection pool.
+    """
+
+    def __init__(self, client, source_bucket, dest_bucket, rules=SYNC_RULES, sqs_client=None,
+                 concurrency=DEFAULT_CONCURRENCY, base_dir=None, job_id_file=JOB_ID_FILE):
+        self.client = client
+        self.sqs = sqs_client
+        self.source_bucket = source_bucket
+        self.dest_bucket = dest_bucket
+        self.rules = rules
+        self.base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+        self.job_id_file = job_id_file
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.metrics = SyncMetrics()
+        self.destinations = None
+        self.copied_from = {}
+        self.sources = {}
+        self.progress_etag = None
+        self.status = None
+        self.job_id = None
+
+    async def call(self, client, method, **kwargs):
+        # The executor's workers bound the requests in flight to the connection pool size
+        self.metrics.counters[f"{method}_requests"] += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, partial(getattr(client, method), **kwargs))
+
+    async def list_objects(self, bucket, prefix):
+        """{key: ObjectInfo} for every object under prefix (or the single key)"""
+        objects = {}
+        arguments = {'Bucket': bucket, 'Prefix': prefix}
+        while True:
+            response = await self.call(self.client, 'list_objects_v2', **arguments)
+            for item in response.get('Contents', []):
+                if is_prefix(prefix) or item['Key'] == prefix:
+                    objects[item['Key']] = object_info(item)
+            if not response.get('IsTruncated'):
+                return objects
+            arguments['ContinuationToken'] = response['NextContinuationToken']
+
+    def targets(self, rule, key):
+        """Destination keys for a source key, leaving out the source itself"""
+        if is_prefix(rule['source']):
+            relative = key[len(rule['source']):]
+            keys = [destination + relative for destination in rule['destinations']]
+        else:
+            keys = list(rule['destinations'])
+        return [target for target in keys if (self.dest_bucket, target) != (self.source_bucket, key)]
+
+    def rule_for(self, key):
+        for rule in self.rules:
+            if key == rule['source'] or (is_prefix(rule['source']) and key.startswith(rule['source'])):
+                return rule
+        return None
+
+    def is_current(self, source, target):
+        """Whether target already holds the source object"""
+        existing = self.destinations.get(target)
+        if existing is None:
+            return False
+        if source.etag in (existing.etag, self.copied_from.get(target)):
+            return True
+        # A single-part copy of a multipart upload gets a different ETag
+        return ('-' in source.etag and existing.size == source.size and existing.last_modified is not None
+                and source.last_modified is not None and existing.last_modified >= source.last_modified)
+
+    async def refresh_destinations(self):
+        """List every destination so change detection starts from what is published"""
+        prefixes = sorted({destination for rule in self.rules for destination in rule['destinations']})
+        listings = await asyncio.gather(*(self.list_objects(self.dest_bucket, prefix) for prefix in prefixes))
+        self.destinations = {}
+        for listing in listings:
+            self.destinations.update(listing)
+
+    async def copy(self, key, source, target):
+        response = await self.call(self.client, 'copy_object', Bucket=self.dest_bucket, Key=target,
+                                   CopySource={'Bucket': self.source_bucket, 'Key': key})
+        result = response.get('CopyObjectResult', {})
+        self.destinations[target] = ObjectInfo(result.get('ETag', source.etag).strip('"'), source.size,
+                                               result.get('LastModified', source.last_modified))
+        self.copied_from[target] = source.etag
+        self.metrics.counters['copies_performed'] += 1
+        self.metrics.counters['bytes_copied'] += source.size or 0
+
+    async def delete(self, target):
+        await self.call(self.client, 'delete_object', Bucket=self.dest_bucket, Key=target)
+        self.destinations.pop(target, None)
+        self.copied_from.pop(target, None)
+        self.metrics.counters['objects_deleted'] += 1
+
+    async def put(self, target, body, **headers):
+        response = await self.call(self.client, 'put_object', Bucket=self.dest_bucket, Key=target, Body=body,
+                                   **headers)
+        self.destinations[target] = ObjectInfo(response.get('ETag', '').strip('"'), len(body), None)
+        self.copied_from.pop(target, None)
+        self.metrics.counters['objects_uploaded'] += 1
+
+    def plan_copies(self, key, source):
+        """Copy operations needed for one source object; unchanged targets are counted as skipped"""
+        rule = self.rule_for(key)
+        operations = []
+        for target in self.targets(rule, key):
+            if self.is_current(source, target):
+                self.metrics.counters['copies_skipped'] += 1
+            else:
+                operations.append(self.copy(key, source, target))
+        return operations
+
+    async def upload_fallback(self, rule):
+        """Publish the rule's local fallback file where it differs from what is there"""
+        path = os.path.join(self.base_dir, rule['fallback'])
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = hashlib.md5(body).hexdigest()
+        operations = []
+        for target in rule['destinations']:
+            existing = self.destinations.get(target)
+            if existing is not None and existing.etag == etag:
+                self.metrics.counters['copies_skipped'] += 1
+            else:
+                operations.append(self.put(target, body, ContentType='application/json'))
+        return operations
+
+    async def sync_once(self, reconcile=False):
+        """
+        One pass over every rule.
+
+        Returns:
+            The pipeline status from progress.json, if known
+        """
+        start = time.perf_counter()
+        if reconcile or self.destinations is None:
+            await self.refresh_destinations()
+        listings = await asyncio.gather(*(self.list_objects(self.source_bucket, rule['source'])
+                                          for rule in self.rules))
+        for listing in listings:
+            self.sources.update(listing)
+
+        # Status changes may reset the dashboard before anything is copied
+        progress = next((listing[PROGRESS_KEY] for listing in listings if PROGRESS_KEY in listing), None)
+        if progress is not None:
+            await self.check_progress(progress)
+
+        operations = []
+        for rule, sources in zip(self.rules, listings):
+            if not sources and rule.get('fallback'):
+                operations.extend(await self.upload_fallback(rule))
+            for key, source in sources.items():
+                operations.extend(self.plan_copies(key, source))
+            if is_prefix(rule['source']):
+                # Like "aws s3 sync --delete"; a destination that is the source itself maps to itself
+                expected = {destination + key[len(rule['source']):]
+                            for key in sources for destination in rule['destinations']}
+                for destination in rule['destinations']:
+                    if (self.dest_bucket, destination) == (self.source_bucket, rule['source']):
+                        continue
+                    operations.extend(self.delete(target) for target in list(self.destinations)
+                                      if target.startswith(destination) and target not in expected)
+                for key in set(self.sources) - set(sources):
+                    if key.startswith(rule['source']):
+                        del self.sources[key]
+        await asyncio.gather(*operations)
+        self.metrics.counters['passes'] += 1
+        self.metrics.last_pass_seconds = time.perf_counter() - start
+        return self.status
+
+    async def check_progress(self, source):
+        """Follow the pipeline status and job ID when progress.json changes"""
+        if source.etag == self.progress_etag:
+            return
+        self.progress_etag = source.etag
+        try:
+            progress = load_json_body(await self.call(self.client, 'get_object', Bucket=self.source_bucket,
+                                                      Key=PROGRESS_KEY))
+        except (ClientError, ValueError) as e:
+            logger.warning(f"Could not read {PROGRESS_KEY}: {str(e)}")
+            return
+
+        status = progress.get('status')
+        if status != self.status:
+            logger.info(f"Pipeline status: {status}")
+            if status in RESET_STATUSES and self.status not in RESET_STATUSES:
+                await self.reset_dashboard()
+        self.status = self.metrics.status = status
+
+        job_id = progress.get('job_id')
+        if job_id is None:
+            # The dashboard detects new runs from the job ID
+            job_id = self.job_id or f"microbiome-demo-job-{int(time.time())}-real"
+            body, headers = encode_body(dict(progress, job_id=job_id))
+            await self.put('data/progress.json', body, **headers)
+            self.copied_from['data/progress.json'] = source.etag
+        if job_id != self.job_id:
+            if self.job_id is not None:
+                logger.info(f"New job detected: {job_id} (previous job: {self.job_id})")
+            self.job_id = job_id
+            if self.job_id_file:
+                with open(self.job_id_file, 'w') as f:
+                    f.write(job_id + '\n')
+
+    async def reset_dashboard(self):
+        """Publish empty charts when a run starts initializing or has failed"""
+        logger.info("Publishing empty resource and summary data for a clean dashboard state")
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        uploads = []
+        for target, document in RESET_DOCUMENTS.items():
+            body, headers = encode_body(dict(document, timestamp=timestamp))
+            uploads.append(self.put(target, body, **headers))
+        await asyncio.gather(*uploads, *(self.delete(target) for target in RESET_DELETES
+                                         if target in self.destinations))
+        # Output left over from the previous run must not replace the empty
+        # documents; the next version the pipeline writes will
+        for rule in self.rules:
+            source = self.sources.get(rule['source'])
+            for target in rule['destinations']:
+                if source is not None and target in RESET_DOCUMENTS:
+                    self.copied_from[target] = source.etag
+
+    async def apply_events(self, events):
+        """Sync the objects named by S3 event notifications"""
+        operations = []
+        for bucket, key, event_name in events:
+            rule = self.rule_for(key)
+            if bucket not in (None, self.source_bucket) or rule is None:
+                continue
+            self.metrics.counters['events_received'] += 1
+            if event_name.startswith('ObjectRemoved'):
+                self.sources.pop(key, None)
+                if is_prefix(rule['source']):
+                    operations.extend(self.delete(target) for target in self.targets(rule, key)
+                                      if target in self.destinations)
+                continue
+            try:
+                source = object_info(await self.call(self.client, 'head_object', Bucket=self.source_bucket, Key=key))
+            except ClientError:
+                continue  # Replaced or removed again since the event was sent
+            self.sources[key] = source
+            if key == PROGRESS_KEY:
+                await self.check_progress(source)
+            operations.extend(self.plan_copies(key, source))
+        await asyncio.gather(*operations)
+
+    async def receive_events(self, queue_url, wait_seconds):
+        response = await self.call(self.sqs, 'receive_message', QueueUrl=queue_url, MaxNumberOfMessages=10,
+                                   WaitTimeSeconds=wait_seconds)
+        messages = response.get('Messages', [])
+        events = [event for message in messages for event in parse_queue_message(message.get('Body'))]
+        if events:
+            await self.apply_events(events)
+        if messages:
+            await self.call(self.sqs, 'delete_message_batch', QueueUrl=queue_url, Entries=[
+                {'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']} for i, message in enumerate(messages)])
+
+    async def run(self, interval=DEFAULT_INTERVAL, reconcile_interval=DEFAULT_RECONCILE_INTERVAL,
+                  queue_url=None, exit_on_complete=False, metrics_file=None):
+        """
+        Sync until stopped (or until the pipeline completes with exit_on_complete).
+
+        Without a queue every pass lists the sources; with one, passes only
+        run every reconcile_interval and events are applied in between.
+        """
+        last_reconcile = None
+        while True:
+            now = time.monotonic()
+            reconcile = last_reconcile is None or now - last_reconcile >= reconcile_interval
+            try:
+                if queue_url and not reconcile:
+                    await self.receive_events(queue_url, wait_seconds=20)
+                else:
+                    await self.sync_once(reconcile=reconcile and last_reconcile is not None)
+                    if reconcile:
+                        last_reconcile = now
+            except (ClientError, BotoCoreError) as e:
+                # Transport errors (timeouts, dropped connections) are BotoCoreErrors; keep retrying
+                self.metrics.counters['errors'] += 1
+                logger.error(f"Sync failed, retrying: {str(e)}")
+            if metrics_file:
+                with open(metrics_file, 'w') as f:
+                    json.dump(self.metrics.snapshot(), f)
+            if exit_on_complete and self.status == 'COMPLETED':
+                await self.sync_once(reconcile=True)
+                logger.info("Pipeline has completed; continuous updates are no longer needed")
+                return
+            if not queue_url:
+                await asyncio.sleep(interval)
+
+async def serve_metrics(metrics, host, port):
+    """Serve /metrics (Prometheus text) and /metrics.json"""
+    async def handle(reader, writer):
+        request = (await reader.readline()).decode('latin-1').split()
+        path = request[1] if len(request) > 1 else '/'
+        if path == '/metrics.json':
+            body, content_type = json.dumps(metrics.snapshot()).encode('utf-8'), 'application/json'
+        else:
+            body, content_type = metrics.prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                     "Connection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+        writer.close()
+    return await asyncio.start_server(handle, host, port)
+
+async def run_service(args):
+    session = boto3.Session(profile_name=args.profile or None, region_name=args.region)
+    config = Config(max_pool_connections=args.concurrency, tcp_keepalive=True,
+                    retries={'mode': 'standard', 'max_attempts': 5})
+    sync = BucketSync(session.client('s3', config=config), args.bucket, args.dashboard_bucket or args.bucket,
+                      sqs_client=session.client('sqs', config=config) if args.queue_url else None,
+                      concurrency=args.concurrency)
+    server = await serve_metrics(sync.metrics, args.metrics_host, args.metrics_port) if args.metrics_port else None
+    try:
+        if args.once:
+            await sync.sync_once()
+        else:
+            await sync.run(args.interval, args.reconcile_interval, args.queue_url, args.exit_on_complete,
+                           args.metrics_file)
+    finally:
+        if server is not None:
+            server.close()
+        sync.executor.shutdown(wait=False)
+    counters = sync.metrics.counters
+    logger.info(f"{counters['copies_performed']} copies performed, {counters['copies_skipped']} skipped as "
+                f"unchanged, {counters['objects_uploaded']} uploads, {counters['objects_deleted']} deletions")
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync pipeline outputs to the dashboard location')
+    parser.add_argument('--bucket', required=True, help='Data bucket the pipeline writes to')
+    parser.add_argument('--dashboard-bucket', help='Bucket the dashboard reads from (default: --bucket)')
+    parser.add_argument('--region', help='AWS region')
+    parser.add_argument('--profile', help='AWS CLI profile')
+    parser.add_argument('--queue-url', help='SQS queue receiving S3 event notifications for the data bucket')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f"Seconds between polling passes without a queue (default: {DEFAULT_INTERVAL})")
+    parser.add_argument('--reconcile-interval', type=float, default=DEFAULT_RECONCILE_INTERVAL,
+                        help=f"Seconds between full listings (default: {DEFAULT_RECONCILE_INTERVAL})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Pooled connections and concurrent transfers (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--metrics-port', type=int, help='Serve metrics on this port')
+    parser.add_argument('--metrics-host', default='127.0.0.1', help='Address to serve metrics on')
+    parser.add_argument('--metrics-file', help='Write a metrics snapshot to this file after every pass')
+    parser.add_argument('--exit-on-complete', action='store_true', help='Stop once the pipeline has completed')
+    parser.add_argument('--once', action='store_true', help='Run a single pass and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(run_service(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -39,11 +39,15 @@ mkdir -p "$TEMP_DIR"
 
 # Copy the lambda function to the package directory
 cp "./lambda/progress_updater.py" "$TEMP_DIR/"
+cp "./lambda/json_publisher.py" "$TEMP_DIR/"
+cp "./lambda/progress_reducer.py" "$TEMP_DIR/"
+cp "./workflow/templates/profiling.py" "$TEMP_DIR/"
+cp "./workflow/templates/dashboard_products.py" "$TEMP_DIR/"
 
 # Create zip package
 echo "Creating Lambda deployment package..."
 cd "$TEMP_DIR"
-zip -r lambda_package.zip progress_updater.py
+zip -r lambda_package.zip progress_updater.py json_publisher.py progress_reducer.py profiling.py dashboard_products.py
 cd - > /dev/null
 
 # Copy the package to S3
@@ -72,6 +76,10 @@ if check_stack_exists "$LAMBDA_STACK_NAME"; then
   PARAMS="ParameterKey=DataBucketName,ParameterValue=$BUCKET_NAME"
   PARAMS="$PARAMS ParameterKey=DashboardBucketName,ParameterValue=${BUCKET_NAME}-dashboard"
   PARAMS="$PARAMS ParameterKey=JobQueueName,ParameterValue=${STACK_NAME}-queue"
+  # PIPELINE_PROFILE=1 or cprofile logs per-section profiles (workflow/templates/profiling.py)
+  if [ -n "$PIPELINE_PROFILE" ]; then
+    PARAMS="$PARAMS ParameterKey=ProfilingMode,ParameterValue=$PIPELINE_PROFILE"
+  fi
   
   update_stack "$LAMBDA_STACK_NAME" "./lambda/lambda_updater.yaml" "$PARAMS"
 else
@@ -81,6 +89,10 @@ else
   PARAMS="ParameterKey=DataBucketName,ParameterValue=$BUCKET_NAME"
   PARAMS="$PARAMS ParameterKey=DashboardBucketName,ParameterValue=${BUCKET_NAME}-dashboard"
   PARAMS="$PARAMS ParameterKey=JobQueueName,ParameterValue=${STACK_NAME}-queue"
+  # PIPELINE_PROFILE=1 or cprofile logs per-section profiles (workflow/templates/profiling.py)
+  if [ -n "$PIPELINE_PROFILE" ]; then
+    PARAMS="$PARAMS ParameterKey=ProfilingMode,ParameterValue=$PIPELINE_PROFILE"
+  fi
   
   create_stack "$LAMBDA_STACK_NAME" "./lambda/lambda_updater.yaml" "$PARAMS"
   
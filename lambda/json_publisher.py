@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# json_publisher.py - Compact, compressed JSON publishing for the dashboard Lambdas
+#
+# The dashboard polls the published documents, so every byte is paid for
+# viewers x refresh rate. Documents are encoded without whitespace (with
+# orjson when it is installed), compressed, and uploaded with matching
+# Content-Encoding and Cache-Control headers so browsers decode them
+# transparently and revalidate instead of re-downloading.
+
+import gzip
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # The standard library encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Only needed when PUBLISH_ENCODING=br
+    brotli = None
+
+# gzip works over the plain HTTP S3 website endpoint; browsers only accept br over HTTPS
+DEFAULT_ENCODING = os.environ.get('PUBLISH_ENCODING', 'gzip')
+DEFAULT_CACHE_CONTROL = os.environ.get('PUBLISH_CACHE_CONTROL', 'no-cache')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def _replace_non_finite(value: Any) -> Any:
+    """Replace NaN and infinity with None, which JSON.parse accepts"""
+    if isinstance(value, float) and (value != value or value in (float('inf'), float('-inf'))):
+        return None
+    if isinstance(value, dict):
+        return {key: _replace_non_finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_replace_non_finite(item) for item in value]
+    return value
+
+def dumps(data: Any) -> bytes:
+    """
+    Encode data as compact UTF-8 JSON.
+
+    Non-finite floats are written as null by both encoders, since browsers
+    reject the NaN literal the standard library writes by default.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:  # e.g. non-string keys, which the standard library converts
+            pass
+    try:
+        return json.dumps(data, separators=(',', ':'), allow_nan=False).encode('utf-8')
+    except ValueError:
+        return json.dumps(_replace_non_finite(data), separators=(',', ':')).encode('utf-8')
+
+def compress(body: bytes, encoding: str = DEFAULT_ENCODING) -> bytes:
+    """Compress a body with the given Content-Encoding"""
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'br':
+        if brotli is None:
+            raise RuntimeError("Brotli encoding requires the brotli package")
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'identity':
+        return body
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+def decompress(body: bytes, encoding: Optional[str]) -> bytes:
+    """
+    Inverse of compress.
+
+    Only gzip and br are decoded; anything else (no encoding, identity, or
+    transfer encodings such as aws-chunked that S3 may report) is returned as-is.
+    """
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'br':
+        if brotli is None:
+            raise RuntimeError("Brotli decoding requires the brotli package")
+        return brotli.decompress(body)
+    return body
+
+def encode_body(data: Any, encoding: str = DEFAULT_ENCODING) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Encode and compress a document for upload.
+
+    Returns:
+        Tuple of (body bytes, S3 put_object header arguments)
+    """
+    body = compress(dumps(data), encoding)
+    headers = {'ContentType': 'application/json', 'CacheControl': DEFAULT_CACHE_CONTROL}
+    if encoding != 'identity':
+        headers['ContentEncoding'] = encoding
+    return body, headers
+
+def put_bytes(client, bucket: str, key: str, body: bytes, content_type: str,
+              encoding: str = DEFAULT_ENCODING) -> int:
+    """
+    Upload an already serialized body (e.g. a dashboard shard), compressed.
+
+    Returns:
+        Number of bytes uploaded
+    """
+    compressed = compress(body, encoding)
+    arguments = {'ContentType': content_type, 'CacheControl': DEFAULT_CACHE_CONTROL}
+    if encoding != 'identity':
+        arguments['ContentEncoding'] = encoding
+    client.put_object(Bucket=bucket, Key=key, Body=compressed, **arguments)
+    return len(compressed)
+
+def put_json(client, bucket: str, key: str, data: Any, encoding: str = DEFAULT_ENCODING) -> int:
+    """
+    Upload a document as compact, compressed JSON.
+
+    Returns:
+        Number of bytes uploaded
+    """
+    body, headers = encode_body(data, encoding)
+    client.put_object(Bucket=bucket, Key=key, Body=body, **headers)
+    return len(body)
+
+def load_json_body(response: Dict[str, Any]) -> Any:
+    """Parse an S3 get_object response, decoding its Content-Encoding"""
+    body = decompress(response['Body'].read(), response.get('ContentEncoding'))
+    return json.loads(body.decode('utf-8'))
+
+def benchmark(data: Any, repeat: int = 50) -> Dict[str, Dict[str, float]]:
+    """
+    Bytes and CPU time per publish for the legacy and compact encodings.
+
+    Returns:
+        {variant: {"bytes", "cpu_ms"}} where cpu_ms is process time per publish
+    """
+    variants = {
+        'indent2': lambda: json.dumps(data, indent=2).encode('utf-8'),
+        'compact': lambda: dumps(data),
+        'compact+gzip': lambda: compress(dumps(data), 'gzip')
+    }
+    if brotli is not None:
+        variants['compact+br'] = lambda: compress(dumps(data), 'br')
+
+    results = {}
+    for name, encode in variants.items():
+        start = time.process_time()
+        for _ in range(repeat):
+            body = encode()
+        results[name] = {
+            'bytes': len(body),
+            'cpu_ms': round((time.process_time() - start) * 1000 / repeat, 3)
+        }
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark bytes and CPU per publish for a JSON document')
+    parser.add_argument('documents', nargs='+', help='JSON documents (e.g. microbiome_summary.json)')
+    parser.add_argument('--repeat', type=int, default=50, help='Encodings per variant (default: 50)')
+    parser.add_argument('--viewers', type=int, default=10, help='Dashboard viewers polling (default: 10)')
+    parser.add_argument('--poll-seconds', type=float, default=5.0, help='Dashboard refresh interval (default: 5)')
+    args = parser.parse_args()
+
+    fetches_per_hour = args.viewers * 3600 / args.poll_seconds
+    print(f"Encoder: {'orjson' if orjson is not None else 'json'}; "
+          f"{fetches_per_hour:.0f} fetches/hour per document")
+    for path in args.documents:
+        with open(path, 'r') as f:
+            document = json.load(f)
+        print(path)
+        for name, result in benchmark(document, args.repeat).items():
+            transfer_mb = result['bytes'] * fetches_per_hour / 1e6
+            print(f"  {name:14s} {result['bytes']:>10d} bytes  {result['cpu_ms']:>8.3f} ms CPU  "
+                  f"{transfer_mb:>10.1f} MB/hour")
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# progress_reducer.py - Incremental per-sample progress from task events
+#
+# progress_tracker.sh writes one object per task event to
+# progress/{workflow_id}/updates/{epoch}_{process}_{status}.json. Keys sort
+# chronologically, so the reducer lists them with StartAfter from a
+# checkpointed cursor and folds only the new events into per-sample state.
+# Everything needed is in the key, so events are never downloaded.
+
+import logging
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from json_publisher import put_json, load_json_body
+
+logger = logging.getLogger(__name__)
+
+UPDATES_PREFIX = "progress/{workflow_id}/updates/"
+CHECKPOINT_KEY = "progress/{workflow_id}/reducer_state.json"
+SAMPLES_KEY = os.environ.get('SAMPLES_KEY', 'input/sample_list.csv')
+
+# Per-sample processes that report events, as "<stage>_<sample_id>"
+SAMPLE_STAGES = [
+    stage.strip() for stage in os.environ.get('PROGRESS_SAMPLE_STAGES', 'preprocess_reads').split(',')
+    if stage.strip()
+]
+WORKFLOW_EVENT = "workflow_complete"
+
+# Events are re-listed this far behind the cursor so that uploads which
+# land late (slow nodes, clock skew) are still counted exactly once
+LATE_EVENT_SECONDS = 300
+
+STATE_VERSION = 1
+
+# Sharded runs (start_demo with "shards") give every Batch array child the
+# workflow ID "<run_id>-shard-<index>" and describe their shards here
+RUN_KEY = "progress/{run_id}/run.json"
+SHARD_SEPARATOR = "-shard-"
+
+def parse_event_key(key: str, prefix: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse an event key written by progress_tracker.sh.
+
+    Returns:
+        {"key", "timestamp", "process", "status"}, or None for other objects
+    """
+    if not key.startswith(prefix) or not key.endswith('.json'):
+        return None
+    name = key[len(prefix):-len('.json')]
+    timestamp, _, rest = name.partition('_')
+    process, _, status = rest.rpartition('_')
+    if not timestamp.isdigit() or not process:
+        return None
+    return {'key': key, 'timestamp': int(timestamp), 'process': process, 'status': normalize_status(status)}
+
+def normalize_status(status: str) -> str:
+    """
+    Map a reported status to started, completed or failed.
+
+    afterScript cannot always tell success from failure and may report an
+    empty status; the task has ended either way, and a failed attempt that
+    is retried reports a new "started" event afterwards.
+    """
+    if status in ('started', 'failed'):
+        return status
+    return 'completed'
+
+def split_sample_process(process: str, stages: List[str] = SAMPLE_STAGES) -> Optional[Tuple[str, str]]:
+    """Split "<stage>_<sample_id>" into (stage, sample_id) for per-sample stages"""
+    for stage in stages:
+        if process.startswith(stage + '_') and len(process) > len(stage) + 1:
+            return stage, process[len(stage) + 1:]
+    return None
+
+class ProgressReducer:
+    """
+    Per-sample progress folded from task events.
+
+    Each sample keeps the latest (status, timestamp) per stage; a sample is
+    completed once every stage completed, failed if its latest attempt of any
+    stage failed, and running otherwise. Counts are adjusted as samples change
+    state, so applying an event costs O(1) regardless of history.
+    """
+
+    def __init__(self, workflow_id: str, stages: List[str] = SAMPLE_STAGES):
+        self.workflow_id = workflow_id
+        self.stages = list(stages)
+        self.cursor = None
+        self.recent = {}
+        self.samples = {}
+        self.counts = {'completed': 0, 'running': 0, 'failed': 0}
+        self.total_samples = None
+        self.first_event = None
+        self.last_event = None
+        self.workflow_status = None
+        self.events_applied = 0
+
+    @property
+    def prefix(self) -> str:
+        return UPDATES_PREFIX.format(workflow_id=self.workflow_id)
+
+    def sample_state(self, sample: str) -> Optional[str]:
+        """Derived state of a sample: completed, running, failed or None if unseen"""
+        stages = self.samples.get(sample)
+        if not stages:
+            return None
+        statuses = [stages[stage][0] for stage in self.stages if stage in stages]
+        if 'failed' in statuses:
+            return 'failed'
+        if len(statuses) == len(self.stages) and all(status == 'completed' for status in statuses):
+            return 'completed'
+        return 'running'
+
+    def apply(self, event: Dict[str, Any]) -> bool:
+        """
+        Fold one parsed event into the state.
+
+        Returns:
+            False if the event was already applied
+        """
+        if event['key'] in self.recent:
+            return False
+        timestamp = event['timestamp']
+        self.recent[event['key']] = timestamp
+        if self.cursor is None or event['key'] > self.cursor:
+            self.cursor = event['key']
+        self.first_event = timestamp if self.first_event is None else min(self.first_event, timestamp)
+        self.last_event = timestamp if self.last_event is None else max(self.last_event, timestamp)
+        self.events_applied += 1
+
+        if event['process'] == WORKFLOW_EVENT:
+            self.workflow_status = event['status']
+            return True
+
+        split = split_sample_process(event['process'], self.stages)
+        if split is None:
+            return True
+        stage, sample = split
+
+        # Within the same second a terminal event wins over "started"
+        rank = (timestamp, event['status'] != 'started')
+        stages = self.samples.setdefault(sample, {})
+        previous = stages.get(stage)
+        if previous is not None and rank < (previous[1], previous[0] != 'started'):
+            return True
+
+        before = self.sample_state(sample)
+        stages[stage] = [event['status'], timestamp]
+        after = self.sample_state(sample)
+        if before != after:
+            if before is not None:
+                self.counts[before] -= 1
+            self.counts[after] += 1
+        return True
+
+    def start_after(self) -> Optional[str]:
+        """StartAfter key for the next listing: the cursor minus the late-event window"""
+        if self.cursor is None:
+            return None
+        cursor_time = parse_event_key(self.cursor, self.prefix)['timestamp']
+        # Keys compare as strings, so keep the cursor's digit count
+        since = str(max(0, cursor_time - LATE_EVENT_SECONDS)).zfill(len(str(cursor_time)))
+        return f"{self.prefix}{since}"
+
+    def prune_recent(self) -> None:
+        """Forget applied keys that have fallen behind the late-event window"""
+        if self.last_event is None:
+            return
+        horizon = self.last_event - LATE_EVENT_SECONDS
+        self.recent = {key: timestamp for key, timestamp in self.recent.items() if timestamp >= horizon}
+
+    def sample_counts(self) -> Dict[str, int]:
+        """Completed/running/failed/pending counts; pending covers samples with no events yet"""
+        seen = sum(self.counts.values())
+        total = max(self.total_samples or 0, seen)
+        return dict(self.counts, pending=total - seen, total=total)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': STATE_VERSION,
+            'workflow_id': self.workflow_id,
+            'stages': self.stages,
+            'cursor': self.cursor,
+            'recent': self.recent,
+            'samples': self.samples,
+            'counts': self.counts,
+            'total_samples': self.total_samples,
+            'first_event': self.first_event,
+            'last_event': self.last_event,
+            'workflow_status': self.workflow_status,
+            'events_applied': self.events_applied
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ProgressReducer':
+        reducer = cls(data['workflow_id'], data['stages'])
+        for field in ('cursor', 'recent', 'samples', 'counts', 'total_samples',
+                      'first_event', 'last_event', 'workflow_status', 'events_applied'):
+            setattr(reducer, field, data[field])
+        return reducer
+
+def list_event_keys(client, bucket: str, prefix: str, start_after: Optional[str] = None) -> Iterator[str]:
+    """List event keys in key (and therefore time) order, starting after a cursor"""
+    arguments = {'Bucket': bucket, 'Prefix': prefix}
+    if start_after:
+        arguments['StartAfter'] = start_after
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(**arguments):
+        for item in page.get('Contents', []):
+            yield item['Key']
+
+def load_checkpoint(client, bucket: str, workflow_id: str,
+                    stages: List[str] = SAMPLE_STAGES) -> Optional[ProgressReducer]:
+    """Load the checkpointed reducer, or None if there is none (or it is stale)"""
+    key = CHECKPOINT_KEY.format(workflow_id=workflow_id)
+    try:
+        data = load_json_body(client.get_object(Bucket=bucket, Key=key))
+    except Exception:
+        return None
+    if data.get('version') != STATE_VERSION or data.get('stages') != list(stages):
+        logger.info(f"Discarding reducer checkpoint {key} written with different settings")
+        return None
+    return ProgressReducer.from_dict(data)
+
+def save_checkpoint(client, bucket: str, reducer: ProgressReducer) -> None:
+    put_json(client, bucket, CHECKPOINT_KEY.format(workflow_id=reducer.workflow_id), reducer.to_dict())
+
+def count_samples(client, bucket: str, key: str = SAMPLES_KEY) -> Optional[int]:
+    """Number of rows in the sample sheet, excluding the header"""
+    try:
+        body = client.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8')
+    except Exception as e:
+        logger.warning(f"Could not read sample sheet s3://{bucket}/{key}: {str(e)}")
+        return None
+    rows = [line for line in body.splitlines() if line.strip()]
+    return max(0, len(rows) - 1)
+
+def reduce_workflow_progress(client, bucket: str, workflow_id: str,
+                             stages: List[str] = SAMPLE_STAGES, samples_key: str = SAMPLES_KEY) -> ProgressReducer:
+    """
+    Bring the checkpointed progress for a workflow up to date.
+
+    Only events after the cursor (plus the late-event window) are listed and
+    applied; the checkpoint is rewritten when anything changed.
+    """
+    reducer = load_checkpoint(client, bucket, workflow_id, stages) or ProgressReducer(workflow_id, stages)
+    changed = False
+    if reducer.total_samples is None:
+        reducer.total_samples = count_samples(client, bucket, samples_key)
+        changed = reducer.total_samples is not None
+
+    applied = 0
+    for key in list_event_keys(client, bucket, reducer.prefix, reducer.start_after()):
+        event = parse_event_key(key, reducer.prefix)
+        if event is not None and reducer.apply(event):
+            applied += 1
+
+    if applied or changed:
+        reducer.prune_recent()
+        save_checkpoint(client, bucket, reducer)
+    logger.info(f"Applied {applied} new progress events for workflow {workflow_id}")
+    return reducer
+
+def split_shard_workflow_id(workflow_id: str) -> Optional[Tuple[str, int]]:
+    """Split "<run_id>-shard-<index>" into (run_id, index), or None for an unsharded workflow"""
+    run_id, separator, index = workflow_id.rpartition(SHARD_SEPARATOR)
+    if not separator or not run_id or not index.isdigit():
+        return None
+    return run_id, int(index)
+
+def load_run(client, bucket: str, workflow_id: str) -> Optional[Dict[str, Any]]:
+    """The manifest of the sharded run a workflow belongs to, or None if it is not sharded"""
+    shard = split_shard_workflow_id(workflow_id)
+    run_id = shard[0] if shard else workflow_id
+    try:
+        return load_json_body(client.get_object(Bucket=bucket, Key=RUN_KEY.format(run_id=run_id)))
+    except Exception:
+        return None
+
+def reduce_run_progress(client, bucket: str, run: Dict[str, Any],
+                        stages: List[str] = SAMPLE_STAGES) -> Dict[str, ProgressReducer]:
+    """
+    Bring every shard of a sharded run up to date.
+
+    Each shard keeps its own checkpoint and counts against its own sample
+    sheet, so the run view is the sum of the shards.
+
+    Returns:
+        {shard workflow ID: reducer}
+    """
+    return {
+        shard['workflow_id']: reduce_workflow_progress(client, bucket, shard['workflow_id'], stages,
+                                                       shard['samples_key'])
+        for shard in run['shards']
+    }
+
+def combine_counts(reducers: List[ProgressReducer]) -> Dict[str, int]:
+    """Sample counts summed over several reducers"""
+    counts = {'completed': 0, 'running': 0, 'failed': 0, 'pending': 0, 'total': 0}
+    for reducer in reducers:
+        for state, count in reducer.sample_counts().items():
+            counts[state] += count
+    return counts
@@ -12,6 +12,12 @@ import os
 import datetime
 from typing import Dict, Any, List, Optional
 
+from json_publisher import put_json, put_bytes, load_json_body
+from progress_reducer import reduce_workflow_progress, load_run, reduce_run_progress, combine_counts
+# Packaged from workflow/templates by deploy_lambda_updater.sh; PIPELINE_PROFILE turns profiling on
+from profiling import profiled, profiled_handler
+from dashboard_products import changed_shards
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,8 +35,26 @@ PIPELINE_TABLE = os.environ.get('PIPELINE_TABLE', 'microbiome-demo-pipeline')
 
 # Constants
 VALID_STATUSES = ['SUBMITTED', 'RUNNING', 'SUCCEEDED', 'FAILED']
-MAX_DEMO_RUNTIME_SECONDS = 15 * 60  # 15 minutes
+MAX_DEMO_RUNTIME_SECONDS = 15 * 60  # Ramp for the example summary only
+
+# Latest task event, copied here by progress_tracker.sh to identify the current run
+LATEST_UPDATE_KEY = "progress/latest/latest_update.json"
+
+# Tiered dashboard products written by create_summary (see dashboard_products.py)
+PRODUCTS_SOURCE_PREFIX = "results/summary/dashboard"
+PRODUCTS_DASHBOARD_PREFIX = "data/dashboard"
+PRODUCTS_OVERVIEW = "overview.json"
+
+# Per-node utilization windows published by resource_sampler.py
+UTILIZATION_PREFIX = "monitoring/utilization"
+UTILIZATION_WINDOWS = ["raw", "1m", "5m", "1h"]
+# Time each window spans (resource_sampler.WINDOWS); a node that has not published
+# for longer, e.g. a terminated instance, no longer contributes to the window
+UTILIZATION_WINDOW_SECONDS = {"raw": 5 * 120, "1m": 60 * 60, "5m": 300 * 72, "1h": 3600 * 48}
+UTILIZATION_FIELDS = ["cpu", "memory", "gpu"]
+DASHBOARD_UTILIZATION_WINDOW = "1m"
 
+@profiled_handler('progress_updater')
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     Handler for Lambda function to update dashboard data with validation
@@ -79,6 +103,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             })
         }
 
+@profiled()
 def get_pipeline_job_status() -> (str, Dict[str, Any]):
     """
     Get the status of the pipeline job from AWS Batch
@@ -153,61 +178,99 @@ def update_job_data_in_dynamodb(job_data: Dict[str, Any]) -> None:
     except Exception as e:
         logger.error(f"Error updating DynamoDB: {str(e)}")
 
+def find_workflow_id(job_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Identify the Nextflow run whose task events should be reduced
+    """
+    if job_data.get('workflow_id'):
+        return job_data['workflow_id']
+    latest_update = read_json_object(DATA_BUCKET, LATEST_UPDATE_KEY)
+    if latest_update:
+        return latest_update.get('workflow_id')
+    return None
+
+def slowest_shard_progress(run: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Remaining-time estimate of a sharded run: shards run in parallel, so the
+    run finishes with the shard that has the most work left
+    """
+    slowest = {}
+    for shard in run['shards']:
+        progress = read_json_object(DATA_BUCKET, f"progress/{shard['workflow_id']}/progress.json") or {}
+        if (progress.get('estimated_remaining_seconds') or 0) >= (slowest.get('estimated_remaining_seconds') or 0):
+            slowest = progress
+    return slowest
+
+@profiled()
 def generate_progress_data(job_status: str, job_data: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Generate validated progress data based on job status
+    Generate validated progress data from per-sample task events
     """
-    # Get the total sample count
-    total_samples = 100  # Default for demo
-    
     # Calculate actual elapsed time
     now = int(time.time() * 1000)
-    started_at = job_data.get('started_at', job_data.get('created_at', now))
+    started_at = job_data.get('started_at') or job_data.get('created_at') or now
     stopped_at = job_data.get('stopped_at', 0)
     
     if stopped_at > 0 and job_status in ['SUCCEEDED', 'FAILED']:
         elapsed_ms = stopped_at - started_at
     else:
         elapsed_ms = now - started_at
+    elapsed_seconds = max(0, int(elapsed_ms // 1000))
     
-    # Convert to seconds and cap at max demo runtime
-    elapsed_seconds = min(elapsed_ms // 1000, MAX_DEMO_RUNTIME_SECONDS)
+    # Fold only the events written since the last invocation into the checkpointed counts
+    workflow_id = find_workflow_id(job_data)
+    counts = {'completed': 0, 'running': 0, 'failed': 0, 'pending': 0, 'total': 0}
+    last_event = None
+    workflow_progress = {}
+    run = load_run(s3_client, DATA_BUCKET, workflow_id) if workflow_id else None
+    if run:
+        # A sharded run: roll the shards up into one view of the run
+        workflow_id = run['run_id']
+        try:
+            reducers = reduce_run_progress(s3_client, DATA_BUCKET, run)
+            counts = combine_counts(list(reducers.values()))
+            events = [reducer.last_event for reducer in reducers.values() if reducer.last_event is not None]
+            last_event = max(events) if events else None
+        except Exception as e:
+            logger.error(f"Error reducing progress events for run {workflow_id}: {str(e)}")
+        workflow_progress = slowest_shard_progress(run)
+        # The newest Batch job is the merge job, which waits in PENDING while the shards run
+        if job_status not in ['SUCCEEDED', 'FAILED'] and counts['total'] > counts['pending']:
+            job_status = 'RUNNING'
+    elif workflow_id:
+        try:
+            reducer = reduce_workflow_progress(s3_client, DATA_BUCKET, workflow_id)
+            counts = reducer.sample_counts()
+            last_event = reducer.last_event
+        except Exception as e:
+            logger.error(f"Error reducing progress events for {workflow_id}: {str(e)}")
+        # Remaining-time estimate maintained by progress_tracker.sh (see progress_eta.py)
+        workflow_progress = read_json_object(DATA_BUCKET, f"progress/{workflow_id}/progress.json") or {}
     
-    # Calculate progress based on elapsed time
-    progress_percentage = min(100, (elapsed_seconds / MAX_DEMO_RUNTIME_SECONDS) * 100)
-    completed_samples = min(total_samples, int((progress_percentage / 100) * total_samples))
+    total_samples = counts['total']
+    completed_samples = counts['completed']
+    running_samples = counts['running']
+    failed_samples = counts['failed']
     
-    # Determine running samples based on status
+    # The Batch job state decides the overall status; the events give the counts
     if job_status == 'SUCCEEDED':
         running_samples = 0
-        pending_samples = 0
         failed_samples = 0
         completed_samples = total_samples
         status = "COMPLETED"
     elif job_status == 'FAILED':
-        # Some samples failed
+        # Samples that never finished failed with the run
         running_samples = 0
-        pending_samples = 0
         failed_samples = total_samples - completed_samples
         status = "FAILED"
     elif job_status == 'RUNNING':
-        # Calculate reasonable values for running/pending
-        running_samples = min(10, total_samples - completed_samples)
-        pending_samples = total_samples - completed_samples - running_samples
-        failed_samples = 0
         status = "RUNNING"
     else:  # SUBMITTED or any other state
         running_samples = 0
-        pending_samples = total_samples
         failed_samples = 0
         completed_samples = 0
         status = "SUBMITTED"
-    
-    # Validate that the counts add up to total_samples
-    if completed_samples + running_samples + pending_samples + failed_samples != total_samples:
-        logger.warning("Sample counts don't add up to total, adjusting...")
-        # Adjust pending samples to make counts add up
-        pending_samples = total_samples - completed_samples - running_samples - failed_samples
+    pending_samples = total_samples - completed_samples - running_samples - failed_samples
     
     # Create progress data structure
     progress_data = {
@@ -222,8 +285,17 @@ def generate_progress_data(job_status: str, job_data: Dict[str, Any]) -> Dict[st
             "failed": failed_samples
         },
         "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
-        "job_id": job_data['job_id']
+        "job_id": job_data['job_id'],
+        "workflow_id": workflow_id,
+        "last_event_time": last_event,
+        "estimated_remaining_seconds": workflow_progress.get("estimated_remaining_seconds"),
+        "estimated_remaining_low_seconds": workflow_progress.get("estimated_remaining_low_seconds"),
+        "estimated_remaining_high_seconds": workflow_progress.get("estimated_remaining_high_seconds")
     }
+    if status in ["COMPLETED", "FAILED"]:
+        for field in ["estimated_remaining_seconds", "estimated_remaining_low_seconds",
+                      "estimated_remaining_high_seconds"]:
+            progress_data[field] = 0
     
     # Validate the progress data
     validate_progress_data(progress_data)
@@ -271,32 +343,20 @@ def validate_progress_data(data: Dict[str, Any]) -> None:
         raise ValueError(f"Sample counts ({count_sum}) don't match total ({total})")
     
     # Check that time elapsed is reasonable
-    if data["time_elapsed"] < 0 or data["time_elapsed"] > MAX_DEMO_RUNTIME_SECONDS:
+    if data["time_elapsed"] < 0:
         raise ValueError(f"Invalid time_elapsed: {data['time_elapsed']}")
 
+@profiled()
 def save_progress_data(progress_data: Dict[str, Any]) -> None:
     """
     Save progress data to S3 buckets
     """
     try:
-        # Convert to JSON
-        progress_json = json.dumps(progress_data, indent=2)
-        
         # Save to data bucket for pipeline history
-        s3_client.put_object(
-            Bucket=DATA_BUCKET,
-            Key=f"status/progress.json",
-            Body=progress_json,
-            ContentType='application/json'
-        )
+        put_json(s3_client, DATA_BUCKET, "status/progress.json", progress_data)
         
         # Save to dashboard bucket for display
-        s3_client.put_object(
-            Bucket=DASHBOARD_BUCKET,
-            Key="data/progress.json",
-            Body=progress_json,
-            ContentType='application/json'
-        )
+        put_json(s3_client, DASHBOARD_BUCKET, "data/progress.json", progress_data)
         
         logger.info("Progress data saved successfully")
         
@@ -304,6 +364,7 @@ def save_progress_data(progress_data: Dict[str, Any]) -> None:
         logger.error(f"Error saving progress data: {str(e)}")
         raise
 
+@profiled()
 def update_summary_data(job_status: str, job_data: Dict[str, Any]) -> None:
     """
     Update or generate summary data based on job status
@@ -318,7 +379,7 @@ def update_summary_data(job_status: str, job_data: Dict[str, Any]) -> None:
                 Bucket=DATA_BUCKET,
                 Key="results/summary/microbiome_summary.json"
             )
-            summary_data = json.loads(response['Body'].read().decode('utf-8'))
+            summary_data = load_json_body(response)
         except:
             # Use example data if real data isn't available
             summary_data = generate_example_summary(job_status, job_data)
@@ -327,18 +388,66 @@ def update_summary_data(job_status: str, job_data: Dict[str, Any]) -> None:
         validate_summary_data(summary_data)
         
         # Save summary data to dashboard bucket
-        s3_client.put_object(
-            Bucket=DASHBOARD_BUCKET,
-            Key="data/summary.json",
-            Body=json.dumps(summary_data, indent=2),
-            ContentType='application/json'
-        )
+        put_json(s3_client, DASHBOARD_BUCKET, "data/summary.json", summary_data)
         
         logger.info("Summary data updated successfully")
         
+        # Publish the tiered overview and whichever detail shards changed
+        publish_dashboard_products()
+        
     except Exception as e:
         logger.error(f"Error updating summary data: {str(e)}")
 
+def read_json_object(bucket: str, key: str) -> Optional[Dict[str, Any]]:
+    """
+    Read a JSON object from S3, returning None if it does not exist or cannot be parsed
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        return load_json_body(response)
+    except Exception:
+        return None
+
+@profiled()
+def publish_dashboard_products() -> List[str]:
+    """
+    Publish the tiered dashboard products, uploading only shards whose content hash changed.
+    
+    Shards are copied before the overview that references them, and shards no
+    longer listed are removed afterwards, so the dashboard never sees a manifest
+    pointing at missing data.
+    
+    Returns:
+        List of shard names that were uploaded
+    """
+    overview = read_json_object(DATA_BUCKET, f"{PRODUCTS_SOURCE_PREFIX}/{PRODUCTS_OVERVIEW}")
+    if not overview or "shards" not in overview:
+        logger.info("No tiered dashboard products available yet")
+        return []
+    
+    previous = read_json_object(DASHBOARD_BUCKET, f"{PRODUCTS_DASHBOARD_PREFIX}/{PRODUCTS_OVERVIEW}")
+    if previous == overview:
+        logger.info("Dashboard products unchanged")
+        return []
+    
+    changed = changed_shards(previous, overview)
+    for name in changed:
+        response = s3_client.get_object(Bucket=DATA_BUCKET, Key=f"{PRODUCTS_SOURCE_PREFIX}/{name}")
+        put_bytes(
+            s3_client, DASHBOARD_BUCKET, f"{PRODUCTS_DASHBOARD_PREFIX}/{name}", response['Body'].read(),
+            'application/json' if name.endswith('.json') else 'application/octet-stream'
+        )
+    
+    put_json(s3_client, DASHBOARD_BUCKET, f"{PRODUCTS_DASHBOARD_PREFIX}/{PRODUCTS_OVERVIEW}", overview)
+    
+    stale = set((previous or {}).get("shards", {})) - set(overview["shards"])
+    for name in sorted(stale):
+        s3_client.delete_object(Bucket=DASHBOARD_BUCKET, Key=f"{PRODUCTS_DASHBOARD_PREFIX}/{name}")
+    
+    logger.info(f"Dashboard products published: {len(changed)} of {len(overview['shards'])} shards changed, "
+                f"{len(stale)} removed")
+    return changed
+
 def generate_example_summary(job_status: str, job_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Generate example summary data for testing
@@ -458,64 +567,97 @@ def validate_summary_data(data: Dict[str, Any]) -> None:
         if not isinstance(execution_metrics[metric], (int, float)):
             raise ValueError(f"Metric {metric} must be a number")
 
+def list_utilization_nodes() -> List[str]:
+    """
+    Node IDs that have published utilization windows (see resource_sampler.py)
+    """
+    nodes = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=DATA_BUCKET, Prefix=f"{UTILIZATION_PREFIX}/", Delimiter='/'):
+        for prefix in page.get('CommonPrefixes', []):
+            nodes.append(prefix['Prefix'].rstrip('/').rsplit('/', 1)[-1])
+    return nodes
+
+def merge_utilization(window: str, documents: List[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Merge per-node window documents into one cluster-wide document.
+    
+    Timestamps are aligned to the window resolution and each metric is the
+    mean over the nodes that reported it at that time. Documents last updated
+    longer ago than the window spans come from nodes that are gone and are
+    skipped, so they no longer count as instances.
+    """
+    now = time.time() if now is None else now
+    span = UTILIZATION_WINDOW_SECONDS.get(window)
+    if span is not None:
+        documents = [doc for doc in documents if now - (doc.get("updated") or 0) <= span]
+    resolution = max([doc.get("resolution_seconds") or 1 for doc in documents] or [1])
+    sums: Dict[int, Dict[str, List[float]]] = {}
+    for doc in documents:
+        for i, timestamp in enumerate(doc.get("time", [])):
+            bucket = int(timestamp // resolution * resolution)
+            point = sums.setdefault(bucket, {field: [] for field in UTILIZATION_FIELDS})
+            for field in UTILIZATION_FIELDS:
+                values = doc.get(field, [])
+                if i < len(values) and values[i] is not None:
+                    point[field].append(values[i])
+    
+    times = sorted(sums)
+    merged = {
+        "window": window,
+        "resolution_seconds": resolution,
+        "nodes": len(documents),
+        "gpu_nodes": sum(1 for doc in documents if any(v is not None for v in doc.get("gpu", []))),
+        "cpus": sum(doc.get("cpus") or 0 for doc in documents),
+        "time": times
+    }
+    for field in UTILIZATION_FIELDS:
+        merged[field] = [
+            round(sum(sums[t][field]) / len(sums[t][field]), 1) if sums[t][field] else None
+            for t in times
+        ]
+    return merged
+
+@profiled()
 def update_resource_data(job_status: str, job_data: Dict[str, Any]) -> None:
     """
-    Update resource utilization data
+    Publish cluster utilization from the samples the compute nodes report.
+    
+    Each node keeps its own ring buffers and publishes one document per
+    window, so no history is read back or rewritten here: the node documents
+    are merged and republished per window, plus data/resources.json in the
+    format the dashboard chart expects.
     """
     try:
-        # Try to get existing resource data
-        try:
-            response = s3_client.get_object(
-                Bucket=DASHBOARD_BUCKET,
-                Key="data/resources.json"
-            )
-            resource_data = json.loads(response['Body'].read().decode('utf-8'))
-            utilization = resource_data.get("utilization", [])
-        except:
-            # Start with empty utilization
-            utilization = []
-        
-        # Calculate elapsed time in minutes
-        now = int(time.time() * 1000)
-        started_at = job_data.get('started_at', job_data.get('created_at', now))
-        elapsed_minutes = (now - started_at) // 60000
-        
-        # Generate a new data point if the job is running
-        if job_status in ['RUNNING', 'SUCCEEDED']:
-            # Create realistic resource usage that varies over time
-            time_point = len(utilization)
-            
-            # Calculate wave patterns for CPU and memory
-            from math import sin, cos
-            cpu_base = 50 + 20 * sin(time_point / 5)
-            memory_base = 70 + 10 * cos(time_point / 7)
-            
-            # GPU usage starts later in the pipeline
-            gpu_usage = 0
-            if elapsed_minutes >= 3:  # GPU kicks in at 3 minutes
-                gpu_usage = 40 + 15 * sin(time_point / 4)
-            
-            # Create new data point
-            new_point = {
-                "time": time_point,
-                "cpu": round(cpu_base, 1),
-                "memory": round(memory_base, 1),
-                "gpu": round(gpu_usage, 1)
+        nodes = list_utilization_nodes()
+        merged_windows = {}
+        for window in UTILIZATION_WINDOWS:
+            documents = [
+                doc for doc in (
+                    read_json_object(DATA_BUCKET, f"{UTILIZATION_PREFIX}/{node}/{window}.json") for node in nodes
+                ) if doc
+            ]
+            merged_windows[window] = merge_utilization(window, documents)
+            put_json(s3_client, DASHBOARD_BUCKET, f"data/utilization/{window}.json", merged_windows[window])
+        
+        dashboard_window = merged_windows[DASHBOARD_UTILIZATION_WINDOW]
+        utilization = [
+            {
+                "time": datetime.datetime.utcfromtimestamp(timestamp).strftime('%H:%M'),
+                "cpu": dashboard_window["cpu"][i] or 0.0,
+                "memory": dashboard_window["memory"][i] or 0.0,
+                "gpu": dashboard_window["gpu"][i] or 0.0
             }
-            
-            # Add to utilization array
-            utilization.append(new_point)
-            
-            # Keep only the last 10 points for display
-            if len(utilization) > 10:
-                utilization = utilization[-10:]
+            for i, timestamp in enumerate(dashboard_window["time"])
+        ]
         
         # Update the resource data
         updated_resource_data = {
             "utilization": utilization,
             "instances": {
-                "cpu": 8,
-                "gpu": 2
+                "cpu": dashboard_window["nodes"] - dashboard_window["gpu_nodes"],
+                "gpu": dashboard_window["gpu_nodes"],
+                "vcpus": dashboard_window["cpus"]
             },
             "timestamp": datetime.datetime.utcnow().isoformat() + "Z"
         }
@@ -524,22 +666,12 @@ def update_resource_data(job_status: str, job_data: Dict[str, Any]) -> None:
         validate_resource_data(updated_resource_data)
         
         # Save to dashboard bucket
-        s3_client.put_object(
-            Bucket=DASHBOARD_BUCKET,
-            Key="data/resources.json",
-            Body=json.dumps(updated_resource_data, indent=2),
-            ContentType='application/json'
-        )
+        put_json(s3_client, DASHBOARD_BUCKET, "data/resources.json", updated_resource_data)
         
         # Also save to data bucket
-        s3_client.put_object(
-            Bucket=DATA_BUCKET,
-            Key="monitoring/resources.json",
-            Body=json.dumps(updated_resource_data, indent=2),
-            ContentType='application/json'
-        )
+        put_json(s3_client, DATA_BUCKET, "monitoring/resources.json", updated_resource_data)
         
-        logger.info("Resource data updated successfully")
+        logger.info(f"Resource data updated from {len(nodes)} nodes")
         
     except Exception as e:
         logger.error(f"Error updating resource data: {str(e)}")
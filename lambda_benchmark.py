@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the progress Lambdas.
+
+Replays a synthetic event stream (N workflows x M task updates per minute)
+through progress_notification_lambda.lambda_handler and
+lambda/progress_updater.lambda_handler against in-process stand-ins for S3,
+DynamoDB, Batch and SNS, and reports handler latency percentiles, S3
+requests and bytes moved per event. No AWS account or network is needed.
+"""
+
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import sys
+import time
+from collections import Counter
+
+from botocore.exceptions import ClientError
+
+# The handlers create boto3 clients at import time, which only needs a region
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workflow', 'templates'))
+
+import progress_notification_lambda
+import progress_updater
+
+SUMMARY_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'dashboard', 'data', 'test_microbiome_summary.json')
+
+class FakeS3:
+    """In-memory S3 client that counts requests and bytes per operation"""
+
+    def __init__(self):
+        self.objects = {}
+        self.requests = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def seed(self, bucket, key, body, **headers):
+        """Store an object without counting it (writes made outside the Lambdas)"""
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.objects[(bucket, key)] = (body, headers)
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.requests['GetObject'] += 1
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'Not found'}}, 'GetObject')
+        body, headers = self.objects[(Bucket, Key)]
+        self.bytes_out += len(body)
+        return dict(headers, Body=io.BytesIO(body), ContentLength=len(body))
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        self.requests['PutObject'] += 1
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        self.bytes_in += len(Body)
+        headers = {name: kwargs[name] for name in ('ContentType', 'ContentEncoding', 'CacheControl') if name in kwargs}
+        self.objects[(Bucket, Key)] = (Body, headers)
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        self.requests['DeleteObject'] += 1
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', StartAfter='', ContinuationToken=None, MaxKeys=1000, Delimiter=None):
+        self.requests['ListObjectsV2'] += 1
+        keys = sorted(key for bucket, key in self.objects
+                      if bucket == Bucket and key.startswith(Prefix) and key > StartAfter)
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {'Contents': [{'Key': key, 'Size': len(self.objects[(Bucket, key)][0])} for key in page],
+                    'KeyCount': len(page)}
+        if start + MaxKeys < len(keys):
+            response['IsTruncated'] = True
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation):
+        client = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                token = None
+                while True:
+                    page = client.list_objects_v2(ContinuationToken=token, **kwargs)
+                    yield page
+                    token = page.get('NextContinuationToken')
+                    if not token:
+                        break
+
+        return Paginator()
+
+class FakeTable:
+    def __init__(self, owner):
+        self.owner = owner
+        self.items = []
+
+    def put_item(self, Item):
+        self.owner.requests['PutItem'] += 1
+        self.items = [item for item in self.items if item.get('job_id') != Item.get('job_id')] + [dict(Item)]
+        return {}
+
+    def scan(self, Limit=None):
+        self.owner.requests['Scan'] += 1
+        return {'Items': self.items[:Limit]}
+
+class FakeDynamoDB:
+    """In-memory stand-in for the boto3 DynamoDB resource"""
+
+    def __init__(self):
+        self.requests = Counter()
+        self.tables = {}
+
+    def Table(self, name):
+        return self.tables.setdefault(name, FakeTable(self))
+
+class FakeBatch:
+    """Batch client reporting one running pipeline job per workflow"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.requests = Counter()
+
+    def list_jobs(self, jobQueue, filters=None):
+        self.requests['ListJobs'] += 1
+        return {'jobSummaryList': [{'jobId': job['jobId'], 'createdAt': job['createdAt']} for job in self.jobs]}
+
+    def describe_jobs(self, jobs):
+        self.requests['DescribeJobs'] += 1
+        return {'jobs': [job for job in self.jobs if job['jobId'] in jobs]}
+
+class FakeSNS:
+    def __init__(self):
+        self.requests = Counter()
+
+    def publish(self, **kwargs):
+        self.requests['Publish'] += 1
+        return {'MessageId': str(self.requests['Publish'])}
+
+def quantile(values, q):
+    """Nearest-rank quantile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+def latency_summary(latencies):
+    """Latency percentiles in milliseconds"""
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'invocations': len(milliseconds),
+        'p50_ms': round(quantile(milliseconds, 0.5), 3),
+        'p99_ms': round(quantile(milliseconds, 0.99), 3),
+        'max_ms': round(max(milliseconds, default=0.0), 3),
+        'mean_ms': round(sum(milliseconds) / max(1, len(milliseconds)), 3)
+    }
+
+def s3_event(bucket, key):
+    return {'Records': [{'s3': {'bucket': {'name': bucket}, 'object': {'key': key}}}]}
+
+def tracker_progress(workflow_id, processes, start_time, now, total_processes):
+    """progress.json as progress_tracker.sh writes it after a task completes"""
+    completed = sum(1 for process in processes.values() if process['status'] == 'completed')
+    return {
+        'workflow_id': workflow_id,
+        'start_time': start_time,
+        'processes': processes,
+        'completed_count': completed,
+        'total_processes': total_processes,
+        'elapsed_seconds': now - start_time,
+        'elapsed_time_formatted': f"{(now - start_time) // 60}m 0s",
+        'estimated_remaining_seconds': 600,
+        'estimated_remaining_formatted': "10m 0s",
+        'percent_complete': round(100 * completed / total_processes, 1),
+        'status': 'running'
+    }
+
+class Harness:
+    """Installs the stand-ins into both handler modules and replays event streams"""
+
+    def __init__(self, workflows, samples):
+        self.bucket = progress_updater.DATA_BUCKET
+        self.s3 = FakeS3()
+        self.dynamodb = FakeDynamoDB()
+        self.sns = FakeSNS()
+        self.start_time = 1700000000
+        self.workflow_ids = [f"wf-{index:04d}" for index in range(workflows)]
+        self.batch = FakeBatch([
+            {'jobId': f"job-{index:04d}", 'status': 'RUNNING', 'createdAt': (self.start_time - index) * 1000,
+             'startedAt': self.start_time * 1000, 'stoppedAt': 0}
+            for index in range(workflows)
+        ])
+        self.samples = samples
+        self.processes = {workflow_id: {} for workflow_id in self.workflow_ids}
+        self.sequence = 0
+
+        self.originals = [
+            (progress_notification_lambda, 's3', self.s3),
+            (progress_notification_lambda, 'sns', self.sns),
+            (progress_updater, 's3_client', self.s3),
+            (progress_updater, 'batch_client', self.batch),
+            (progress_updater, 'dynamodb', self.dynamodb)
+        ]
+        self.originals = [(module, name, getattr(module, name, None), fake) for module, name, fake in self.originals]
+        for module, name, _, fake in self.originals:
+            setattr(module, name, fake)
+
+        sheet = "sample_id,body_site\n" + "".join(f"S{i},stool\n" for i in range(samples))
+        self.s3.seed(self.bucket, 'input/sample_list.csv', sheet.encode('utf-8'))
+        if os.path.exists(SUMMARY_FIXTURE):
+            with open(SUMMARY_FIXTURE, 'r') as f:
+                self.s3.seed(self.bucket, 'results/summary/microbiome_summary.json', json.load(f))
+
+    def close(self):
+        """Put the real clients back into the handler modules"""
+        for module, name, original, _ in self.originals:
+            setattr(module, name, original)
+
+    def write_task_event(self, workflow_id, now):
+        """Write one task event the way progress_tracker.sh does; returns the progress.json key"""
+        processes = self.processes[workflow_id]
+        sample = self.sequence % self.samples
+        name = f"preprocess_reads_S{sample}"
+        status = 'completed' if processes.get(name, {}).get('status') == 'started' else 'started'
+        self.sequence += 1
+        update = {'process': name, 'status': status, 'timestamp': now, 'workflow_id': workflow_id}
+        self.s3.seed(self.bucket, f"progress/{workflow_id}/updates/{now}_{name}_{status}.json", update)
+        self.s3.seed(self.bucket, 'progress/latest/latest_update.json', update)
+        processes[name] = {'status': status, 'last_updated': now}
+        key = f"progress/{workflow_id}/progress.json"
+        self.s3.seed(self.bucket, key,
+                     tracker_progress(workflow_id, processes, self.start_time, now, 8 + 3 * self.samples))
+        return key
+
+    def measure(self, handler, event):
+        before_requests = sum(self.s3.requests.values())
+        before_bytes = self.s3.bytes_in + self.s3.bytes_out
+        start = time.perf_counter()
+        response = handler(event, None)
+        latency = time.perf_counter() - start
+        if response.get('statusCode') != 200:
+            raise RuntimeError(f"Handler failed: {response}")
+        return latency, sum(self.s3.requests.values()) - before_requests, \
+            self.s3.bytes_in + self.s3.bytes_out - before_bytes
+
+    def run(self, updates_per_minute, minutes):
+        """
+        Replay the stream: every minute each workflow emits its task updates
+        (each triggering the notification Lambda) and the scheduled updater runs once.
+        """
+        notification = {'latencies': [], 'requests': 0, 'bytes': 0}
+        updater = {'latencies': [], 'requests': 0, 'bytes': 0}
+        before = Counter(self.s3.requests)
+        for minute in range(minutes):
+            for update in range(updates_per_minute):
+                now = self.start_time + minute * 60 + (update * 60) // updates_per_minute
+                for workflow_id in self.workflow_ids:
+                    key = self.write_task_event(workflow_id, now)
+                    latency, requests, moved = self.measure(progress_notification_lambda.lambda_handler,
+                                                            s3_event(self.bucket, key))
+                    notification['latencies'].append(latency)
+                    notification['requests'] += requests
+                    notification['bytes'] += moved
+            latency, requests, moved = self.measure(progress_updater.lambda_handler, {'source': 'aws.events'})
+            updater['latencies'].append(latency)
+            updater['requests'] += requests
+            updater['bytes'] += moved
+
+        events = len(notification['latencies'])
+        return {
+            'workflows': len(self.workflow_ids),
+            'updates_per_minute': updates_per_minute,
+            'minutes': minutes,
+            'events': events,
+            'notification_lambda': dict(latency_summary(notification['latencies']),
+                                        s3_requests_per_event=round(notification['requests'] / events, 2),
+                                        s3_bytes_per_event=round(notification['bytes'] / events)),
+            'progress_updater': dict(latency_summary(updater['latencies']),
+                                     s3_requests_per_event=round(updater['requests'] / events, 3),
+                                     s3_bytes_per_event=round(updater['bytes'] / events),
+                                     s3_requests_per_invocation=round(updater['requests'] / minutes, 1)),
+            's3_requests': dict(self.s3.requests - before),
+            'dynamodb_requests': dict(self.dynamodb.requests),
+            'batch_requests': dict(self.batch.requests)
+        }
+
+def run_benchmark(workflows=10, updates_per_minute=6, minutes=10, samples=100):
+    """Run one scale point with fresh stand-ins"""
+    logging.disable(logging.CRITICAL)
+    harness = Harness(workflows, samples)
+    try:
+        return harness.run(updates_per_minute, minutes)
+    finally:
+        harness.close()
+        logging.disable(logging.NOTSET)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the progress Lambdas offline against local stand-ins')
+    parser.add_argument('--workflows', type=int, nargs='+', default=[1, 10, 50],
+                        help='Concurrent workflows per scale point (default: 1 10 50)')
+    parser.add_argument('--updates-per-minute', type=int, default=6,
+                        help='Task updates per workflow per minute (default: 6)')
+    parser.add_argument('--minutes', type=int, default=10, help='Minutes of events to replay (default: 10)')
+    parser.add_argument('--samples', type=int, default=100, help='Samples per workflow (default: 100)')
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for workflows in args.workflows:
+        result = run_benchmark(workflows, args.updates_per_minute, args.minutes, args.samples)
+        results.append(result)
+        for name in ('notification_lambda', 'progress_updater'):
+            stats = result[name]
+            print(f"{workflows:>4} workflows x {args.updates_per_minute}/min  {name:20s} "
+                  f"p50 {stats['p50_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms  "
+                  f"{stats['s3_requests_per_event']:>6} S3 requests/event  "
+                  f"{stats['s3_bytes_per_event']:>8} bytes/event")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to: {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,107 @@ import time
 s3 = boto3.client('s3')
 batch = boto3.client('batch')
 
+SAMPLES_KEY = 'input/sample_list.csv'
+# Sharded runs: one sample sheet per Batch array child, and the run manifest
+# that progress_reducer.py rolls the shards up with
+SHARDS_PREFIX = 'input/shards/{run_id}'
+RUN_KEY = 'progress/{run_id}/run.json'
+MAX_ARRAY_SIZE = 10000  # AWS Batch limit
+
+def split_sample_sheet(text, shards):
+    """
+    Split a sample sheet into at most `shards` sheets with the same header.
+
+    Samples are dealt round-robin so every shard gets a similar mix of body
+    sites (and therefore of read depths).
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    header, rows = lines[0], lines[1:]
+    count = max(1, min(shards, len(rows), MAX_ARRAY_SIZE))
+    return [[header] + rows[index::count] for index in range(count)]
+
+def submit_sharded_run(data_bucket, job_queue, job_definition, shards, processing_time, use_cache):
+    """
+    Submit a run as a Batch array job with one child per shard of the sample
+    sheet, followed by a merge job that depends on the whole array.
+
+    Each child runs the pipeline on its shard under the workflow ID
+    "<run_id>-shard-<index>" and stores its samples in the result cache; the
+    merge job runs the pipeline on the full sheet, restoring every sample
+    from the cache, and produces the cohort reports.
+
+    Returns:
+        The run manifest written to progress/<run_id>/run.json
+    """
+    timestamp = int(time.time())
+    run_id = f"microbiome-demo-{timestamp}"
+    sheet = s3.get_object(Bucket=data_bucket, Key=SAMPLES_KEY)['Body'].read().decode('utf-8')
+    sheets = split_sample_sheet(sheet, shards)
+    prefix = SHARDS_PREFIX.format(run_id=run_id)
+
+    manifest = {
+        'run_id': run_id,
+        'created': timestamp,
+        'total_samples': sum(len(lines) - 1 for lines in sheets),
+        'shards': []
+    }
+    for index, lines in enumerate(sheets):
+        key = f"{prefix}/shard_{index}.csv"
+        s3.put_object(Bucket=data_bucket, Key=key, Body='\n'.join(lines) + '\n', ContentType='text/csv')
+        manifest['shards'].append({
+            'index': index,
+            'workflow_id': f"{run_id}-shard-{index}",
+            'samples_key': key,
+            'samples': len(lines) - 1
+        })
+
+    # Shards always store their results: the merge job reads them from the cache
+    shard_env = [
+        {'name': 'RUN_ID', 'value': run_id},
+        {'name': 'SAMPLE_SHARDS', 'value': f"s3://{data_bucket}/{prefix}"},
+        {'name': 'SAMPLE_COUNT', 'value': str(max(shard['samples'] for shard in manifest['shards']))},
+        {'name': 'PROCESSING_TIME', 'value': str(processing_time)},
+        {'name': 'DATA_BUCKET', 'value': data_bucket},
+        {'name': 'RESULT_CACHE', 'value': 'true' if use_cache else 'refresh'}
+    ]
+    shard_job = {
+        'jobName': f"{run_id}-shards",
+        'jobQueue': job_queue,
+        'jobDefinition': job_definition,
+        'containerOverrides': {'environment': shard_env}
+    }
+    # Batch array jobs need at least two children; a single shard runs as a plain job
+    if len(sheets) > 1:
+        shard_job['arrayProperties'] = {'size': len(sheets)}
+    else:
+        shard_env.append({'name': 'SHARD_INDEX', 'value': '0'})
+    array_job_id = batch.submit_job(**shard_job)['jobId']
+
+    merge_env = [
+        {'name': 'RUN_ID', 'value': run_id},
+        {'name': 'SAMPLE_COUNT', 'value': str(manifest['total_samples'])},
+        {'name': 'PROCESSING_TIME', 'value': str(processing_time)},
+        {'name': 'DATA_BUCKET', 'value': data_bucket},
+        {'name': 'RESULT_CACHE', 'value': 'true'}
+    ]
+    merge_job_id = batch.submit_job(
+        jobName=f"{run_id}-merge",
+        jobQueue=job_queue,
+        jobDefinition=job_definition,
+        dependsOn=[{'jobId': array_job_id}],
+        containerOverrides={'environment': merge_env}
+    )['jobId']
+
+    manifest['array_job_id'] = array_job_id
+    manifest['merge_job_id'] = merge_job_id
+    s3.put_object(
+        Bucket=data_bucket,
+        Key=RUN_KEY.format(run_id=run_id),
+        Body=json.dumps(manifest, separators=(',', ':')),
+        ContentType='application/json'
+    )
+    return manifest
+
 def lambda_handler(event, context):
     print("Received event: {}".format(json.dumps(event)))
     
@@ -18,6 +119,8 @@ def lambda_handler(event, context):
     action = event.get('action', 'test')
     samples = event.get('samples', 100)
     processing_time = event.get('processingTime', 15)
+    use_cache = event.get('useCache', False)  # Reuse per-sample results from earlier runs; off while tool images are :latest
+    shards = int(event.get('shards', 1))  # Split the cohort across this many Batch array children
     
     if action == 'test':
         # Just create a test file
@@ -65,11 +168,30 @@ def lambda_handler(event, context):
         # Let the job definition's command handle Nextflow installation and execution
         print(f"Submitting job to queue: {job_queue}")
         
-        # Create environment variables for sample count and processing time
+        if shards > 1:
+            run = submit_sharded_run(data_bucket, job_queue, job_definition, shards, processing_time, use_cache)
+            print(f"Submitted run {run['run_id']}: {len(run['shards'])} shards as array job "
+                  f"{run['array_job_id']}, merge job {run['merge_job_id']}")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Successfully submitted sharded run',
+                    'runId': run['run_id'],
+                    'jobId': run['merge_job_id'],
+                    'arrayJobId': run['array_job_id'],
+                    'shards': len(run['shards']),
+                    'samples': run['total_samples'],
+                    'processingTime': processing_time,
+                    'useCache': use_cache
+                })
+            }
+        
+        # Create environment variables for sample count, processing time and the result cache
         job_env = [
             {'name': 'SAMPLE_COUNT', 'value': str(samples)},
             {'name': 'PROCESSING_TIME', 'value': str(processing_time)},
-            {'name': 'DATA_BUCKET', 'value': data_bucket}
+            {'name': 'DATA_BUCKET', 'value': data_bucket},
+            {'name': 'RESULT_CACHE', 'value': 'true' if use_cache else 'false'}
         ]
         
         response = batch.submit_job(
@@ -90,7 +212,8 @@ def lambda_handler(event, context):
                 'message': 'Successfully submitted job',
                 'jobId': job_id,
                 'samples': samples,
-                'processingTime': processing_time
+                'processingTime': processing_time,
+                'useCache': use_cache
             })
         }
     else:
@@ -1,12 +1,22 @@
 import json
 import boto3
 import os
+import sys
 import logging
 import time
 import traceback
+import zlib
 from datetime import datetime
 from botocore.exceptions import ClientError
 
+# The shared publisher lives in lambda/ and the profiler in workflow/templates/ in the
+# repository, and both are next to this file when packaged
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workflow', 'templates'))
+
+from json_publisher import encode_body, load_json_body
+from profiling import profiled, profiled_handler
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -69,6 +79,7 @@ def extract_workflow_id(key):
         logger.warning(f"Error extracting workflow ID: {str(e)}")
         return 'unknown'
 
+@profiled()
 def get_progress_data(bucket, key, max_retries=MAX_RETRIES):
     """
     Retrieves and parses progress data from S3 with retry logic
@@ -80,20 +91,19 @@ def get_progress_data(bucket, key, max_retries=MAX_RETRIES):
     while retry_count < max_retries:
         try:
             response = s3.get_object(Bucket=bucket, Key=key)
-            data = response['Body'].read().decode('utf-8')
             
             try:
-                return json.loads(data)
-            except json.JSONDecodeError as je:
-                # Try to recover corrupted JSON if possible
-                logger.warning(f"Error parsing JSON: {str(je)}. Attempting recovery...")
+                return load_json_body(response)
+            except (ValueError, OSError, EOFError, zlib.error) as je:
+                # Corrupted JSON, or a body that does not match its Content-Encoding
+                # (gzip.BadGzipFile is an OSError, a truncated stream an EOFError)
+                logger.warning(f"Error decoding progress data: {str(je)}. Attempting recovery...")
                 
                 # Check if backup exists
                 backup_key = f"{key}{BACKUP_SUFFIX}"
                 try:
                     backup_response = s3.get_object(Bucket=bucket, Key=backup_key)
-                    backup_data = backup_response['Body'].read().decode('utf-8')
-                    return json.loads(backup_data)
+                    return load_json_body(backup_response)
                 except Exception:
                     logger.warning("No valid backup found. Creating empty progress data.")
                     # Return empty but valid progress data
@@ -145,6 +155,7 @@ def prepare_dashboard_data(progress_data, workflow_id):
         'status': progress_data.get('status', DEFAULT_STATUS),
         'elapsed_time': progress_data.get('elapsed_time_formatted', DEFAULT_TIME_FORMAT),
         'remaining_time': progress_data.get('estimated_remaining_formatted', DEFAULT_TIME_FORMAT),
+        'remaining_time_range': progress_data.get('estimated_remaining_range', DEFAULT_TIME_FORMAT),
         'start_time_human': progress_data.get('start_time_human', 'Not available'),
         'processes': {
             'completed': progress_data.get('completed_count', 0),
@@ -167,15 +178,15 @@ def prepare_dashboard_data(progress_data, workflow_id):
         
     return dashboard_data
 
+@profiled()
 def update_dashboard(bucket, dashboard_data, workflow_id, max_retries=MAX_RETRIES):
     """
     Updates dashboard data files in S3 with retry logic
     Returns True on success or raises ProgressProcessingError
     """
-    # Prepare JSON data
+    # Prepare compact, compressed JSON data
     try:
-        json_data = json.dumps(dashboard_data, indent=2)
-        content_type = 'application/json'
+        json_data, headers = encode_body(dashboard_data)
     except Exception as e:
         raise ProgressProcessingError(f"Failed to serialize dashboard data: {str(e)}")
     
@@ -195,11 +206,14 @@ def update_dashboard(bucket, dashboard_data, workflow_id, max_retries=MAX_RETRIE
                 try:
                     existing = s3.get_object(Bucket=bucket, Key=key)
                     backup_key = f"{key}{BACKUP_SUFFIX}"
+                    backup_headers = {'ContentType': 'application/json'}
+                    if existing.get('ContentEncoding'):
+                        backup_headers['ContentEncoding'] = existing['ContentEncoding']
                     s3.put_object(
                         Bucket=bucket,
                         Key=backup_key,
                         Body=existing['Body'].read(),
-                        ContentType=content_type
+                        **backup_headers
                     )
                 except ClientError:
                     # Object doesn't exist yet, no backup needed
@@ -210,7 +224,7 @@ def update_dashboard(bucket, dashboard_data, workflow_id, max_retries=MAX_RETRIE
                     Bucket=bucket,
                     Key=key,
                     Body=json_data,
-                    ContentType=content_type
+                    **headers
                 )
                 success = True
                 
@@ -226,6 +240,7 @@ def update_dashboard(bucket, dashboard_data, workflow_id, max_retries=MAX_RETRIE
     logger.info(f"Dashboard data updated successfully at {dashboard_key} and {latest_key}")
     return True
 
+@profiled()
 def send_notification(status, workflow_id, progress_data):
     """
     Sends SNS notification based on workflow status if SNS_TOPIC_ARN is configured
@@ -270,6 +285,7 @@ def send_notification(status, workflow_id, progress_data):
         logger.error(f"Failed to send {status} notification: {str(e)}")
         return False
 
+@profiled_handler('progress_notification')
 def lambda_handler(event, context):
     """
     Lambda function to handle progress notifications from Nextflow workflow.
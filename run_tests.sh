@@ -35,6 +35,204 @@ else
     ((failures++))
 fi
 
+# Run trace_metrics.py tests
+echo "Testing trace_metrics.py..."
+if python3 -m unittest workflow/templates/test_trace_metrics.py; then
+    echo -e "${GREEN}✓ trace_metrics.py tests passed${NC}"
+else
+    echo -e "${RED}✗ trace_metrics.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run resource_profile.py tests
+echo "Testing resource_profile.py..."
+if python3 -m unittest workflow/templates/test_resource_profile.py; then
+    echo -e "${GREEN}✓ resource_profile.py tests passed${NC}"
+else
+    echo -e "${RED}✗ resource_profile.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run table_stream.py tests
+echo "Testing table_stream.py..."
+if python3 -m unittest workflow/templates/test_table_stream.py; then
+    echo -e "${GREEN}✓ table_stream.py tests passed${NC}"
+else
+    echo -e "${RED}✗ table_stream.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run abundance_topk.py tests
+echo "Testing abundance_topk.py..."
+if python3 -m unittest workflow/templates/test_abundance_topk.py; then
+    echo -e "${GREEN}✓ abundance_topk.py tests passed${NC}"
+else
+    echo -e "${RED}✗ abundance_topk.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run dashboard_products.py tests
+echo "Testing dashboard_products.py..."
+if python3 -m unittest workflow/templates/test_dashboard_products.py; then
+    echo -e "${GREEN}✓ dashboard_products.py tests passed${NC}"
+else
+    echo -e "${RED}✗ dashboard_products.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run json_publisher.py tests
+echo "Testing json_publisher.py..."
+if python3 -m unittest test_json_publisher.py; then
+    echo -e "${GREEN}✓ json_publisher.py tests passed${NC}"
+else
+    echo -e "${RED}✗ json_publisher.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run resource_sampler.py tests
+echo "Testing resource_sampler.py..."
+if python3 -m unittest workflow/templates/test_resource_sampler.py; then
+    echo -e "${GREEN}✓ resource_sampler.py tests passed${NC}"
+else
+    echo -e "${RED}✗ resource_sampler.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run progress_reducer.py tests
+echo "Testing progress_reducer.py..."
+if python3 -m unittest test_progress_reducer.py; then
+    echo -e "${GREEN}✓ progress_reducer.py tests passed${NC}"
+else
+    echo -e "${RED}✗ progress_reducer.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run progress_eta.py tests
+echo "Testing progress_eta.py..."
+if python3 -m unittest workflow/templates/test_progress_eta.py; then
+    echo -e "${GREEN}✓ progress_eta.py tests passed${NC}"
+else
+    echo -e "${RED}✗ progress_eta.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run the offline Lambda benchmark tests
+echo "Testing lambda_benchmark.py..."
+if python3 -m unittest test_lambda_benchmark.py; then
+    echo -e "${GREEN}✓ lambda_benchmark.py tests passed${NC}"
+else
+    echo -e "${RED}✗ lambda_benchmark.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run progress updater Lambda tests
+echo "Testing progress_updater.py..."
+if python3 -m unittest test_progress_updater.py; then
+    echo -e "${GREEN}✓ progress_updater.py tests passed${NC}"
+else
+    echo -e "${RED}✗ progress_updater.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run synthetic_cohort.py tests
+echo "Testing synthetic_cohort.py..."
+if python3 -m unittest workflow/templates/test_synthetic_cohort.py; then
+    echo -e "${GREEN}✓ synthetic_cohort.py tests passed${NC}"
+else
+    echo -e "${RED}✗ synthetic_cohort.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run reporting_benchmark.py tests
+echo "Testing reporting_benchmark.py..."
+if python3 -m unittest workflow/templates/test_reporting_benchmark.py; then
+    echo -e "${GREEN}✓ reporting_benchmark.py tests passed${NC}"
+else
+    echo -e "${RED}✗ reporting_benchmark.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run dashboard_sync.py tests
+echo "Testing dashboard_sync.py..."
+if python3 -m unittest test_dashboard_sync.py; then
+    echo -e "${GREEN}✓ dashboard_sync.py tests passed${NC}"
+else
+    echo -e "${RED}✗ dashboard_sync.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run dashboard_feed.py tests
+echo "Testing dashboard_feed.py..."
+if python3 -m unittest test_dashboard_feed.py; then
+    echo -e "${GREEN}✓ dashboard_feed.py tests passed${NC}"
+else
+    echo -e "${RED}✗ dashboard_feed.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run progress_agent.py tests
+echo "Testing progress_agent.py..."
+if python3 -m unittest workflow/templates/test_progress_agent.py; then
+    echo -e "${GREEN}✓ progress_agent.py tests passed${NC}"
+else
+    echo -e "${RED}✗ progress_agent.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run result_cache.py tests
+echo "Testing result_cache.py..."
+if python3 -m unittest workflow/templates/test_result_cache.py; then
+    echo -e "${GREEN}✓ result_cache.py tests passed${NC}"
+else
+    echo -e "${RED}✗ result_cache.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run sharded submission tests
+echo "Testing sharded run submission..."
+if python3 -m unittest test_shard_launcher.py; then
+    echo -e "${GREEN}✓ Sharded run submission tests passed${NC}"
+else
+    echo -e "${RED}✗ Sharded run submission tests failed${NC}"
+    ((failures++))
+fi
+
+# Run results_warehouse.py tests
+echo "Testing results_warehouse.py..."
+if python3 -m unittest workflow/templates/test_results_warehouse.py; then
+    echo -e "${GREEN}✓ results_warehouse.py tests passed${NC}"
+else
+    echo -e "${RED}✗ results_warehouse.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run presence_bits.py tests
+echo "Testing presence_bits.py..."
+if python3 -m unittest workflow/templates/test_presence_bits.py; then
+    echo -e "${GREEN}✓ presence_bits.py tests passed${NC}"
+else
+    echo -e "${RED}✗ presence_bits.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run grouped_stats.py tests
+echo "Testing grouped_stats.py..."
+if python3 -m unittest workflow/templates/test_grouped_stats.py; then
+    echo -e "${GREEN}✓ grouped_stats.py tests passed${NC}"
+else
+    echo -e "${RED}✗ grouped_stats.py tests failed${NC}"
+    ((failures++))
+fi
+
+# Run profiling.py tests
+echo "Testing profiling.py..."
+if python3 -m unittest workflow/templates/test_profiling.py; then
+    echo -e "${GREEN}✓ profiling.py tests passed${NC}"
+else
+    echo -e "${RED}✗ profiling.py tests failed${NC}"
+    ((failures++))
+fi
+
 # Run any other Python tests here
 # ...
 
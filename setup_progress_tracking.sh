@@ -27,9 +27,18 @@ aws s3api put-object --bucket $BUCKET_NAME --key progress/ --content-type applic
 aws s3api put-object --bucket $BUCKET_NAME --key progress/latest/ --content-type application/json
 aws s3api put-object --bucket $BUCKET_NAME --key dashboard/data/ --content-type application/json
 
-# Upload the progress tracker template to S3
+# Upload the progress tracker template and its ETA model to S3
 echo "Uploading progress tracker template..."
 aws s3 cp workflow/templates/progress_tracker.sh s3://$BUCKET_NAME/workflow/templates/progress_tracker.sh
+aws s3 cp workflow/templates/progress_eta.py s3://$BUCKET_NAME/workflow/templates/progress_eta.py
+aws s3 cp workflow/templates/trace_metrics.py s3://$BUCKET_NAME/workflow/templates/trace_metrics.py
+# Compute node setup, run by the Batch launch template in the CloudFormation stacks
+aws s3 cp workflow/templates/batch_init.sh s3://$BUCKET_NAME/workflow/templates/batch_init.sh
+# Node-local agent that batches the task events (started by batch_init.sh)
+aws s3 cp workflow/templates/progress_agent.py s3://$BUCKET_NAME/workflow/templates/progress_agent.py
+aws s3 cp workflow/templates/progress_event.sh s3://$BUCKET_NAME/workflow/templates/progress_event.sh
+# Node utilization sampler feeding monitoring/utilization/ (also started by batch_init.sh)
+aws s3 cp workflow/templates/resource_sampler.py s3://$BUCKET_NAME/workflow/templates/resource_sampler.py
 
 # Deploy CloudFormation stack for progress tracking resources
 echo "Deploying progress tracking infrastructure..."
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test script for the dashboard push feed.
+Checks that changes reach connected browsers as merge patches, that
+reconnecting clients only receive what they missed, and that the polling
+fallback answers 304 until a document changes.
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from dashboard_feed import (
+    LAYOUTS, DashboardFeed, FileStore, S3Store, NOT_MODIFIED, apply_merge_patch, diff, serve_feed
+)
+import json_publisher
+from test_dashboard_sync import FakeS3
+
+def parse_events(text):
+    """(id, event, data) for each event in an SSE stream"""
+    events = []
+    for block in text.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+async def http_get(port, path, headers=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = [f"GET {path} HTTP/1.1", 'Host: localhost'] + [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    await writer.drain()
+    return reader, writer
+
+class TestDashboardFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp.name, 'data', 'dashboard'))
+        self.write('data/progress.json', {'status': 'RUNNING', 'completed_samples': 1, 'total_samples': 10,
+                                          'sample_status': {'completed': 1, 'running': 2}})
+        self.write('data/summary.json', {'taxonomic_profile': {'sample_count': 10}})
+        self.feed = DashboardFeed(FileStore(self.tmp.name), LAYOUTS['local'])
+
+    def tearDown(self):
+        self.feed.executor.shutdown()
+        self.tmp.cleanup()
+
+    def write(self, key, document):
+        path = os.path.join(self.tmp.name, key)
+        with open(path, 'w') as f:
+            json.dump(document, f)
+        # Make the change visible even within the filesystem's timestamp resolution
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+    def test_diff(self):
+        """Test merge patches and the full-document fallback"""
+        old = {'a': 1, 'b': {'c': 2, 'd': 3}, 'e': [1, 2], 'f': 'x' * 50}
+        new = {'a': 1, 'b': {'c': 4}, 'e': [1, 2, 3], 'f': 'x' * 50}
+        event, patch = diff(old, new)
+        self.assertEqual(event, 'patch')
+        self.assertEqual(patch, {'b': {'c': 4, 'd': None}, 'e': [1, 2, 3]})
+        self.assertEqual(apply_merge_patch(old, patch), new)
+        # A merge patch cannot set a value to null
+        self.assertEqual(diff(old, dict(old, a=None)), ('replace', dict(old, a=None)))
+        self.assertEqual(diff(None, new), ('replace', new))
+
+    def test_refresh_publishes_only_changes(self):
+        """Test that reads are conditional and unchanged documents publish nothing"""
+        asyncio.run(self.feed.refresh())
+        self.assertEqual(self.feed.event_id, 2)
+        self.assertNotIn('resources', self.feed.documents)
+        reads = self.feed.store.requests['read']
+
+        asyncio.run(self.feed.refresh())
+        self.assertEqual(self.feed.event_id, 2)
+        self.assertEqual(self.feed.store.requests['read'], reads)
+
+        self.write('data/progress.json', {'status': 'RUNNING', 'completed_samples': 2, 'total_samples': 10,
+                                          'sample_status': {'completed': 2, 'running': 2}})
+        # The bounded overview takes over from the full summary once it exists
+        self.write('data/dashboard/overview.json', {'taxonomic_profile': {'sample_count': 10}, 'shards': {}})
+        asyncio.run(self.feed.refresh())
+        events = parse_events(b''.join(message for _, message in self.feed.history).decode('utf-8'))
+        self.assertEqual(events[-2][1:], ('patch', {'channel': 'progress', 'data': {
+            'completed_samples': 2, 'sample_status': {'completed': 2}}}))
+        self.assertEqual(events[-1][2]['data'], {'shards': {}})
+        self.assertEqual(self.feed.versions['summary'][0], 'data/dashboard/overview.json')
+
+    def test_event_stream(self):
+        """Test the snapshot on connect, pushed patches and catching up after a reconnect"""
+        async def scenario():
+            await self.feed.refresh()
+            server = await serve_feed(self.feed, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await http_get(port, '/events')
+            head = await reader.readuntil(b'\r\n\r\n')
+            self.assertIn(b'Content-Type: text/event-stream', head)
+            first = await reader.readuntil(b'event: snapshot\n')
+            first += await reader.readuntil(b'\n\n')
+
+            self.write('data/progress.json', {'status': 'COMPLETED', 'completed_samples': 10, 'total_samples': 10,
+                                              'sample_status': {'completed': 10, 'running': 0}})
+            await self.feed.refresh()
+            pushed = await reader.readuntil(b'\n\n')
+            writer.close()
+
+            # A client that saw event 2 only receives event 3; one that is current receives nothing
+            reader, writer = await http_get(port, '/events', {'Last-Event-ID': '2'})
+            await reader.readuntil(b'\r\n\r\n')
+            await reader.readuntil(b'retry: 3000\n\n')
+            replayed = await reader.readuntil(b'\n\n')
+            writer.close()
+            self.assertEqual(self.feed.catch_up(3), [])
+            self.assertEqual(self.feed.catch_up(99), [self.feed.snapshot()])
+            self.feed.close_streams()
+            await asyncio.sleep(0.01)
+            server.close()
+            await server.wait_closed()
+            return first.decode('utf-8'), pushed.decode('utf-8'), replayed.decode('utf-8')
+
+        first, pushed, replayed = asyncio.run(scenario())
+        snapshot = parse_events(first)[0]
+        self.assertEqual(snapshot[:2], (2, 'snapshot'))
+        self.assertEqual(snapshot[2]['channels']['progress']['completed_samples'], 1)
+        self.assertEqual(parse_events(pushed), [(3, 'patch', {'channel': 'progress', 'data': {
+            'status': 'COMPLETED', 'completed_samples': 10, 'sample_status': {'completed': 10, 'running': 0}}})])
+        self.assertEqual(parse_events(replayed), parse_events(pushed))
+
+    def test_conditional_get(self):
+        """Test the polling fallback for browsers without EventSource"""
+        async def scenario():
+            await self.feed.refresh()
+            server = await serve_feed(self.feed, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            responses = []
+            for headers in ({}, {'If-None-Match': self.feed.etags['progress']}):
+                reader, writer = await http_get(port, '/data/progress.json', headers)
+                responses.append(await reader.read())
+                writer.close()
+            server.close()
+            await server.wait_closed()
+            return responses
+
+        full, not_modified = asyncio.run(scenario())
+        self.assertTrue(full.startswith(b'HTTP/1.1 200 OK'))
+        self.assertEqual(json.loads(full.split(b'\r\n\r\n', 1)[1])['completed_samples'], 1)
+        self.assertTrue(not_modified.startswith(b'HTTP/1.1 304 Not Modified'))
+        self.assertEqual(not_modified.split(b'\r\n\r\n', 1)[1], b'')
+        self.assertEqual(self.feed.counters['not_modified_responses'], 1)
+
+    @unittest.skipUnless(importlib.util.find_spec('boto3'), "S3Store needs boto3")
+    def test_s3_store(self):
+        """Test conditional GETs against the bucket"""
+        s3 = FakeS3()
+        original_get = s3.get_object
+
+        def get_object(Bucket, Key, IfNoneMatch=None):
+            response = original_get(Bucket, Key)
+            if IfNoneMatch == f'"{s3.objects[(Bucket, Key)]["ETag"]}"':
+                from botocore.exceptions import ClientError
+                raise ClientError({'Error': {'Code': '304'}}, 'GetObject')
+            return dict(response, ETag=f'"{s3.objects[(Bucket, Key)]["ETag"]}"')
+        s3.get_object = get_object
+
+        json_publisher.put_json(s3, 'bucket', 'status/progress.json', {'status': 'RUNNING'})
+        store = S3Store(s3, 'bucket')
+        token, document = store.read('status/progress.json')
+        self.assertEqual(document, {'status': 'RUNNING'})
+        self.assertIs(store.read('status/progress.json', token), NOT_MODIFIED)
+        self.assertIsNone(store.read('monitoring/resources.json'))
+        self.assertEqual(store.requests['get_object'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
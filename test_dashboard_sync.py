@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Test script for the dashboard bucket-sync service.
+Checks that only changed objects are copied, that mirrored prefixes follow
+deletions, and that S3 event notifications are applied without a listing.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import importlib.util
+import io
+import json
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# The sync service is built on boto3; without it the tests are skipped
+HAS_BOTO3 = importlib.util.find_spec('boto3') is not None
+if HAS_BOTO3:
+    from botocore.exceptions import ClientError, EndpointConnectionError
+
+    from dashboard_sync import BucketSync, parse_queue_message
+    import json_publisher
+
+BUCKET = 'data-bucket'
+DASHBOARD = 'dashboard-bucket'
+
+class FakeS3:
+    """In-memory S3 client with ETags, supporting the calls the sync service makes"""
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+        self.clock = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def _store(self, bucket, key, body, headers):
+        self.clock += datetime.timedelta(seconds=1)
+        etag = hashlib.md5(body).hexdigest()
+        self.objects[(bucket, key)] = {'Body': body, 'ETag': etag, 'LastModified': self.clock, 'Headers': headers}
+        return etag
+
+    def put_object(self, Bucket, Key, Body, **headers):
+        self.calls.append('put_object')
+        body = Body.encode('utf-8') if isinstance(Body, str) else Body
+        return {'ETag': f'"{self._store(Bucket, Key, body, headers)}"'}
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self.calls.append('copy_object')
+        source = self.objects[(CopySource['Bucket'], CopySource['Key'])]
+        etag = self._store(Bucket, Key, source['Body'], source['Headers'])
+        return {'CopyObjectResult': {'ETag': f'"{etag}"', 'LastModified': self.clock}}
+
+    def delete_object(self, Bucket, Key):
+        self.calls.append('delete_object')
+        self.objects.pop((Bucket, Key), None)
+
+    def get_object(self, Bucket, Key):
+        self.calls.append('get_object')
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        item = self.objects[(Bucket, Key)]
+        return dict(item['Headers'], Body=io.BytesIO(item['Body']))
+
+    def head_object(self, Bucket, Key):
+        self.calls.append('head_object')
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        item = self.objects[(Bucket, Key)]
+        return {'ETag': f'"{item["ETag"]}"', 'ContentLength': len(item['Body']), 'LastModified': item['LastModified']}
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        self.calls.append('list_objects_v2')
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {'Contents': [{'Key': key, 'ETag': f'"{self.objects[(Bucket, key)]["ETag"]}"',
+                              'Size': len(self.objects[(Bucket, key)]['Body']),
+                              'LastModified': self.objects[(Bucket, key)]['LastModified']} for key in keys],
+                'IsTruncated': False}
+
+class FakeSQS:
+    def __init__(self, bodies):
+        self.bodies = list(bodies)
+        self.deleted = []
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds):
+        messages = [{'Body': body, 'ReceiptHandle': str(i)} for i, body in enumerate(self.bodies)]
+        self.bodies = []
+        return {'Messages': messages}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.deleted.extend(entry['ReceiptHandle'] for entry in Entries)
+
+def s3_event(key, event_name='ObjectCreated:Put', bucket=BUCKET):
+    return json.dumps({'Records': [{'eventName': event_name,
+                                    's3': {'bucket': {'name': bucket}, 'object': {'key': key}}}]})
+
+@unittest.skipUnless(HAS_BOTO3, "dashboard_sync needs boto3")
+class TestDashboardSync(unittest.TestCase):
+
+    def setUp(self):
+        self.s3 = FakeS3()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.job_id_file = os.path.join(self.tmp.name, 'job_id.txt')
+        self.put_progress('RUNNING', job_id='job-1')
+        self.s3.put_object(Bucket=BUCKET, Key='results/summary/microbiome_summary.json', Body=b'{"summary":1}')
+        self.s3.put_object(Bucket=BUCKET, Key='results/summary/dashboard/overview.json', Body=b'{}')
+        self.s3.put_object(Bucket=BUCKET, Key='results/summary/dashboard/sites/stool.json', Body=b'[]')
+        self.s3.put_object(Bucket=BUCKET, Key='monitoring/resources.json', Body=b'{"utilization":[]}')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def put_progress(self, status, **fields):
+        json_publisher.put_json(self.s3, BUCKET, 'status/progress.json', dict(fields, status=status))
+
+    def sync(self, dest_bucket=DASHBOARD, **kwargs):
+        return BucketSync(self.s3, BUCKET, dest_bucket, base_dir=self.tmp.name, job_id_file=self.job_id_file,
+                          **kwargs)
+
+    def transfers(self):
+        return [call for call in self.s3.calls if call in ('copy_object', 'put_object', 'delete_object')]
+
+    def test_copies_only_changed_objects(self):
+        """Test that an unchanged pass lists but transfers nothing"""
+        sync = self.sync()
+        asyncio.run(sync.sync_once())
+        self.assertEqual(sync.metrics.counters['copies_performed'], 10)
+        self.assertEqual(self.s3.objects[(DASHBOARD, 'data/dashboard/sites/stool.json')]['Body'], b'[]')
+        # Server-side copies keep the publisher's Content-Encoding
+        self.assertEqual(self.s3.objects[(DASHBOARD, 'data/progress.json')]['Headers']['ContentEncoding'],
+                         json_publisher.DEFAULT_ENCODING)
+        with open(self.job_id_file) as f:
+            self.assertEqual(f.read().strip(), 'job-1')
+
+        self.s3.calls = []
+        asyncio.run(sync.sync_once())
+        self.assertEqual(self.transfers(), [])
+        self.assertEqual(self.s3.calls, ['list_objects_v2'] * 4)
+        self.assertEqual(sync.metrics.counters['copies_skipped'], 10)
+
+        self.s3.put_object(Bucket=BUCKET, Key='monitoring/resources.json', Body=b'{"utilization":[1]}')
+        self.s3.calls = []
+        asyncio.run(sync.sync_once())
+        self.assertEqual(self.transfers(), ['copy_object', 'copy_object'])
+        self.assertIn('dashboard_sync_copies_performed_total 12', sync.metrics.prometheus())
+
+    def test_restart_detects_published_objects(self):
+        """Test that a restarted service compares against what is already published"""
+        asyncio.run(self.sync().sync_once())
+        self.s3.calls = []
+        sync = self.sync()
+        asyncio.run(sync.sync_once())
+        self.assertEqual(self.transfers(), [])
+        self.assertEqual(sync.metrics.counters['copies_skipped'], 10)
+
+    def test_same_bucket_mirror(self):
+        """Test that sources are never copied onto themselves and mirrored prefixes follow deletions"""
+        sync = self.sync(dest_bucket=BUCKET)
+        asyncio.run(sync.sync_once())
+        self.assertEqual(sync.metrics.counters['copies_performed'], 5)
+
+        self.s3.delete_object(Bucket=BUCKET, Key='results/summary/dashboard/sites/stool.json')
+        asyncio.run(sync.sync_once())
+        self.assertNotIn((BUCKET, 'data/dashboard/sites/stool.json'), self.s3.objects)
+        self.assertIn((BUCKET, 'results/summary/dashboard/overview.json'), self.s3.objects)
+        self.assertEqual(sync.metrics.counters['objects_deleted'], 1)
+
+    def test_progress_status(self):
+        """Test the reset on INITIALIZING, job ID injection and fallback summary"""
+        self.s3.delete_object(Bucket=BUCKET, Key='results/summary/microbiome_summary.json')
+        os.makedirs(os.path.join(self.tmp.name, 'dashboard', 'data'))
+        with open(os.path.join(self.tmp.name, 'dashboard', 'data', 'test_microbiome_summary.json'), 'wb') as f:
+            f.write(b'{"test":true}')
+        self.put_progress('INITIALIZING')
+
+        sync = self.sync()
+        self.assertEqual(asyncio.run(sync.sync_once()), 'INITIALIZING')
+        # Resources left over from the previous run are replaced by empty charts
+        resources = json_publisher.load_json_body(self.s3.get_object(Bucket=DASHBOARD, Key='data/resources.json'))
+        self.assertEqual(resources['utilization'], [])
+        self.assertIn('timestamp', resources)
+        # Without a pipeline summary the bundled test summary is shown
+        self.assertEqual(self.s3.objects[(DASHBOARD, 'data/summary.json')]['Body'], b'{"test":true}')
+        progress = json_publisher.load_json_body(self.s3.get_object(Bucket=DASHBOARD, Key='data/progress.json'))
+        self.assertTrue(progress['job_id'].startswith('microbiome-demo-job-'))
+
+        # The injected job ID and the empty charts survive the next pass
+        self.s3.calls = []
+        asyncio.run(sync.sync_once())
+        self.assertEqual(self.transfers(), [])
+
+        # New output from the pipeline replaces them
+        self.s3.put_object(Bucket=BUCKET, Key='monitoring/resources.json', Body=b'{"utilization":[1]}')
+        self.s3.put_object(Bucket=BUCKET, Key='results/summary/microbiome_summary.json', Body=b'{"summary":2}')
+        asyncio.run(sync.sync_once())
+        self.assertEqual(self.s3.objects[(DASHBOARD, 'data/resources.json')]['Body'], b'{"utilization":[1]}')
+        self.assertEqual(self.s3.objects[(DASHBOARD, 'data/summary.json')]['Body'], b'{"summary":2}')
+
+    def test_queue_events(self):
+        """Test applying S3 event notifications and stopping once the pipeline completes"""
+        wrapped = json.dumps({'Type': 'Notification', 'Message': s3_event('results/summary/dashboard/a%2Bb.json')})
+        events = parse_queue_message(wrapped)
+        self.assertEqual(events, [(BUCKET, 'results/summary/dashboard/a+b.json', 'ObjectCreated:Put')])
+        self.assertEqual(parse_queue_message('not json'), [])
+
+        sync = self.sync()
+        asyncio.run(sync.sync_once())
+        self.s3.put_object(Bucket=BUCKET, Key='results/summary/dashboard/a+b.json', Body=b'{"x":1}')
+        self.s3.delete_object(Bucket=BUCKET, Key='results/summary/dashboard/sites/stool.json')
+        self.put_progress('COMPLETED', job_id='job-1')
+        sync.sqs = FakeSQS([wrapped, s3_event('results/summary/dashboard/sites/stool.json', 'ObjectRemoved:Delete'),
+                            s3_event('status/progress.json'), s3_event('unrelated/key.json')])
+        self.s3.calls = []
+
+        asyncio.run(sync.receive_events('queue', wait_seconds=0))
+        self.assertNotIn('list_objects_v2', self.s3.calls)
+        self.assertIn((DASHBOARD, 'data/dashboard/a+b.json'), self.s3.objects)
+        self.assertNotIn((DASHBOARD, 'data/dashboard/sites/stool.json'), self.s3.objects)
+        self.assertEqual(sync.status, 'COMPLETED')
+        self.assertEqual(sync.metrics.counters['events_received'], 3)
+        self.assertEqual(sync.sqs.deleted, ['0', '1', '2', '3'])
+
+        # exit_on_complete runs a final reconcile pass and returns
+        asyncio.run(sync.run(interval=0, queue_url=None, exit_on_complete=True))
+        self.assertEqual(sync.metrics.snapshot()['pipeline_status'], 'COMPLETED')
+
+    def test_transport_errors_are_retried(self):
+        """Test that a dropped connection is counted and the service keeps syncing"""
+        self.put_progress('COMPLETED', job_id='job-1')
+        list_objects = self.s3.list_objects_v2
+        failures = []
+
+        def flaky_list(**kwargs):
+            if not failures:
+                failures.append(kwargs)
+                raise EndpointConnectionError(endpoint_url='https://s3.amazonaws.com')
+            return list_objects(**kwargs)
+        self.s3.list_objects_v2 = flaky_list
+
+        sync = self.sync()
+        asyncio.run(sync.run(interval=0, exit_on_complete=True))
+        self.assertEqual(sync.metrics.counters['errors'], 1)
+        self.assertEqual(sync.status, 'COMPLETED')
+        self.assertIn((DASHBOARD, 'data/summary.json'), self.s3.objects)
+
+if __name__ == '__main__':
+    unittest.main()
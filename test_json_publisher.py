@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared dashboard JSON publisher.
+Checks the compact encoding, compression round trips and S3 upload headers.
+"""
+
+import gzip
+import io
+import json
+import unittest
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Import the publisher from the lambda directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+import json_publisher
+
+class TestJsonPublisher(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.document = {
+            "status": "RUNNING",
+            "sample_status": {"completed": 4, "running": 2},
+            "diversity": {"std": float('nan'), "values": [1.5, 2.5]}
+        }
+
+    def test_dumps_is_compact_and_browser_safe(self):
+        """Test compact separators and NaN written as null"""
+        body = json_publisher.dumps(self.document)
+        self.assertNotIn(b'\n', body)
+        self.assertNotIn(b': ', body)
+        self.assertNotIn(b'NaN', body)
+        self.assertIsNone(json.loads(body)["diversity"]["std"])
+
+    def test_put_json_sets_headers(self):
+        """Test that uploads carry Content-Encoding and Cache-Control"""
+        client = MagicMock()
+        size = json_publisher.put_json(client, 'bucket', 'data/progress.json', self.document, encoding='gzip')
+
+        kwargs = client.put_object.call_args.kwargs
+        self.assertEqual(kwargs['ContentEncoding'], 'gzip')
+        self.assertEqual(kwargs['ContentType'], 'application/json')
+        self.assertEqual(kwargs['CacheControl'], json_publisher.DEFAULT_CACHE_CONTROL)
+        self.assertEqual(size, len(kwargs['Body']))
+        self.assertEqual(json.loads(gzip.decompress(kwargs['Body']))["status"], "RUNNING")
+
+    def test_identity_encoding(self):
+        """Test uploads without compression omit Content-Encoding"""
+        body, headers = json_publisher.encode_body(self.document, encoding='identity')
+        self.assertNotIn('ContentEncoding', headers)
+        self.assertEqual(json.loads(body)["sample_status"]["running"], 2)
+
+    def test_gzip_is_deterministic(self):
+        """Test identical documents produce identical bodies"""
+        first, _ = json_publisher.encode_body(self.document, encoding='gzip')
+        second, _ = json_publisher.encode_body(self.document, encoding='gzip')
+        self.assertEqual(first, second)
+
+    def test_load_json_body(self):
+        """Test reading compressed and plain objects back"""
+        body, headers = json_publisher.encode_body(self.document, encoding='gzip')
+        response = {'Body': io.BytesIO(body), 'ContentEncoding': headers['ContentEncoding']}
+        self.assertEqual(json_publisher.load_json_body(response)["status"], "RUNNING")
+
+        plain = {'Body': io.BytesIO(b'{"status": "SUCCEEDED"}')}
+        self.assertEqual(json_publisher.load_json_body(plain)["status"], "SUCCEEDED")
+
+    def test_unsupported_encoding(self):
+        """Test that unknown encodings are rejected on upload"""
+        with self.assertRaises(ValueError):
+            json_publisher.compress(b'{}', 'deflate')
+
+    def test_benchmark(self):
+        """Test the bytes and CPU benchmark reports every variant"""
+        results = json_publisher.benchmark(self.document, repeat=2)
+        self.assertLess(results['compact']['bytes'], results['indent2']['bytes'])
+        self.assertIn('compact+gzip', results)
+
+if __name__ == '__main__':
+    unittest.main()
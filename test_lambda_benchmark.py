@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline Lambda benchmark.
+Runs a small replay against the in-process stand-ins and checks the counters.
+"""
+
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import lambda_benchmark
+from lambda_benchmark import FakeS3, run_benchmark
+
+class TestLambdaBenchmark(unittest.TestCase):
+
+    def test_fake_s3_counts_requests(self):
+        """Test the S3 stand-in's objects, pagination and counters"""
+        s3 = FakeS3()
+        for i in range(5):
+            s3.put_object(Bucket='b', Key=f"progress/wf/updates/{i}.json", Body=b'{}')
+        pages = list(s3.get_paginator('list_objects_v2').paginate(Bucket='b', Prefix='progress/', MaxKeys=2))
+        self.assertEqual([len(page['Contents']) for page in pages], [2, 2, 1])
+        self.assertEqual(s3.requests['PutObject'], 5)
+        self.assertEqual(s3.requests['ListObjectsV2'], 3)
+        self.assertEqual(s3.bytes_in, 10)
+        with self.assertRaises(lambda_benchmark.ClientError):
+            s3.get_object(Bucket='b', Key='missing')
+
+    def test_replay(self):
+        """Test a small replay through both handlers"""
+        result = run_benchmark(workflows=2, updates_per_minute=3, minutes=2, samples=5)
+        self.assertEqual(result['events'], 2 * 3 * 2)
+        self.assertEqual(result['notification_lambda']['invocations'], 12)
+        self.assertEqual(result['progress_updater']['invocations'], 2)
+        # Read progress.json, then back up and write two dashboard files
+        self.assertLessEqual(result['notification_lambda']['s3_requests_per_event'], 7)
+        self.assertGreater(result['progress_updater']['s3_bytes_per_event'], 0)
+        self.assertGreaterEqual(result['notification_lambda']['p99_ms'], result['notification_lambda']['p50_ms'])
+        self.assertEqual(result['batch_requests']['ListJobs'], 2)
+
+        # The real clients are restored afterwards
+        self.assertNotIsInstance(lambda_benchmark.progress_updater.s3_client, FakeS3)
+
+if __name__ == '__main__':
+    unittest.main()
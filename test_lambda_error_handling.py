@@ -4,6 +4,8 @@ Test script for Lambda function error handling.
 This script tests various error scenarios to ensure the Lambda function handles them gracefully.
 """
 
+import gzip
+import io
 import json
 import unittest
 import os
@@ -146,6 +148,23 @@ class TestLambdaErrorHandling(unittest.TestCase):
         self.assertEqual(result['processes']['completed'], 0)
         self.assertEqual(result['processes']['total'], 0)
     
+    @patch('progress_notification_lambda.s3')
+    def test_get_progress_data_gzip_error(self, mock_s3):
+        """Test that a corrupt compressed body falls back to the backup"""
+        truncated = gzip.compress(b'{"status": "running"}')[:12]
+        backup = gzip.compress(b'{"status": "running", "percent_complete": 40}')
+        mock_s3.get_object.side_effect = [
+            {'Body': io.BytesIO(truncated), 'ContentEncoding': 'gzip'},
+            {'Body': io.BytesIO(b'not gzip'), 'ContentEncoding': 'gzip'},
+            {'Body': io.BytesIO(b'not gzip'), 'ContentEncoding': 'gzip'},
+            {'Body': io.BytesIO(backup), 'ContentEncoding': 'gzip'}
+        ]
+
+        result = lambda_func.get_progress_data('test-bucket', 'progress/test-workflow/progress.json')
+        self.assertEqual(result['status'], 'unknown')
+        result = lambda_func.get_progress_data('test-bucket', 'progress/test-workflow/progress.json')
+        self.assertEqual(result['percent_complete'], 40)
+
     def test_prepare_dashboard_data(self):
         """Test dashboard data preparation with validation"""
         # Test with valid data
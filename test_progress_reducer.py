@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test script for the incremental progress reducer.
+Checks event key parsing, per-sample state transitions and that each
+invocation only lists events after the checkpointed cursor.
+"""
+
+import io
+import json
+import unittest
+import os
+import sys
+
+# Import the reducer from the lambda directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+import json_publisher
+import progress_reducer
+from progress_reducer import ProgressReducer, parse_event_key, reduce_workflow_progress
+
+PREFIX = "progress/wf-1/updates/"
+
+def event_key(timestamp, process, status, prefix=PREFIX):
+    return f"{prefix}{timestamp}_{process}_{status}.json"
+
+class FakeS3:
+    """In-memory S3 client supporting the calls the reducer makes"""
+
+    def __init__(self):
+        self.objects = {}
+        self.list_calls = []
+
+    def add_event(self, timestamp, process, status):
+        self.objects[event_key(timestamp, process, status)] = b'{}'
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise KeyError(Key)
+        body, encoding = self.objects[Key] if isinstance(self.objects[Key], tuple) else (self.objects[Key], None)
+        response = {'Body': io.BytesIO(body)}
+        if encoding:
+            response['ContentEncoding'] = encoding
+        return response
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = (Body, kwargs.get('ContentEncoding'))
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix, StartAfter=''):
+                keys = sorted(key for key in client.objects if key.startswith(Prefix) and key > StartAfter)
+                client.list_calls.append(keys)
+                for i in range(0, len(keys), 2):
+                    yield {'Contents': [{'Key': key} for key in keys[i:i + 2]]}
+
+        return Paginator()
+
+class TestProgressReducer(unittest.TestCase):
+
+    def test_parse_event_key(self):
+        """Test keys written by progress_tracker.sh, including empty afterScript statuses"""
+        event = parse_event_key(event_key(1700000000, "preprocess_reads_SRS_01", "started"), PREFIX)
+        self.assertEqual(event['timestamp'], 1700000000)
+        self.assertEqual(event['process'], "preprocess_reads_SRS_01")
+        self.assertEqual(event['status'], "started")
+        self.assertEqual(parse_event_key(f"{PREFIX}1700000000_preprocess_reads_S1_.json", PREFIX)['status'], "completed")
+        self.assertIsNone(parse_event_key(PREFIX, PREFIX))
+        self.assertIsNone(parse_event_key(f"{PREFIX}notes.json", PREFIX))
+
+    def test_sample_transitions(self):
+        """Test running, completed, failed and retried samples"""
+        reducer = ProgressReducer("wf-1", stages=["preprocess_reads"])
+        reducer.total_samples = 4
+        for timestamp, process, status in [
+            (100, "preprocess_reads_A", "started"),
+            (100, "preprocess_reads_B", "started"),
+            (100, "preprocess_reads_C", "started"),
+            (160, "preprocess_reads_A", "completed"),
+            (170, "preprocess_reads_B", "failed"),
+            (175, "preprocess_reads_B", "started"),
+            # Terminal event in the same second as a start that sorts after it
+            (180, "preprocess_reads_C", "completed"),
+            (180, "preprocess_reads_C", "started"),
+        ]:
+            reducer.apply(parse_event_key(event_key(timestamp, process, status), PREFIX))
+
+        self.assertEqual(reducer.sample_counts(),
+                         {'completed': 2, 'running': 1, 'failed': 0, 'pending': 1, 'total': 4})
+        self.assertEqual((reducer.first_event, reducer.last_event), (100, 180))
+
+    def test_multiple_stages(self):
+        """Test that a sample only completes once every stage has"""
+        reducer = ProgressReducer("wf-1", stages=["preprocess_reads", "metaphlan_analysis"])
+        reducer.apply(parse_event_key(event_key(100, "preprocess_reads_A", "completed"), PREFIX))
+        self.assertEqual(reducer.sample_state("A"), "running")
+        reducer.apply(parse_event_key(event_key(200, "metaphlan_analysis_A", "completed"), PREFIX))
+        self.assertEqual(reducer.sample_state("A"), "completed")
+        reducer.apply(parse_event_key(event_key(300, "workflow_complete", "completed"), PREFIX))
+        self.assertEqual(reducer.workflow_status, "completed")
+
+    def test_incremental_reduction(self):
+        """Test that each invocation lists only events after the cursor and late events count once"""
+        client = FakeS3()
+        client.objects[progress_reducer.SAMPLES_KEY] = b"sample_id,body_site\nA,stool\nB,stool\nC,stool\n"
+        client.add_event(1000, "preprocess_reads_A", "started")
+        client.add_event(1001, "preprocess_reads_B", "started")
+
+        first = reduce_workflow_progress(client, "bucket", "wf-1", ["preprocess_reads"])
+        self.assertEqual(first.sample_counts()['running'], 2)
+        self.assertEqual(first.total_samples, 3)
+
+        # History behind the late-event window is never listed again
+        for i in range(10):
+            client.add_event(2000 + i, f"preprocess_reads_X{i}", "started")
+        reduce_workflow_progress(client, "bucket", "wf-1", ["preprocess_reads"])
+        client.add_event(3000, "preprocess_reads_A", "completed")
+        reduce_workflow_progress(client, "bucket", "wf-1", ["preprocess_reads"])
+        self.assertNotIn(event_key(1000, "preprocess_reads_A", "started"), client.list_calls[-1])
+
+        # Uploaded after the 3000 event was reduced, but within the window behind it
+        client.add_event(2900, "preprocess_reads_B", "completed")
+        latest = reduce_workflow_progress(client, "bucket", "wf-1", ["preprocess_reads"])
+        self.assertEqual(client.list_calls[-1], [event_key(2900, "preprocess_reads_B", "completed"),
+                                                 event_key(3000, "preprocess_reads_A", "completed")])
+        counts = latest.sample_counts()
+        self.assertEqual((counts['completed'], counts['running'], counts['total']), (2, 10, 12))
+        self.assertEqual(latest.events_applied, 14)
+
+        # Nothing new: the window is re-listed but nothing is applied twice
+        again = reduce_workflow_progress(client, "bucket", "wf-1", ["preprocess_reads"])
+        self.assertEqual(again.events_applied, 14)
+        self.assertEqual(again.sample_counts(), counts)
+
+    def test_checkpoint_round_trip(self):
+        """Test that the checkpoint is written compressed and restores the state"""
+        client = FakeS3()
+        client.add_event(1000, "preprocess_reads_A", "completed")
+        reducer = reduce_workflow_progress(client, "bucket", "wf-1", ["preprocess_reads"])
+
+        body, encoding = client.objects["progress/wf-1/reducer_state.json"]
+        self.assertEqual(encoding, json_publisher.DEFAULT_ENCODING)
+        restored = ProgressReducer.from_dict(json.loads(json_publisher.decompress(body, encoding)))
+        self.assertEqual(restored.to_dict(), reducer.to_dict())
+
+        # A checkpoint written for other stages is rebuilt from scratch
+        self.assertIsNone(progress_reducer.load_checkpoint(client, "bucket", "wf-1", ["metaphlan_analysis"]))
+
+    def test_sharded_run(self):
+        """Test that the shards of a sharded run roll up into one set of counts"""
+        client = FakeS3()
+        run = {'run_id': 'run-1', 'shards': []}
+        for index, samples in enumerate([["A", "C"], ["B"]]):
+            key = f"input/shards/run-1/shard_{index}.csv"
+            client.objects[key] = ("sample_id,body_site\n" + "".join(f"{s},stool\n" for s in samples)).encode()
+            run['shards'].append({'index': index, 'workflow_id': f"run-1-shard-{index}", 'samples_key': key})
+        client.objects["progress/run-1/run.json"] = json.dumps(run).encode()
+        client.objects[event_key(1000, "preprocess_reads_A", "completed", "progress/run-1-shard-0/updates/")] = b'{}'
+        client.objects[event_key(1001, "preprocess_reads_B", "started", "progress/run-1-shard-1/updates/")] = b'{}'
+
+        self.assertEqual(progress_reducer.split_shard_workflow_id("run-1-shard-1"), ("run-1", 1))
+        self.assertIsNone(progress_reducer.split_shard_workflow_id("wf-1"))
+        self.assertEqual(progress_reducer.load_run(client, "bucket", "run-1-shard-1"), run)
+        self.assertEqual(progress_reducer.load_run(client, "bucket", "run-1"), run)
+        self.assertIsNone(progress_reducer.load_run(client, "bucket", "wf-1"))
+
+        reducers = progress_reducer.reduce_run_progress(client, "bucket", run, ["preprocess_reads"])
+        self.assertEqual(sorted(reducers), ["run-1-shard-0", "run-1-shard-1"])
+        self.assertEqual(progress_reducer.combine_counts(list(reducers.values())),
+                         {'completed': 1, 'running': 1, 'failed': 0, 'pending': 1, 'total': 3})
+
+if __name__ == '__main__':
+    unittest.main()
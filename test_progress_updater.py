@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script for the progress updater Lambda.
+Checks how per-node utilization windows are merged into cluster-wide documents.
+"""
+
+import unittest
+import os
+import sys
+
+# The handler creates boto3 clients at import time, which only needs a region
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workflow', 'templates'))
+from progress_updater import merge_utilization
+
+def node_document(node, updated, times, cpu, gpu=None):
+    """Build a window document as resource_sampler.py publishes it"""
+    return {
+        'node': node,
+        'window': '1m',
+        'resolution_seconds': 60,
+        'updated': updated,
+        'cpus': 16,
+        'time': times,
+        'cpu': cpu,
+        'memory': [50.0] * len(times),
+        'gpu': gpu or [None] * len(times)
+    }
+
+class TestProgressUpdater(unittest.TestCase):
+
+    def test_merge_utilization(self):
+        """Test that node windows are averaged per aligned timestamp"""
+        now = 10000
+        documents = [
+            node_document('a', now, [9600, 9660], [20.0, 40.0]),
+            node_document('b', now - 30, [9610, 9670], [60.0, None], gpu=[80.0, 90.0])
+        ]
+        merged = merge_utilization('1m', documents, now)
+        self.assertEqual(merged['time'], [9600, 9660])
+        self.assertEqual(merged['cpu'], [40.0, 40.0])
+        self.assertEqual(merged['gpu'], [80.0, 90.0])
+        self.assertEqual((merged['nodes'], merged['gpu_nodes'], merged['cpus']), (2, 1, 32))
+
+    def test_merge_utilization_skips_stale_nodes(self):
+        """Test that nodes which stopped publishing longer ago than the window are left out"""
+        now = 100000
+        documents = [
+            node_document('live', now - 60, [now - 120], [30.0]),
+            # Terminated two hours ago, beyond the one-hour 1m window
+            node_document('gone', now - 7200, [now - 7260], [90.0], gpu=[50.0])
+        ]
+        merged = merge_utilization('1m', documents, now)
+        self.assertEqual((merged['nodes'], merged['gpu_nodes'], merged['cpus']), (1, 0, 16))
+        self.assertEqual(merged['cpu'], [30.0])
+
+        # The five-minute window spans six hours, so the node still counts there
+        self.assertEqual(merge_utilization('5m', documents, now)['nodes'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
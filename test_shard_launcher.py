@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script for sharded run submission in the launcher Lambda.
+Checks how the sample sheet is split, the array and merge jobs submitted
+and the run manifest the progress reducer rolls the shards up with.
+"""
+
+import importlib.util
+import json
+import unittest
+import os
+import sys
+
+# Import the launcher from the lambda_code directory
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda_code'))
+# The launcher creates boto3 clients at import time; without boto3 the tests are skipped
+HAS_BOTO3 = importlib.util.find_spec('boto3') is not None
+if HAS_BOTO3:
+    import index_fixed
+    from index_fixed import split_sample_sheet, submit_sharded_run
+    from lambda_benchmark import FakeS3
+
+SHEET = "sample_id,body_site,fastq_1,fastq_2\n" + "".join(
+    f"S{i},{'gut' if i % 2 else 'oral'},s3://b/S{i}_1.fq.gz,s3://b/S{i}_2.fq.gz\n" for i in range(7))
+
+class FakeBatch:
+    def __init__(self):
+        self.jobs = []
+
+    def submit_job(self, **kwargs):
+        self.jobs.append(kwargs)
+        return {'jobId': f"job-{len(self.jobs)}"}
+
+def environment(job):
+    return {item['name']: item['value'] for item in job['containerOverrides']['environment']}
+
+@unittest.skipUnless(HAS_BOTO3, "index_fixed needs boto3")
+class TestShardLauncher(unittest.TestCase):
+
+    def setUp(self):
+        self.s3, self.batch = FakeS3(), FakeBatch()
+        self.s3.seed('bucket', 'input/sample_list.csv', SHEET.encode('utf-8'))
+        self.clients = index_fixed.s3, index_fixed.batch
+        index_fixed.s3, index_fixed.batch = self.s3, self.batch
+
+    def tearDown(self):
+        index_fixed.s3, index_fixed.batch = self.clients
+
+    def test_split_sample_sheet(self):
+        """Test that every sample lands in exactly one shard, under the header"""
+        sheets = split_sample_sheet(SHEET, 3)
+        self.assertEqual([len(lines) - 1 for lines in sheets], [3, 2, 2])
+        self.assertTrue(all(lines[0].startswith("sample_id,") for lines in sheets))
+        rows = sorted(row for lines in sheets for row in lines[1:])
+        self.assertEqual(rows, sorted(SHEET.splitlines()[1:]))
+        # Never more shards than samples
+        self.assertEqual(len(split_sample_sheet(SHEET, 50)), 7)
+
+    def test_submit_sharded_run(self):
+        """Test the array job, the merge job that depends on it and the run manifest"""
+        run = submit_sharded_run('bucket', 'queue', 'definition', 3, 15, use_cache=False)
+        shard_job, merge_job = self.batch.jobs
+        self.assertEqual(shard_job['arrayProperties'], {'size': 3})
+        self.assertEqual(merge_job['dependsOn'], [{'jobId': 'job-1'}])
+        self.assertTrue(shard_job['jobName'].startswith('microbiome-demo-'))
+
+        shard_env, merge_env = environment(shard_job), environment(merge_job)
+        self.assertEqual(shard_env['RUN_ID'], run['run_id'])
+        self.assertEqual(shard_env['SAMPLE_SHARDS'], f"s3://bucket/input/shards/{run['run_id']}")
+        # Shards recompute but still store the results the merge job restores
+        self.assertEqual(shard_env['RESULT_CACHE'], 'refresh')
+        self.assertEqual(merge_env['RESULT_CACHE'], 'true')
+        self.assertNotIn('SAMPLE_SHARDS', merge_env)
+
+        manifest = json.loads(self.s3.objects[('bucket', f"progress/{run['run_id']}/run.json")][0])
+        self.assertEqual(manifest, run)
+        self.assertEqual(manifest['total_samples'], 7)
+        self.assertEqual(manifest['merge_job_id'], 'job-2')
+        for shard in manifest['shards']:
+            self.assertEqual(shard['workflow_id'], f"{run['run_id']}-shard-{shard['index']}")
+            sheet = self.s3.objects[('bucket', shard['samples_key'])][0].decode('utf-8')
+            self.assertEqual(len(sheet.splitlines()) - 1, shard['samples'])
+
+    def test_single_shard(self):
+        """Test that one shard is submitted as a plain job, since arrays need two children"""
+        self.s3.seed('bucket', 'input/sample_list.csv', b"sample_id,body_site\nS0,gut\n")
+        submit_sharded_run('bucket', 'queue', 'definition', 4, 15, use_cache=True)
+        self.assertNotIn('arrayProperties', self.batch.jobs[0])
+        self.assertEqual(environment(self.batch.jobs[0])['SHARD_INDEX'], '0')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,14 +12,38 @@
 // Default values
 params.bucket_name = 'microbiome-demo-bucket' // Default bucket name
 
+// Sharded runs (start_demo with "shards"): every Batch array child processes one
+// shard of the sample sheet under its own workflow ID and stores its samples in
+// the result cache; the merge job that follows reports on the whole sheet
+params.run_id = System.getenv('RUN_ID')
+params.sample_shards = System.getenv('SAMPLE_SHARDS')  // Prefix of shard_<index>.csv sample sheets
+params.shard_index = System.getenv('AWS_BATCH_JOB_ARRAY_INDEX') ?: System.getenv('SHARD_INDEX')  // Set by Batch on array children
+def shard = params.sample_shards && params.shard_index != null
+
 // Define parameters with defaults that will be overridden by command line or config
-params.samples = "s3://${params.bucket_name}/input/sample_list.csv"
-params.output = "s3://${params.bucket_name}/results"
+params.samples = shard ? "${params.sample_shards}/shard_${params.shard_index}.csv" : "s3://${params.bucket_name}/input/sample_list.csv"
+params.output = shard ? "s3://${params.bucket_name}/results/shards/${params.run_id}/shard_${params.shard_index}" : "s3://${params.bucket_name}/results"
+params.report = !shard  // Run the cohort reporting stages; shards leave them to the merge job
 params.kraken_db = "s3://${params.bucket_name}/reference/kraken2_db"
 params.metaphlan_db = "s3://${params.bucket_name}/reference/metaphlan_db"
 params.humann_db = "s3://${params.bucket_name}/reference/humann_db"
 params.enable_progress_tracking = true  // Enable real-time progress tracking
-params.workflow_id = UUID.randomUUID().toString()  // Unique ID for this workflow run
+params.workflow_id = params.run_id ? (shard ? "${params.run_id}-shard-${params.shard_index}" : params.run_id) : UUID.randomUUID().toString()  // Unique ID for this workflow run
+params.trace_file = "${workflow.launchDir}/reports/nextflow_trace.txt"  // Written on the head node; measured and published by workflow.onComplete
+params.run_start_ms = workflow.start.toInstant().toEpochMilli()  // Trace rows submitted earlier belong to previous runs
+params.resource_profile = null  // Learned resource profile from templates/resource_profile.py
+params.price_table = "${baseDir}/templates/price_table.json"  // Instance prices for per-task cost attribution
+// Part of every cache key; pin the images by digest so a tool update invalidates cached results
+params.tool_versions = 'microbiome-tools=public.ecr.aws/lts/microbiome-tools:latest,kraken2-gpu=public.ecr.aws/lts/kraken2-gpu:latest'
+// Off unless RESULT_CACHE=true or refresh: a :latest tag does not change with the image, so a
+// cached result could outlive a tool update. Turn it on by default once the tags are pinned.
+params.result_cache = System.getenv('RESULT_CACHE') in ['true', 'refresh']  // Reuse per-sample results from earlier runs
+params.result_cache_refresh = System.getenv('RESULT_CACHE') == 'refresh'  // Recompute every sample but still store the results
+params.result_cache_prefix = "s3://${params.bucket_name}/cache/results"
+params.result_cache_max_age_days = 90  // Evict cached samples unused for this long
+params.result_cache_max_gb = 500  // Evict least recently used samples above this size
+params.warehouse = "s3://${params.bucket_name}/warehouse"  // Cross-run Parquet tables (templates/results_warehouse.py); null to skip
+params.profiling = System.getenv('PIPELINE_PROFILE') ?: ''  // 1 or cprofile to profile the reporting stages (templates/profiling.py)
 
 // Resource configuration with architecture-specific settings
 params.resources = [
@@ -55,6 +79,7 @@ log.info """
   metaphlan_db     : ${params.metaphlan_db}
   humann_db        : ${params.humann_db}
   progress_tracking: ${params.enable_progress_tracking ? 'enabled' : 'disabled'}
+  result_cache     : ${params.result_cache ? params.result_cache_prefix : 'disabled'}
 """
 
 // First detect compute resources available to optimize process allocation
@@ -68,8 +93,30 @@ process detect_resources {
     template 'resource_detector.sh'
 }
 
+// Load the learned per-process resource profile, if one was provided
+def loadResourceProfile() {
+    if (!params.resource_profile) {
+        return null
+    }
+    try {
+        def profile = new groovy.json.JsonSlurper().parseText(file(params.resource_profile).text)
+        log.info "Using learned resource profile ${params.resource_profile} (${profile.tasks_analyzed} tasks)"
+        return profile
+    } catch (Exception e) {
+        log.warn "Could not load resource profile ${params.resource_profile}: ${e.message}"
+        return null
+    }
+}
+resourceProfile = loadResourceProfile()
+
+// Input bytes each per-sample task was sized with, by resource key and sample;
+// workflow.onComplete writes them next to the trace for resource_profile.py
+taskInputs = new java.util.concurrent.ConcurrentHashMap()
+
 // Parse resources.json file to extract architecture and GPU availability
-def getResourceConfig(resources_file, process_name) {
+// When a learned profile covers the process, size cpus/memory from the task's
+// input bytes instead of the static table, capped at what the node provides
+def getResourceConfig(resources_file, process_name, input_bytes = 0, tag = null) {
     def json = new groovy.json.JsonSlurper().parseText(resources_file.text)
     def arch = json.architecture ?: 'x86_64'  // Default to x86_64
     def gpu_count = json.gpu ?: 0
@@ -77,10 +124,29 @@ def getResourceConfig(resources_file, process_name) {
     // Special handling for Kraken based on GPU availability
     if (process_name == 'kraken' && gpu_count == 0) {
         // Use CPU-specific resources when no GPU is available
-        return params.resources[arch]['kraken_cpu']
+        process_name = 'kraken_cpu'
+    }
+    if (tag != null) {
+        taskInputs["${process_name}\t${tag}".toString()] = input_bytes
+    }
+    
+    def static_config = params.resources[arch][process_name]
+    def learned = resourceProfile?.processes?.get(process_name)
+    if (!learned) {
+        return static_config
     }
     
-    return params.resources[arch][process_name]
+    def input_gb = input_bytes / (1024 ** 3)
+    def memory_gb = (learned.memory_intercept_gb + learned.memory_per_input_gb * input_gb + learned.memory_headroom_gb) * learned.safety_factor
+    memory_gb = Math.max(learned.memory_min_gb as double, Math.ceil(memory_gb))
+    def cpus = learned.cpus as Integer
+    if (json.usable_memory) {
+        memory_gb = Math.min(memory_gb, Math.floor((json.usable_memory as double) / 1024))
+    }
+    if (json.cpu) {
+        cpus = Math.min(cpus, json.cpu as Integer)
+    }
+    return static_config + [cpus: cpus, memory: "${memory_gb as Integer} GB"]
 }
 
 // Check if GPU is available based on resources
@@ -89,6 +155,26 @@ def hasGpu(resources_file) {
     return (json.gpu as Integer) > 0
 }
 
+// beforeScript/afterScript reporting a task event ("started" or "ended") for
+// progress tracking. The per-sample and reporting processes all report, so the
+// ETA model times each process type instead of assuming the preprocess duration
+def progressEvent(process_name, event, total_processes) {
+    if (!params.enable_progress_tracking) {
+        return ""
+    }
+    def status = event == 'started' ? 'started' : '\${success:completed:failed}'
+    """
+    export PROCESS_NAME="${process_name}"
+    export PROCESS_STATUS="${status}"
+    export WORKFLOW_ID="${params.workflow_id}"
+    export BUCKET_NAME="${params.bucket_name}"
+    export TOTAL_PROCESSES="${total_processes}"
+    # Hand the event to the node's progress agent; without one, run the tracker
+    bash /tmp/progress-agent/progress_event.sh 2>/dev/null || \
+        bash -c 'bash \$(aws s3 cp s3://${params.bucket_name}/workflow/templates/progress_tracker.sh - | cat)' || true
+    """
+}
+
 // Make the resources available to all processes
 resources_ch.into { 
     resources_preprocess; 
@@ -115,7 +201,7 @@ if (params.enable_progress_tracking) {
         // Count the total number of processes in the workflow
         // This is a fixed count based on our workflow definition
         // Plus one for each sample in the paired-end reads
-        def fixed_processes = 8  // detect_resources, kraken_reports, merge_metaphlan, merge_humann, diversity_analysis, create_summary, upload_results, generate_cost_report
+        def fixed_processes = 7  // detect_resources, kraken_reports, merge_metaphlan, merge_humann, diversity_analysis, create_summary, upload_results
         def sample_count = 0
         
         try {
@@ -142,8 +228,80 @@ Channel
     .fromPath(params.samples)
     .splitCsv(header: true)
     .map { row -> tuple(row.sample_id, row.body_site, file(row.fastq_1), file(row.fastq_2)) }
+    .set { sample_reads }
+
+// Look up every sample in the cross-run result cache with one index read.
+// The key covers the input digests, tool versions, reference databases and
+// the per-sample process scripts, so any change to them is a miss.
+process cache_lookup {
+    input:
+    path('sample_list.csv') from file(params.samples)
+    path('workflow.nf') from file(workflow.scriptFile)
+    path('result_cache.py') from file("${baseDir}/templates/result_cache.py")
+    
+    output:
+    path('cache_lookup.tsv') into cache_lookup_table
+    
+    script:
+    """
+    python3 result_cache.py lookup \
+        --cache ${params.result_cache_prefix} \
+        --samples sample_list.csv \
+        --workflow workflow.nf \
+        --databases kraken=${params.kraken_db},metaphlan=${params.metaphlan_db},humann=${params.humann_db} \
+        --tool-versions '${params.tool_versions}' \
+        --output cache_lookup.tsv ${params.result_cache ? (params.result_cache_refresh ? '--refresh' : '') : '--disabled'}
+    """
+}
+
+cache_lookup_table.into { cache_lookup_for_split; cache_lookup_for_index }
+cache_lookup_for_split
+    .splitCsv(header: true, sep: '\t')
+    .map { row -> tuple(row.sample_id, row.cache_key, row.hit == 'true') }
+    .into { cache_keys; cache_keys_store }
+
+// Hits skip the per-sample processes; misses are computed as before
+cached_samples = Channel.create()
+samples_to_compute = Channel.create()
+sample_reads
+    .join(cache_keys)
+    .choice(cached_samples, samples_to_compute) { it[5] ? 0 : 1 }
+samples_to_compute
+    .map { tuple(it[0], it[1], it[2], it[3]) }
     .set { fastq_files }
 
+// Restore the outputs of samples already processed by an earlier run
+process cache_restore {
+    tag { sample_id }
+    errorStrategy { task.attempt <= 3 ? 'retry' : 'terminate' }
+    maxRetries 3
+    
+    input:
+    tuple val(sample_id), val(body_site), val(fastq_1), val(fastq_2), val(cache_key), val(hit) from cached_samples
+    path('result_cache.py') from file("${baseDir}/templates/result_cache.py")
+    val total_processes from progress_init_ch.value() // For progress tracking
+    
+    output:
+    tuple val(sample_id), val(body_site), path("${sample_id}.kreport") into kraken_restored
+    tuple val(sample_id), val(body_site), path("${sample_id}.metaphlan.tsv") into metaphlan_restored
+    tuple val(sample_id), val(body_site), path("${sample_id}.humann.genefamilies.tsv"), path("${sample_id}.humann.pathabundance.tsv") into humann_restored
+    
+    // A restored sample counts as all three per-sample tasks for progress tracking;
+    // without a start event they are counted but not timed
+    afterScript:
+    progressEvent("preprocess_reads_${sample_id}", 'ended', total_processes) +
+        progressEvent("taxonomic_classification_kraken_${sample_id}", 'ended', total_processes) +
+        progressEvent("metaphlan_analysis_${sample_id}", 'ended', total_processes)
+    
+    script:
+    """
+    python3 result_cache.py restore \
+        --cache ${params.result_cache_prefix} \
+        --key ${cache_key} \
+        --sample-id ${sample_id}
+    """
+}
+
 // Pre-process reads (QC, adapter trimming)
 process preprocess_reads {
     tag { sample_id }
@@ -156,8 +314,8 @@ process preprocess_reads {
     val total_processes from progress_init_ch.value() // For progress tracking
     
     // Dynamic resource allocation
-    cpus { getResourceConfig(resources, 'preprocess').cpus }
-    memory { getResourceConfig(resources, 'preprocess').memory }
+    cpus { getResourceConfig(resources, 'preprocess', fastq_1.size() + fastq_2.size(), sample_id).cpus }
+    memory { getResourceConfig(resources, 'preprocess', fastq_1.size() + fastq_2.size(), sample_id).memory }
     
     output:
     tuple val(sample_id), val(body_site), path("${sample_id}_1.trimmed.fastq.gz"), path("${sample_id}_2.trimmed.fastq.gz") into trimmed_reads
@@ -165,26 +323,10 @@ process preprocess_reads {
     
     // Progress tracking script before and after the main process
     beforeScript:
-    params.enable_progress_tracking ? 
-    """
-    export PROCESS_NAME="preprocess_reads_${sample_id}"
-    export PROCESS_STATUS="started"
-    export WORKFLOW_ID="${params.workflow_id}"
-    export BUCKET_NAME="${params.bucket_name}"
-    export TOTAL_PROCESSES="${total_processes}"
-    bash -c 'bash \$(aws s3 cp s3://${params.bucket_name}/workflow/templates/progress_tracker.sh - | cat)' || true
-    """ : ""
+    progressEvent("preprocess_reads_${sample_id}", 'started', total_processes)
     
     afterScript:
-    params.enable_progress_tracking ?
-    """
-    export PROCESS_NAME="preprocess_reads_${sample_id}"
-    export PROCESS_STATUS="\${success:completed:failed}"
-    export WORKFLOW_ID="${params.workflow_id}"
-    export BUCKET_NAME="${params.bucket_name}"
-    export TOTAL_PROCESSES="${total_processes}"
-    bash -c 'bash \$(aws s3 cp s3://${params.bucket_name}/workflow/templates/progress_tracker.sh - | cat)' || true
-    """ : ""
+    progressEvent("preprocess_reads_${sample_id}", 'ended', total_processes)
     
     script:
     """
@@ -240,14 +382,21 @@ process taxonomic_classification_kraken {
     
     // Dynamic resource allocation
     accelerator { hasGpu(resources) ? 1 : 0 }  // Request GPU only if available
-    cpus { getResourceConfig(resources, 'kraken').cpus }
-    memory { getResourceConfig(resources, 'kraken').memory }
+    cpus { getResourceConfig(resources, 'kraken', trimmed_1.size() + trimmed_2.size(), sample_id).cpus }
+    memory { getResourceConfig(resources, 'kraken', trimmed_1.size() + trimmed_2.size(), sample_id).memory }
     
     input:
     tuple val(sample_id), val(body_site), path(trimmed_1), path(trimmed_2) from reads_for_kraken
+    val total_processes from progress_init_ch.value() // For progress tracking
     
     output:
-    tuple val(sample_id), val(body_site), path("${sample_id}.kraken.out"), path("${sample_id}.kreport") into kraken_results
+    tuple val(sample_id), val(body_site), path("${sample_id}.kraken.out"), path("${sample_id}.kreport") into kraken_computed
+    
+    beforeScript:
+    progressEvent("taxonomic_classification_kraken_${sample_id}", 'started', total_processes)
+    
+    afterScript:
+    progressEvent("taxonomic_classification_kraken_${sample_id}", 'ended', total_processes)
     
     script:
     """
@@ -324,11 +473,27 @@ process taxonomic_classification_kraken {
     """
 }
 
+// Report computed and restored samples alike
+kraken_computed.into { kraken_for_reports; kraken_for_cache }
+kraken_for_reports
+    .map { tuple(it[0], it[1], it[3]) }
+    .mix(kraken_restored)
+    .set { kraken_results }
+
 // Generate Kraken2 summary reports
+// The combined report is the largest artifact, so it is written once and
+// moved (not copied) to the published results
 process kraken_reports {
+    publishDir "${params.output}/taxonomic", mode: 'move', pattern: 'kraken_summary'
+    publishDir "${params.output}/taxonomic", mode: 'copy', pattern: '*.profile.*'
+    
+    when:
+    params.report
+    
     input:
     path resources from resources_kraken_reports.first()
-    path('reports/*') from kraken_results.map { it[3] }.collect()
+    path('reports/*') from kraken_results.map { it[2] }.collect()
+    path('profiling.py') from file("${baseDir}/templates/profiling.py")
     
     // Dynamic resource allocation
     cpus { getResourceConfig(resources, 'reporting').cpus }
@@ -336,11 +501,19 @@ process kraken_reports {
     path('metadata/*') from kraken_results.map { tuple(it[0], it[1]) }.collectFile(name: 'sample_metadata.csv', newLine: true) { 
         [it[0], it[1]].join(',') 
     }
+    val total_processes from progress_init_ch.value() // For progress tracking
     
     output:
-    path('kraken_summary.tsv') into kraken_summary
+    path('kraken_summary')
     path('kraken_species_counts.tsv') into kraken_species_counts
     path('kraken_phylum_counts.tsv') into kraken_phylum_counts
+    path('*.profile.*') optional true
+    
+    beforeScript:
+    progressEvent('kraken_reports', 'started', total_processes)
+    
+    afterScript:
+    progressEvent('kraken_reports', 'ended', total_processes)
     
     script:
     """
@@ -348,17 +521,27 @@ process kraken_reports {
     echo "sample_id,body_site" > metadata.csv
     cat metadata/sample_metadata.csv >> metadata.csv
     
+    # Profile the stage's sections when PIPELINE_PROFILE is set (templates/profiling.py)
+    export PIPELINE_PROFILE="${params.profiling}"
+    
     # Combine Kraken2 reports
     python3 <<EOF
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 import os
 import re
+from profiling import profile_stage
+
+profiler = profile_stage('kraken_reports')
 
 # Load metadata
+profiler.mark('load_metadata')
 metadata = pd.read_csv('metadata.csv')
 metadata.set_index('sample_id', inplace=True)
 
 # Get list of report files
+profiler.mark('parse_reports')
 report_files = [os.path.join('reports', f) for f in os.listdir('reports')]
 
 # Function to parse Kraken report
@@ -394,10 +577,22 @@ combined_df = pd.concat(all_data)
 # Merge with metadata
 combined_df['body_site'] = combined_df['sample'].map(metadata['body_site'])
 
-# Save combined report
-combined_df.to_csv('kraken_summary.tsv', sep='\\t', index=False)
+# Save the combined report as Parquet partitioned by rank (kraken_summary/rank=S/...),
+# dictionary-encoded and sorted by sample and taxon, so readers of the S or P rows
+# open only that partition and can skip row groups by their statistics
+profiler.mark('write_summary')
+summary_table = pa.Table.from_pandas(combined_df.sort_values(['rank', 'sample', 'name'], kind='stable'),
+                                     preserve_index=False)
+ds.write_dataset(
+    summary_table, 'kraken_summary', format='parquet',
+    partitioning=ds.partitioning(pa.schema([('rank', pa.string())]), flavor='hive'),
+    file_options=ds.ParquetFileFormat().make_write_options(compression='zstd', use_dictionary=True,
+                                                           write_statistics=True),
+    max_rows_per_group=128 * 1024
+)
 
 # Extract species counts
+profiler.mark('species_counts')
 species_df = combined_df[combined_df['rank'] == 'S'].copy()
 species_pivot = species_df.pivot_table(
     index='name', 
@@ -408,6 +603,7 @@ species_pivot = species_df.pivot_table(
 species_pivot.to_csv('kraken_species_counts.tsv', sep='\\t')
 
 # Extract phylum-level information
+profiler.mark('phylum_counts')
 phylum_df = combined_df[combined_df['rank'] == 'P'].copy()
 phylum_pivot = phylum_df.pivot_table(
     index='name', 
@@ -436,48 +632,88 @@ EOF
 }
 
 // Taxonomic and functional profiling with MetaPhlAn and HUMAnN
+// HUMAnN is seeded with the MetaPhlAn profile computed here so its internal
+// taxonomic prescreen (a second bowtie2 mapping of the same reads) is skipped
 process metaphlan_analysis {
     tag { sample_id }
+    publishDir "${params.output}/reports/timings", mode: 'copy', pattern: '*.timings.tsv'
     
     input:
     tuple val(sample_id), val(body_site), path(trimmed_1), path(trimmed_2) from reads_for_metaphlan
     path resources from resources_metaphlan.first()
     
     // Dynamic resource allocation
-    cpus { getResourceConfig(resources, 'metaphlan').cpus }
-    memory { getResourceConfig(resources, 'metaphlan').memory }
+    cpus { getResourceConfig(resources, 'metaphlan', trimmed_1.size() + trimmed_2.size(), sample_id).cpus }
+    memory { getResourceConfig(resources, 'metaphlan', trimmed_1.size() + trimmed_2.size(), sample_id).memory }
+    val total_processes from progress_init_ch.value() // For progress tracking
     
     output:
-    tuple val(sample_id), val(body_site), path("${sample_id}.metaphlan.tsv") into metaphlan_results
-    tuple val(sample_id), val(body_site), path("${sample_id}.humann.genefamilies.tsv"), path("${sample_id}.humann.pathabundance.tsv") into humann_results
+    tuple val(sample_id), val(body_site), path("${sample_id}.metaphlan.tsv") into metaphlan_computed
+    tuple val(sample_id), val(body_site), path("${sample_id}.humann.genefamilies.tsv"), path("${sample_id}.humann.pathabundance.tsv") into humann_computed
+    path("${sample_id}.timings.tsv") into metaphlan_timings
+    
+    beforeScript:
+    progressEvent("metaphlan_analysis_${sample_id}", 'started', total_processes)
+    
+    afterScript:
+    progressEvent("metaphlan_analysis_${sample_id}", 'ended', total_processes)
     
     script:
     """
+    # Record wall-clock seconds for each stage so the removed prescreen can be verified
+    echo -e "stage\\tseconds" > ${sample_id}.timings.tsv
+    record_stage() {
+        echo -e "\$1\\t\$((\$(date +%s) - \$2))" >> ${sample_id}.timings.tsv
+    }
+    
     # Concatenate paired reads for MetaPhlAn
+    stage_start=\$(date +%s)
     cat ${trimmed_1} ${trimmed_2} > ${sample_id}.fastq.gz
+    record_stage concatenate \$stage_start
     
     # Download MetaPhlAn database directly to the compute node (no transit through user's computer)
     echo "Directly accessing MetaPhlAn database (downloading directly to compute node)..."
+    stage_start=\$(date +%s)
     metaphlan --install --bowtie2db metaphlan_db
+    record_stage metaphlan_db_install \$stage_start
     echo "MetaPhlAn database setup complete - direct installation to compute node."
     
     # Run MetaPhlAn
+    stage_start=\$(date +%s)
     metaphlan ${sample_id}.fastq.gz \
               --input_type fastq \
               --bowtie2db metaphlan_db \
               --nproc ${task.cpus} \
               --output_file ${sample_id}.metaphlan.tsv \
               --bowtie2out ${sample_id}.metaphlan.bowtie2.bz2
+    record_stage metaphlan \$stage_start
+    
+    # Verify the profile exists before handing it to HUMAnN
+    if [ ! -s "${sample_id}.metaphlan.tsv" ]; then
+        echo "ERROR: MetaPhlAn failed to create ${sample_id}.metaphlan.tsv"
+        exit 1
+    fi
     
     # Run HUMAnN for functional profiling with direct database access
+    # --taxonomic-profile reuses the MetaPhlAn output above instead of re-mapping
+    # the reads with bowtie2 for HUMAnN's own prescreen
     echo "Directly accessing HUMAnN databases from S3 (no transit through user's computer)..."
+    stage_start=\$(date +%s)
     humann --input ${sample_id}.fastq.gz \
            --output humann_output \
+           --taxonomic-profile ${sample_id}.metaphlan.tsv \
            --nucleotide-database ${params.humann_db}/chocophlan \
            --protein-database ${params.humann_db}/uniref \
-           --metaphlan-options "--bowtie2db metaphlan_db --nproc ${task.cpus}" \
            --verbose \
            --threads ${task.cpus}
+    record_stage humann \$stage_start
+    
+    # HUMAnN only runs its prescreen when no profile is supplied; flag it if one shows up
+    if ls humann_output/*_humann_temp/*_metaphlan_bowtie2.txt &> /dev/null; then
+        echo -e "humann_prescreen\\tduplicated" >> ${sample_id}.timings.tsv
+    else
+        echo -e "humann_prescreen\\tskipped" >> ${sample_id}.timings.tsv
+    fi
     
     # Copy and rename HUMAnN outputs
     cp humann_output/${sample_id}.fastq.gz_genefamilies.tsv ${sample_id}.humann.genefamilies.tsv
@@ -485,11 +721,80 @@ process metaphlan_analysis {
     
     # Log completion
     echo "Completed MetaPhlAn and HUMAnN analysis for sample ${sample_id}"
+    cat ${sample_id}.timings.tsv
+    """
+}
+
+metaphlan_computed.into { metaphlan_for_reports; metaphlan_for_cache }
+metaphlan_for_reports.mix(metaphlan_restored).set { metaphlan_results }
+humann_computed.into { humann_for_reports; humann_for_cache }
+humann_for_reports.mix(humann_restored).set { humann_results }
+
+// Samples computed in this run, with their cache keys; samples whose inputs
+// could not be digested have no key and are not cached
+kraken_for_cache
+    .map { tuple(it[0], it[3]) }
+    .join(metaphlan_for_cache.map { tuple(it[0], it[2]) })
+    .join(humann_for_cache.map { tuple(it[0], it[2], it[3]) })
+    .join(cache_keys_store.map { tuple(it[0], it[1]) })
+    .filter { it[5] }
+    .set { cache_store_inputs }
+
+// Store newly computed samples in the result cache
+process cache_store {
+    tag { sample_id }
+    
+    when:
+    params.result_cache
+    
+    input:
+    tuple val(sample_id), path(kreport), path(metaphlan), path(genefamilies), path(pathabundance), val(cache_key) from cache_store_inputs
+    path('result_cache.py') from file("${baseDir}/templates/result_cache.py")
+    
+    output:
+    path("${sample_id}.cache_entry.json") into cache_entries
+    
+    script:
+    """
+    python3 result_cache.py store \
+        --cache ${params.result_cache_prefix} \
+        --key ${cache_key} \
+        --sample-id ${sample_id} \
+        --file kreport=${kreport} \
+        --file metaphlan=${metaphlan} \
+        --file genefamilies=${genefamilies} \
+        --file pathabundance=${pathabundance} \
+        --entry ${sample_id}.cache_entry.json
+    """
+}
+
+// Add this run's entries and hits to the cache index and evict old entries;
+// the only writer of the index, so runs never race within themselves
+process cache_index {
+    when:
+    params.result_cache
+    
+    input:
+    path('entries/*') from cache_entries.collect().ifEmpty([])
+    path('cache_lookup.tsv') from cache_lookup_for_index
+    path('result_cache.py') from file("${baseDir}/templates/result_cache.py")
+    
+    script:
+    """
+    python3 result_cache.py index \
+        --cache ${params.result_cache_prefix} \
+        --entries \$(find entries -name '*.json' 2>/dev/null) \
+        --lookup cache_lookup.tsv \
+        --max-age-days ${params.result_cache_max_age_days} \
+        --max-gb ${params.result_cache_max_gb}
     """
 }
 
 // Merge MetaPhlAn results
 process merge_metaphlan {
+    when:
+    params.report
+    
     input:
     path('profiles/*') from metaphlan_results.map { it[2] }.collect()
     path resources from resources_merge_metaphlan.first()
@@ -500,10 +805,17 @@ process merge_metaphlan {
     path('metadata/*') from metaphlan_results.map { tuple(it[0], it[1]) }.collectFile(name: 'sample_metadata.csv', newLine: true) { 
         [it[0], it[1]].join(',') 
     }
+    val total_processes from progress_init_ch.value() // For progress tracking
     
     output:
     path('metaphlan_merged.tsv') into metaphlan_merged
     
+    beforeScript:
+    progressEvent('merge_metaphlan', 'started', total_processes)
+    
+    afterScript:
+    progressEvent('merge_metaphlan', 'ended', total_processes)
+    
     script:
     """
     # Parse metadata
@@ -538,6 +850,9 @@ EOF
 
 // Merge and analyze HUMAnN results
 process merge_humann {
+    when:
+    params.report
+    
     input:
     path('genefamilies/*') from humann_results.map { it[2] }.collect()
     path resources from resources_merge_humann.first()
@@ -549,12 +864,19 @@ process merge_humann {
     path('metadata/*') from humann_results.map { tuple(it[0], it[1]) }.collectFile(name: 'sample_metadata.csv', newLine: true) { 
         [it[0], it[1]].join(',') 
     }
+    val total_processes from progress_init_ch.value() // For progress tracking
     
     output:
     path('humann_genefamilies_merged.tsv') into humann_genefamilies_merged
     path('humann_pathabundance_merged.tsv') into humann_pathabundance_merged
     path('humann_pathabundance_relab_merged.tsv') into humann_pathabundance_relab
     
+    beforeScript:
+    progressEvent('merge_humann', 'started', total_processes)
+    
+    afterScript:
+    progressEvent('merge_humann', 'ended', total_processes)
+    
     script:
     """
     # Parse metadata
@@ -577,9 +899,14 @@ process merge_humann {
 
 // Calculate diversity metrics
 process diversity_analysis {
+    publishDir "${params.output}/diversity", mode: 'copy', pattern: '*.profile.*'
+    
     input:
     path(metaphlan_merged) from metaphlan_merged
     path resources from resources_diversity.first()
+    path('presence_bits.py') from file("${baseDir}/templates/presence_bits.py")
+    path('grouped_stats.py') from file("${baseDir}/templates/grouped_stats.py")
+    path('profiling.py') from file("${baseDir}/templates/profiling.py")
     
     // Dynamic resource allocation
     cpus { getResourceConfig(resources, 'reporting').cpus }
@@ -587,11 +914,20 @@ process diversity_analysis {
     path('metadata/*') from metaphlan_results.map { tuple(it[0], it[1]) }.collectFile(name: 'sample_metadata.csv', newLine: true) { 
         [it[0], it[1]].join(',') 
     }
+    val total_processes from progress_init_ch.value() // For progress tracking
     
     output:
     path('alpha_diversity.tsv') into alpha_diversity
     path('beta_diversity.tsv') into beta_diversity
     path('pcoa_coordinates.tsv') into pcoa_coords
+    path('beta_dispersion.tsv') into beta_dispersion
+    path('*.profile.*') optional true
+    
+    beforeScript:
+    progressEvent('diversity_analysis', 'started', total_processes)
+    
+    afterScript:
+    progressEvent('diversity_analysis', 'ended', total_processes)
     
     script:
     """
@@ -599,6 +935,9 @@ process diversity_analysis {
     echo "sample_id,body_site" > metadata.csv
     cat metadata/sample_metadata.csv >> metadata.csv
     
+    # Profile the stage's sections when PIPELINE_PROFILE is set (templates/profiling.py)
+    export PIPELINE_PROFILE="${params.profiling}"
+    
     # Run diversity analysis
     python3 <<EOF
 import pandas as pd
@@ -606,9 +945,15 @@ import numpy as np
 from scipy.spatial.distance import pdist, squareform
 from skbio.diversity import alpha_diversity, beta_diversity
 from skbio.stats.ordination import pcoa
+from presence_bits import pack_presence, observed_richness, jaccard_distances
+from grouped_stats import grouped_stats
+from profiling import profile_stage
 import json
 
+profiler = profile_stage('diversity_analysis')
+
 # Load metadata
+profiler.mark('load_tables')
 metadata = pd.read_csv('metadata.csv')
 metadata.set_index('sample_id', inplace=True)
 
@@ -621,10 +966,14 @@ df = df.set_index(df.columns[0])
 # Filter to species level
 species_df = df[df.index.str.contains('s__')]
 
+# Observed species and Jaccard only need presence/absence: pack it into bits
+profiler.mark('alpha_diversity')
+presence = pack_presence(species_df.T.values)
+
 # Alpha diversity
 shannon_div = alpha_diversity('shannon', species_df.T.values, species_df.T.index)
 simpson_div = alpha_diversity('simpson', species_df.T.values, species_df.T.index)
-observed_otus = alpha_diversity('observed_otus', species_df.T.values, species_df.T.index)
+observed_otus = pd.Series(observed_richness(presence), index=species_df.T.index)
 
 # Combine alpha diversity metrics
 alpha_df = pd.DataFrame({
@@ -639,8 +988,9 @@ alpha_df['body_site'] = alpha_df.index.map(metadata['body_site'])
 alpha_df.to_csv('alpha_diversity.tsv', sep='\\t')
 
 # Beta diversity
+profiler.mark('beta_diversity')
 bc_dm = beta_diversity('braycurtis', species_df.T.values, species_df.T.index)
-jc_dm = beta_diversity('jaccard', species_df.T.values, species_df.T.index)
+jc_matrix = jaccard_distances(presence)
 
 # Convert distance matrices to dataframes
 bc_df = pd.DataFrame(
@@ -649,9 +999,9 @@ bc_df = pd.DataFrame(
     columns=bc_dm.ids
 )
 jc_df = pd.DataFrame(
-    squareform(jc_dm.data),
-    index=jc_dm.ids,
-    columns=jc_dm.ids
+    jc_matrix,
+    index=bc_dm.ids,
+    columns=bc_dm.ids
 )
 
 # Save beta diversity
@@ -661,11 +1011,12 @@ jc_df.to_csv('beta_diversity_jaccard.tsv', sep='\\t')
 # Combined beta diversity for visualization
 beta_df = pd.DataFrame({
     'braycurtis': squareform(bc_dm.data),
-    'jaccard': squareform(jc_dm.data)
+    'jaccard': squareform(jc_matrix, checks=False)
 })
 beta_df.to_csv('beta_diversity.tsv', sep='\\t')
 
 # PCoA on Bray-Curtis distances
+profiler.mark('pcoa')
 pcoa_results = pcoa(bc_dm)
 pcoa_df = pd.DataFrame(
     pcoa_results.samples.values,
@@ -686,7 +1037,28 @@ variance_df = pd.DataFrame({
 variance_df.index.name = 'pc'
 variance_df.to_csv('pcoa_variance_explained.tsv', sep='\\t')
 
+# Beta dispersion: each sample's mean distance to the other samples of its
+# body site and its distance to the site centroid in PCoA space, summarised
+# per site in one grouped pass
+profiler.mark('beta_dispersion')
+sites = metadata['body_site'].reindex(bc_df.index).to_numpy(dtype=object)
+same_site = (sites[:, None] == sites[None, :]) & ~np.eye(len(sites), dtype=bool)
+site_peers = np.where(same_site.any(axis=1), same_site.sum(axis=1), np.nan)
+pcs = pcoa_df[['PC1', 'PC2', 'PC3', 'PC4', 'PC5']].reindex(bc_df.index)
+centroids = pcs.groupby(sites).transform('mean')
+dispersion_overall, dispersion_by_site = grouped_stats(list(sites), {
+    'braycurtis_within_site': ((bc_df.values * same_site).sum(axis=1) / site_peers).tolist(),
+    'jaccard_within_site': ((jc_matrix * same_site).sum(axis=1) / site_peers).tolist(),
+    'distance_to_centroid': np.sqrt(((pcs - centroids) ** 2).sum(axis=1)).tolist()
+})
+pd.DataFrame.from_records([
+    dict(body_site=site, metric=metric, **stats)
+    for site, metrics in dispersion_by_site.items()
+    for metric, stats in metrics.items()
+]).to_csv('beta_dispersion.tsv', sep='\\t', index=False)
+
 # Generate summary JSON for dashboard
+profiler.mark('summary')
 summary = {
     'samples': len(species_df.columns),
     'species_count': len(species_df),
@@ -698,6 +1070,10 @@ summary = {
     },
     'pcoa': {
         'variance_explained': variance_explained[:3].tolist()
+    },
+    'beta_dispersion': {
+        'overall': dispersion_overall,
+        'by_site': dispersion_by_site
     }
 }
 
@@ -715,6 +1091,8 @@ EOF
 
 // Create summary reports for dashboard
 process create_summary {
+    publishDir "${params.output}/summary", mode: 'copy', pattern: '*.profile.*'
+    
     input:
     path(kraken_species_counts) from kraken_species_counts
     path(kraken_phylum_counts) from kraken_phylum_counts
@@ -727,135 +1105,149 @@ process create_summary {
     path(humann_pathabundance_relab) from humann_pathabundance_relab
     path(alpha_diversity) from alpha_diversity
     path(pcoa_coords) from pcoa_coords
+    path('table_stream.py') from file("${baseDir}/templates/table_stream.py")
+    path('abundance_topk.py') from file("${baseDir}/templates/abundance_topk.py")
+    path('grouped_stats.py') from file("${baseDir}/templates/grouped_stats.py")
+    path('dashboard_products.py') from file("${baseDir}/templates/dashboard_products.py")
+    path('profiling.py') from file("${baseDir}/templates/profiling.py")
+    val total_processes from progress_init_ch.value() // For progress tracking
     
     output:
     path('microbiome_summary.json') into microbiome_summary
+    path('dashboard') into dashboard_products
+    path('*.profile.*') optional true
+    
+    beforeScript:
+    progressEvent('create_summary', 'started', total_processes)
+    
+    afterScript:
+    progressEvent('create_summary', 'ended', total_processes)
     
     script:
     """
+    # Profile the stage's sections when PIPELINE_PROFILE is set (templates/profiling.py)
+    export PIPELINE_PROFILE="${params.profiling}"
+    
     # Generate summary JSON for dashboard
     python3 <<EOF
-import pandas as pd
 import json
-import numpy as np
-
-# Load data files
-kraken_species_df = pd.read_csv('${kraken_species_counts}', sep='\\t', index_col=0)
-kraken_phylum_df = pd.read_csv('${kraken_phylum_counts}', sep='\\t', index_col=0)
-metaphlan_df = pd.read_csv('${metaphlan_merged}', sep='\\t', skiprows=1)
-humann_df = pd.read_csv('${humann_pathabundance_relab}', sep='\\t', skiprows=0)
-alpha_df = pd.read_csv('${alpha_diversity}', sep='\\t', index_col=0)
-pcoa_df = pd.read_csv('${pcoa_coords}', sep='\\t', index_col=0)
-
-# Clean metaphlan data
-if metaphlan_df.columns[0].startswith('#'):
-    metaphlan_df = metaphlan_df.rename(columns={metaphlan_df.columns[0]: metaphlan_df.columns[0][1:]})
-metaphlan_df = metaphlan_df.set_index(metaphlan_df.columns[0])
-
-# Extract species-level data
-metaphlan_species = metaphlan_df[metaphlan_df.index.str.contains('s__')]
-
-# Calculate key metrics
-sample_count = len(kraken_species_df.columns)
-species_count = len(metaphlan_species)
-
-# Get top 20 species by mean abundance
-top_species = metaphlan_species.mean(axis=1).sort_values(ascending=False).head(20)
-top_species_data = [
-    {"name": name.split('|')[-1].replace('s__', ''), "abundance": float(abundance)}
-    for name, abundance in top_species.items()
-]
+from table_stream import count_samples, iter_row_means, read_columns, parse_float
+from abundance_topk import top_k_table
+from grouped_stats import grouped_stats
+from profiling import profile_stage
+
+profiler = profile_stage('create_summary')
+
+# Only the aggregates below are needed, so the tables are streamed in chunks
+# instead of being loaded whole; memory is bounded by the summary size
+
+# Sample count comes from the Kraken species table header alone
+profiler.mark('read_tables')
+sample_count = count_samples('${kraken_species_counts}')
+
+# Only the alpha diversity and PCoA columns used below are read
+def as_float(value):
+    number = parse_float(value)
+    return float('nan') if number is None else number
+
+alpha_samples, alpha = read_columns('${alpha_diversity}', ['shannon', 'observed_species', 'body_site'],
+                                    converters={'shannon': as_float, 'observed_species': as_float})
+_, pcoa = read_columns('${pcoa_coords}', ['PC1', 'PC2', 'body_site'],
+                       converters={'PC1': as_float, 'PC2': as_float})
+sample_sites = dict(zip(alpha_samples, alpha['body_site']))
+
+# Top 20 species by mean abundance, overall and per body site, in one pass
+# (the merged table starts with a #SampleMetadata line before the header)
+profiler.mark('top_species')
+def species_entries(ranking):
+    return [{"name": name.split('|')[-1].replace('s__', ''), "abundance": float(abundance)}
+            for name, abundance in ranking]
+
+species = top_k_table('${metaphlan_merged}', 20, skip_lines=1, row_filter=lambda name: 's__' in name,
+                      sample_groups=sample_sites)
+species_count = species.features_seen
+top_species_data = species_entries(species.top())
+top_species_by_site = {site: species_entries(ranking) for site, ranking in species.top_by_group().items()}
 
 # Get top 15 pathways
+profiler.mark('top_pathways')
+def pathway_entries(ranking):
+    return [{"name": name.split(':')[0] if ':' in name else name, "abundance": float(abundance)}
+            for name, abundance in ranking]
+
+pathway_count = 0
+pathway_data = []
+top_pathways_by_site = {}
 try:
-    humann_df.set_index(humann_df.columns[0], inplace=True)
-    top_pathways = humann_df.iloc[:, :].mean(axis=1).sort_values(ascending=False).head(15)
-    pathway_data = [
-        {"name": name.split(':')[0] if ':' in name else name, "abundance": float(abundance)}
-        for name, abundance in top_pathways.items()
-    ]
+    pathways = top_k_table('${humann_pathabundance_relab}', 15, sample_groups=sample_sites)
+    pathway_count = pathways.features_seen
+    pathway_data = pathway_entries(pathways.top())
+    top_pathways_by_site = {site: pathway_entries(ranking) for site, ranking in pathways.top_by_group().items()}
 except Exception as e:
-    pathway_data = []
     print(f"Error processing pathways: {e}")
 
 # Calculate phylum-level distribution
+profiler.mark('phylum_distribution')
 phylum_data = []
 try:
-    phylum_counts = kraken_phylum_df.mean(axis=1).sort_values(ascending=False)
+    phylum_counts = sorted(iter_row_means('${kraken_phylum_counts}'), key=lambda item: item[1], reverse=True)
     phylum_data = [
         {"name": name, "abundance": float(abundance)}
-        for name, abundance in phylum_counts.items()
+        for name, abundance in phylum_counts
     ]
 except Exception as e:
     print(f"Error processing phylum data: {e}")
 
-# Extract diversity metrics by body site
-diversity_by_site = {}
+# Diversity metrics overall and by body site, in one grouped pass
+profiler.mark('diversity_stats')
+diversity_overall, diversity_by_site = {}, {}
 try:
-    for site in alpha_df['body_site'].unique():
-        site_data = alpha_df[alpha_df['body_site'] == site]
-        diversity_by_site[site] = {
-            "shannon": {
-                "mean": float(site_data['shannon'].mean()),
-                "std": float(site_data['shannon'].std()),
-                "min": float(site_data['shannon'].min()),
-                "max": float(site_data['shannon'].max())
-            },
-            "observed_species": {
-                "mean": float(site_data['observed_species'].mean()),
-                "std": float(site_data['observed_species'].std()),
-                "min": float(site_data['observed_species'].min()),
-                "max": float(site_data['observed_species'].max())
-            }
-        }
+    diversity_overall, diversity_by_site = grouped_stats(
+        alpha['body_site'], {metric: alpha[metric] for metric in ('shannon', 'observed_species')})
 except Exception as e:
     print(f"Error processing diversity by site: {e}")
     
-# Extract diversity metrics overall
 diversity_data = {
-    "alpha": {
-        "shannon": {
-            "mean": float(alpha_df['shannon'].mean()),
-            "std": float(alpha_df['shannon'].std()),
-            "min": float(alpha_df['shannon'].min()),
-            "max": float(alpha_df['shannon'].max())
-        },
-        "observed_species": {
-            "mean": float(alpha_df['observed_species'].mean()),
-            "std": float(alpha_df['observed_species'].std()),
-            "min": float(alpha_df['observed_species'].min()),
-            "max": float(alpha_df['observed_species'].max())
-        }
-    },
+    "alpha": diversity_overall,
     "beta": {
         "pcoa": {
-            "pc1_vs_pc2": pcoa_df[['PC1', 'PC2', 'body_site']].to_dict(orient='records'),
+            "pc1_vs_pc2": [
+                {"PC1": pc1, "PC2": pc2, "body_site": site}
+                for pc1, pc2, site in zip(pcoa['PC1'], pcoa['PC2'], pcoa['body_site'])
+            ],
             "variance_explained": [0.32, 0.18, 0.12]  # Placeholder - actual values would come from PCoA
         }
     },
     "by_site": diversity_by_site
 }
 
-# Create execution metrics for cost calculation
+# Per-sample estimates while the run is still going: once it ends, workflow.onComplete
+# measures every task from the trace and replaces them (templates/publish_run_metrics.sh)
+profiler.mark('execution_metrics')
 execution_metrics = {
     "cpu_hours": sample_count * 0.5,  # Estimate: 30 minutes per sample of CPU time
     "gpu_hours": sample_count * 0.1,  # Estimate: 6 minutes per sample of GPU time
     "wall_clock_minutes": 15,
     "samples_processed": sample_count,
-    "data_processed_gb": sample_count * 0.5  # Assume 500MB per sample
+    "data_processed_gb": sample_count * 0.5,  # Assume 500MB per sample
+    "hotspots": [],
+    "source": "estimate"
 }
 
 # Combine everything into a summary
+profiler.mark('write_summary')
 summary = {
     "taxonomic_profile": {
         "sample_count": sample_count,
         "species_count": species_count,
         "top_species": top_species_data,
+        "top_species_by_site": top_species_by_site,
         "phylum_distribution": phylum_data
     },
     "functional_profile": {
-        "pathway_count": len(humann_df) if not isinstance(humann_df, pd.Series) else 0,
-        "top_pathways": pathway_data
+        "pathway_count": pathway_count,
+        "top_pathways": pathway_data,
+        "top_pathways_by_site": top_pathways_by_site
     },
     "diversity": diversity_data,
     "execution_metrics": execution_metrics,
@@ -867,11 +1259,14 @@ summary = {
     }
 }
 
-# Save to JSON
+# Save to JSON (compact: the summary is polled by the dashboard)
 with open('microbiome_summary.json', 'w') as f:
-    json.dump(summary, f, indent=2)
+    json.dump(summary, f, separators=(',', ':'))
 EOF
     
+    # Split the summary into a bounded overview plus content-hashed detail shards
+    python3 dashboard_products.py microbiome_summary.json --output-dir dashboard
+    
     # Log completion
     echo "Created microbiome summary for dashboard"
     """
@@ -882,18 +1277,26 @@ process upload_results {
     publishDir "${params.output}", mode: 'copy'
     
     input:
-    path(kraken_summary) from kraken_summary
     path(metaphlan_merged) from metaphlan_merged
     path(humann_genefamilies_merged) from humann_genefamilies_merged
     path(humann_pathabundance_merged) from humann_pathabundance_merged
     path(alpha_diversity) from alpha_diversity
     path(beta_diversity) from beta_diversity
     path(pcoa_coords) from pcoa_coords
+    path(beta_dispersion) from beta_dispersion
     path(microbiome_summary) from microbiome_summary
+    path(dashboard_products) from dashboard_products
+    val total_processes from progress_init_ch.value() // For progress tracking
     
     output:
     path('*')
     
+    beforeScript:
+    progressEvent('upload_results', 'started', total_processes)
+    
+    afterScript:
+    progressEvent('upload_results', 'ended', total_processes)
+    
     script:
     """
     # Create output directories
@@ -902,15 +1305,17 @@ process upload_results {
     mkdir -p diversity
     mkdir -p summary
     
-    # Copy files to appropriate locations
-    cp ${kraken_summary} taxonomic/
-    cp ${metaphlan_merged} taxonomic/
-    cp ${humann_genefamilies_merged} functional/
-    cp ${humann_pathabundance_merged} functional/
-    cp ${alpha_diversity} diversity/
-    cp ${beta_diversity} diversity/
-    cp ${pcoa_coords} diversity/
-    cp ${microbiome_summary} summary/
+    # Link files into place; publishDir copies each one once, straight from the
+    # task that produced it (kraken_summary is published by kraken_reports)
+    ln -s \$(readlink -f ${metaphlan_merged}) taxonomic/
+    ln -s \$(readlink -f ${humann_genefamilies_merged}) functional/
+    ln -s \$(readlink -f ${humann_pathabundance_merged}) functional/
+    ln -s \$(readlink -f ${alpha_diversity}) diversity/
+    ln -s \$(readlink -f ${beta_diversity}) diversity/
+    ln -s \$(readlink -f ${pcoa_coords}) diversity/
+    ln -s \$(readlink -f ${beta_dispersion}) diversity/
+    ln -s \$(readlink -f ${microbiome_summary}) summary/
+    ln -s \$(readlink -f ${dashboard_products}) summary/
     
     # Generate a timestamp for completion
     date > completion_time.txt
@@ -920,35 +1325,28 @@ process upload_results {
     """
 }
 
-// Generate cost report
-process generate_cost_report {
-    publishDir "${params.output}/reports", mode: 'copy'
+// Append this run's species, pathway and diversity tables to the cross-run warehouse
+process ingest_results {
+    when:
+    params.report && params.warehouse
     
-    output:
-    path('cost_report.json')
+    input:
+    path(metaphlan_merged) from metaphlan_merged
+    path(humann_pathabundance_merged) from humann_pathabundance_merged
+    path(alpha_diversity) from alpha_diversity
+    path(pcoa_coords) from pcoa_coords
+    path('sample_list.csv') from file(params.samples)
+    path('results_warehouse.py') from file("${baseDir}/templates/results_warehouse.py")
     
     script:
     """
-    # Calculate approximate costs based on instance hours
-    cat << EOF > cost_report.json
-    {
-      "estimated_cost": {
-        "compute": {
-          "graviton_spot": $(echo "scale=2; \${NEXTFLOW_SPOT_HOURS:-0.5} * 0.0408" | bc),
-          "gpu_spot": $(echo "scale=2; \${NEXTFLOW_GPU_HOURS:-0.25} * 0.50" | bc)
-        },
-        "storage": 0.12,
-        "data_transfer": 0.02,
-        "total": $(echo "scale=2; \${NEXTFLOW_SPOT_HOURS:-0.5} * 0.0408 + \${NEXTFLOW_GPU_HOURS:-0.25} * 0.50 + 0.14" | bc)
-      },
-      "comparison": {
-        "on_premises": 1800.00,
-        "standard_cloud": 120.00,
-        "optimized_cloud": $(echo "scale=2; \${NEXTFLOW_SPOT_HOURS:-0.5} * 0.0408 + \${NEXTFLOW_GPU_HOURS:-0.25} * 0.50 + 0.14" | bc)
-      },
-      "time_saved": "336 hours (2 weeks)"
-    }
-    EOF
+    python3 results_warehouse.py --warehouse ${params.warehouse} ingest \
+        --run-id ${params.workflow_id} \
+        --samples sample_list.csv \
+        --species ${metaphlan_merged} \
+        --pathways ${humann_pathabundance_merged} \
+        --alpha ${alpha_diversity} \
+        --pcoa ${pcoa_coords}
     """
 }
 
@@ -966,6 +1364,28 @@ workflow.onComplete {
     =========================================
     """
     
+    // The trace now holds every task of the run: publish the measured execution metrics,
+    // the cost report charging each task, and the input bytes the per-sample tasks were sized with
+    try {
+        def inputsFile = new File(new File(params.trace_file).parentFile, 'task_inputs.tsv')
+        inputsFile.parentFile.mkdirs()
+        inputsFile.text = 'resource_key\ttag\tinput_bytes\n' + taskInputs.collect { key, bytes -> "${key}\t${bytes}\n" }.join('')
+        def publish = ['bash', "${baseDir}/templates/publish_run_metrics.sh", params.trace_file,
+                       "${params.run_start_ms}", params.output, inputsFile.path,
+                       params.samples, params.price_table].execute()
+        def pout = new StringBuilder()
+        def perr = new StringBuilder()
+        publish.consumeProcessOutput(pout, perr)
+        publish.waitForOrKill(300000)
+        if (publish.exitValue() == 0) {
+            log.info pout.toString().trim()
+        } else {
+            log.warn "Execution metrics not measured, the summary keeps its estimates: ${perr.toString().trim()}"
+        }
+    } catch (Exception e) {
+        log.warn "Failed to publish execution metrics: ${e.message}"
+    }
+    
     // Update progress tracking on workflow completion
     if (params.enable_progress_tracking) {
         def status = workflow.success ? "completed" : "failed"
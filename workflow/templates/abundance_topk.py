@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# abundance_topk.py - Streaming top-k features of a feature-by-sample abundance table
+#
+# The table is read in chunks of rows. For every row the sum and count of
+# the present values are taken over all samples and over each sample group
+# (body site), and only the k best means per group are kept in a min-heap,
+# so a single pass yields the overall and per-site rankings without sorting
+# the table.
+
+import argparse
+import heapq
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from table_stream import iter_rows, read_header, read_columns
+
+try:
+    import numpy as np
+except ImportError:  # Chunks are reduced in pure Python instead
+    np = None
+
+ALL_SAMPLES = 'all'
+DEFAULT_CHUNK_SIZE = 5000
+
+def match_sample_groups(columns, sample_groups):
+    """
+    Assign each sample column of a merged table to a group.
+
+    Merged tables name their columns after the per-sample files, e.g.
+    "S1.metaphlan" or "S1_Abundance", so a column matches the longest
+    sample ID it equals or starts with followed by "." or "_".
+
+    Args:
+        columns: Sample column names (without the feature column)
+        sample_groups: Mapping of sample ID to group (e.g. body site)
+
+    Returns:
+        List with the group of each column, None for unmatched columns
+    """
+    by_length = sorted(sample_groups, key=len, reverse=True)
+    groups = []
+    for column in columns:
+        group = sample_groups.get(column)
+        if group is None:
+            for sample_id in by_length:
+                if column.startswith(sample_id) and column[len(sample_id):len(sample_id) + 1] in ('.', '_'):
+                    group = sample_groups[sample_id]
+                    break
+        groups.append(group)
+    return groups
+
+class TopKAggregator:
+    """
+    Keep the k features with the highest mean abundance, overall and per group.
+
+    Means skip missing values (pandas skipna semantics) and are 0.0 for a
+    feature with no values in a group. Ties keep the feature seen first,
+    matching a stable descending sort.
+    """
+
+    def __init__(self, k, column_groups=None):
+        """
+        Args:
+            k: Number of features to keep per group
+            column_groups: Optional group label for each sample column;
+                None entries only count towards the overall ranking
+        """
+        self.k = k
+        self.features_seen = 0
+        self._groups = {ALL_SAMPLES: None}
+        if column_groups is not None:
+            for group in sorted(set(g for g in column_groups if g is not None)):
+                self._groups[group] = [i for i, g in enumerate(column_groups) if g == group]
+        self._heaps = {group: [] for group in self._groups}
+
+    def _offer(self, group, mean, index, feature):
+        heap = self._heaps[group]
+        # (mean, -index) is unique per row, so features are never compared
+        item = (mean, -index, feature)
+        if len(heap) < self.k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def _chunk_means_numpy(self, values):
+        matrix = np.array([[np.nan if v is None else v for v in row] for row in values], dtype=np.float64)
+        present = ~np.isnan(matrix)
+        filled = np.where(present, matrix, 0.0)
+        means = {}
+        for group, columns in self._groups.items():
+            if columns is None:
+                sums, counts = filled.sum(axis=1), present.sum(axis=1)
+            else:
+                sums, counts = filled[:, columns].sum(axis=1), present[:, columns].sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means[group] = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+        return means
+
+    def _chunk_means_python(self, values):
+        means = {}
+        for group, columns in self._groups.items():
+            group_means = []
+            for row in values:
+                present = [v for v in (row if columns is None else [row[i] for i in columns]) if v is not None]
+                group_means.append(sum(present) / len(present) if present else 0.0)
+            means[group] = group_means
+        return means
+
+    def update(self, features, values):
+        """
+        Add a chunk of rows.
+
+        Args:
+            features: Feature names of the chunk
+            values: Per-row lists of sample values (None for missing)
+        """
+        if not features:
+            return
+        start = self.features_seen
+        self.features_seen += len(features)
+
+        if np is None:
+            for group, means in self._chunk_means_python(values).items():
+                for offset, mean in enumerate(means):
+                    self._offer(group, mean, start + offset, features[offset])
+            return
+
+        for group, means in self._chunk_means_numpy(values).items():
+            # Only rows at or above the chunk's k-th largest mean can enter the heap;
+            # rows tied with it are all kept so earlier rows still win ties
+            if len(means) > self.k:
+                threshold = means[np.argpartition(means, len(means) - self.k)[len(means) - self.k]]
+                candidates = np.flatnonzero(means >= threshold)
+            else:
+                candidates = range(len(means))
+            for offset in candidates:
+                self._offer(group, float(means[offset]), start + int(offset), features[offset])
+
+    def top(self, group=ALL_SAMPLES):
+        """List of (feature, mean) pairs for a group, highest mean first"""
+        return [(feature, mean) for mean, _, feature in sorted(self._heaps[group], reverse=True)]
+
+    def top_by_group(self):
+        """Dictionary of group -> top list, excluding the overall ranking"""
+        return {group: self.top(group) for group in self._groups if group != ALL_SAMPLES}
+
+def top_k_table(path, k, skip_lines=0, sep='\t', row_filter=None, sample_groups=None,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream a feature-by-sample table and rank its features by mean abundance.
+
+    Args:
+        path: Table file
+        k: Number of features to keep per group
+        skip_lines: Lines before the header
+        sep: Field separator
+        row_filter: Optional predicate on the feature name
+        sample_groups: Optional mapping of sample ID to group for per-group rankings
+        chunk_size: Rows reduced at a time
+
+    Returns:
+        TopKAggregator holding the rankings and the number of features read
+    """
+    column_groups = None
+    if sample_groups:
+        column_groups = match_sample_groups(read_header(path, skip_lines, sep)[1:], sample_groups)
+    aggregator = TopKAggregator(k, column_groups)
+
+    features, values = [], []
+    for feature, row in iter_rows(path, skip_lines, sep, row_filter):
+        features.append(feature)
+        values.append(row)
+        if len(features) >= chunk_size:
+            aggregator.update(features, values)
+            features, values = [], []
+    aggregator.update(features, values)
+    return aggregator
+
+def load_sample_groups(path, column='body_site', sep='\t'):
+    """Load a sample ID -> group mapping from a per-sample table (index column first)"""
+    index, data = read_columns(path, [column], sep)
+    return dict(zip(index, data[column]))
+
+def main():
+    parser = argparse.ArgumentParser(description='Top-k features of an abundance table by mean abundance')
+    parser.add_argument('table', help='Feature-by-sample table')
+    parser.add_argument('-k', type=int, default=20, help='Features to keep (default: 20)')
+    parser.add_argument('--skip-lines', type=int, default=0, help='Lines before the header (default: 0)')
+    parser.add_argument('--contains', help='Only rank features whose name contains this text (e.g. s__)')
+    parser.add_argument('--groups', help='Per-sample TSV with a body_site column for per-site rankings')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                      help=f'Rows reduced at a time (default: {DEFAULT_CHUNK_SIZE})')
+
+    args = parser.parse_args()
+
+    row_filter = (lambda name: args.contains in name) if args.contains else None
+    sample_groups = load_sample_groups(args.groups) if args.groups else None
+    aggregator = top_k_table(args.table, args.k, args.skip_lines, row_filter=row_filter,
+                             sample_groups=sample_groups, chunk_size=args.chunk_size)
+
+    json.dump({
+        'features': aggregator.features_seen,
+        'top': aggregator.top(),
+        'by_group': aggregator.top_by_group()
+    }, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
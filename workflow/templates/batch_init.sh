@@ -10,21 +10,28 @@ echo "======================================================" >> /var/log/batch-
 echo "Initialization started at $(date)" >> /var/log/batch-init.log
 echo "Instance type: $(curl -s http://169.254.169.254/latest/meta-data/instance-type)" >> /var/log/batch-init.log
 
-# Update system packages
+# Update system packages; the Batch AMIs are Amazon Linux, other images use apt.
+# Optional setup steps log their failures instead of stopping the script, so
+# the progress agent and the utilization sampler below always start
 echo "Updating system packages..."
-apt-get update -y >> /var/log/batch-init.log 2>&1
-apt-get install -y \
-  bc \
-  curl \
-  wget \
-  pigz \
-  awscli \
-  zip \
-  unzip \
-  python3-pip \
-  samtools \
-  bcftools \
-  tabix >> /var/log/batch-init.log 2>&1
+if command -v apt-get > /dev/null; then
+  apt-get update -y >> /var/log/batch-init.log 2>&1
+  apt-get install -y \
+    bc \
+    curl \
+    wget \
+    pigz \
+    awscli \
+    zip \
+    unzip \
+    python3-pip \
+    samtools \
+    bcftools \
+    tabix >> /var/log/batch-init.log 2>&1 || echo "Package install failed" >> /var/log/batch-init.log
+else
+  yum install -y bc wget pigz zip unzip python3-pip >> /var/log/batch-init.log 2>&1 || \
+    echo "Package install failed" >> /var/log/batch-init.log
+fi
 
 # Create working directories
 echo "Creating working directories..."
@@ -34,15 +41,16 @@ mkdir -p /tmp/results
 
 # Install Python dependencies
 echo "Installing Python dependencies..."
-pip3 install boto3 pandas numpy matplotlib >> /var/log/batch-init.log 2>&1
+pip3 install boto3 pandas numpy matplotlib >> /var/log/batch-init.log 2>&1 || \
+  echo "pip install failed" >> /var/log/batch-init.log
 
 # Set up AWS region
 export AWS_DEFAULT_REGION="${AWS_BATCH_JOB_AWS_REGION:-us-east-1}"
 
 # Pull container images in advance for faster job startup
 echo "Pre-pulling Docker images..."
-docker pull public.ecr.aws/lts/genomics-tools:latest >> /var/log/batch-init.log 2>&1
-docker pull public.ecr.aws/lts/nextflow:latest >> /var/log/batch-init.log 2>&1
+docker pull public.ecr.aws/lts/genomics-tools:latest >> /var/log/batch-init.log 2>&1 || true
+docker pull public.ecr.aws/lts/nextflow:latest >> /var/log/batch-init.log 2>&1 || true
 
 # Download reference files if this is a Graviton instance (ARM-based)
 if grep -q "aarch64" /proc/cpuinfo; then
@@ -50,7 +58,7 @@ if grep -q "aarch64" /proc/cpuinfo; then
   
   # Download reference genome index for chromosome 20
   echo "Downloading reference genome index..."
-  aws s3 cp ${REFERENCE_BUCKET:-s3://omics-demo-bucket}/input/demo_reference.fai /tmp/references/ >> /var/log/batch-init.log 2>&1
+  aws s3 cp ${REFERENCE_BUCKET:-s3://omics-demo-bucket}/input/demo_reference.fai /tmp/references/ >> /var/log/batch-init.log 2>&1 || true
   
   # Set ARM-specific optimizations
   export MALLOC_ARENA_MAX=4
@@ -60,11 +68,40 @@ fi
 export NXF_OPTS="-Xms512m -Xmx2g"
 export NXF_ANSI_LOG=false
 
+# Start the utilization sampler; it keeps ring buffers of node CPU/memory/GPU
+# usage and publishes one document per window to monitoring/utilization/
+echo "Starting utilization sampler..."
+SAMPLER_BUCKET="${REFERENCE_BUCKET:-s3://omics-demo-bucket}"
+SAMPLER_BUCKET="${SAMPLER_BUCKET#s3://}"
+INSTANCE_ID=$(curl -s http://169.254.169.254/latest/meta-data/instance-id)
+if aws s3 cp "s3://${SAMPLER_BUCKET}/workflow/templates/resource_sampler.py" /opt/resource_sampler.py >> /var/log/batch-init.log 2>&1; then
+  nohup python3 /opt/resource_sampler.py --bucket "${SAMPLER_BUCKET}" --node-id "${INSTANCE_ID:-$(hostname)}" \
+    >> /var/log/resource-sampler.log 2>&1 &
+else
+  echo "Utilization sampler not available; skipping" >> /var/log/batch-init.log
+fi
+
+# Start the progress agent; tasks hand their start/end events to it through
+# /tmp/progress-agent (mounted into the task containers) and it publishes
+# them in batches instead of each task running the aws CLI
+echo "Starting progress agent..."
+mkdir -p /opt/progress_agent
+AGENT_READY=true
+for template in progress_agent.py progress_event.sh progress_eta.py trace_metrics.py; do
+  aws s3 cp "s3://${SAMPLER_BUCKET}/workflow/templates/${template}" /opt/progress_agent/ >> /var/log/batch-init.log 2>&1 || AGENT_READY=false
+done
+if [ "$AGENT_READY" = true ]; then
+  nohup python3 /opt/progress_agent/progress_agent.py run --spool /tmp/progress-agent \
+    >> /var/log/progress-agent.log 2>&1 &
+else
+  echo "Progress agent not available; tasks will run progress_tracker.sh" >> /var/log/batch-init.log
+fi
+
 # Report success
 echo "Instance initialization completed successfully at $(date)" >> /var/log/batch-init.log
 echo "Batch instance ready for Omics Demo workloads"
 
-# This script is used as a template and will be customized by CloudFormation
-# The following placeholders will be replaced at deployment time:
+# The launch template in the CloudFormation stacks fetches this script from
+# s3://<bucket>/workflow/templates/ and runs it from the instance user data with:
 # - ${REFERENCE_BUCKET} - S3 bucket containing reference data
 # - ${AWS_BATCH_JOB_AWS_REGION} - AWS region for the Batch job
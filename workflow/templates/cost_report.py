@@ -5,60 +5,92 @@
 # cost_report.py - Generate cost comparisons for the Microbiome Demo
 
 import argparse
+import copy
+import csv
 import json
 import datetime
 import os
 import sys
 
-def calculate_costs(cpu_hours, gpu_hours, data_gb, duration_minutes):
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from trace_metrics import parse_duration, process_name, run_rows
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for batch scenario sweeps
+    np = None
+
+# Cost rates (USD)
+DEFAULT_RATES = {
+    'on_premises': {
+        'cpu_hour': 1.20,        # Cost per CPU hour on-prem
+        'gpu_hour': 5.00,        # Cost per GPU hour on-prem
+        'storage_gb_month': 0.20, # Cost per GB-month of storage on-prem
+        'setup_time_hours': 336.0 # Two weeks of setup time
+    },
+    'standard_cloud': {
+        'cpu_hour': 0.40,        # Regular EC2 instances
+        'gpu_hour': 1.50,        # Regular GPU instances
+        'storage_gb_month': 0.10  # Regular S3 storage
+    },
+    'optimized_aws': {
+        'graviton_spot_hour': 0.0408,  # c7g.2xlarge Spot
+        'gpu_spot_hour': 0.50,         # g5g.2xlarge Spot
+        'storage_gb_month': 0.02,      # S3 storage
+        'data_transfer_gb': 0.01       # Data transfer
+    }
+}
+
+STORAGE_MONTHS = 0.25  # Assume 1 week storage = 0.25 months
+
+# Flattened result columns for batch mode: (column, path in calculate_costs output, decimals)
+BATCH_COLUMNS = [
+    ('compute_graviton_spot', ('estimated_cost', 'compute', 'graviton_spot'), 2),
+    ('compute_gpu_spot', ('estimated_cost', 'compute', 'gpu_spot'), 2),
+    ('storage', ('estimated_cost', 'storage'), 2),
+    ('data_transfer', ('estimated_cost', 'data_transfer'), 2),
+    ('total', ('estimated_cost', 'total'), 2),
+    ('on_premises', ('comparison', 'on_premises'), 2),
+    ('standard_cloud', ('comparison', 'standard_cloud'), 2),
+    ('optimized_cloud', ('comparison', 'optimized_cloud'), 2),
+    ('savings_versus_on_premises', ('savings', 'versus_on_premises'), 2),
+    ('savings_percentage', ('savings', 'percentage'), 1)
+]
+SCENARIO_COLUMNS = ['cpu_hours', 'gpu_hours', 'data_gb', 'duration_minutes']
+
+def cost_components(cpu_hours, gpu_hours, data_gb, rates=DEFAULT_RATES):
     """
-    Calculate costs for the microbiome analysis workload.
+    Unrounded cost components shared by the scalar and batch calculations.
+    
+    Works on Python floats and on NumPy arrays (rates may also be arrays,
+    which broadcast against the scenarios), so both paths perform exactly
+    the same floating point operations.
     
-    Args:
-        cpu_hours: Total CPU instance hours
-        gpu_hours: Total GPU instance hours
-        data_gb: Amount of data processed in GB
-        duration_minutes: Wall-clock duration in minutes
-        
     Returns:
-        Dictionary with cost calculations
+        Dictionary keyed by BATCH_COLUMNS column names
     """
-    # Cost rates (USD)
-    rates = {
-        'on_premises': {
-            'cpu_hour': 1.20,        # Cost per CPU hour on-prem
-            'gpu_hour': 5.00,        # Cost per GPU hour on-prem
-            'storage_gb_month': 0.20, # Cost per GB-month of storage on-prem
-            'setup_time_hours': 336.0 # Two weeks of setup time
-        },
-        'standard_cloud': {
-            'cpu_hour': 0.40,        # Regular EC2 instances
-            'gpu_hour': 1.50,        # Regular GPU instances
-            'storage_gb_month': 0.10  # Regular S3 storage
-        },
-        'optimized_aws': {
-            'graviton_spot_hour': 0.0408,  # c7g.2xlarge Spot
-            'gpu_spot_hour': 0.50,         # g5g.2xlarge Spot
-            'storage_gb_month': 0.02,      # S3 storage
-            'data_transfer_gb': 0.01       # Data transfer
-        }
-    }
+    on_prem = rates['on_premises']
+    standard = rates['standard_cloud']
+    optimized = rates['optimized_aws']
     
     # Calculate on-premises cost
-    on_prem_compute = (cpu_hours * rates['on_premises']['cpu_hour']) + (gpu_hours * rates['on_premises']['gpu_hour'])
-    on_prem_setup = rates['on_premises']['setup_time_hours'] * rates['on_premises']['cpu_hour']
-    on_prem_storage = data_gb * rates['on_premises']['storage_gb_month'] * 0.25  # Assume 1 week storage = 0.25 months
+    on_prem_compute = (cpu_hours * on_prem['cpu_hour']) + (gpu_hours * on_prem['gpu_hour'])
+    on_prem_setup = on_prem['setup_time_hours'] * on_prem['cpu_hour']
+    on_prem_storage = data_gb * on_prem['storage_gb_month'] * STORAGE_MONTHS
     on_prem_total = on_prem_compute + on_prem_setup + on_prem_storage
     
     # Calculate standard cloud cost
-    standard_compute = (cpu_hours * rates['standard_cloud']['cpu_hour']) + (gpu_hours * rates['standard_cloud']['gpu_hour'])
-    standard_storage = data_gb * rates['standard_cloud']['storage_gb_month'] * 0.25  # Assume 1 week storage
+    standard_compute = (cpu_hours * standard['cpu_hour']) + (gpu_hours * standard['gpu_hour'])
+    standard_storage = data_gb * standard['storage_gb_month'] * STORAGE_MONTHS
     standard_total = standard_compute + standard_storage
     
     # Calculate optimized AWS cost
-    optimized_compute = (cpu_hours * rates['optimized_aws']['graviton_spot_hour']) + (gpu_hours * rates['optimized_aws']['gpu_spot_hour'])
-    optimized_storage = data_gb * rates['optimized_aws']['storage_gb_month'] * 0.25  # Assume 1 week storage
-    optimized_transfer = data_gb * rates['optimized_aws']['data_transfer_gb']
+    graviton_spot = cpu_hours * optimized['graviton_spot_hour']
+    gpu_spot = gpu_hours * optimized['gpu_spot_hour']
+    optimized_compute = graviton_spot + gpu_spot
+    optimized_storage = data_gb * optimized['storage_gb_month'] * STORAGE_MONTHS
+    optimized_transfer = data_gb * optimized['data_transfer_gb']
     optimized_total = optimized_compute + optimized_storage + optimized_transfer
     
     # Calculate savings
@@ -66,27 +98,55 @@ def calculate_costs(cpu_hours, gpu_hours, data_gb, duration_minutes):
     savings_percent = (savings_vs_on_prem / on_prem_total) * 100
     
     return {
-        "estimated_cost": {
-            "compute": {
-                "graviton_spot": round(cpu_hours * rates['optimized_aws']['graviton_spot_hour'], 2),
-                "gpu_spot": round(gpu_hours * rates['optimized_aws']['gpu_spot_hour'], 2)
-            },
-            "storage": round(optimized_storage, 2),
-            "data_transfer": round(optimized_transfer, 2),
-            "total": round(optimized_total, 2)
-        },
-        "comparison": {
-            "on_premises": round(on_prem_total, 2),
-            "standard_cloud": round(standard_total, 2),
-            "optimized_cloud": round(optimized_total, 2)
-        },
-        "savings": {
-            "versus_on_premises": round(savings_vs_on_prem, 2),
-            "percentage": round(savings_percent, 1),
-            "time_saved": "336 hours (2 weeks)"
-        }
+        'compute_graviton_spot': graviton_spot,
+        'compute_gpu_spot': gpu_spot,
+        'storage': optimized_storage,
+        'data_transfer': optimized_transfer,
+        'total': optimized_total,
+        'on_premises': on_prem_total,
+        'standard_cloud': standard_total,
+        'optimized_cloud': optimized_total,
+        'savings_versus_on_premises': savings_vs_on_prem,
+        'savings_percentage': savings_percent
     }
 
+def calculate_costs(cpu_hours, gpu_hours, data_gb, duration_minutes, rates=None):
+    """
+    Calculate costs for the microbiome analysis workload.
+    
+    Args:
+        cpu_hours: Total CPU instance hours
+        gpu_hours: Total GPU instance hours
+        data_gb: Amount of data processed in GB
+        duration_minutes: Wall-clock duration in minutes
+        rates: Rate table (default: DEFAULT_RATES)
+        
+    Returns:
+        Dictionary with cost calculations
+    """
+    components = cost_components(cpu_hours, gpu_hours, data_gb, rates or DEFAULT_RATES)
+    
+    result = {
+        "estimated_cost": {"compute": {}},
+        "comparison": {},
+        "savings": {}
+    }
+    for column, path, decimals in BATCH_COLUMNS:
+        section = result
+        for key in path[:-1]:
+            section = section[key]
+        section[path[-1]] = round(components[column], decimals)
+    result["savings"]["time_saved"] = "336 hours (2 weeks)"
+    
+    return result
+
+NEXTFLOW_METRIC_VARIABLES = [
+    'NEXTFLOW_CPU_HOURS',
+    'NEXTFLOW_GPU_HOURS',
+    'NEXTFLOW_DATA_SIZE_GB',
+    'NEXTFLOW_DURATION_MINUTES'
+]
+
 def get_nextflow_metrics():
     """Extract metrics from Nextflow environment variables if available"""
     return {
@@ -96,6 +156,351 @@ def get_nextflow_metrics():
         'duration_minutes': float(os.environ.get('NEXTFLOW_DURATION_MINUTES', '15'))
     }
 
+def load_execution_metrics(path):
+    """
+    Load metrics produced by trace_metrics.py (or create_summary)
+    
+    Args:
+        path: Path to an execution_metrics.json file
+        
+    Returns:
+        Dictionary with the arguments expected by calculate_costs
+    """
+    with open(path, 'r') as f:
+        execution_metrics = json.load(f)
+    
+    return {
+        'cpu_hours': float(execution_metrics.get('cpu_hours', 0)),
+        'gpu_hours': float(execution_metrics.get('gpu_hours', 0)),
+        'data_gb': float(execution_metrics.get('data_processed_gb', 0)),
+        'duration_minutes': float(execution_metrics.get('wall_clock_minutes', 0))
+    }
+
+def load_price_table(path):
+    """
+    Load per-instance hourly prices for trace cost attribution
+    
+    The table has "instances" (instance type -> vcpus, spot and on_demand
+    hourly prices), optional "queues" (queue -> instance_type and
+    price_model) and a "default" placement for tasks with neither.
+    """
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def load_sample_sites(path):
+    """Load a sample_id -> body_site mapping from the pipeline sample sheet"""
+    with open(path, 'r', newline='') as f:
+        return {row['sample_id']: row['body_site'] for row in csv.DictReader(f)}
+
+def task_placement(row, price_table):
+    """Resolve the instance type and price model a trace row ran on"""
+    placement = dict(price_table.get('default', {}))
+    placement.update(price_table.get('queues', {}).get((row.get('queue') or '').strip(), {}))
+    for field in ('machine_type', 'instance_type'):
+        value = (row.get(field) or '').strip()
+        if value and value != '-':
+            placement['instance_type'] = value
+    price_model = (row.get('price_model') or '').strip().lower()
+    if price_model in ('spot', 'on_demand', 'standard'):
+        placement['price_model'] = 'on_demand' if price_model == 'standard' else price_model
+    return placement.get('instance_type'), placement.get('price_model', 'spot')
+
+def attribute_costs(rows, price_table, sample_sites=None):
+    """
+    Attribute compute cost to processes, samples and body sites in one pass
+    
+    Each task is charged its share of the instance it ran on:
+    realtime hours x hourly price x (task cpus / instance vcpus).
+    Cached tasks cost nothing in this run and are skipped. Tasks that are
+    not tied to a sample (merges, reports; an empty or "-" tag) are charged
+    to "shared".
+    
+    Args:
+        rows: Iterable of Nextflow trace rows (dictionaries of strings)
+        price_table: Table from load_price_table()
+        sample_sites: Optional sample_id -> body_site mapping
+        
+    Returns:
+        Dictionary with cost totals per process, sample, body site and instance type
+    """
+    instances = price_table.get('instances', {})
+    sample_sites = sample_sites or {}
+    by_process = {}
+    by_sample = {}
+    by_body_site = {}
+    by_instance_type = {}
+    total = 0.0
+    tasks = 0
+    unpriced = 0
+    # Hourly price per CPU keyed by the placement fields, resolved once per combination
+    placements = {}
+    
+    for row in rows:
+        if (row.get('status') or '').strip() == 'CACHED':
+            continue
+        tasks += 1
+        
+        placement_key = (row.get('queue'), row.get('machine_type'), row.get('instance_type'), row.get('price_model'))
+        if placement_key not in placements:
+            instance_type, price_model = task_placement(row, price_table)
+            instance = instances.get(instance_type)
+            if instance and price_model in instance:
+                placements[placement_key] = (f"{instance_type}:{price_model}", instance[price_model], instance.get('vcpus'))
+            else:
+                placements[placement_key] = None
+        placement = placements[placement_key]
+        if placement is None:
+            unpriced += 1
+            continue
+        key, hourly_price, vcpus = placement
+        
+        try:
+            cpus = int(row.get('cpus') or 1)
+        except ValueError:
+            cpus = 1
+        share = min(1.0, cpus / float(vcpus or cpus))
+        cost = parse_duration(row.get('realtime')) / 3600.0 * hourly_price * share
+        
+        sample = (row.get('tag') or '').strip()
+        if sample in ('', '-'):
+            sample = 'shared'
+        site = sample_sites.get(sample, 'shared')
+        process = process_name(row)
+        by_process[process] = by_process.get(process, 0.0) + cost
+        by_sample[sample] = by_sample.get(sample, 0.0) + cost
+        by_body_site[site] = by_body_site.get(site, 0.0) + cost
+        by_instance_type[key] = by_instance_type.get(key, 0.0) + cost
+        total += cost
+    
+    def ranked(costs):
+        return {name: round(cost, 4) for name, cost in sorted(costs.items(), key=lambda item: item[1], reverse=True)}
+    
+    return {
+        'total': round(total, 4),
+        'tasks': tasks,
+        'unpriced_tasks': unpriced,
+        'by_process': ranked(by_process),
+        'by_sample': ranked(by_sample),
+        'by_body_site': ranked(by_body_site),
+        'by_instance_type': ranked(by_instance_type)
+    }
+
+def attribute_trace_costs(trace_path, price_table, sample_sites=None, since=None):
+    """
+    Stream a Nextflow trace file through attribute_costs()
+
+    With since (epoch ms), only tasks submitted at or after it are charged,
+    as in trace_metrics.run_rows().
+    """
+    with open(trace_path, 'r', newline='') as f:
+        return attribute_costs(run_rows(csv.DictReader(f, delimiter='\t'), since), price_table, sample_sites)
+
+def merge_rates(overrides):
+    """Complete a partial rate table with DEFAULT_RATES"""
+    rates = copy.deepcopy(DEFAULT_RATES)
+    for tier, values in overrides.items():
+        if tier not in rates:
+            raise ValueError(f"Unknown rate tier: {tier}")
+        rates[tier].update(values)
+    return rates
+
+def load_rate_catalog(path):
+    """
+    Load a rate catalog from JSON
+    
+    The file holds either a single rate table shaped like DEFAULT_RATES or a
+    mapping of price point name to rate table. Missing rates fall back to
+    DEFAULT_RATES.
+    
+    Args:
+        path: Path to the catalog JSON file
+        
+    Returns:
+        Dictionary mapping price point name to a complete rate table
+    """
+    with open(path, 'r') as f:
+        catalog = json.load(f)
+    
+    if any(tier in catalog for tier in DEFAULT_RATES):
+        catalog = {'default': catalog}
+    return {name: merge_rates(table) for name, table in catalog.items()}
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Batch cost calculation requires numpy")
+
+def _two_product_error(a, b, product):
+    """Rounding error of product = a * b, so that a * b == product + error exactly (Dekker)"""
+    split = 134217729.0  # 2**27 + 1
+    a_big = split * a
+    a_hi = a_big - (a_big - a)
+    a_lo = a - a_hi
+    b_big = split * b
+    b_hi = b_big - (b_big - b)
+    b_lo = b - b_hi
+    return ((a_hi * b_hi - product) + a_hi * b_lo + a_lo * b_hi) + a_lo * b_lo
+
+def round_half_even(values, decimals):
+    """
+    Vectorized equivalent of Python's round(value, decimals) for floats
+    
+    np.round scales by 10**decimals before rounding, which can push values
+    that sit next to a .5 boundary across it. Here the scaled value is kept
+    exactly as hi + lo, so ties and near-ties resolve the same way as the
+    built-in round() used by calculate_costs.
+    """
+    _require_numpy()
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** decimals
+    
+    with np.errstate(invalid='ignore', over='ignore'):
+        hi = values * scale
+        lo = _two_product_error(values, scale, hi)
+        base = np.floor(hi)
+        offset = (hi - base) - 0.5  # Exact whenever it is close to zero
+        round_up = (offset > -lo) | ((offset == -lo) & (np.mod(base, 2) != 0))
+        rounded = (base + round_up) / scale
+    
+    # round() keeps the sign of zero results and passes inf/nan through
+    rounded = np.where(rounded == 0, np.copysign(0.0, values), rounded)
+    return np.where(np.isfinite(values), rounded, values)
+
+def _scenario_arrays(scenarios):
+    """Convert a mapping, DataFrame or (N, 3|4) array of scenarios to float arrays"""
+    if hasattr(scenarios, 'columns') or isinstance(scenarios, dict):
+        length = len(scenarios[SCENARIO_COLUMNS[0]])
+        return {
+            column: (np.asarray(scenarios[column], dtype=np.float64) if column in scenarios
+                     else np.zeros(length))
+            for column in SCENARIO_COLUMNS
+        }
+    
+    matrix = np.atleast_2d(np.asarray(scenarios, dtype=np.float64))
+    if matrix.shape[1] not in (3, 4):
+        raise ValueError("Scenario arrays need cpu_hours, gpu_hours, data_gb[, duration_minutes] columns")
+    arrays = {column: matrix[:, i] for i, column in enumerate(SCENARIO_COLUMNS[:matrix.shape[1]])}
+    arrays.setdefault('duration_minutes', np.zeros(matrix.shape[0]))
+    return arrays
+
+def calculate_costs_batch(scenarios, catalog=None):
+    """
+    Evaluate many scenarios against one or more price points at once
+    
+    Every row matches calculate_costs() for the same inputs and rates.
+    
+    Args:
+        scenarios: Mapping or DataFrame with cpu_hours, gpu_hours, data_gb and
+            optional duration_minutes columns, or an (N, 3|4) array in that order
+        catalog: Mapping of price point name to rate table
+            (default: {'default': DEFAULT_RATES})
+        
+    Returns:
+        Dictionary of equal-length NumPy arrays with scenario, rate_name, the
+        scenario inputs and one column per BATCH_COLUMNS entry. Rows are
+        grouped by price point, then ordered by scenario.
+    """
+    _require_numpy()
+    catalog = catalog or {'default': DEFAULT_RATES}
+    names = list(catalog)
+    inputs = _scenario_arrays(scenarios)
+    count = len(inputs['cpu_hours'])
+    
+    # Rates become (price points, 1) columns that broadcast against (1, scenarios)
+    rates = {
+        tier: {
+            key: np.array([catalog[name][tier][key] for name in names], dtype=np.float64)[:, None]
+            for key in DEFAULT_RATES[tier]
+        }
+        for tier in DEFAULT_RATES
+    }
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        components = cost_components(
+            inputs['cpu_hours'][None, :],
+            inputs['gpu_hours'][None, :],
+            inputs['data_gb'][None, :],
+            rates
+        )
+    
+    shape = (len(names), count)
+    results = {
+        'scenario': np.tile(np.arange(count), len(names)),
+        'rate_name': np.repeat(np.array(names, dtype=object), count)
+    }
+    for column in SCENARIO_COLUMNS:
+        results[column] = np.tile(inputs[column], len(names))
+    for column, _, decimals in BATCH_COLUMNS:
+        results[column] = round_half_even(np.broadcast_to(components[column], shape).ravel(), decimals)
+    return results
+
+def read_scenarios(path, chunk_size=100000):
+    """Yield scenario CSV rows in column-oriented chunks of at most chunk_size rows"""
+    with open(path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        chunk = {column: [] for column in SCENARIO_COLUMNS}
+        for row in reader:
+            for column in SCENARIO_COLUMNS:
+                chunk[column].append(float(row.get(column) or 0))
+            if len(chunk['cpu_hours']) >= chunk_size:
+                yield chunk
+                chunk = {column: [] for column in SCENARIO_COLUMNS}
+        if chunk['cpu_hours']:
+            yield chunk
+
+def write_batch_results(chunks, output):
+    """
+    Stream batch results to CSV, or to Parquet when output ends in .parquet
+    
+    Args:
+        chunks: Iterable of calculate_costs_batch results
+        output: Output file path
+        
+    Returns:
+        Number of rows written
+    """
+    columns = ['scenario', 'rate_name'] + SCENARIO_COLUMNS + [column for column, _, _ in BATCH_COLUMNS]
+    rows = 0
+    
+    if output.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.table({column: chunk[column].tolist() if column == 'rate_name' else chunk[column]
+                                  for column in columns})
+                if writer is None:
+                    writer = pq.ParquetWriter(output, table.schema)
+                writer.write_table(table)
+                rows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+    
+    with open(output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(zip(*(chunk[column].tolist() for column in columns)))
+            rows += len(chunk['scenario'])
+    return rows
+
+def run_batch(scenarios_path, output, catalog=None, chunk_size=100000):
+    """Evaluate a scenario CSV chunk by chunk and stream the results to output"""
+    offset = 0
+    
+    def evaluated_chunks():
+        nonlocal offset
+        for chunk in read_scenarios(scenarios_path, chunk_size):
+            results = calculate_costs_batch(chunk, catalog)
+            results['scenario'] = results['scenario'] + offset
+            offset += len(chunk['cpu_hours'])
+            yield results
+    
+    return write_batch_results(evaluated_chunks(), output)
+
 def main():
     parser = argparse.ArgumentParser(description='Generate cost report for Microbiome Demo')
     parser.add_argument('--cpu-hours', type=float, default=50.0,
@@ -108,13 +513,45 @@ def main():
                       help='Wall-clock duration in minutes (default: 15)')
     parser.add_argument('--output', default='cost_report.json',
                       help='Output JSON file (default: cost_report.json)')
+    parser.add_argument('--execution-metrics',
+                      help='execution_metrics.json from trace_metrics.py; takes precedence over other inputs')
+    parser.add_argument('--rates',
+                      help='Rate catalog JSON (one rate table or a mapping of price point name to rate table)')
+    parser.add_argument('--scenarios',
+                      help='CSV of cpu_hours,gpu_hours,data_gb[,duration_minutes] scenarios to evaluate in batch')
+    parser.add_argument('--batch-output', default='cost_scenarios.csv',
+                      help='Batch results file, .csv or .parquet (default: cost_scenarios.csv)')
+    parser.add_argument('--chunk-size', type=int, default=100000,
+                      help='Scenarios evaluated per batch chunk (default: 100000)')
+    parser.add_argument('--trace',
+                      help='Nextflow trace file for per-task cost attribution')
+    parser.add_argument('--price-table',
+                      default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'price_table.json'),
+                      help='Instance price table for --trace (default: price_table.json next to this script)')
+    parser.add_argument('--samples',
+                      help='Sample sheet CSV (sample_id,body_site,...) for per-body-site attribution')
+    parser.add_argument('--since', type=int,
+                      help='Only attribute --trace tasks submitted at or after this time (epoch ms, e.g. the run start)')
     
     args = parser.parse_args()
     
-    # Try to get metrics from Nextflow, otherwise use command line args
+    catalog = load_rate_catalog(args.rates) if args.rates else None
+    
+    # Batch mode: evaluate every scenario against every price point
+    if args.scenarios:
+        rows = run_batch(args.scenarios, args.batch_output, catalog, args.chunk_size)
+        print(f"Evaluated {rows} scenario/price point combinations into: {args.batch_output}")
+        return
+    
+    # Prefer measured metrics, then Nextflow environment, otherwise command line args
     try:
-        metrics = get_nextflow_metrics()
-    except:
+        if args.execution_metrics:
+            metrics = load_execution_metrics(args.execution_metrics)
+        elif any(key in os.environ for key in NEXTFLOW_METRIC_VARIABLES):
+            metrics = get_nextflow_metrics()
+        else:
+            raise LookupError("No Nextflow metrics in the environment")
+    except Exception:
         metrics = {
             'cpu_hours': args.cpu_hours,
             'gpu_hours': args.gpu_hours,
@@ -123,11 +560,15 @@ def main():
         }
     
     # Calculate costs
+    rates = None
+    if catalog:
+        rates = catalog.get('default', next(iter(catalog.values())))
     cost_data = calculate_costs(
         metrics['cpu_hours'],
         metrics['gpu_hours'],
         metrics['data_gb'],
-        metrics['duration_minutes']
+        metrics['duration_minutes'],
+        rates
     )
     
     # Add metadata
@@ -139,6 +580,16 @@ def main():
         'duration_minutes': metrics['duration_minutes']
     }
     
+    # Attribute compute cost to individual tasks when a trace is available
+    if args.trace:
+        sample_sites = load_sample_sites(args.samples) if args.samples else None
+        attribution = attribute_trace_costs(args.trace, load_price_table(args.price_table), sample_sites, args.since)
+        if args.since is not None and attribution['tasks'] == 0:
+            # A trace left by an earlier run says nothing about this one
+            print(f"No tasks of this run in {args.trace}; leaving out per-task attribution")
+        else:
+            cost_data['attribution'] = attribution
+    
     # Write to file
     with open(args.output, 'w') as f:
         json.dump(cost_data, f, indent=2)
@@ -146,6 +597,11 @@ def main():
     print(f"Cost report generated at: {args.output}")
     print(f"Total cost: ${cost_data['estimated_cost']['total']}")
     print(f"Savings vs. on-premises: {cost_data['savings']['percentage']}% (${cost_data['savings']['versus_on_premises']})")
+    if 'attribution' in cost_data:
+        attribution = cost_data['attribution']
+        print(f"Attributed compute cost: ${attribution['total']} over {attribution['tasks']} tasks")
+        for process, cost in list(attribution['by_process'].items())[:5]:
+            print(f"  {process}: ${cost}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
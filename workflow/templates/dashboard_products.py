@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# dashboard_products.py - Split the microbiome summary into a dashboard overview and hashed shards
+#
+# The overview is small and bounded regardless of cohort size: it keeps the
+# headline counts, alpha diversity, a capped phylum distribution and a
+# manifest of detail shards. Each shard (full phylum table, per-site tables,
+# PCoA grids, pages of binary PCoA points) is listed with a content hash so
+# publishers only copy the shards whose hash changed and clients only
+# re-fetch those.
+#
+# PCoA coordinates are binned into a grid per body site at several zoom
+# levels, so the scatter plot payload stays constant as cohorts grow; exact
+# points are only shipped for cohorts below PCOA_EXACT_POINT_LIMIT.
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+
+PRODUCTS_VERSION = 1
+OVERVIEW_FILE = 'overview.json'
+HASH_LENGTH = 16           # Hex characters of the SHA-256 digest kept per shard
+PHYLUM_OVERVIEW_LIMIT = 12 # Phyla shown in the overview; the rest are folded into "Other"
+PCOA_PAGE_SIZE = 50000     # Points per binary PCoA shard
+PCOA_EXACT_POINT_LIMIT = 5000   # Above this only the binned grids are published
+PCOA_ZOOM_LEVELS = (8, 16, 32, 64)  # Grid cells per axis; each level nests in the previous one
+CENTROID_DECIMALS = 5
+
+# PCoA point record: PC1 and PC2 as float32, body site index as uint16 (little-endian)
+PCOA_POINT = struct.Struct('<ffH')
+
+def content_hash(data):
+    """Truncated SHA-256 of a shard's bytes"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+def encode_json(data):
+    """Deterministic JSON encoding, so unchanged content always hashes the same"""
+    return json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+def shard_filename(name):
+    """File-safe version of a body site or table name"""
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+
+def cap_distribution(entries, limit=PHYLUM_OVERVIEW_LIMIT):
+    """Keep the largest entries and fold the remainder into a single "Other" entry"""
+    ranked = sorted(entries, key=lambda entry: entry['abundance'], reverse=True)
+    if len(ranked) <= limit:
+        return ranked
+    other = sum(entry['abundance'] for entry in ranked[limit - 1:])
+    return ranked[:limit - 1] + [{"name": "Other", "abundance": other}]
+
+def pack_points(points, sites):
+    """
+    Pack PCoA points into fixed-size binary records.
+
+    Args:
+        points: List of {"PC1", "PC2", "body_site"} records
+        sites: Ordered body site names; the record stores the site's index
+
+    Returns:
+        Bytes of len(points) * PCOA_POINT.size
+    """
+    site_index = {site: i for i, site in enumerate(sites)}
+    buffer = bytearray(PCOA_POINT.size * len(points))
+    for i, point in enumerate(points):
+        PCOA_POINT.pack_into(buffer, i * PCOA_POINT.size,
+                             point['PC1'], point['PC2'], site_index[point['body_site']])
+    return bytes(buffer)
+
+def unpack_points(data, sites):
+    """Inverse of pack_points (values come back as float32 precision)"""
+    return [
+        {"PC1": pc1, "PC2": pc2, "body_site": sites[site]}
+        for pc1, pc2, site in PCOA_POINT.iter_unpack(data)
+    ]
+
+def point_bounds(points):
+    """PC1 and PC2 ranges of the points, as {"PC1": [min, max], "PC2": [min, max]}"""
+    if not points:
+        return {"PC1": [], "PC2": []}
+    pc1 = [point['PC1'] for point in points]
+    pc2 = [point['PC2'] for point in points]
+    return {"PC1": [min(pc1), max(pc1)], "PC2": [min(pc2), max(pc2)]}
+
+def _cell_index(value, low, span, size):
+    return min(size - 1, max(0, int((value - low) / span * size)))
+
+def bin_points(points, bounds, levels=PCOA_ZOOM_LEVELS):
+    """
+    Bin PCoA points into square grids per body site, in one pass over the points.
+
+    All levels share the same bounds, so with power-of-two sizes cell (x, y)
+    at one level lies inside cell (x // 2, y // 2) of the next coarser level.
+
+    Args:
+        points: List of {"PC1", "PC2", "body_site"} records
+        bounds: Grid extent from point_bounds
+        levels: Cells per axis for each zoom level
+
+    Returns:
+        {level size: {body site: [[x, y, count, centroid PC1, centroid PC2], ...]}}
+        with only non-empty cells, sorted by (x, y)
+    """
+    if not points:
+        return {size: {} for size in levels}
+    low1, high1 = bounds['PC1']
+    low2, high2 = bounds['PC2']
+    span1 = (high1 - low1) or 1.0
+    span2 = (high2 - low2) or 1.0
+
+    cells = {size: {} for size in levels}
+    for point in points:
+        pc1, pc2, site = point['PC1'], point['PC2'], point['body_site']
+        for size in levels:
+            key = (site, _cell_index(pc1, low1, span1, size), _cell_index(pc2, low2, span2, size))
+            cell = cells[size].get(key)
+            if cell is None:
+                cells[size][key] = [1, pc1, pc2]
+            else:
+                cell[0] += 1
+                cell[1] += pc1
+                cell[2] += pc2
+
+    grids = {}
+    for size, level_cells in cells.items():
+        grid = {}
+        for (site, x, y), (count, sum1, sum2) in sorted(level_cells.items()):
+            grid.setdefault(site, []).append([
+                x, y, count,
+                round(sum1 / count, CENTROID_DECIMALS),
+                round(sum2 / count, CENTROID_DECIMALS)
+            ])
+        grids[size] = grid
+    return grids
+
+def build_products(summary, page_size=PCOA_PAGE_SIZE, exact_limit=PCOA_EXACT_POINT_LIMIT,
+                   levels=PCOA_ZOOM_LEVELS):
+    """
+    Split a microbiome summary into an overview document and detail shards.
+
+    Args:
+        summary: Dictionary written by create_summary as microbiome_summary.json
+        page_size: PCoA points per binary shard
+        exact_limit: Largest cohort for which exact PCoA points are published
+        levels: Cells per axis for each PCoA grid zoom level
+
+    Returns:
+        Tuple of (overview dictionary, {shard name: bytes})
+    """
+    taxonomic = summary.get('taxonomic_profile', {})
+    functional = summary.get('functional_profile', {})
+    diversity = summary.get('diversity', {})
+    pcoa = diversity.get('beta', {}).get('pcoa', {})
+    points = pcoa.get('pc1_vs_pc2', [])
+    by_site = diversity.get('by_site', {})
+
+    shards = {}
+    phyla = taxonomic.get('phylum_distribution', [])
+    shards['taxonomy/phyla.json'] = encode_json(phyla)
+
+    species_by_site = taxonomic.get('top_species_by_site', {})
+    pathways_by_site = functional.get('top_pathways_by_site', {})
+    for site in sorted(set(by_site) | set(species_by_site) | set(pathways_by_site)):
+        shards[f'sites/{shard_filename(site)}.json'] = encode_json({
+            "body_site": site,
+            "diversity": by_site.get(site, {}),
+            "top_species": species_by_site.get(site, []),
+            "top_pathways": pathways_by_site.get(site, [])
+        })
+
+    sites = sorted(set(point['body_site'] for point in points))
+    bounds = point_bounds(points)
+    grid_shards = []
+    for size, grid in bin_points(points, bounds, levels).items():
+        name = f'pcoa/grid-{size}.json'
+        shards[name] = encode_json({"size": size, "bounds": bounds, "cells": grid})
+        grid_shards.append({"size": size, "shard": name})
+
+    pages = []
+    if len(points) <= exact_limit:
+        for page, start in enumerate(range(0, len(points), page_size)):
+            name = f'pcoa/points-{page:04d}.bin'
+            shards[name] = pack_points(points[start:start + page_size], sites)
+            pages.append(name)
+
+    overview = {
+        "version": PRODUCTS_VERSION,
+        "taxonomic_profile": {
+            "sample_count": taxonomic.get('sample_count', 0),
+            "species_count": taxonomic.get('species_count', 0),
+            "top_species": taxonomic.get('top_species', []),
+            "phylum_count": len(phyla),
+            "phylum_distribution": cap_distribution(phyla)
+        },
+        "functional_profile": {
+            "pathway_count": functional.get('pathway_count', 0),
+            "top_pathways": functional.get('top_pathways', [])
+        },
+        "diversity": {
+            "alpha": diversity.get('alpha', {}),
+            "beta": {
+                "pcoa": {
+                    "point_count": len(points),
+                    "variance_explained": pcoa.get('variance_explained', []),
+                    "bounds": bounds,
+                    "sites": sites,
+                    "grids": grid_shards,
+                    "exact_points": bool(pages),
+                    "record_format": PCOA_POINT.format,
+                    "pages": pages
+                }
+            },
+            "by_site": by_site
+        },
+        "execution_metrics": summary.get('execution_metrics', {}),
+        "cost_analysis": summary.get('cost_analysis', {}),
+        "shards": {
+            name: {"hash": content_hash(data), "bytes": len(data)}
+            for name, data in sorted(shards.items())
+        }
+    }
+    return overview, shards
+
+def changed_shards(previous_overview, overview):
+    """Names of shards that are new or whose content hash differs from the previous overview"""
+    previous = (previous_overview or {}).get('shards', {})
+    return [
+        name for name, entry in sorted(overview.get('shards', {}).items())
+        if previous.get(name, {}).get('hash') != entry['hash']
+    ]
+
+def write_products(summary, output_dir, page_size=PCOA_PAGE_SIZE, exact_limit=PCOA_EXACT_POINT_LIMIT):
+    """Write the overview and shards under output_dir and return the overview"""
+    overview, shards = build_products(summary, page_size, exact_limit)
+    for name, data in shards.items():
+        path = os.path.join(output_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    with open(os.path.join(output_dir, OVERVIEW_FILE), 'wb') as f:
+        f.write(encode_json(overview))
+    return overview
+
+def main():
+    parser = argparse.ArgumentParser(description='Build tiered dashboard data products from a microbiome summary')
+    parser.add_argument('summary', help='microbiome_summary.json from create_summary')
+    parser.add_argument('--output-dir', default='dashboard', help='Output directory (default: dashboard)')
+    parser.add_argument('--page-size', type=int, default=PCOA_PAGE_SIZE,
+                      help=f'PCoA points per shard (default: {PCOA_PAGE_SIZE})')
+    parser.add_argument('--exact-limit', type=int, default=PCOA_EXACT_POINT_LIMIT,
+                      help=f'Largest cohort published with exact PCoA points (default: {PCOA_EXACT_POINT_LIMIT})')
+
+    args = parser.parse_args()
+
+    with open(args.summary, 'r') as f:
+        summary = json.load(f)
+
+    overview = write_products(summary, args.output_dir, args.page_size, args.exact_limit)
+    total = sum(entry['bytes'] for entry in overview['shards'].values())
+    print(f"Dashboard products written to: {args.output_dir} "
+          f"({len(overview['shards'])} shards, {total} bytes)")
+
+if __name__ == "__main__":
+    main()
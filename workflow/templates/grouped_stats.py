@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# grouped_stats.py - Single-pass grouped summary statistics
+#
+# Summaries by body site used to mask the table once per site and then scan
+# it again for each of mean, std, min and max of each metric, and once more
+# for the overall figures. Here every row is visited once: it updates a
+# running mean/variance (Welford) and min/max for its group and keeps the
+# value for the quantiles. Overall statistics are combined from the group
+# accumulators (Chan et al.) and the overall quantiles come from merging the
+# already sorted group values, so nothing is scanned twice.
+
+import heapq
+import math
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+def quantile_key(q):
+    """Summary key of a quantile: 'median' for 0.5, otherwise e.g. 'q25'"""
+    return 'median' if q == 0.5 else f"q{q * 100:g}"
+
+def quantile(ordered, q):
+    """Linearly interpolated quantile of sorted values (the pandas/numpy default)"""
+    if not ordered:
+        return float('nan')
+    position = (len(ordered) - 1) * q
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+class _Accumulator:
+    """Running count, mean, sum of squared deviations, min and max of one metric"""
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max', 'values')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.values = []
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.values.append(value)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def summary(self, ordered, quantiles):
+        nan = float('nan')
+        stats = {
+            "count": self.count,
+            "mean": self.mean if self.count else nan,
+            # Sample standard deviation (ddof=1), as pandas reports it
+            "std": math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else nan,
+            "min": self.min if self.count else nan,
+            "max": self.max if self.count else nan,
+        }
+        for q in quantiles:
+            stats[quantile_key(q)] = quantile(ordered, q)
+        return stats
+
+class GroupedStats:
+    """
+    Summary statistics of several metrics, overall and per group, in one pass.
+
+    Missing values (None or NaN) are skipped per metric, like pandas' skipna.
+    Rows whose group is None only count towards the overall statistics.
+    """
+
+    def __init__(self, metrics, quantiles=DEFAULT_QUANTILES):
+        """
+        Args:
+            metrics: Names of the metrics to summarise
+            quantiles: Quantiles to report, as fractions in [0, 1]
+        """
+        self.metrics = list(metrics)
+        self.quantiles = tuple(quantiles)
+        self._groups = {}
+
+    def add(self, group, values):
+        """
+        Add one row.
+
+        Args:
+            group: Group label of the row
+            values: Mapping of metric name to value; absent metrics are missing
+        """
+        accumulators = self._groups.get(group)
+        if accumulators is None:
+            accumulators = self._groups[group] = {metric: _Accumulator() for metric in self.metrics}
+        for metric in self.metrics:
+            value = values.get(metric)
+            if not _missing(value):
+                accumulators[metric].add(float(value))
+
+    def update(self, groups, columns):
+        """
+        Add rows given as columns.
+
+        Args:
+            groups: Group label of each row
+            columns: Mapping of metric name to the values of each row
+        """
+        names = [metric for metric in self.metrics if metric in columns]
+        for row, group in enumerate(groups):
+            self.add(group, {metric: columns[metric][row] for metric in names})
+
+    def _ordered(self):
+        return {(group, metric): sorted(accumulator.values)
+                for group, accumulators in self._groups.items()
+                for metric, accumulator in accumulators.items()}
+
+    def by_group(self, ordered=None):
+        """Statistics of each group: {group: {metric: stats}}, groups sorted"""
+        ordered = ordered if ordered is not None else self._ordered()
+        return {group: {metric: accumulator.summary(ordered[(group, metric)], self.quantiles)
+                        for metric, accumulator in self._groups[group].items()}
+                for group in sorted((g for g in self._groups if g is not None), key=str)}
+
+    def overall(self, ordered=None):
+        """Statistics over all rows: {metric: stats}"""
+        ordered = ordered if ordered is not None else self._ordered()
+        stats = {}
+        for metric in self.metrics:
+            combined = _Accumulator()
+            for accumulators in self._groups.values():
+                combined.merge(accumulators[metric])
+            values = list(heapq.merge(*(ordered[(group, metric)] for group in self._groups)))
+            stats[metric] = combined.summary(values, self.quantiles)
+        return stats
+
+    def summarize(self):
+        """(overall, by_group) with each group's values sorted only once"""
+        ordered = self._ordered()
+        return self.overall(ordered), self.by_group(ordered)
+
+def grouped_stats(groups, columns, quantiles=DEFAULT_QUANTILES):
+    """
+    Overall and per-group statistics of columnar data.
+
+    Args:
+        groups: Group label of each row
+        columns: Mapping of metric name to the values of each row
+        quantiles: Quantiles to report
+
+    Returns:
+        (overall, by_group) as {metric: stats} and {group: {metric: stats}},
+        where stats has count, mean, std, min, max and one key per quantile
+    """
+    stats = GroupedStats(columns, quantiles)
+    stats.update(groups, columns)
+    return stats.summarize()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# profiling.py - Opt-in wall/CPU time and memory profiles of named sections
+#
+# Set PIPELINE_PROFILE=1 to record wall and CPU time and the tracemalloc peak
+# of each named section of a reporting stage or Lambda handler, or
+# PIPELINE_PROFILE=cprofile to also dump cProfile statistics. Stages write
+# <name>.profile.json (and <name>.profile.prof) next to their outputs;
+# Lambda handlers log one CloudWatch Embedded Metric Format line per section
+# instead. With the variable unset, sections are a shared no-op context and
+# decorated functions are called directly.
+
+import atexit
+import cProfile
+import datetime
+import functools
+import json
+import os
+import pstats
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; max RSS is then omitted
+    resource = None
+
+PROFILE_ENV = 'PIPELINE_PROFILE'
+PROFILE_DIR_ENV = 'PIPELINE_PROFILE_DIR'
+EMF_NAMESPACE = os.environ.get('PIPELINE_PROFILE_NAMESPACE', 'MicrobiomeDemo/Profiling')
+TOP_FUNCTIONS = 15
+MB = 1024 * 1024
+
+_OFF = ('', '0', 'false', 'no', 'off')
+_NULL_SECTION = nullcontext()
+
+# Profilers that are running, innermost last
+_active = []
+
+def profile_mode():
+    """'' when profiling is off, 'on' for timings and memory, 'cprofile' to add cProfile dumps"""
+    value = os.environ.get(PROFILE_ENV, '').strip().lower()
+    if value in _OFF:
+        return ''
+    return 'cprofile' if value == 'cprofile' else 'on'
+
+def max_rss_mb():
+    """Peak resident set size of this process, or None where it is not available"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (MB if sys.platform == 'darwin' else 1024), 1)
+
+class _Section:
+    """Times one entry of a named section"""
+
+    __slots__ = ('profiler', 'name', 'wall', 'cpu', 'child_peak')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        stack = self.profiler._open
+        # The parent keeps the peak reached so far before the peak is reset for this section
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.child_peak = 0
+        stack.append(self)
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+        stack = self.profiler._open
+        stack.pop()
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        self.profiler._record(self.name, wall, cpu, peak)
+        return False
+
+class Profiler:
+    """
+    Wall time, CPU time and peak traced memory of named sections.
+
+    Sections can be nested and entered repeatedly; repeated entries add up.
+    A disabled profiler hands out a shared no-op context and records nothing.
+    """
+
+    def __init__(self, name, mode=None, output_dir=None, emf=False):
+        """
+        Args:
+            name: Stage or handler name, used for file names and the EMF dimension
+            mode: Override of profile_mode()
+            output_dir: Where profiles are written (default: PIPELINE_PROFILE_DIR or '.')
+            emf: Log Embedded Metric Format lines instead of writing a JSON profile
+        """
+        self.name = name
+        self.mode = profile_mode() if mode is None else mode
+        self.enabled = bool(self.mode)
+        self.output_dir = output_dir or os.environ.get(PROFILE_DIR_ENV, '.')
+        self.emf = emf
+        self.sections = {}
+        self.result = None
+        self._open = []
+        self._root = None
+        self._marked = None
+        self._started = None
+        self._cprofile = None
+        self._owns_tracemalloc = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.finish()
+        return False
+
+    def _record(self, name, wall, cpu, peak):
+        stats = self.sections.get(name)
+        if stats is None:
+            stats = self.sections[name] = {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_bytes': 0}
+        stats['calls'] += 1
+        stats['wall_seconds'] += wall
+        stats['cpu_seconds'] += cpu
+        stats['peak_bytes'] = max(stats['peak_bytes'], peak)
+
+    def start(self):
+        """Start profiling; a no-op when disabled or already started"""
+        if not self.enabled or self._started is not None:
+            return self
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        self._started = time.time()
+        _active.append(self)
+        self._root = _Section(self, None).__enter__()
+        if self.mode == 'cprofile':
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        return self
+
+    def section(self, name):
+        """Context manager timing the named section"""
+        if self._root is None:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def mark(self, name):
+        """
+        End the section started by the previous mark and start the named one.
+
+        Marks split a linear script into consecutive sections without
+        re-indenting it; finish() ends the last one.
+        """
+        if self._root is None:
+            return
+        if self._marked is not None:
+            self._marked.__exit__(None, None, None)
+        self._marked = _Section(self, name).__enter__()
+
+    def finish(self):
+        """
+        Stop profiling and publish the profile.
+
+        Returns:
+            The profile dictionary, or None when disabled
+        """
+        if self._root is None:
+            return self.result
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        # Sections left open by an exception end here
+        while self._open[-1] is not self._root:
+            self._open[-1].__exit__(None, None, None)
+        self._marked = None
+        root, self._root = self._root, None
+        root.__exit__(None, None, None)
+        total = self.sections.pop(None)
+        if self in _active:
+            _active.remove(self)
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+        self.result = {
+            'name': self.name,
+            'started': datetime.datetime.fromtimestamp(self._started, datetime.timezone.utc).isoformat(),
+            'wall_seconds': round(total['wall_seconds'], 6),
+            'cpu_seconds': round(total['cpu_seconds'], 6),
+            'peak_memory_mb': round(total['peak_bytes'] / MB, 3),
+            'max_rss_mb': max_rss_mb(),
+            'sections': [
+                {'name': name, 'calls': stats['calls'], 'wall_seconds': round(stats['wall_seconds'], 6),
+                 'cpu_seconds': round(stats['cpu_seconds'], 6),
+                 'peak_memory_mb': round(stats['peak_bytes'] / MB, 3)}
+                for name, stats in self.sections.items()
+            ],
+            'cprofile': None
+        }
+        if self._cprofile is not None:
+            self.result['cprofile'] = os.path.join(self.output_dir, f"{self.name}.profile.prof")
+            self._cprofile.dump_stats(self.result['cprofile'])
+        if self.emf:
+            for line in emf_lines(self.result):
+                print(line, flush=True)
+            if self._cprofile is not None:
+                # The dump only lives as long as the Lambda sandbox, so log the top functions too
+                stats = pstats.Stats(self._cprofile, stream=sys.stdout)
+                stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        else:
+            with open(os.path.join(self.output_dir, f"{self.name}.profile.json"), 'w') as f:
+                json.dump(self.result, f, indent=2)
+        return self.result
+
+def emf_lines(result, namespace=EMF_NAMESPACE):
+    """CloudWatch Embedded Metric Format lines for a profile: one per section and one for the total"""
+    timestamp = int(time.time() * 1000)
+    rows = [dict(result, name='total', calls=1)] + result['sections']
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [['Function', 'Section']],
+                    'Metrics': [
+                        {'Name': 'WallTime', 'Unit': 'Milliseconds'},
+                        {'Name': 'CpuTime', 'Unit': 'Milliseconds'},
+                        {'Name': 'PeakMemory', 'Unit': 'Megabytes'}
+                    ]
+                }]
+            },
+            'Function': result['name'],
+            'Section': row['name'],
+            'WallTime': round(row['wall_seconds'] * 1000, 3),
+            'CpuTime': round(row['cpu_seconds'] * 1000, 3),
+            'PeakMemory': row['peak_memory_mb'],
+            'Calls': row['calls']
+        }, separators=(',', ':')))
+    return lines
+
+def section(name):
+    """Context manager timing the named section of the innermost running profiler, if any"""
+    if not _active:
+        return _NULL_SECTION
+    return _active[-1].section(name)
+
+def profile_stage(name):
+    """
+    Profiler for a reporting stage script, written when the script exits.
+
+    Returns a disabled profiler unless PIPELINE_PROFILE is set.
+    """
+    profiler = Profiler(name).start()
+    if profiler.enabled:
+        atexit.register(profiler.finish)
+    return profiler
+
+def profiled(name=None):
+    """Decorator timing each call of a function as a section of the running profiler, if any"""
+    def decorate(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return function(*args, **kwargs)
+            with _active[-1].section(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def profiled_handler(name=None):
+    """
+    Decorator profiling each invocation of a Lambda handler.
+
+    The profile is logged as EMF lines; cProfile dumps go to
+    PIPELINE_PROFILE_DIR or the temporary directory.
+    """
+    def decorate(handler):
+        label = name or handler.__name__
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            mode = profile_mode()
+            if not mode:
+                return handler(event, context)
+            output_dir = os.environ.get(PROFILE_DIR_ENV, tempfile.gettempdir())
+            with Profiler(label, mode, output_dir, emf=True):
+                return handler(event, context)
+        return wrapper
+    return decorate
@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# progress_agent.py - Node-local agent that batches task progress events
+#
+# Before this agent, every task's beforeScript/afterScript downloaded
+# progress_tracker.sh with the aws CLI and ran it. The tracker then started
+# 3-7 more aws and python3 processes, which added seconds to every short
+# task. batch_init.sh now starts this agent on each compute node. Tasks hand
+# it their events through progress_event.sh, which writes one small file into
+# the spool directory, or through the Unix socket in the same directory.
+# Every flush interval the agent coalesces the queued events per workflow.
+# It writes the event objects that progress_reducer.py folds, one
+# latest_update.json, and does a single read-modify-write of progress.json
+# (with the ETA model) for all the tasks that ended.
+#
+#   progress_agent.py run --spool /tmp/progress-agent
+#   progress_agent.py post --process preprocess_reads_S1 --status started ...
+#   progress_agent.py benchmark --tasks 20
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from progress_eta import format_time, update_progress_eta
+
+TEMPLATES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# /tmp is mounted into the task containers (aws.batch.volumes)
+DEFAULT_SPOOL = '/tmp/progress-agent'
+INCOMING_DIR = 'incoming'
+SOCKET_NAME = 'agent.sock'
+EVENT_SCRIPT = 'progress_event.sh'
+DEFAULT_FLUSH_INTERVAL = 5.0
+UPLOAD_CONCURRENCY = 8
+PROGRESS_WRITE_ATTEMPTS = 5    # Conditional progress.json writes before the events wait for the next flush
+
+UPDATE_KEY = "progress/{workflow_id}/updates/{timestamp}_{process}_{status}.json"
+LATEST_UPDATE_KEYS = ("progress/{workflow_id}/latest_update.json", "progress/latest/latest_update.json")
+PROGRESS_KEYS = ("progress/{workflow_id}/progress.json", "progress/latest/progress.json")
+PRIOR_KEY = "progress/eta_prior.json"
+
+REQUIRED_FIELDS = ('process', 'status', 'timestamp', 'workflow_id', 'bucket')
+
+def error_code(error):
+    """S3 error code of a botocore ClientError (or a LocalBucket error)"""
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+def precondition_failed(error):
+    """Whether a conditional PUT lost to a concurrent write"""
+    return error_code(error) in ('PreconditionFailed', '412', 'ConditionalRequestConflict', '409')
+
+def human_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+def parse_event(line):
+    """An event from a spool file or socket line, or None if it is malformed"""
+    try:
+        event = json.loads(line)
+        event['timestamp'] = int(event['timestamp'])
+    except (TypeError, ValueError, KeyError):
+        return None
+    if not isinstance(event, dict) or any(event.get(field) in (None, '') for field in REQUIRED_FIELDS
+                                          if field != 'status'):
+        return None
+    event['status'] = event.get('status') or ''
+    return event
+
+def ended(status):
+    """
+    Whether a reported status ends the task.
+
+    afterScript may report an empty status; as in progress_reducer.py the
+    task has ended either way.
+    """
+    return status != 'started'
+
+def coalesce(events):
+    """
+    The last event of each task, in time order.
+
+    A task that started and ended within one flush only needs its end event;
+    its start time travels with it as started_at.
+    """
+    latest = OrderedDict()
+    for event in sorted(events, key=lambda event: event['timestamp']):
+        key = (event['bucket'], event['workflow_id'], event['process'])
+        latest.pop(key, None)
+        latest[key] = event
+    return list(latest.values())
+
+def update_document(event):
+    """The per-event object progress_tracker.sh used to upload"""
+    return {'process': event['process'], 'status': event['status'], 'timestamp': event['timestamp'],
+            'human_time': human_time(event['timestamp']), 'workflow_id': event['workflow_id']}
+
+def new_progress(event):
+    return {
+        'workflow_id': event['workflow_id'],
+        'start_time': event['timestamp'],
+        'start_time_human': human_time(event['timestamp']),
+        'processes': {},
+        'completed_count': 0,
+        'total_processes': int(event.get('total_processes') or 0),
+        'elapsed_seconds': 0,
+        'estimated_remaining_seconds': 0,
+        'percent_complete': 0,
+        'status': 'running'
+    }
+
+def apply_event(progress, event, prior=None):
+    """
+    Fold a task event into a progress.json document, as progress_tracker.sh does.
+
+    A start only adds the task to the ETA model's running tasks; an end
+    records its status and counts it.
+    """
+    name = event['process']
+    timestamp = event['timestamp']
+    total_processes = int(event.get('total_processes') or progress.get('total_processes', 0))
+    progress['total_processes'] = total_processes
+    progress['elapsed_seconds'] = timestamp - progress.get('start_time', timestamp)
+    if not ended(event['status']):
+        update_progress_eta(progress, name, 'started', None, timestamp, prior)
+        progress['elapsed_time_formatted'] = format_time(progress['elapsed_seconds'])
+        return progress
+
+    status = event['status'] if event['status'] in ('completed', 'failed') else 'completed'
+    progress.setdefault('processes', {})[name] = {
+        'status': status,
+        'last_updated': timestamp,
+        'last_updated_human': human_time(timestamp)
+    }
+    completed_count = sum(1 for p in progress['processes'].values() if p.get('status') == 'completed')
+    progress['completed_count'] = completed_count
+    if total_processes > 0:
+        progress['percent_complete'] = round((completed_count / total_processes) * 100, 1)
+    else:
+        progress['percent_complete'] = 0
+
+    update_progress_eta(progress, name, status, event.get('started_at'), timestamp, prior)
+    progress['elapsed_time_formatted'] = format_time(progress['elapsed_seconds'])
+
+    if completed_count >= total_processes:
+        progress['status'] = 'completed'
+        progress['end_time'] = timestamp
+        progress['end_time_human'] = human_time(timestamp)
+        progress['total_runtime_seconds'] = progress['elapsed_seconds']
+        progress['total_runtime_formatted'] = progress['elapsed_time_formatted']
+        progress['percent_complete'] = 100
+    return progress
+
+def read_json_body(response):
+    body = response['Body'].read()
+    if response.get('ContentEncoding') == 'gzip':
+        body = gzip.decompress(body)
+    return json.loads(body.decode('utf-8'))
+
+class BucketError(Exception):
+    """Error raised by LocalBucket, shaped like botocore's ClientError"""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+class LocalBucket:
+    """S3 stand-in that keeps objects as files under root/<bucket>/<key>"""
+
+    def __init__(self, root):
+        self.root = root
+        self.requests = Counter()
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self.requests['PutObject'] += 1
+        body = Body.encode('utf-8') if isinstance(Body, str) else Body
+        path = self._path(Bucket, Key)
+        if IfMatch or IfNoneMatch:
+            try:
+                with open(path, 'rb') as f:
+                    current = '"' + hashlib.md5(f.read()).hexdigest() + '"'
+            except FileNotFoundError:
+                current = None
+            if (IfNoneMatch == '*' and current) or (IfMatch and IfMatch != current):
+                raise BucketError('PreconditionFailed')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        return {'ETag': '"' + hashlib.md5(body).hexdigest() + '"'}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self.requests['GetObject'] += 1
+        try:
+            with open(self._path(Bucket, Key), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            raise BucketError('NoSuchKey')
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if IfNoneMatch == etag:
+            raise BucketError('304')
+        return {'Body': io.BytesIO(body), 'ETag': etag}
+
+class ProgressAgent:
+    """
+    Queue of task events, flushed to S3 in batches.
+
+    progress.json documents are cached with their ETag, so a flush only
+    downloads one when another node has written it since.
+    """
+
+    def __init__(self, client, spool=DEFAULT_SPOOL, concurrency=UPLOAD_CONCURRENCY):
+        self.client = client
+        self.spool = spool
+        self.pending = []
+        self.documents = {}
+        self.priors = {}
+        self.counters = Counter()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def add(self, event):
+        self.pending.append(event)
+        self.counters['events_received'] += 1
+
+    def drain_spool(self):
+        """Move the events tasks left in the spool directory into the queue"""
+        incoming = os.path.join(self.spool, INCOMING_DIR)
+        try:
+            names = sorted(name for name in os.listdir(incoming) if name.endswith('.event'))
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(incoming, name)
+            try:
+                with open(path, 'r') as f:
+                    event = parse_event(f.read())
+                os.remove(path)
+            except OSError:
+                continue
+            if event is None:
+                self.counters['events_malformed'] += 1
+            else:
+                self.add(event)
+
+    def prior(self, bucket):
+        """Durations fitted from earlier runs (progress_eta.py fit), if any were published"""
+        if bucket not in self.priors:
+            try:
+                self.priors[bucket] = read_json_body(self.client.get_object(Bucket=bucket, Key=PRIOR_KEY))
+            except Exception:
+                self.priors[bucket] = None
+        return self.priors[bucket]
+
+    def load_progress(self, bucket, workflow_id):
+        """
+        The workflow's progress.json and its ETag.
+
+        Returns:
+            Tuple of (etag, document), or (None, None) if there is none yet
+        """
+        key = PROGRESS_KEYS[0].format(workflow_id=workflow_id)
+        cached = self.documents.get((bucket, workflow_id))
+        arguments = {'IfNoneMatch': cached[0]} if cached and cached[0] else {}
+        try:
+            response = self.client.get_object(Bucket=bucket, Key=key, **arguments)
+        except Exception as e:
+            if error_code(e) in ('304', 'NotModified') and cached:
+                return cached[0], json.loads(json.dumps(cached[1]))
+            if error_code(e) in ('NoSuchKey', '404'):
+                return None, None
+            raise
+        return response.get('ETag'), read_json_body(response)
+
+    def put(self, bucket, key, document, **conditions):
+        body = json.dumps(document, separators=(',', ':')).encode('utf-8')
+        return self.client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json',
+                                      **conditions)
+
+    def update_progress(self, bucket, workflow_id, events):
+        """
+        Fold task events into progress.json with a conditional PUT.
+
+        Agents on other nodes (and progress_tracker.sh) write the same
+        document, so the write only succeeds if it is unchanged since it was
+        read; otherwise it is re-read and the events are applied again, like
+        the result cache index (result_cache.py).
+
+        Returns:
+            The document as written
+        """
+        key = PROGRESS_KEYS[0].format(workflow_id=workflow_id)
+        for _ in range(PROGRESS_WRITE_ATTEMPTS):
+            etag, progress = self.load_progress(bucket, workflow_id)
+            condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+            progress = progress or new_progress(events[0])
+            prior = None if 'eta_model' in progress else self.prior(bucket)
+            for event in events:
+                apply_event(progress, event, prior)
+            try:
+                response = self.put(bucket, key, progress, **condition)
+            except Exception as e:
+                if not precondition_failed(e):
+                    raise
+                self.documents.pop((bucket, workflow_id), None)
+                self.counters['progress_conflicts'] += 1
+                continue
+            self.documents[(bucket, workflow_id)] = (response.get('ETag'), progress)
+            return progress
+        raise RuntimeError(f"progress.json of {workflow_id} kept changing during {PROGRESS_WRITE_ATTEMPTS} writes")
+
+    def flush_workflow(self, bucket, workflow_id, events):
+        """Publish one workflow's coalesced events"""
+        uploads = [(UPDATE_KEY.format(workflow_id=workflow_id, timestamp=event['timestamp'],
+                                      process=event['process'], status=event['status']), update_document(event))
+                   for event in events]
+        uploads += [(key.format(workflow_id=workflow_id), update_document(events[-1])) for key in LATEST_UPDATE_KEYS]
+        list(self.executor.map(lambda upload: self.put(bucket, *upload), uploads))
+        self.counters['objects_uploaded'] += len(uploads)
+
+        # Starts go into the document too: the ETA counts running tasks as in flight
+        progress = self.update_progress(bucket, workflow_id, events)
+        # The other copies follow the workflow's document, which is the one merged into
+        list(self.executor.map(lambda key: self.put(bucket, key.format(workflow_id=workflow_id), progress),
+                               PROGRESS_KEYS[1:]))
+        self.counters['progress_updates'] += 1
+
+    def flush(self):
+        """
+        Publish everything queued since the last flush.
+
+        A workflow whose upload fails keeps its events queued for the next flush.
+        """
+        self.drain_spool()
+        events, self.pending = coalesce(self.pending), []
+        workflows = OrderedDict()
+        for event in events:
+            workflows.setdefault((event['bucket'], event['workflow_id']), []).append(event)
+        for (bucket, workflow_id), batch in workflows.items():
+            try:
+                self.flush_workflow(bucket, workflow_id, batch)
+                self.counters['events_published'] += len(batch)
+            except Exception as e:
+                self.pending.extend(batch)
+                self.counters['flush_errors'] += 1
+                print(f"Error publishing progress for {workflow_id}, retrying: {e}", file=sys.stderr)
+        self.counters['flushes'] += 1
+        return len(events)
+
+    async def handle_client(self, reader, writer):
+        """Events posted over the Unix socket, one JSON object per line"""
+        try:
+            async for line in reader:
+                event = parse_event(line)
+                if event is None:
+                    self.counters['events_malformed'] += 1
+                else:
+                    self.add(event)
+        finally:
+            writer.close()
+
+    async def serve(self, flush_interval=DEFAULT_FLUSH_INTERVAL, stop=None):
+        """Accept events on the socket and flush every flush_interval seconds until stop is set"""
+        install_spool(self.spool)
+        socket_path = os.path.join(self.spool, SOCKET_NAME)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(self.handle_client, path=socket_path)
+        os.chmod(socket_path, 0o777)
+        loop = asyncio.get_running_loop()
+        stop = stop or asyncio.Event()
+        try:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                await loop.run_in_executor(None, self.flush)
+        finally:
+            server.close()
+            os.remove(socket_path)
+            # Whatever could not be published stays in the spool for the next agent
+            for event in self.pending:
+                write_spool_event(self.spool, event)
+
+def install_spool(spool):
+    """Create the spool directory and put progress_event.sh where the task containers can run it"""
+    os.makedirs(os.path.join(spool, INCOMING_DIR), exist_ok=True)
+    os.chmod(os.path.join(spool, INCOMING_DIR), 0o777)
+    shutil.copy(os.path.join(TEMPLATES_DIR, EVENT_SCRIPT), os.path.join(spool, EVENT_SCRIPT))
+
+def write_spool_event(spool, event):
+    path = os.path.join(spool, INCOMING_DIR, f"{event['timestamp']}.{os.getpid()}.{time.monotonic_ns()}")
+    with open(path + '.tmp', 'w') as f:
+        json.dump(event, f)
+    os.replace(path + '.tmp', path + '.event')
+
+def post_event(event, spool=DEFAULT_SPOOL):
+    """Send an event to the agent's socket, or leave it in the spool if the agent is not listening"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(os.path.join(spool, SOCKET_NAME))
+            connection.sendall(json.dumps(event).encode('utf-8') + b'\n')
+        return 'socket'
+    except OSError:
+        write_spool_event(spool, event)
+        return 'spool'
+
+# Stand-in for the aws CLI used by benchmark: "aws s3 cp" against LocalBucket's
+# directory layout, paying the CLI's interpreter and botocore start-up
+AWS_SHIM = """#!{python}
+import os, shutil, sys
+try:
+    import awscli.clidriver
+except ImportError:
+    try:
+        import botocore.session
+    except ImportError:
+        pass
+root = os.environ['PROGRESS_BENCH_ROOT']
+with open(os.path.join(root, '.aws_calls'), 'a') as f:
+    f.write(' '.join(sys.argv[1:3]) + '\\n')
+src, dst = [a for a in sys.argv[3:] if not a.startswith('--')][:2]
+local = lambda url: os.path.join(root, url[len('s3://'):])
+if src.startswith('s3://'):
+    if not os.path.exists(local(src)):
+        sys.exit(1)
+    if dst == '-':
+        sys.stdout.write(open(local(src)).read())
+    else:
+        shutil.copy(local(src), dst)
+else:
+    os.makedirs(os.path.dirname(local(dst)), exist_ok=True)
+    shutil.copy(src, local(dst))
+"""
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def overhead_stats(durations):
+    milliseconds = [d * 1000 for d in durations]
+    return {'mean_ms': round(statistics.mean(milliseconds), 2), 'p50_ms': round(percentile(milliseconds, 0.5), 2),
+            'p95_ms': round(percentile(milliseconds, 0.95), 2)}
+
+def run_task_events(command, work_dir, env, tasks, workflow_id):
+    """Per-task overhead (start plus end event) of running command as before/afterScript"""
+    durations = []
+    for index in range(tasks):
+        task_dir = os.path.join(work_dir, f'task{index}')
+        os.makedirs(task_dir)
+        task_env = dict(env, PROCESS_NAME=f'preprocess_reads_S{index:04d}', WORKFLOW_ID=workflow_id,
+                        TOTAL_PROCESSES=str(tasks))
+        elapsed = 0.0
+        for status in ('started', 'completed'):
+            started = time.perf_counter()
+            subprocess.run(['bash', '-c', command], cwd=task_dir, env=dict(task_env, PROCESS_STATUS=status),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            elapsed += time.perf_counter() - started
+        durations.append(elapsed)
+    return durations
+
+def benchmark(tasks=20, bucket='progress-bench'):
+    """
+    Per-task progress overhead with and without the agent, offline.
+
+    Without the agent each event downloads and runs progress_tracker.sh with
+    an aws CLI stand-in over a local directory. This pays the CLI start-up
+    but not the S3 round trips, so it underestimates the real overhead.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'bucket')
+        bin_dir = os.path.join(tmp, 'bin')
+        os.makedirs(bin_dir)
+        with open(os.path.join(bin_dir, 'aws'), 'w') as f:
+            f.write(AWS_SHIM.format(python=sys.executable))
+        os.chmod(os.path.join(bin_dir, 'aws'), 0o755)
+        templates = os.path.join(root, bucket, 'workflow', 'templates')
+        os.makedirs(templates)
+        for name in ('progress_tracker.sh', 'progress_eta.py', 'trace_metrics.py'):
+            shutil.copy(os.path.join(TEMPLATES_DIR, name), templates)
+        env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''), BUCKET_NAME=bucket,
+                   PROGRESS_BENCH_ROOT=root)
+
+        tracker = run_task_events(
+            f"aws s3 cp s3://{bucket}/workflow/templates/progress_tracker.sh ./progress_tracker.sh --quiet "
+            "&& bash progress_tracker.sh; rm -f progress_tracker.sh",
+            os.path.join(tmp, 'tracker'), env, tasks, 'bench-tracker')
+        with open(os.path.join(root, '.aws_calls')) as f:
+            tracker_calls = len(f.read().splitlines())
+
+        spool = os.path.join(tmp, 'spool')
+        install_spool(spool)
+        agent_tasks = run_task_events(f"bash {os.path.join(spool, EVENT_SCRIPT)}", os.path.join(tmp, 'agent'),
+                                      dict(env, PROGRESS_AGENT_SPOOL=spool), tasks, 'bench-agent')
+        store = LocalBucket(root)
+        agent = ProgressAgent(store, spool)
+        started = time.perf_counter()
+        agent.flush()
+        flush_seconds = time.perf_counter() - started
+        agent.executor.shutdown()
+
+        with open(os.path.join(root, bucket, PROGRESS_KEYS[0].format(workflow_id='bench-agent'))) as f:
+            agent_progress = json.load(f)
+        with open(os.path.join(root, bucket, PROGRESS_KEYS[0].format(workflow_id='bench-tracker'))) as f:
+            tracker_progress = json.load(f)
+
+    return {
+        'tasks': tasks,
+        'tracker': dict(overhead_stats(tracker), aws_calls_per_task=round(tracker_calls / tasks, 2),
+                        completed_count=tracker_progress['completed_count']),
+        'agent': dict(overhead_stats(agent_tasks), s3_requests_per_task=round(sum(store.requests.values()) / tasks, 2),
+                      flush_ms=round(flush_seconds * 1000, 2), completed_count=agent_progress['completed_count']),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Node-local agent that batches task progress events')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Collect events on this node and publish them in batches')
+    run_parser.add_argument('--spool', default=DEFAULT_SPOOL, help=f"Spool directory (default: {DEFAULT_SPOOL})")
+    run_parser.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL,
+                            help=f"Seconds between flushes (default: {DEFAULT_FLUSH_INTERVAL})")
+    run_parser.add_argument('--bucket-dir', help='Write objects under this directory instead of S3')
+
+    post_parser = subparsers.add_parser('post', help='Hand one event to the agent')
+    post_parser.add_argument('--spool', default=DEFAULT_SPOOL, help=f"Spool directory (default: {DEFAULT_SPOOL})")
+    post_parser.add_argument('--process', required=True, help='Process name, e.g. preprocess_reads_SRS011061')
+    post_parser.add_argument('--status', required=True, help='started, completed or failed')
+    post_parser.add_argument('--workflow-id', required=True, help='Workflow run identifier')
+    post_parser.add_argument('--bucket', required=True, help='Bucket to publish progress to')
+    post_parser.add_argument('--total-processes', type=int, default=0, help='Total processes in the workflow')
+    post_parser.add_argument('--started-at', type=int, help='Epoch seconds the task started')
+
+    bench_parser = subparsers.add_parser('benchmark', help='Compare per-task overhead with and without the agent')
+    bench_parser.add_argument('--tasks', type=int, default=20, help='Tasks to simulate (default: 20)')
+    bench_parser.add_argument('--output', help='Write the results as JSON')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        if args.bucket_dir:
+            client = LocalBucket(args.bucket_dir)
+        else:
+            import boto3
+            client = boto3.client('s3')
+        agent = ProgressAgent(client, args.spool)
+
+        async def run():
+            stop = asyncio.Event()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+            await agent.serve(args.flush_interval, stop)
+
+        asyncio.run(run())
+        print(json.dumps(dict(agent.counters)))
+    elif args.command == 'post':
+        event = {'process': args.process, 'status': args.status, 'timestamp': int(time.time()),
+                 'started_at': args.started_at, 'workflow_id': args.workflow_id, 'bucket': args.bucket,
+                 'total_processes': args.total_processes}
+        print(f"Event queued via {post_event(event, args.spool)}")
+    else:
+        result = benchmark(args.tasks)
+        for mode in ('tracker', 'agent'):
+            stats = result[mode]
+            print(f"{mode:8s} per-task overhead: mean {stats['mean_ms']:>8.2f} ms  p50 {stats['p50_ms']:>8.2f} ms  "
+                  f"p95 {stats['p95_ms']:>8.2f} ms")
+        print(f"tracker: {result['tracker']['aws_calls_per_task']} aws CLI calls per task; agent: "
+              f"{result['agent']['s3_requests_per_task']} S3 requests per task, "
+              f"one flush of {args.tasks} tasks in {result['agent']['flush_ms']} ms")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=2)
+            print(f"Results written to: {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# progress_eta.py - Remaining-time estimates from per-process duration models
+#
+# Each process type keeps an EWMA of its task durations (plus a window of
+# recent durations for quantiles). Per-sample work runs in parallel at the
+# parallelism achieved so far; the single reporting processes run one after
+# another at the end. The estimate comes with bounds whose width is
+# calibrated by replaying recorded Nextflow traces.
+
+import argparse
+import json
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from trace_metrics import parse_duration, parse_timestamp, process_name, read_trace
+
+# Processes run once per sample, concurrently across samples
+PER_SAMPLE_PROCESSES = ['preprocess_reads', 'taxonomic_classification_kraken', 'metaphlan_analysis']
+# Processes run once per workflow, mostly one after another
+SERIAL_PROCESSES = [
+    'detect_resources', 'kraken_reports', 'merge_metaphlan', 'merge_humann',
+    'diversity_analysis', 'create_summary', 'upload_results'
+]
+
+MODEL_VERSION = 1
+EWMA_ALPHA = 0.2            # Weight of the newest duration in the running mean
+RECENT_DURATIONS = 64       # Durations kept per process for quantiles
+MIN_OBSERVATIONS = 3        # Below this the spread is widened to UNCERTAIN_CV
+UNCERTAIN_CV = 0.5          # Assumed coefficient of variation for barely observed processes
+INTERVAL = 0.9              # Coverage of the reported bounds
+INTERVAL_Z = 1.645          # Normal quantile for INTERVAL
+QUEUE_SLOTS = int(os.environ.get('ETA_QUEUE_SLOTS', '0')) or None
+
+def quantile(values, q):
+    """Nearest-rank quantile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+def process_type(name):
+    """Map a tracked process name such as "preprocess_reads_SRS011" to its process"""
+    for known in PER_SAMPLE_PROCESSES + SERIAL_PROCESSES:
+        if name == known or name.startswith(known + '_'):
+            return known
+    return name
+
+def expected_tasks(sample_count):
+    """Number of tasks of each process in a run over sample_count samples"""
+    expected = {name: sample_count for name in PER_SAMPLE_PROCESSES}
+    expected.update({name: 1 for name in SERIAL_PROCESSES})
+    return expected
+
+def samples_from_total_processes(total_processes):
+    """Invert the total computed by progress_init in microbiome_main.nf"""
+    return max(0, (total_processes - len(SERIAL_PROCESSES)) // len(PER_SAMPLE_PROCESSES))
+
+def format_time(seconds):
+    """Format seconds as "1h 2m 3s" """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours > 0:
+        return f"{hours}h {minutes}m {seconds}s"
+    elif minutes > 0:
+        return f"{minutes}m {seconds}s"
+    else:
+        return f"{seconds}s"
+
+class DurationModel:
+    """Exponentially weighted mean/variance and recent quantiles of one process's durations"""
+
+    def __init__(self, mean=None, variance=0.0, count=0, recent=None):
+        self.mean = mean
+        self.variance = variance
+        self.count = count
+        self.recent = list(recent or [])
+
+    def update(self, duration):
+        if self.mean is None:
+            self.mean = duration
+        else:
+            delta = duration - self.mean
+            self.mean += EWMA_ALPHA * delta
+            self.variance = (1 - EWMA_ALPHA) * (self.variance + EWMA_ALPHA * delta * delta)
+        self.count += 1
+        self.recent.append(duration)
+        del self.recent[:-RECENT_DURATIONS]
+
+    def std(self):
+        """Spread of a single task, widened while there are few observations"""
+        std = math.sqrt(self.variance)
+        if self.count < MIN_OBSERVATIONS:
+            std = max(std, UNCERTAIN_CV * (self.mean or 0.0))
+        return std
+
+    def quantiles(self):
+        return {f"p{int(q * 100)}": round(quantile(self.recent, q), 1) for q in (0.1, 0.5, 0.9)}
+
+    def remaining(self, elapsed):
+        """Expected time left for a task that has been running for elapsed seconds"""
+        longer = [duration for duration in self.recent if duration > elapsed]
+        if longer:
+            return sum(longer) / len(longer) - elapsed
+        return max(self.mean - elapsed, self.std(), 0.0)
+
+    def to_dict(self):
+        return {'mean': self.mean, 'variance': self.variance, 'count': self.count, 'recent': self.recent}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['mean'], data['variance'], data['count'], data['recent'])
+
+class EtaEstimator:
+    """
+    Remaining-time estimator for one workflow run.
+
+    Args:
+        prior: Optional fitted model (see fit_prior) used until a process has
+            been observed in this run, and for the calibration of the bounds
+    """
+
+    def __init__(self, prior=None):
+        prior = prior or {}
+        self.models = {}
+        self.prior = {name: DurationModel.from_dict(model) for name, model in prior.get('processes', {}).items()}
+        self.std_scale = prior.get('std_scale', 1.0)
+        self.completed = {}
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_complete = None
+
+    def observe(self, name, started_at, completed_at):
+        """Record a finished task; returns its duration or None if the start is unknown"""
+        kind = process_type(name)
+        self.completed[kind] = self.completed.get(kind, 0) + 1
+        if started_at is None or completed_at is None or completed_at < started_at:
+            return None
+        duration = float(completed_at - started_at)
+        self.models.setdefault(kind, DurationModel()).update(duration)
+        self.busy_seconds += duration
+        self.first_start = started_at if self.first_start is None else min(self.first_start, started_at)
+        self.last_complete = completed_at if self.last_complete is None else max(self.last_complete, completed_at)
+        return duration
+
+    def model(self, kind):
+        """Model for a process: observed in this run, else the prior, else the mean of all observed tasks"""
+        model = self.models.get(kind)
+        if model is not None and model.count >= MIN_OBSERVATIONS:
+            return model
+        prior = self.prior.get(kind)
+        if prior is not None:
+            return prior
+        if model is not None:
+            return model
+        observed = [m.mean for m in self.models.values()]
+        if observed:
+            return DurationModel(sum(observed) / len(observed))
+        return None
+
+    def parallelism(self, running=0):
+        """Tasks run concurrently so far: busy task-seconds over wall seconds"""
+        slots = 1.0
+        if self.last_complete is not None and self.last_complete > self.first_start:
+            slots = max(slots, self.busy_seconds / (self.last_complete - self.first_start))
+        slots = max(slots, float(running))
+        if QUEUE_SLOTS:
+            slots = min(slots, QUEUE_SLOTS)
+        return slots
+
+    def estimate(self, expected, running=None, elapsed=None):
+        """
+        Estimate the remaining seconds.
+
+        Args:
+            expected: {process: total tasks in the run}
+            running: Optional {process: [seconds each running task has run]}
+            elapsed: Seconds since the run started, used when nothing has been timed yet
+
+        Returns:
+            Dictionary with seconds, low, high and the parallelism assumed
+        """
+        running = running or {}
+        running_count = sum(len(tasks) for tasks in running.values())
+        slots = self.parallelism(running_count)
+        parallel_work = parallel_var = serial = serial_var = critical = 0.0
+
+        for kind in set(expected) | set(running):
+            in_flight = running.get(kind, [])
+            pending = max(0, expected.get(kind, 0) - self.completed.get(kind, 0) - len(in_flight))
+            if not pending and not in_flight:
+                continue
+            model = self.model(kind)
+            if model is None:
+                # Nothing timed yet: spread the elapsed time evenly over finished tasks
+                done = sum(self.completed.values())
+                mean = (elapsed or 0.0) / done if done else 0.0
+                model = DurationModel(mean, mean * mean)
+            std = model.std()
+            work = pending * model.mean + sum(model.remaining(age) for age in in_flight)
+            var = (pending + len(in_flight)) * std * std
+            if kind in SERIAL_PROCESSES:
+                serial += work
+                serial_var += var
+            else:
+                parallel_work += work
+                parallel_var += var
+                critical = max(critical, model.mean if pending else 0.0,
+                               max((model.remaining(age) for age in in_flight), default=0.0))
+
+        seconds = max(parallel_work / slots, critical) + serial
+        spread = INTERVAL_Z * self.std_scale * math.sqrt(parallel_var / (slots * slots) + serial_var)
+        return {
+            'seconds': round(seconds, 1),
+            'low': round(max(0.0, seconds - spread), 1),
+            'high': round(seconds + spread, 1),
+            'parallelism': round(slots, 2)
+        }
+
+    def to_dict(self):
+        return {
+            'version': MODEL_VERSION,
+            'processes': {name: model.to_dict() for name, model in self.models.items()},
+            'prior': {name: model.to_dict() for name, model in self.prior.items()},
+            'std_scale': self.std_scale,
+            'completed': self.completed,
+            'busy_seconds': self.busy_seconds,
+            'first_start': self.first_start,
+            'last_complete': self.last_complete
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        estimator = cls({'processes': data['prior'], 'std_scale': data['std_scale']})
+        estimator.models = {name: DurationModel.from_dict(model) for name, model in data['processes'].items()}
+        estimator.completed = data['completed']
+        estimator.busy_seconds = data['busy_seconds']
+        estimator.first_start = data['first_start']
+        estimator.last_complete = data['last_complete']
+        return estimator
+
+def running_ages(running_tasks, now):
+    """{process: [seconds each running task has run]} from a progress.json running_tasks map"""
+    running = {}
+    for task, started_at in running_tasks.items():
+        running.setdefault(process_type(task), []).append(max(0.0, float(now - started_at)))
+    return running
+
+def update_progress_eta(progress, name, status, started_at, completed_at, prior=None):
+    """
+    Fold a task event into the ETA model stored in a progress.json document.
+
+    A started event only records the task in running_tasks (name -> start
+    time), so the estimate counts it as in flight, as replay() does, instead
+    of as pending at the full mean. An end event removes it and times it.
+    completed_at is the time of the event either way.
+
+    Sets estimated_remaining_seconds with its low/high bounds and formatted
+    values; used by progress_tracker.sh and progress_agent.py.
+    """
+    state = progress.get('eta_model')
+    if state and state.get('version') == MODEL_VERSION:
+        estimator = EtaEstimator.from_dict(state)
+    else:
+        estimator = EtaEstimator(prior)
+    running_tasks = progress.setdefault('running_tasks', {})
+    if status == 'started':
+        running_tasks[name] = completed_at
+    else:
+        recorded = running_tasks.pop(name, None)
+        if started_at is None:
+            started_at = recorded
+        if status == 'completed':
+            estimator.observe(name, started_at, completed_at)
+
+    samples = samples_from_total_processes(int(progress.get('total_processes', 0)))
+    estimate = estimator.estimate(expected_tasks(samples), running_ages(running_tasks, completed_at),
+                                  elapsed=progress.get('elapsed_seconds'))
+    progress['eta_model'] = estimator.to_dict()
+    progress['estimated_remaining_seconds'] = math.ceil(estimate['seconds'])
+    progress['estimated_remaining_low_seconds'] = math.floor(estimate['low'])
+    progress['estimated_remaining_high_seconds'] = math.ceil(estimate['high'])
+    progress['estimated_remaining_formatted'] = format_time(estimate['seconds'])
+    progress['estimated_remaining_range'] = f"{format_time(estimate['low'])} - {format_time(estimate['high'])}"
+    progress['eta_interval'] = INTERVAL
+    return estimate
+
+def load_trace_tasks(path):
+    """
+    Read the timed tasks of a recorded run from a Nextflow trace (trace.raw = true).
+
+    Returns:
+        List of (process, start seconds, complete seconds), sorted by start
+    """
+    tasks = []
+    with open(path, 'r', newline='') as f:
+        for row in read_trace(f):
+            if (row.get('status') or '').strip() not in ('COMPLETED', 'CACHED'):
+                continue
+            start = parse_timestamp(row.get('start'))
+            if start is None:
+                continue
+            complete = parse_timestamp(row.get('complete'))
+            if complete is None:
+                complete = start + parse_duration(row.get('realtime')) * 1000
+            tasks.append((process_name(row), start / 1000.0, complete / 1000.0))
+    tasks.sort(key=lambda task: task[1])
+    return tasks
+
+def legacy_estimate(elapsed, completed, total):
+    """The previous estimate: average elapsed time per completed task times tasks left"""
+    if completed <= 0 or completed >= total:
+        return 0.0
+    return elapsed / completed * (total - completed)
+
+def replay(tasks, prior=None):
+    """
+    Replay a recorded run, estimating the remaining time at every task completion.
+
+    Returns:
+        List of per-completion points with the actual and estimated remaining seconds
+    """
+    if not tasks:
+        return []
+    run_start = min(task[1] for task in tasks)
+    run_end = max(task[2] for task in tasks)
+    expected = {}
+    for name, _, _ in tasks:
+        expected[name] = expected.get(name, 0) + 1
+
+    estimator = EtaEstimator(prior)
+    points = []
+    completions = sorted(tasks, key=lambda task: task[2])
+    for index, (name, start, complete) in enumerate(completions):
+        estimator.observe(name, start, complete)
+        if index == len(completions) - 1:
+            break
+        now = complete
+        running = {}
+        for other, other_start, other_complete in tasks:
+            if other_start <= now < other_complete:
+                running.setdefault(other, []).append(now - other_start)
+        estimate = estimator.estimate(expected, running, elapsed=now - run_start)
+        points.append({
+            'time': now - run_start,
+            'actual': run_end - now,
+            'estimate': estimate['seconds'],
+            'low': estimate['low'],
+            'high': estimate['high'],
+            'legacy': legacy_estimate(now - run_start, index + 1, len(tasks))
+        })
+    return points
+
+def score(points):
+    """
+    Accuracy of replayed estimates.
+
+    Returns:
+        Mean absolute error and mean absolute percentage error for the model
+        and the legacy estimate, and how often the actual remaining time fell
+        inside the bounds
+    """
+    if not points:
+        return {'points': 0}
+    scored = [point for point in points if point['actual'] > 0]
+
+    def mape(key):
+        return round(100 * sum(abs(p[key] - p['actual']) / p['actual'] for p in scored) / max(1, len(scored)), 1)
+
+    def mae(key):
+        return round(sum(abs(p[key] - p['actual']) for p in points) / len(points), 1)
+
+    inside = 0
+    for point in points:
+        if point['low'] <= point['actual'] <= point['high']:
+            inside += 1
+    return {
+        'points': len(points),
+        'mae_seconds': mae('estimate'),
+        'mape_percent': mape('estimate'),
+        'legacy_mae_seconds': mae('legacy'),
+        'legacy_mape_percent': mape('legacy'),
+        'coverage': round(inside / len(points), 3),
+        'target_coverage': INTERVAL
+    }
+
+def calibrate(points):
+    """Scale for the bounds that makes INTERVAL of the replayed actuals fall inside them"""
+    ratios = []
+    for point in points:
+        half_width = point['high'] - point['estimate']
+        if half_width > 0:
+            ratios.append(abs(point['actual'] - point['estimate']) / half_width)
+    if not ratios:
+        return 1.0
+    return round(max(quantile(ratios, INTERVAL), 0.1), 3)
+
+def fit_models(runs):
+    """Duration models per process from the tasks of recorded runs"""
+    processes = {}
+    for tasks in runs:
+        for name, start, complete in tasks:
+            processes.setdefault(name, DurationModel()).update(complete - start)
+    return {'version': MODEL_VERSION, 'processes': {name: model.to_dict() for name, model in processes.items()}}
+
+def fit_prior(traces):
+    """
+    Fit per-process duration models from recorded runs.
+
+    The bound scale is calibrated by replaying each run against the models
+    fitted from the other runs (or against itself when only one is given).
+    """
+    runs = [load_trace_tasks(path) for path in traces]
+    points = []
+    for index, tasks in enumerate(runs):
+        others = runs[:index] + runs[index + 1:]
+        points.extend(replay(tasks, fit_models(others or [tasks])))
+    prior = fit_models(runs)
+    prior['std_scale'] = calibrate(points)
+    prior['runs'] = len(runs)
+    return prior
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit and score remaining-time models from Nextflow traces')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = subparsers.add_parser('fit', help='Fit a prior from recorded runs')
+    fit_parser.add_argument('traces', nargs='+', help='Nextflow trace files (trace.raw = true)')
+    fit_parser.add_argument('--output', default='eta_prior.json', help='Output JSON file (default: eta_prior.json)')
+
+    replay_parser = subparsers.add_parser('replay', help='Score ETA accuracy against recorded runs')
+    replay_parser.add_argument('traces', nargs='+', help='Nextflow trace files (trace.raw = true)')
+    replay_parser.add_argument('--prior', help='Prior from "fit" (default: learn within each run only)')
+    replay_parser.add_argument('--output', help='Write the per-completion points and scores as JSON')
+
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        prior = fit_prior(args.traces)
+        with open(args.output, 'w') as f:
+            json.dump(prior, f, indent=2)
+        print(f"ETA prior written to: {args.output} ({len(prior['processes'])} processes, "
+              f"bound scale {prior['std_scale']})")
+        for name, model in sorted(prior['processes'].items()):
+            print(f"  {name}: mean {format_time(model['mean'])} over {model['count']} tasks")
+        return
+
+    prior = None
+    if args.prior:
+        with open(args.prior, 'r') as f:
+            prior = json.load(f)
+    report = {}
+    for path in args.traces:
+        points = replay(load_trace_tasks(path), prior)
+        report[path] = {'score': score(points), 'points': points}
+        result = report[path]['score']
+        if not result['points']:
+            print(f"{path}: no timed tasks")
+            continue
+        print(f"{path}: {result['points']} estimates, MAPE {result['mape_percent']}% "
+              f"(legacy {result['legacy_mape_percent']}%), MAE {format_time(result['mae_seconds'])} "
+              f"(legacy {format_time(result['legacy_mae_seconds'])}), "
+              f"{result['coverage'] * 100:.0f}% inside the {INTERVAL * 100:.0f}% bounds")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
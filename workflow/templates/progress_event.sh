@@ -0,0 +1,35 @@
+#!/bin/bash
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# progress_event.sh - Hand a task event to the node's progress agent
+#
+# Called from beforeScript/afterScript with the same environment as
+# progress_tracker.sh (PROCESS_NAME, PROCESS_STATUS, WORKFLOW_ID, BUCKET_NAME,
+# TOTAL_PROCESSES). The event is written into the spool directory that
+# progress_agent.py drains; apart from the final rename everything runs in
+# bash builtins, so a task pays a few milliseconds instead of several aws and
+# python3 start-ups. Exits non-zero when no agent spool exists, so callers
+# can fall back to progress_tracker.sh.
+
+SPOOL="${PROGRESS_AGENT_SPOOL:-/tmp/progress-agent}"
+[ -d "${SPOOL}/incoming" ] || exit 1
+
+printf -v TIMESTAMP '%(%s)T' -1
+
+# beforeScript and afterScript run in the same task directory; the start time
+# left here gives the task duration for the ETA model
+STARTED_AT=null
+if [ "${PROCESS_STATUS}" == "started" ]; then
+  echo "${TIMESTAMP}" > .progress_started_at
+elif [ -f .progress_started_at ]; then
+  read -r STARTED_AT < .progress_started_at
+  rm -f .progress_started_at
+fi
+
+EVENT="${SPOOL}/incoming/${TIMESTAMP}.${HOSTNAME}.$$.${RANDOM}"
+printf '{"process":"%s","status":"%s","timestamp":%s,"started_at":%s,"workflow_id":"%s","bucket":"%s","total_processes":%s}\n' \
+  "${PROCESS_NAME}" "${PROCESS_STATUS}" "${TIMESTAMP}" "${STARTED_AT:-null}" "${WORKFLOW_ID}" "${BUCKET_NAME}" \
+  "${TOTAL_PROCESSES:-0}" > "${EVENT}.tmp" || exit 1
+# The agent only picks up complete files
+mv "${EVENT}.tmp" "${EVENT}.event"
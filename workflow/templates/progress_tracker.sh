@@ -29,15 +29,22 @@ EOF
 # Log locally
 echo "[Progress Tracker] ${PROCESS_NAME} ${PROCESS_STATUS} at ${HUMAN_TIME}"
 
+# beforeScript and afterScript run in the same task directory, so the start
+# time left here gives the task duration for the ETA model
+if [ "${PROCESS_STATUS}" == "started" ]; then
+  echo "${TIMESTAMP}" > .progress_started_at
+fi
+
 # Upload to S3
 # Use a consistent filename for the latest update
 aws s3 cp progress_update.json s3://${BUCKET_NAME}/progress/${WORKFLOW_ID}/latest_update.json
+aws s3 cp progress_update.json s3://${BUCKET_NAME}/progress/latest/latest_update.json
 
 # Also save with timestamp for history
 aws s3 cp progress_update.json s3://${BUCKET_NAME}/progress/${WORKFLOW_ID}/updates/${TIMESTAMP}_${PROCESS_NAME}_${PROCESS_STATUS}.json
 
-# If this is a process completion, update the master progress file
-if [ "${PROCESS_STATUS}" == "completed" ] || [ "${PROCESS_STATUS}" == "failed" ]; then
+# Update the master progress file; starts are recorded too, so the ETA counts running tasks as in flight
+if [ "${PROCESS_STATUS}" == "completed" ] || [ "${PROCESS_STATUS}" == "failed" ] || [ "${PROCESS_STATUS}" == "started" ]; then
   # Try to get the existing progress file, create new one if it doesn't exist
   aws s3 cp s3://${BUCKET_NAME}/progress/${WORKFLOW_ID}/progress.json ./existing_progress.json || {
     # Initialize progress file with workflow start info
@@ -57,12 +64,24 @@ if [ "${PROCESS_STATUS}" == "completed" ] || [ "${PROCESS_STATUS}" == "failed" ]
 EOF
   }
 
+  # Fetch the ETA model; the previous average-per-process estimate is used if this fails
+  # (kept out of the task directory so staged inputs are never overwritten)
+  export STARTED_AT=$(cat .progress_started_at 2>/dev/null || true)
+  export ETA_DIR=$(mktemp -d)
+  aws s3 cp s3://${BUCKET_NAME}/workflow/templates/progress_eta.py ${ETA_DIR}/ > /dev/null 2>&1 || true
+  aws s3 cp s3://${BUCKET_NAME}/workflow/templates/trace_metrics.py ${ETA_DIR}/ > /dev/null 2>&1 || true
+  if ! grep -q '"eta_model"' existing_progress.json; then
+    # Durations fitted from earlier runs with progress_eta.py fit, if any were published
+    aws s3 cp s3://${BUCKET_NAME}/progress/eta_prior.json ${ETA_DIR}/ > /dev/null 2>&1 || true
+  fi
+
   # Update the progress file
   python3 - << EOF
 import json
 import time
 import os
 import math
+import sys
 
 # Load existing progress
 with open('existing_progress.json', 'r') as f:
@@ -77,11 +96,12 @@ timestamp = int(os.environ.get('TIMESTAMP', time.time()))
 if 'processes' not in progress:
     progress['processes'] = {}
 
-progress['processes'][process_name] = {
-    'status': process_status,
-    'last_updated': timestamp,
-    'last_updated_human': os.environ.get('HUMAN_TIME')
-}
+if process_status != 'started':
+    progress['processes'][process_name] = {
+        'status': process_status,
+        'last_updated': timestamp,
+        'last_updated_human': os.environ.get('HUMAN_TIME')
+    }
 
 # Count completed processes
 completed_count = sum(1 for p in progress['processes'].values() if p.get('status') == 'completed')
@@ -101,8 +121,22 @@ else:
 start_time = progress.get('start_time', timestamp)
 progress['elapsed_seconds'] = timestamp - start_time
 
-# Estimate remaining time based on completed work
-if completed_count > 0 and completed_count < total_processes:
+# Estimate remaining time from per-process duration models
+try:
+    sys.path.insert(0, os.environ.get('ETA_DIR', ''))
+    from progress_eta import update_progress_eta
+except ImportError:
+    update_progress_eta = None
+
+if update_progress_eta is not None:
+    prior = None
+    prior_path = os.path.join(os.environ.get('ETA_DIR', ''), 'eta_prior.json')
+    if os.path.exists(prior_path):
+        with open(prior_path, 'r') as f:
+            prior = json.load(f)
+    started_at = os.environ.get('STARTED_AT')
+    update_progress_eta(progress, process_name, process_status, int(started_at) if started_at else None, timestamp, prior)
+elif completed_count > 0 and completed_count < total_processes:
     avg_time_per_process = progress['elapsed_seconds'] / completed_count
     remaining_processes = total_processes - completed_count
     progress['estimated_remaining_seconds'] = math.ceil(avg_time_per_process * remaining_processes)
@@ -148,5 +182,11 @@ fi
 rm -f progress_update.json
 rm -f existing_progress.json
 rm -f updated_progress.json 2>/dev/null || true
+if [ -n "${ETA_DIR}" ]; then
+  rm -rf "${ETA_DIR}"
+fi
+if [ "${PROCESS_STATUS}" != "started" ]; then
+  rm -f .progress_started_at
+fi
 
 exit 0
\ No newline at end of file
@@ -0,0 +1,89 @@
+#!/bin/bash
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# publish_run_metrics.sh - Measure a finished run from its trace and publish the results
+#
+# Usage: publish_run_metrics.sh TRACE RUN_START_MS OUTPUT [TASK_INPUTS [SAMPLES [PRICE_TABLE]]]
+#
+# Called from workflow.onComplete on the head node. Nextflow writes the trace
+# there as tasks finish, so once the run has ended it holds every task;
+# trace_metrics.py keeps those submitted since RUN_START_MS. The measured
+# execution_metrics.json is published to OUTPUT/reports and replaces the
+# per-sample estimates that create_summary wrote into the summary and its
+# dashboard overview while the last tasks were still running. cost_report.py
+# then prices the run from those metrics and charges every task to its
+# process, sample and body site (from the SAMPLES sheet) at PRICE_TABLE's
+# prices, as OUTPUT/reports/cost_report.json. TASK_INPUTS, the bytes
+# getResourceConfig sized each per-sample task with, is published next to
+# the trace for resource_profile.py. OUTPUT and SAMPLES are s3:// or local
+# paths.
+
+TRACE=$1
+RUN_START_MS=$2
+OUTPUT=$3
+TASK_INPUTS=${4:-}
+SAMPLES=${5:-}
+TEMPLATES=$(cd "$(dirname "$0")" && pwd)
+PRICE_TABLE=${6:-${TEMPLATES}/price_table.json}
+
+# Copy one file between local paths and S3
+copy() {
+  if [[ "$1" == s3://* || "$2" == s3://* ]]; then
+    aws s3 cp "$1" "$2" --quiet
+  else
+    mkdir -p "$(dirname "$2")" && cp "$1" "$2"
+  fi
+}
+
+copy_dir() {
+  if [[ "$2" == s3://* ]]; then
+    aws s3 cp "$1" "$2" --recursive --quiet
+  else
+    mkdir -p "$2" && cp -r "$1"/. "$2"/
+  fi
+}
+
+if [ ! -s "${TRACE}" ]; then
+  echo "No trace at ${TRACE}; execution metrics were not measured" >&2
+  exit 1
+fi
+
+WORK=$(mktemp -d)
+trap 'rm -rf "${WORK}"' EXIT
+
+# Keep the trace with the other reports: resource_profile.py learns from past runs' traces
+copy "${TRACE}" "${OUTPUT}/reports/nextflow_trace.txt"
+if [ -n "${TASK_INPUTS}" ] && [ -s "${TASK_INPUTS}" ]; then
+  copy "${TASK_INPUTS}" "${OUTPUT}/reports/task_inputs.tsv"
+fi
+
+SUMMARY_ARGS=()
+if copy "${OUTPUT}/summary/microbiome_summary.json" "${WORK}/microbiome_summary.json" 2>/dev/null; then
+  SUMMARY_ARGS=(--summary "${WORK}/microbiome_summary.json")
+fi
+
+python3 "${TEMPLATES}/trace_metrics.py" "${TRACE}" --since "${RUN_START_MS}" \
+    --output "${WORK}/execution_metrics.json" "${SUMMARY_ARGS[@]}" || exit 1
+if [ ! -s "${WORK}/execution_metrics.json" ]; then
+  # No task of this run finished, so the summary keeps its estimates
+  exit 1
+fi
+copy "${WORK}/execution_metrics.json" "${OUTPUT}/reports/execution_metrics.json"
+
+if [ ${#SUMMARY_ARGS[@]} -gt 0 ]; then
+  # Only the overview changes; the shards keep their content hashes
+  python3 "${TEMPLATES}/dashboard_products.py" "${WORK}/microbiome_summary.json" --output-dir "${WORK}/dashboard" || exit 1
+  copy "${WORK}/microbiome_summary.json" "${OUTPUT}/summary/microbiome_summary.json"
+  copy_dir "${WORK}/dashboard" "${OUTPUT}/summary/dashboard"
+fi
+
+echo "Published measured execution metrics to ${OUTPUT}/reports/execution_metrics.json"
+
+COST_ARGS=(--trace "${TRACE}" --since "${RUN_START_MS}" --price-table "${PRICE_TABLE}")
+if [ -n "${SAMPLES}" ] && copy "${SAMPLES}" "${WORK}/sample_list.csv"; then
+  COST_ARGS+=(--samples "${WORK}/sample_list.csv")
+fi
+python3 "${TEMPLATES}/cost_report.py" --execution-metrics "${WORK}/execution_metrics.json" \
+    --output "${WORK}/cost_report.json" "${COST_ARGS[@]}" || exit 1
+copy "${WORK}/cost_report.json" "${OUTPUT}/reports/cost_report.json"
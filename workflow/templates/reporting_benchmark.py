@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# reporting_benchmark.py - Benchmark the reporting stages on synthetic cohorts
+#
+# Extracts the Python heredocs of kraken_reports, diversity_analysis and
+# create_summary from microbiome_main.nf, stages a synthetic cohort from
+# synthetic_cohort.py the way Nextflow would, and runs each stage in its own
+# process to record wall time, peak RSS and output size per scale point.
+# Every run is appended to a JSON Lines history so that "compare" can flag
+# regressions between runs.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_cohort import generate_cohort
+
+TEMPLATES_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKFLOW = os.path.join(os.path.dirname(TEMPLATES_DIR), 'microbiome_main.nf')
+DEFAULT_HISTORY = 'reporting_benchmark_history.jsonl'
+
+STAGES = ['kraken_reports', 'diversity_analysis', 'create_summary']
+
+# Inputs each stage reads, by the name the stage sees them under
+STAGE_INPUTS = {
+    'kraken_reports': ['reports', 'metadata.csv'],
+    'diversity_analysis': ['metaphlan_merged.tsv', 'metadata.csv'],
+    'create_summary': ['kraken_species_counts.tsv', 'kraken_phylum_counts.tsv', 'metaphlan_merged.tsv',
+                       'humann_pathabundance_relab_merged.tsv', 'alpha_diversity.tsv', 'pcoa_coordinates.tsv']
+}
+
+# Nextflow input variables referenced by the heredocs
+STAGE_VARIABLES = {
+    'diversity_analysis': {'metaphlan_merged': 'metaphlan_merged.tsv'},
+    'create_summary': {
+        'kraken_species_counts': 'kraken_species_counts.tsv',
+        'kraken_phylum_counts': 'kraken_phylum_counts.tsv',
+        'metaphlan_merged': 'metaphlan_merged.tsv',
+        'humann_pathabundance_relab': 'humann_pathabundance_relab_merged.tsv',
+        'alpha_diversity': 'alpha_diversity.tsv',
+        'pcoa_coords': 'pcoa_coordinates.tsv'
+    }
+}
+
+# Python steps a stage's script runs after its heredoc
+STAGE_COMMANDS = {
+    'create_summary': [['dashboard_products.py', 'microbiome_summary.json', '--output-dir', 'dashboard']]
+}
+
+# Below these differences a change is treated as noise
+NOISE_FLOOR = {'wall_seconds': 0.1, 'peak_rss_mb': 5.0, 'output_bytes': 0}
+
+STAGE_SCRIPT = '_stage.py'
+STAGE_LOGS = ('_stdout.log', '_stderr.log')
+
+def process_script(nf_text, process):
+    """The body of a DSL1 process, up to the end of its script block"""
+    # Heredocs can close braces in the first column, so match the closing quotes
+    match = re.search(r'^process ' + re.escape(process) + r' \{\n(.*?^    """)\n\}\n', nf_text, re.M | re.S)
+    if match is None:
+        raise ValueError(f"Process {process} not found in the workflow")
+    return match.group(1)
+
+def render_groovy(text, variables, process=''):
+    """Resolve ${...} references and backslash escapes of a Groovy triple-quoted string"""
+    def replace(match):
+        if match.group(1) is not None:
+            name = match.group(1)
+            if name not in variables:
+                raise ValueError(f"Unresolved Nextflow variable ${{{name}}} in {process}")
+            return variables[name]
+        return match.group(0)[1]
+    return re.sub(r'\$\{([^}]+)\}|\\[\\$]', replace, text)
+
+def extract_stage(nf_text, process, variables=None):
+    """
+    Python source of a process's heredocs and the templates it stages.
+
+    Returns:
+        (source, [template file names])
+    """
+    body = process_script(nf_text, process)
+    blocks = re.findall(r'python3 <<EOF\n(.*?)\nEOF\n', body, re.S)
+    if not blocks:
+        raise ValueError(f"Process {process} has no Python heredoc")
+    source = render_groovy('\n\n'.join(blocks), variables or {}, process)
+    templates = re.findall(r"path\('([^']+\.py)'\) from file\(\"\$\{baseDir\}/templates/[^\"]+\"\)", body)
+    return source + '\n', templates
+
+def run_commands(workdir, commands):
+    """
+    Run commands in workdir one after another, each in its own process.
+
+    Returns:
+        {"status", "wall_seconds", "peak_rss_mb", "error"}
+    """
+    result = {'status': 'ok', 'wall_seconds': 0.0, 'peak_rss_mb': 0.0}
+    stdout_path, stderr_path = (os.path.join(workdir, name) for name in STAGE_LOGS)
+    # Bytecode caches of the staged templates are not stage outputs
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    for command in commands:
+        with open(stdout_path, 'a') as stdout, open(stderr_path, 'a') as stderr:
+            start = time.perf_counter()
+            process = subprocess.Popen([sys.executable] + command, cwd=workdir, stdout=stdout, stderr=stderr,
+                                       env=env)
+            # wait4 reports the usage of this child alone, unlike RUSAGE_CHILDREN
+            _, status, usage = os.wait4(process.pid, 0)
+            result['wall_seconds'] += time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+        result['peak_rss_mb'] = max(result['peak_rss_mb'], peak)
+        if process.returncode != 0:
+            with open(stderr_path, 'r') as f:
+                lines = [line.strip() for line in f if line.strip()]
+            result['status'] = 'failed'
+            result['error'] = lines[-1] if lines else f"exit status {process.returncode}"
+            break
+    result['wall_seconds'] = round(result['wall_seconds'], 3)
+    result['peak_rss_mb'] = round(result['peak_rss_mb'], 1)
+    return result
+
+def stage_outputs(workdir, staged):
+    """Sizes of the files a stage wrote, excluding what was staged into it"""
+    outputs = {}
+    for root, dirs, names in os.walk(workdir):
+        dirs[:] = [name for name in dirs if os.path.relpath(os.path.join(root, name), workdir) not in staged]
+        for name in names:
+            path = os.path.relpath(os.path.join(root, name), workdir)
+            if path not in staged and name not in (STAGE_SCRIPT,) + STAGE_LOGS:
+                outputs[path] = os.path.getsize(os.path.join(root, name))
+    return dict(sorted(outputs.items()))
+
+def run_stage(process, nf_text, inputs, workdir):
+    """
+    Stage inputs into workdir and run one process's Python logic.
+
+    Args:
+        inputs: Mapping of staged name to the file or directory providing it
+    """
+    source, templates = extract_stage(nf_text, process, STAGE_VARIABLES.get(process))
+    os.makedirs(workdir)
+    staged = set()
+    for name in STAGE_INPUTS[process]:
+        os.symlink(os.path.abspath(inputs[name]), os.path.join(workdir, name))
+        staged.add(name)
+    for name in templates:
+        shutil.copy(os.path.join(TEMPLATES_DIR, name), os.path.join(workdir, name))
+        staged.add(name)
+    with open(os.path.join(workdir, STAGE_SCRIPT), 'w') as f:
+        f.write(source)
+
+    commands = [[STAGE_SCRIPT]] + STAGE_COMMANDS.get(process, [])
+    result = run_commands(workdir, commands)
+    result['outputs'] = stage_outputs(workdir, staged)
+    result['output_bytes'] = sum(result['outputs'].values())
+    return result
+
+def run_scale_point(work_root, samples, species=500, body_sites=3, pathways=300, gene_families=0, seed=1,
+                    repeat=1, workflow=WORKFLOW):
+    """
+    Generate one cohort and run the reporting stages on it in pipeline order.
+
+    Later stages read the outputs of earlier ones; when diversity_analysis
+    cannot run (scikit-bio is not installed) create_summary falls back to the
+    cohort's reference diversity tables. With repeat > 1 the fastest wall time
+    and the largest peak RSS are kept.
+    """
+    with open(workflow, 'r') as f:
+        nf_text = f.read()
+    cohort_dir = os.path.join(work_root, 'cohort')
+    manifest = generate_cohort(cohort_dir, samples, species, body_sites, pathways, gene_families, seed=seed)
+    available = {name: os.path.join(cohort_dir, name)
+                 for name in ('reports', 'metadata.csv', 'metaphlan_merged.tsv',
+                              'humann_pathabundance_relab_merged.tsv')}
+    for name in ('alpha_diversity.tsv', 'pcoa_coordinates.tsv'):
+        available[name] = os.path.join(cohort_dir, 'diversity', name)
+    sources = {name: 'synthetic' for name in available}
+
+    stages = {}
+    for process in STAGES:
+        missing = [name for name in STAGE_INPUTS[process] if name not in available]
+        if missing:
+            stages[process] = {'status': 'skipped', 'error': f"missing inputs: {', '.join(missing)}"}
+            continue
+        runs = [run_stage(process, nf_text, available, os.path.join(work_root, f"{process}.{attempt}"))
+                for attempt in range(repeat)]
+        result = runs[-1]
+        if result['status'] == 'ok':
+            result['wall_seconds'] = min(run['wall_seconds'] for run in runs)
+            result['peak_rss_mb'] = max(run['peak_rss_mb'] for run in runs)
+            result['inputs'] = {name: sources[name] for name in STAGE_INPUTS[process]}
+            for name in result['outputs']:
+                available[name] = os.path.join(work_root, f"{process}.{repeat - 1}", name)
+                sources[name] = process
+        stages[process] = result
+
+    return {
+        'samples': samples,
+        'species': species,
+        'body_sites': body_sites,
+        'pathways': pathways,
+        'gene_families': gene_families,
+        'seed': seed,
+        'species_per_sample': manifest['species_per_sample'],
+        'input_bytes': manifest['input_bytes'],
+        'stages': stages
+    }
+
+def git_commit(path):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(path),
+                                       stderr=subprocess.DEVNULL, text=True).strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(scales, species=500, body_sites=3, pathways=300, gene_families=0, seed=1, repeat=1,
+                  workflow=WORKFLOW, label=None, keep_dir=None):
+    """
+    Run every scale point (number of samples) and return the run record.
+    Work directories are removed afterwards unless keep_dir is given.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    record = {
+        'run_id': now.strftime('%Y%m%dT%H%M%SZ'),
+        'created_at': now.isoformat(),
+        'label': label,
+        'commit': git_commit(workflow),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'results': []
+    }
+    root = keep_dir or tempfile.mkdtemp(prefix='reporting_benchmark_')
+    try:
+        for samples in scales:
+            work_root = os.path.join(root, f"samples_{samples}")
+            record['results'].append(run_scale_point(work_root, samples, species, body_sites, pathways,
+                                                     gene_families, seed, repeat, workflow))
+    finally:
+        if keep_dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return record
+
+def append_history(path, record):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+def load_history(path):
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def scale_key(result):
+    return tuple(result[field] for field in ('samples', 'species', 'body_sites', 'pathways', 'gene_families', 'seed'))
+
+def compare_runs(baseline, current, threshold=0.25):
+    """
+    Compare two run records scale point by scale point.
+
+    A metric regresses when it grew by more than threshold (relative) and by
+    more than its noise floor; a stage that ran in the baseline but not in the
+    current run is always a regression.
+
+    Returns:
+        List of {"samples", "stage", "metric", "baseline", "current", "change", "regression"}
+    """
+    baseline_results = {scale_key(result): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        previous = baseline_results.get(scale_key(result))
+        if previous is None:
+            continue
+        for stage, stats in result['stages'].items():
+            before = previous['stages'].get(stage)
+            if before is None or before['status'] != 'ok':
+                continue
+            if stats['status'] != 'ok':
+                rows.append({'samples': result['samples'], 'stage': stage, 'metric': 'status',
+                             'baseline': 'ok', 'current': stats['status'], 'change': None, 'regression': True})
+                continue
+            for metric, floor in NOISE_FLOOR.items():
+                old, new = before[metric], stats[metric]
+                change = (new - old) / old if old else None
+                rows.append({
+                    'samples': result['samples'], 'stage': stage, 'metric': metric,
+                    'baseline': old, 'current': new,
+                    'change': round(change, 3) if change is not None else None,
+                    'regression': new - old > floor and (change is None or change > threshold)
+                })
+    return rows
+
+def find_run(history, run_id):
+    for record in history:
+        if record['run_id'] == run_id or record.get('label') == run_id:
+            return record
+    raise ValueError(f"Run {run_id} not found in the history")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the reporting stages on synthetic cohorts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark and append the results to the history')
+    run_parser.add_argument('--samples', type=int, nargs='+', default=[50, 200, 1000],
+                            help='Samples per scale point (default: 50 200 1000)')
+    run_parser.add_argument('--species', type=int, default=500, help='Species in the catalog (default: 500)')
+    run_parser.add_argument('--body-sites', type=int, default=3, help='Number of body sites (default: 3)')
+    run_parser.add_argument('--pathways', type=int, default=300, help='Pathways (default: 300)')
+    run_parser.add_argument('--gene-families', type=int, default=0,
+                            help='Gene families; no benchmarked stage reads them (default: 0)')
+    run_parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    run_parser.add_argument('--repeat', type=int, default=1, help='Runs per stage, keeping the fastest (default: 1)')
+    run_parser.add_argument('--workflow', default=WORKFLOW, help='Workflow to extract the stages from')
+    run_parser.add_argument('--label', help='Name for this run, usable with "compare"')
+    run_parser.add_argument('--keep', help='Keep cohorts and stage outputs in this directory')
+    run_parser.add_argument('--history', default=DEFAULT_HISTORY,
+                            help=f"JSON Lines file to append the run to (default: {DEFAULT_HISTORY})")
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two runs from the history')
+    compare_parser.add_argument('--history', default=DEFAULT_HISTORY,
+                                help=f"JSON Lines history (default: {DEFAULT_HISTORY})")
+    compare_parser.add_argument('--baseline', help='Run ID or label of the baseline (default: the previous run)')
+    compare_parser.add_argument('--current', help='Run ID or label to check (default: the latest run)')
+    compare_parser.add_argument('--threshold', type=float, default=0.25,
+                                help='Relative growth counted as a regression (default: 0.25)')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        record = run_benchmark(args.samples, args.species, args.body_sites, args.pathways, args.gene_families,
+                               args.seed, args.repeat, args.workflow, args.label, args.keep)
+        for result in record['results']:
+            for stage, stats in result['stages'].items():
+                if stats['status'] != 'ok':
+                    print(f"{result['samples']:>6} samples  {stage:20s} {stats['status']}: {stats['error']}")
+                    continue
+                print(f"{result['samples']:>6} samples  {stage:20s} {stats['wall_seconds']:>8.2f} s  "
+                      f"{stats['peak_rss_mb']:>8.1f} MB peak  {stats['output_bytes'] / 1e6:>8.2f} MB written")
+        append_history(args.history, record)
+        print(f"Run {record['run_id']} appended to: {args.history}")
+        return
+
+    history = load_history(args.history)
+    current = find_run(history, args.current) if args.current else history[-1]
+    if args.baseline:
+        baseline = find_run(history, args.baseline)
+    else:
+        earlier = history[:history.index(current)]
+        if not earlier:
+            print("No earlier run to compare against")
+            return
+        baseline = earlier[-1]
+    rows = compare_runs(baseline, current, args.threshold)
+    print(f"Comparing run {current['run_id']} against {baseline['run_id']}")
+    for row in rows:
+        change = f"{row['change'] * 100:+.0f}%" if row['change'] is not None else 'n/a'
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f"{row['samples']:>6} samples  {row['stage']:20s} {row['metric']:14s} "
+              f"{row['baseline']!s:>12} -> {row['current']!s:>12}  {change:>6}  {flag}")
+    if any(row['regression'] for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# resource_profile.py - Learn per-process CPU and memory requirements from past traces
+
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from trace_metrics import parse_percent, parse_size, process_name, is_gpu_task, read_trace
+
+# The params.resources key each process sizes itself with through getResourceConfig.
+# Processes that do not query getResourceConfig are not learned.
+RESOURCE_KEYS = {
+    'preprocess_reads': 'preprocess',
+    'taxonomic_classification_kraken': 'kraken',
+    'metaphlan_analysis': 'metaphlan',
+    'merge_humann': 'humann',
+    'kraken_reports': 'reporting',
+    'merge_metaphlan': 'reporting',
+    'diversity_analysis': 'reporting',
+    'create_summary': 'reporting'
+}
+# Keys getResourceConfig is queried with a per-task input size; the others are queried without one
+PER_SAMPLE_KEYS = {'preprocess', 'kraken', 'kraken_cpu', 'metaphlan'}
+
+PROFILE_VERSION = 1
+MIN_TASKS_FOR_FIT = 3      # Below this a flat p95 memory is used instead of a fit
+MEMORY_QUANTILE = 0.95     # Residual quantile added as headroom above the fit
+CPU_QUANTILE = 0.90        # Quantile of effective cores used
+SAFETY_FACTOR = 1.1        # Margin on top of the learned memory requirement
+MIN_MEMORY_GB = 1.0
+GB = 1024 ** 3
+
+def resource_key(row, task_inputs=None):
+    """
+    Get the params.resources key a trace row was sized with, or None.
+
+    getResourceConfig switches Kraken to kraken_cpu on nodes without a GPU;
+    the key it recorded in task_inputs says which one a task used.
+    """
+    key = RESOURCE_KEYS.get(process_name(row))
+    if key != 'kraken':
+        return key
+    tag = (row.get('tag') or '').strip()
+    for recorded in ('kraken', 'kraken_cpu'):
+        if task_inputs and (recorded, tag) in task_inputs:
+            return recorded
+    return 'kraken' if is_gpu_task(row) else 'kraken_cpu'
+
+def quantile(values, q):
+    """Nearest-rank quantile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+def fit_linear(xs, ys):
+    """
+    Least-squares fit of y = intercept + slope * x.
+
+    The slope is clamped at zero so larger inputs never get less memory.
+
+    Returns:
+        Tuple of (intercept, slope)
+    """
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return mean_y, 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+    slope = max(0.0, slope)
+    return mean_y - slope * mean_x, slope
+
+def load_task_inputs(path):
+    """
+    Load the input bytes tasks were sized with from the pipeline's task_inputs.tsv.
+
+    Each row has the resource key, the task tag (sample_id) and the bytes
+    getResourceConfig was queried with, e.g. the trimmed reads for Kraken.
+
+    Returns:
+        Dictionary mapping (resource key, tag) to input bytes
+    """
+    task_inputs = {}
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            task_inputs[(row['resource_key'], row['tag'])] = float(row['input_bytes'])
+    return task_inputs
+
+def collect_observations(rows, task_inputs=None, skipped=None):
+    """
+    Collect (input_gb, peak_rss_gb, cores_used) observations per resource key.
+
+    Only successful tasks of processes that query getResourceConfig are
+    used. Per-sample keys take their input size from task_inputs, the bytes
+    the pipeline sized the task with; the bytes a task read (rchar) also
+    count database reads and are not used. Tasks of a per-sample key without
+    a recorded size are left out and counted in the optional skipped
+    dictionary. Other keys are queried without an input size, so they are
+    recorded at zero input.
+    """
+    observations = {}
+    for row in rows:
+        if (row.get('status') or 'COMPLETED').strip() not in ('COMPLETED', 'CACHED'):
+            continue
+        key = resource_key(row, task_inputs)
+        if key is None:
+            continue
+        input_bytes = 0.0
+        if key in PER_SAMPLE_KEYS:
+            tag = (row.get('tag') or '').strip()
+            if not task_inputs or (key, tag) not in task_inputs:
+                if skipped is not None:
+                    skipped[key] = skipped.get(key, 0) + 1
+                continue
+            input_bytes = task_inputs[(key, tag)]
+        observations.setdefault(key, []).append((
+            input_bytes / GB,
+            parse_size(row.get('peak_rss') or row.get('rss')) / GB,
+            parse_percent(row.get('%cpu')) / 100.0
+        ))
+    return observations
+
+def build_profile(observations):
+    """
+    Fit a memory model and CPU requirement for each resource key.
+
+    Returns:
+        Resource profile dictionary consumed by getResourceConfig
+    """
+    processes = {}
+    total = 0
+    for key, points in sorted(observations.items()):
+        total += len(points)
+        sizes = [p[0] for p in points]
+        memory = [p[1] for p in points]
+        cores = [p[2] for p in points]
+
+        if len(points) >= MIN_TASKS_FOR_FIT:
+            intercept, slope = fit_linear(sizes, memory)
+            residuals = [m - (intercept + slope * s) for s, m in zip(sizes, memory)]
+            headroom = max(0.0, quantile(residuals, MEMORY_QUANTILE))
+        else:
+            intercept, slope, headroom = quantile(memory, MEMORY_QUANTILE), 0.0, 0.0
+
+        processes[key] = {
+            'tasks': len(points),
+            'cpus': max(1, math.ceil(quantile(cores, CPU_QUANTILE))),
+            'memory_intercept_gb': round(max(0.0, intercept), 4),
+            'memory_per_input_gb': round(slope, 4),
+            'memory_headroom_gb': round(headroom, 4),
+            'memory_min_gb': MIN_MEMORY_GB,
+            'safety_factor': SAFETY_FACTOR,
+            'max_input_gb': round(max(sizes), 3)
+        }
+
+    return {
+        'version': PROFILE_VERSION,
+        'generated_at': datetime.datetime.now().isoformat(),
+        'tasks_analyzed': total,
+        'processes': processes
+    }
+
+def recommend(profile, key, input_bytes=0):
+    """
+    Resource request for a task of the given input size.
+
+    Mirrors getResourceConfig in microbiome_main.nf.
+
+    Returns:
+        Dictionary with cpus and memory_gb, or None if the key was not learned
+    """
+    learned = profile.get('processes', {}).get(key)
+    if not learned:
+        return None
+    memory_gb = (learned['memory_intercept_gb']
+                 + learned['memory_per_input_gb'] * input_bytes / GB
+                 + learned['memory_headroom_gb']) * learned['safety_factor']
+    return {
+        'cpus': learned['cpus'],
+        'memory_gb': max(learned['memory_min_gb'], math.ceil(memory_gb))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Learn a resource profile from historical Nextflow traces')
+    parser.add_argument('traces', nargs='+', help='Nextflow trace files from previous runs')
+    parser.add_argument('--inputs', nargs='+', default=[],
+                      help='task_inputs.tsv files the same runs published next to their traces; '
+                      'per-sample processes are only learned from tasks listed there')
+    parser.add_argument('--output', default='resource_profile.json',
+                      help='Output JSON file (default: resource_profile.json)')
+
+    args = parser.parse_args()
+
+    task_inputs = {}
+    for path in args.inputs:
+        task_inputs.update(load_task_inputs(path))
+    if not task_inputs:
+        print("Warning: no --inputs given; only processes without a per-sample input are learned")
+    observations = {}
+    skipped = {}
+    for trace in args.traces:
+        with open(trace, 'r', newline='') as f:
+            for key, points in collect_observations(read_trace(f), task_inputs, skipped).items():
+                observations.setdefault(key, []).extend(points)
+    for key, count in sorted(skipped.items()):
+        print(f"Warning: skipped {count} {key} tasks without a recorded input size")
+
+    profile = build_profile(observations)
+
+    with open(args.output, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+    print(f"Resource profile written to: {args.output} ({profile['tasks_analyzed']} tasks)")
+    for key, learned in profile['processes'].items():
+        print(f"  {key}: {learned['cpus']} cpus, "
+              f"{learned['memory_intercept_gb']} GB + {learned['memory_per_input_gb']} GB per input GB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# resource_sampler.py - Sample node CPU, memory and GPU utilization into fixed-size ring buffers
+#
+# Runs on each compute node (started by batch_init.sh). CPU and memory come
+# from the container cgroup (v2, then v1) with /proc as a fallback, so the
+# numbers reflect the limits the jobs actually run under. Samples go into an
+# array-backed ring buffer, and are averaged into 1m/5m/1h rings for longer
+# windows. One compact document per window is written locally and/or to S3.
+#
+# Every path is resolved under --root, so the sampler can be pointed at a
+# fake procfs/cgroup tree for local testing.
+
+import argparse
+import gzip
+import json
+import math
+import os
+import shutil
+import socket
+import subprocess
+import time
+from array import array
+
+FIELDS = ('cpu', 'memory', 'gpu')
+
+# (window name, bucket seconds, points kept); the raw window uses the sampling interval
+WINDOWS = (
+    ('raw', None, 120),
+    ('1m', 60, 60),      # last hour at one-minute resolution
+    ('5m', 300, 72),     # last six hours
+    ('1h', 3600, 48)     # last two days
+)
+
+DEFAULT_INTERVAL = 5
+DEFAULT_PUBLISH_EVERY = 60
+VALUE_DECIMALS = 1
+
+def _read(root, path):
+    """Contents of a file under root, or None if it cannot be read"""
+    try:
+        with open(os.path.join(root, path.lstrip('/')), 'r') as f:
+            return f.read().strip()
+    except (OSError, IOError):
+        return None
+
+def _read_int(root, path):
+    value = _read(root, path)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _meminfo(root):
+    """Parse /proc/meminfo into a dictionary of bytes"""
+    values = {}
+    for line in (_read(root, '/proc/meminfo') or '').splitlines():
+        name, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts:
+            values[name] = int(parts[0]) * 1024
+    return values
+
+def cpu_count(root):
+    """Online CPUs listed in /proc/stat, falling back to os.cpu_count()"""
+    lines = (_read(root, '/proc/stat') or '').splitlines()
+    count = sum(1 for line in lines if line.startswith('cpu') and line[3:4].isdigit())
+    return count or os.cpu_count() or 1
+
+def cpu_limit(root):
+    """CPUs available to the cgroup (quota / period), or the node's CPU count"""
+    quota = _read(root, '/sys/fs/cgroup/cpu.max')
+    if quota:
+        limit, _, period = quota.partition(' ')
+        if limit != 'max' and period:
+            return int(limit) / int(period)
+    quota_us = _read_int(root, '/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period_us = _read_int(root, '/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota_us and quota_us > 0 and period_us:
+        return quota_us / period_us
+    return float(cpu_count(root))
+
+def cpu_usage_seconds(root):
+    """
+    Cumulative CPU time as (busy seconds, capacity seconds or None).
+
+    cgroup counters report busy time only, so capacity is derived from wall
+    time and cpu_limit; /proc/stat reports both busy and total jiffies.
+    """
+    stat = _read(root, '/sys/fs/cgroup/cpu.stat')
+    if stat:
+        for line in stat.splitlines():
+            name, _, value = line.partition(' ')
+            if name == 'usage_usec':
+                return int(value) / 1e6, None
+    usage_ns = _read_int(root, '/sys/fs/cgroup/cpuacct/cpuacct.usage')
+    if usage_ns is not None:
+        return usage_ns / 1e9, None
+
+    line = ((_read(root, '/proc/stat') or '').splitlines() or [''])[0]
+    if line.startswith('cpu '):
+        ticks = [int(value) for value in line.split()[1:]]
+        idle = ticks[3] + (ticks[4] if len(ticks) > 4 else 0)
+        hz = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        return (sum(ticks) - idle) / hz, sum(ticks) / hz
+    return None, None
+
+def memory_usage(root):
+    """Memory in use and its limit in bytes, from the cgroup or /proc/meminfo"""
+    meminfo = _meminfo(root)
+    total = meminfo.get('MemTotal')
+
+    used = _read_int(root, '/sys/fs/cgroup/memory.current')
+    if used is not None:
+        limit = _read_int(root, '/sys/fs/cgroup/memory.max')
+        return used, limit or total
+    used = _read_int(root, '/sys/fs/cgroup/memory/memory.usage_in_bytes')
+    if used is not None:
+        limit = _read_int(root, '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+        # cgroup v1 reports an effectively unlimited value when no limit is set
+        return used, limit if limit and (not total or limit < total) else total
+
+    if total is None:
+        return None, None
+    return total - meminfo.get('MemAvailable', meminfo.get('MemFree', 0)), total
+
+def read_gpu_utilization():
+    """Mean GPU utilization in percent from nvidia-smi, or None without GPUs"""
+    if not shutil.which('nvidia-smi'):
+        return None
+    try:
+        output = subprocess.run(
+            ['nvidia-smi', '--query-gpu=utilization.gpu', '--format=csv,noheader,nounits'],
+            capture_output=True, text=True, timeout=5, check=True
+        ).stdout
+        values = [float(line) for line in output.split() if line.strip()]
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+    return sum(values) / len(values) if values else None
+
+class Sampler:
+    """Turn cumulative counters into utilization percentages between calls"""
+
+    def __init__(self, root='/', gpu_reader=read_gpu_utilization, clock=time.time):
+        self.root = root
+        self.gpu_reader = gpu_reader
+        self.clock = clock
+        self.cpus = cpu_limit(root)
+        self._last = None
+
+    def sample(self):
+        """
+        Take a sample.
+
+        Returns:
+            Dictionary with time and cpu, memory, gpu percentages
+            (None when not measurable, e.g. CPU on the first call)
+        """
+        now = self.clock()
+        busy, capacity = cpu_usage_seconds(self.root)
+        cpu = None
+        if self._last is not None and busy is not None:
+            last_time, last_busy, last_capacity = self._last
+            if capacity is not None and last_capacity is not None:
+                available = capacity - last_capacity
+            else:
+                available = (now - last_time) * self.cpus
+            if available > 0:
+                cpu = min(100.0, max(0.0, 100.0 * (busy - last_busy) / available))
+        self._last = (now, busy, capacity)
+
+        used, limit = memory_usage(self.root)
+        memory = 100.0 * used / limit if used is not None and limit else None
+        return {'time': now, 'cpu': cpu, 'memory': memory, 'gpu': self.gpu_reader()}
+
+class RingBuffer:
+    """Fixed-capacity time series stored in preallocated arrays; the oldest point is overwritten"""
+
+    def __init__(self, capacity, fields=FIELDS):
+        self.capacity = capacity
+        self.fields = fields
+        self.times = array('d', [0.0]) * capacity
+        self.columns = {field: array('d', [math.nan]) * capacity for field in fields}
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, values):
+        """Add a point; missing values are stored as NaN"""
+        if self.size < self.capacity:
+            index = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[index] = timestamp
+        for field in self.fields:
+            value = values.get(field)
+            self.columns[field][index] = math.nan if value is None else value
+
+    def _order(self):
+        return [(self.start + i) % self.capacity for i in range(self.size)]
+
+    def columns_in_order(self):
+        """(times, {field: values}) oldest first, with NaN as None"""
+        order = self._order()
+        times = [self.times[i] for i in order]
+        columns = {}
+        for field in self.fields:
+            column = self.columns[field]
+            columns[field] = [None if math.isnan(column[i]) else column[i] for i in order]
+        return times, columns
+
+class Downsampler:
+    """Average samples into fixed buckets aligned to multiples of bucket_seconds"""
+
+    def __init__(self, bucket_seconds, capacity, fields=FIELDS):
+        self.bucket_seconds = bucket_seconds
+        self.fields = fields
+        self.ring = RingBuffer(capacity, fields)
+        self._bucket = None
+        self._sums = {}
+        self._counts = {}
+
+    def _mean(self, field):
+        count = self._counts.get(field, 0)
+        return self._sums[field] / count if count else None
+
+    def _flush(self):
+        if self._bucket is not None:
+            self.ring.append(self._bucket, {field: self._mean(field) for field in self.fields})
+        self._sums = {field: 0.0 for field in self.fields}
+        self._counts = {field: 0 for field in self.fields}
+
+    def add(self, timestamp, values):
+        bucket = math.floor(timestamp / self.bucket_seconds) * self.bucket_seconds
+        if bucket != self._bucket:
+            self._flush()
+            self._bucket = bucket
+        for field in self.fields:
+            value = values.get(field)
+            if value is not None:
+                self._sums[field] += value
+                self._counts[field] += 1
+
+    def columns_in_order(self):
+        """Completed buckets followed by the bucket still being filled"""
+        times, columns = self.ring.columns_in_order()
+        if self._bucket is not None:
+            times.append(float(self._bucket))
+            for field in self.fields:
+                columns[field].append(self._mean(field))
+            if len(times) > self.ring.capacity:
+                times = times[1:]
+                columns = {field: values[1:] for field, values in columns.items()}
+        return times, columns
+
+class UtilizationSeries:
+    """Raw samples plus downsampled windows"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, windows=WINDOWS, fields=FIELDS):
+        self.interval = interval
+        self.fields = fields
+        self.windows = {}
+        for name, bucket_seconds, capacity in windows:
+            if bucket_seconds is None:
+                self.windows[name] = (interval, RingBuffer(capacity, fields))
+            else:
+                self.windows[name] = (bucket_seconds, Downsampler(bucket_seconds, capacity, fields))
+
+    def add(self, sample):
+        for _, series in self.windows.values():
+            if isinstance(series, RingBuffer):
+                series.append(sample['time'], sample)
+            else:
+                series.add(sample['time'], sample)
+
+    def documents(self, node_id, cpus=None):
+        """One compact, columnar document per window"""
+        documents = {}
+        for name, (resolution, series) in self.windows.items():
+            times, columns = series.columns_in_order()
+            document = {
+                'node': node_id,
+                'window': name,
+                'resolution_seconds': resolution,
+                'updated': int(time.time()),
+                'cpus': cpus,
+                'time': [int(t) for t in times]
+            }
+            for field in self.fields:
+                document[field] = [None if v is None else round(v, VALUE_DECIMALS) for v in columns[field]]
+            documents[name] = document
+        return documents
+
+def encode_document(document):
+    """Compact JSON bytes for a window document"""
+    return json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+def write_documents(documents, output_dir):
+    """Write each window document to output_dir/<window>.json"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name, document in documents.items():
+        path = os.path.join(output_dir, f'{name}.json')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(encode_document(document))
+        os.replace(path + '.tmp', path)
+
+def publish_documents(client, bucket, prefix, documents):
+    """Upload each window document gzip-encoded to s3://bucket/prefix/<window>.json"""
+    for name, document in documents.items():
+        client.put_object(
+            Bucket=bucket,
+            Key=f'{prefix}/{name}.json',
+            Body=gzip.compress(encode_document(document), mtime=0),
+            ContentType='application/json',
+            ContentEncoding='gzip',
+            CacheControl='no-cache'
+        )
+
+def default_node_id():
+    """Hostname of the node (batch_init.sh passes the EC2 instance ID instead)"""
+    return socket.gethostname()
+
+def run(sampler, series, interval, publish_every, publish, iterations=None, sleep=time.sleep):
+    """
+    Sample every interval seconds and publish every publish_every seconds.
+
+    Args:
+        sampler: Sampler instance
+        series: UtilizationSeries to fill
+        interval: Seconds between samples
+        publish_every: Seconds between publishes
+        publish: Callable taking the window documents
+        iterations: Stop after this many samples (None runs until killed)
+        sleep: Sleep function (replaceable in tests)
+    """
+    count = 0
+    last_publish = None
+    while iterations is None or count < iterations:
+        sample = sampler.sample()
+        series.add(sample)
+        count += 1
+        if last_publish is None or sample['time'] - last_publish >= publish_every:
+            publish()
+            last_publish = sample['time']
+        if iterations is None or count < iterations:
+            sleep(interval)
+    publish()
+
+def main():
+    parser = argparse.ArgumentParser(description='Sample node utilization into ring buffers and publish per-window documents')
+    parser.add_argument('--root', default='/', help='Filesystem root for /proc and /sys (default: /)')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                      help=f'Seconds between samples (default: {DEFAULT_INTERVAL})')
+    parser.add_argument('--publish-every', type=float, default=DEFAULT_PUBLISH_EVERY,
+                      help=f'Seconds between publishes (default: {DEFAULT_PUBLISH_EVERY})')
+    parser.add_argument('--node-id', default=None, help='Node identifier (default: hostname)')
+    parser.add_argument('--output-dir', help='Write window documents to this directory')
+    parser.add_argument('--bucket', help='Upload window documents to this S3 bucket')
+    parser.add_argument('--prefix', default='monitoring/utilization',
+                      help='S3 key prefix; the node ID is appended (default: monitoring/utilization)')
+    parser.add_argument('--iterations', type=int, default=None, help='Stop after this many samples')
+
+    args = parser.parse_args()
+
+    node_id = args.node_id or default_node_id()
+    sampler = Sampler(args.root)
+    series = UtilizationSeries(args.interval)
+    client = None
+    if args.bucket:
+        import boto3
+        client = boto3.client('s3')
+
+    def publish():
+        documents = series.documents(node_id, sampler.cpus)
+        if args.output_dir:
+            write_documents(documents, args.output_dir)
+        if client is not None:
+            try:
+                publish_documents(client, args.bucket, f'{args.prefix}/{node_id}', documents)
+            except Exception as e:
+                # Keep sampling through transient S3 errors
+                print(f"Error publishing utilization: {e}")
+
+    run(sampler, series, args.interval, args.publish_every, publish, args.iterations)
+
+if __name__ == "__main__":
+    main()
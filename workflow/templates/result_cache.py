@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# result_cache.py - Cross-run cache of per-sample results
+#
+# A re-submitted run used to send every sample through preprocess_reads,
+# Kraken2, MetaPhlAn and HUMAnN again, even when nothing had changed. Each
+# sample now gets a key that hashes everything its results depend on:
+#   - the sample ID (it appears in the output headers)
+#   - the FASTQ digests (S3 ETag and size, or SHA-256 of local files)
+#   - the tool versions
+#   - a manifest of each reference database
+#   - the script blocks of the per-sample processes in microbiome_main.nf
+# Results are stored under <cache>/objects/<key>/. A single manifest index,
+# <cache>/index.json, maps keys to entries, so looking up thousands of samples
+# costs one GET. Listing their inputs costs one LIST per directory of FASTQs.
+# Only the index step writes the index, once per run, with a conditional PUT.
+# That step also records hits and evicts entries by age and total size.
+#
+#   result_cache.py lookup --cache s3://bucket/cache/results --samples sample_list.csv ...
+#   result_cache.py restore --cache ... --key KEY --sample-id ID
+#   result_cache.py store --cache ... --key KEY --sample-id ID --file kreport=ID.kreport ...
+#   result_cache.py index --cache ... --entries entries/*.json --lookup cache_lookup.tsv
+
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+
+CACHE_VERSION = 1
+INDEX_NAME = 'index.json'
+OBJECTS_DIR = 'objects'
+
+# Restored outputs, by the name they are stored under
+CACHED_FILES = {
+    'kreport': '{sample_id}.kreport',
+    'metaphlan': '{sample_id}.metaphlan.tsv',
+    'genefamilies': '{sample_id}.humann.genefamilies.tsv',
+    'pathabundance': '{sample_id}.humann.pathabundance.tsv',
+}
+
+# Processes whose script blocks produce the cached outputs
+CACHED_PROCESSES = ['preprocess_reads', 'taxonomic_classification_kraken', 'metaphlan_analysis']
+
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_GB = 500
+# Shards of a sharded run finish together and all write the index
+INDEX_WRITE_ATTEMPTS = 10
+INDEX_RETRY_SECONDS = 0.2
+HASH_CHUNK = 1 << 20
+
+LOOKUP_COLUMNS = ['sample_id', 'cache_key', 'hit']
+
+def error_code(error):
+    """S3 error code of a botocore ClientError"""
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+def split_url(url):
+    """(bucket, key) of an s3:// URL, or None for a local path"""
+    if not url.startswith('s3://'):
+        return None
+    bucket, _, key = url[len('s3://'):].partition('/')
+    return bucket, key
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def list_objects(client, bucket, prefix):
+    """{key: (etag, size)} for every object under prefix"""
+    objects = {}
+    arguments = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        response = client.list_objects_v2(**arguments)
+        for item in response.get('Contents', []):
+            objects[item['Key']] = (item['ETag'].strip('"'), item['Size'])
+        if not response.get('IsTruncated'):
+            return objects
+        arguments['ContinuationToken'] = response['NextContinuationToken']
+
+def input_digests(client, paths):
+    """
+    Content digest of each input file.
+
+    S3 inputs are listed once per directory rather than with a HEAD per
+    file; their ETags change whenever the content does.
+
+    Returns:
+        {path: digest string}, leaving out inputs that do not exist
+    """
+    digests = {}
+    listings = {}
+    for path in paths:
+        location = split_url(path)
+        if location is None:
+            if os.path.isfile(path):
+                digests[path] = 'sha256:' + file_sha256(path)
+            continue
+        bucket, key = location
+        prefix = key.rsplit('/', 1)[0] + '/' if '/' in key else ''
+        if (bucket, prefix) not in listings:
+            listings[(bucket, prefix)] = list_objects(client, bucket, prefix)
+        if key in listings[(bucket, prefix)]:
+            etag, size = listings[(bucket, prefix)][key]
+            digests[path] = f"etag:{etag}:{size}"
+    return digests
+
+def database_manifest(client, url):
+    """Digest of every file in a reference database, so that any update changes it"""
+    location = split_url(url.rstrip('/'))
+    if location is None:
+        entries = []
+        for root, _, files in os.walk(url):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                entries.append([os.path.relpath(os.path.join(root, name), url), stat.st_size, stat.st_mtime_ns])
+        return digest(sorted(entries))
+    bucket, prefix = location
+    objects = list_objects(client, bucket, prefix + '/')
+    return digest(sorted([key[len(prefix) + 1:], etag, size] for key, (etag, size) in objects.items()))
+
+def process_fingerprint(nf_text, process):
+    """Digest of a process's script block; directives and progress hooks do not affect it"""
+    match = re.search(r'^process ' + re.escape(process) + r' \{\n.*?^    script:\n(.*?^    """)\n\}\n',
+                      nf_text, re.M | re.S)
+    if match is None:
+        raise ValueError(f"Process {process} not found in the workflow")
+    return hashlib.sha256(match.group(1).encode('utf-8')).hexdigest()
+
+def parse_pairs(text):
+    """{name: value} from "name=value,name=value" """
+    pairs = {}
+    for item in (text or '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip():
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+def cache_key(sample_id, inputs, tools, databases, processes):
+    """Key of a sample's results; None if an input digest is missing"""
+    if any(value is None for value in inputs):
+        return None
+    return digest({'version': CACHE_VERSION, 'sample_id': sample_id, 'inputs': inputs, 'tools': tools,
+                   'databases': databases, 'processes': processes})
+
+class ResultCache:
+    """Entries and objects under an s3:// cache prefix"""
+
+    def __init__(self, client, url):
+        self.client = client
+        self.bucket, prefix = split_url(url.rstrip('/'))
+        self.prefix = prefix + '/' if prefix else ''
+        self.index_etag = None
+
+    def object_key(self, key, name):
+        return f"{self.prefix}{OBJECTS_DIR}/{key}/{name}"
+
+    def load_index(self):
+        """The manifest index ({"entries": {key: entry}}), remembering its ETag for the conditional write"""
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + INDEX_NAME)
+        except Exception as e:
+            if error_code(e) in ('NoSuchKey', '404'):
+                self.index_etag = None
+                return {'version': CACHE_VERSION, 'entries': {}}
+            raise
+        self.index_etag = response.get('ETag')
+        body = response['Body'].read()
+        if response.get('ContentEncoding') == 'gzip':
+            body = gzip.decompress(body)
+        index = json.loads(body.decode('utf-8'))
+        if index.get('version') != CACHE_VERSION:
+            return {'version': CACHE_VERSION, 'entries': {}}
+        return index
+
+    def save_index(self, index):
+        """Write the index unless someone else wrote it since it was loaded"""
+        body = gzip.compress(json.dumps(index, separators=(',', ':')).encode('utf-8'), mtime=0)
+        condition = {'IfMatch': self.index_etag} if self.index_etag else {'IfNoneMatch': '*'}
+        response = self.client.put_object(Bucket=self.bucket, Key=self.prefix + INDEX_NAME, Body=body,
+                                          ContentType='application/json', ContentEncoding='gzip', **condition)
+        self.index_etag = response.get('ETag')
+
+    def store(self, key, sample_id, files):
+        """
+        Upload a sample's outputs.
+
+        Args:
+            files: {stored name: local path}
+
+        Returns:
+            The index entry for the key
+        """
+        sizes = {}
+        for name, path in files.items():
+            with open(path, 'rb') as f:
+                self.client.put_object(Bucket=self.bucket, Key=self.object_key(key, name), Body=f)
+            sizes[name] = os.path.getsize(path)
+        now = int(time.time())
+        return {'key': key, 'sample_id': sample_id, 'files': sizes, 'bytes': sum(sizes.values()),
+                'created': now, 'last_used': now}
+
+    def restore(self, key, entry, sample_id, output_dir='.'):
+        """Download a hit's outputs under the names the downstream processes expect"""
+        paths = []
+        for name in entry['files']:
+            path = os.path.join(output_dir, CACHED_FILES.get(name, name).format(sample_id=sample_id))
+            response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key, name))
+            with open(path, 'wb') as f:
+                for chunk in iter(lambda: response['Body'].read(HASH_CHUNK), b''):
+                    f.write(chunk)
+            paths.append(path)
+        return paths
+
+    def delete_entries(self, keys, index):
+        objects = [{'Key': self.object_key(key, name)} for key in keys for name in index['entries'][key]['files']]
+        for start in range(0, len(objects), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects[start:start + 1000],
+                                                                   'Quiet': True})
+
+    def update_index(self, entries=(), used=(), max_age_days=DEFAULT_MAX_AGE_DAYS, max_bytes=None, now=None):
+        """
+        Add new entries, mark hits as used and evict, in one conditional write.
+
+        Entries older than max_age_days (by last use) are evicted, then the
+        least recently used until the cache fits in max_bytes.
+
+        Returns:
+            (index, evicted keys)
+        """
+        now = int(now if now is not None else time.time())
+        for attempt in range(INDEX_WRITE_ATTEMPTS):
+            index = self.load_index()
+            live = index['entries']
+            for entry in entries:
+                live[entry['key']] = dict({name: value for name, value in entry.items() if name != 'key'},
+                                          last_used=now)
+            for key in used:
+                if key in live:
+                    live[key]['last_used'] = now
+            expired = {key for key, entry in live.items() if now - entry['last_used'] > max_age_days * 86400}
+            kept = sorted((key for key in live if key not in expired), key=lambda key: live[key]['last_used'])
+            total = sum(live[key]['bytes'] for key in kept)
+            while max_bytes is not None and kept and total > max_bytes:
+                key = kept.pop(0)
+                total -= live[key]['bytes']
+                expired.add(key)
+            evicted = {key: live.pop(key) for key in sorted(expired)}
+            index['updated'] = now
+            index['bytes'] = total
+            try:
+                self.save_index(index)
+            except Exception as e:
+                if error_code(e) in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409'):
+                    time.sleep(random.uniform(0, INDEX_RETRY_SECONDS * 2 ** min(attempt, 5)))
+                    continue
+                raise
+            # Objects go only after the index no longer points at them
+            if evicted:
+                self.delete_entries(evicted, {'entries': evicted})
+            return index, sorted(evicted)
+        raise RuntimeError(f"Index was changed concurrently {INDEX_WRITE_ATTEMPTS} times; giving up")
+
+def read_samples(path):
+    with open(path, 'r', newline='') as f:
+        return list(csv.DictReader(f))
+
+def lookup(client, cache_url, samples, nf_text, databases, tools, refresh=False):
+    """
+    Key and hit flag per sample, from one index read.
+
+    With refresh every sample is a miss, but keys are still computed so the
+    new results replace the cached ones.
+
+    Returns:
+        List of {"sample_id", "cache_key", "hit"}
+    """
+    cache = ResultCache(client, cache_url)
+    entries = cache.load_index()['entries']
+    digests = input_digests(client, [row[column] for row in samples for column in ('fastq_1', 'fastq_2')])
+    manifests = {name: database_manifest(client, url) for name, url in sorted(databases.items())}
+    processes = {process: process_fingerprint(nf_text, process) for process in CACHED_PROCESSES}
+    rows = []
+    for row in samples:
+        key = cache_key(row['sample_id'], [digests.get(row['fastq_1']), digests.get(row['fastq_2'])], tools,
+                        manifests, processes)
+        rows.append({'sample_id': row['sample_id'], 'cache_key': key or '',
+                     'hit': 'true' if not refresh and key in entries
+                     and set(entries[key]['files']) >= set(CACHED_FILES) else 'false'})
+    return rows
+
+def write_lookup(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=LOOKUP_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        writer.writerows(rows)
+
+def read_lookup(path):
+    with open(path, 'r', newline='') as f:
+        return list(csv.DictReader(f, delimiter='\t'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-run cache of per-sample results')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    lookup_parser = subparsers.add_parser('lookup', help='Compute cache keys and find hits for a sample sheet')
+    lookup_parser.add_argument('--samples', required=True, help='Sample sheet (sample_id,body_site,fastq_1,fastq_2)')
+    lookup_parser.add_argument('--workflow', required=True, help='microbiome_main.nf, for the process fingerprints')
+    lookup_parser.add_argument('--databases', default='', help='Reference databases as name=url,name=url')
+    lookup_parser.add_argument('--tool-versions', default='', help='Tool versions as name=version,name=version')
+    lookup_parser.add_argument('--disabled', action='store_true', help='Report every sample as a miss without a key')
+    lookup_parser.add_argument('--refresh', action='store_true', help='Report every sample as a miss but keep the keys')
+    lookup_parser.add_argument('--output', default='cache_lookup.tsv', help='Lookup table to write')
+
+    restore_parser = subparsers.add_parser('restore', help="Download a hit's outputs")
+    restore_parser.add_argument('--key', required=True, help='Cache key from lookup')
+    restore_parser.add_argument('--sample-id', required=True, help='Sample ID, for the output file names')
+    restore_parser.add_argument('--output-dir', default='.', help='Directory to restore into')
+
+    store_parser = subparsers.add_parser('store', help="Upload a sample's outputs and write its index entry")
+    store_parser.add_argument('--key', required=True, help='Cache key from lookup')
+    store_parser.add_argument('--sample-id', required=True, help='Sample ID')
+    store_parser.add_argument('--file', action='append', default=[], help='Output to store, as name=path')
+    store_parser.add_argument('--entry', default='cache_entry.json', help='Index entry to write')
+
+    index_parser = subparsers.add_parser('index', help='Merge new entries, record hits and evict')
+    index_parser.add_argument('--entries', nargs='*', default=[], help='Entry files written by store')
+    index_parser.add_argument('--lookup', help='Lookup table, to mark hits as used')
+    index_parser.add_argument('--max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                              help=f"Evict entries unused for this long (default: {DEFAULT_MAX_AGE_DAYS})")
+    index_parser.add_argument('--max-gb', type=float, default=DEFAULT_MAX_GB,
+                              help=f"Evict least recently used entries above this size (default: {DEFAULT_MAX_GB})")
+
+    for subparser in (lookup_parser, restore_parser, store_parser, index_parser):
+        subparser.add_argument('--cache', required=True, help='Cache location, e.g. s3://bucket/cache/results')
+    args = parser.parse_args()
+
+    if args.command == 'lookup' and args.disabled:
+        write_lookup([{'sample_id': row['sample_id'], 'cache_key': '', 'hit': 'false'}
+                      for row in read_samples(args.samples)], args.output)
+        print("Result cache disabled; every sample will be computed")
+        return
+
+    import boto3
+    client = boto3.client('s3')
+
+    if args.command == 'lookup':
+        with open(args.workflow, 'r') as f:
+            nf_text = f.read()
+        rows = lookup(client, args.cache, read_samples(args.samples), nf_text, parse_pairs(args.databases),
+                      parse_pairs(args.tool_versions), args.refresh)
+        write_lookup(rows, args.output)
+        hits = sum(row['hit'] == 'true' for row in rows)
+        print(f"Result cache: {hits} of {len(rows)} samples restored from earlier runs")
+    elif args.command == 'restore':
+        cache = ResultCache(client, args.cache)
+        entries = cache.load_index()['entries']
+        if args.key not in entries:
+            sys.exit(f"Cache entry {args.key} is no longer in the index")
+        for path in cache.restore(args.key, entries[args.key], args.sample_id, args.output_dir):
+            print(f"Restored {path}")
+    elif args.command == 'store':
+        files = parse_pairs(','.join(args.file))
+        entry = ResultCache(client, args.cache).store(args.key, args.sample_id, files)
+        with open(args.entry, 'w') as f:
+            json.dump(entry, f)
+        print(f"Stored {len(files)} outputs of {args.sample_id} ({entry['bytes']} bytes)")
+    else:
+        entries = []
+        for path in args.entries:
+            with open(path, 'r') as f:
+                entries.append(json.load(f))
+        used = [row['cache_key'] for row in read_lookup(args.lookup) if row['hit'] == 'true'] if args.lookup else []
+        index, evicted = ResultCache(client, args.cache).update_index(
+            entries, used, args.max_age_days, int(args.max_gb * 1024 ** 3))
+        print(f"Result cache: {len(entries)} entries added, {len(used)} hits recorded, {len(evicted)} evicted; "
+              f"{len(index['entries'])} entries, {index['bytes'] / 1024 ** 3:.2f} GB")
+
+if __name__ == '__main__':
+    main()
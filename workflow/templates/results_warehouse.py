@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# results_warehouse.py - Cross-run results warehouse
+#
+# upload_results leaves every run's tables as loose TSV files, so a question
+# across runs ("abundance of species X by body site") used to mean downloading
+# and parsing every one of them. "ingest" appends a run's species, pathway,
+# alpha diversity and PCoA tables to Parquet datasets partitioned by run and
+# body site:
+#
+#   <warehouse>/<table>/run_id=<run>/body_site=<site>/part-0.parquet
+#   <warehouse>/_catalog/<run>.json    files, rows, samples and min/max per partition
+#
+# Queries read the catalog instead of listing the bucket, skip partitions
+# whose run, body site or column ranges cannot match, and push the remaining
+# filters down to the Parquet row groups (rows are sorted by feature). SQL
+# queries run in DuckDB when it is installed.
+#
+#   results_warehouse.py ingest --warehouse s3://bucket/warehouse --run-id RUN --samples sample_list.csv \
+#       --species metaphlan_merged.tsv --pathways humann_pathabundance_merged.tsv \
+#       --alpha alpha_diversity.tsv --pcoa pcoa_coordinates.tsv
+#   results_warehouse.py abundance --warehouse ... --species Bacteroides_fragilis
+#   results_warehouse.py query --warehouse ... "SELECT body_site, avg(shannon) FROM alpha_diversity GROUP BY 1"
+
+import argparse
+import json
+import os
+import posixpath
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+try:
+    import duckdb
+except ImportError:  # Only needed for SQL queries
+    duckdb = None
+
+CATALOG_DIR = '_catalog'
+PARTITION_COLUMNS = ['run_id', 'body_site']
+UNKNOWN_SITE = 'unknown'
+
+# Feature column each table is sorted by, so row group statistics prune lookups
+TABLES = {
+    'species': 'species',
+    'pathways': 'pathway',
+    'alpha_diversity': 'sample_id',
+    'pcoa': 'sample_id',
+}
+
+ROWS_PER_GROUP = 64 * 1024
+CATALOG_READERS = 16
+
+def open_warehouse(location):
+    """(filesystem, root path) for an s3:// URI or a local directory"""
+    if '://' not in location:
+        location = os.path.abspath(location)
+    return pafs.FileSystem.from_uri(location)
+
+def read_sample_sites(path):
+    """{sample_id: body_site} from a sample sheet or metadata.csv"""
+    samples = pd.read_csv(path, dtype=str)
+    return dict(zip(samples['sample_id'], samples['body_site'].fillna(UNKNOWN_SITE)))
+
+def species_name(clade):
+    """Species of a MetaPhlAn clade name, or None above species or for strains"""
+    rank = clade.rsplit('|', 1)[-1]
+    return rank[len('s__'):] if rank.startswith('s__') else None
+
+def read_species(path):
+    """Long (sample_id, taxon, species, relative_abundance) rows from merge_metaphlan output"""
+    with open(path, 'r') as f:
+        skip = 1 if f.readline().startswith('#SampleMetadata') else 0
+    table = pd.read_csv(path, sep='\t', skiprows=skip)
+    table = table.rename(columns={table.columns[0]: 'taxon'})
+    table['taxon'] = table['taxon'].astype(str)
+    table['species'] = table['taxon'].map(species_name)
+    table = table[table['species'].notna()]
+    table = table.drop(columns=[column for column in ('NCBI_tax_id', 'clade_taxid') if column in table])
+    rows = table.melt(id_vars=['taxon', 'species'], var_name='sample_id', value_name='relative_abundance')
+    return rows[rows['relative_abundance'] > 0]
+
+def read_pathways(path):
+    """Long (sample_id, pathway, abundance) rows of the unstratified pathways in humann_join_tables output"""
+    table = pd.read_csv(path, sep='\t')
+    table = table.rename(columns={table.columns[0]: 'pathway'})
+    table = table[~table['pathway'].astype(str).str.contains('|', regex=False)]
+    # humann_join_tables names the columns after the input files
+    table.columns = ['pathway'] + [column.replace('.humann', '').rsplit('_Abundance', 1)[0]
+                                   for column in table.columns[1:]]
+    rows = table.melt(id_vars=['pathway'], var_name='sample_id', value_name='abundance')
+    return rows[rows['abundance'] > 0]
+
+def read_sample_table(path):
+    """diversity_analysis output indexed by sample, without its body_site column"""
+    table = pd.read_csv(path, sep='\t')
+    table = table.rename(columns={table.columns[0]: 'sample_id'})
+    table['sample_id'] = table['sample_id'].astype(str)
+    return table.drop(columns=[column for column in ('body_site',) if column in table])
+
+def partition_stats(frame):
+    """Rows, samples and min/max of every numeric column of one partition"""
+    columns = {}
+    for column in frame.columns:
+        if column in PARTITION_COLUMNS or not pd.api.types.is_numeric_dtype(frame[column]):
+            continue
+        values = frame[column].dropna()
+        if len(values):
+            columns[column] = [float(values.min()), float(values.max())]
+    return {'rows': int(len(frame)), 'samples': int(frame['sample_id'].nunique()), 'columns': columns}
+
+def matches(stats, ranges):
+    """Whether a partition's min/max can overlap every (low, high) column range"""
+    for column, (low, high) in (ranges or {}).items():
+        if column not in stats['columns']:
+            continue
+        minimum, maximum = stats['columns'][column]
+        if (low is not None and maximum < low) or (high is not None and minimum > high):
+            return False
+    return True
+
+class Warehouse:
+    """Parquet datasets partitioned by run and body site, with a per-run catalog"""
+
+    def __init__(self, location):
+        self.location = location
+        self.fs, self.root = open_warehouse(location)
+        self._catalog = None
+
+    def path(self, *parts):
+        return posixpath.join(self.root, *parts)
+
+    def ingest(self, run_id, tables, sample_sites):
+        """
+        Replace a run's partitions with the given tables.
+
+        Args:
+            tables: {table name: DataFrame with a sample_id column}
+            sample_sites: {sample_id: body_site}
+
+        Returns:
+            The run's catalog entry
+        """
+        entry = {'run_id': run_id, 'ingested_at': int(time.time()), 'tables': {}}
+        for name, frame in tables.items():
+            frame = frame.copy()
+            frame['sample_id'] = frame['sample_id'].astype(str)
+            frame['body_site'] = frame['sample_id'].map(sample_sites).fillna(UNKNOWN_SITE)
+            frame = frame.sort_values(['body_site'] + list(dict.fromkeys([TABLES[name], 'sample_id'])), kind='stable')
+            run_dir = self.path(name, f"run_id={run_id}")
+            self.fs.delete_dir_contents(run_dir, missing_dir_ok=True)
+
+            partitions = {}
+            for site, rows in frame.groupby('body_site', sort=True):
+                directory = posixpath.join(run_dir, f"body_site={site}")
+                self.fs.create_dir(directory)
+                table = pa.Table.from_pandas(rows.drop(columns=['body_site']), preserve_index=False)
+                ds.write_dataset(table, directory, filesystem=self.fs, format='parquet',
+                                 basename_template='part-{i}.parquet', existing_data_behavior='overwrite_or_ignore',
+                                 max_rows_per_group=ROWS_PER_GROUP, min_rows_per_group=min(len(rows), ROWS_PER_GROUP))
+                files = sorted(info.path for info in self.fs.get_file_info(pafs.FileSelector(directory))
+                               if info.path.endswith('.parquet'))
+                partitions[site] = dict(partition_stats(rows), files=[posixpath.relpath(path, self.root)
+                                                                      for path in files])
+            entry['tables'][name] = partitions
+
+        self.fs.create_dir(self.path(CATALOG_DIR))
+        with self.fs.open_output_stream(self.path(CATALOG_DIR, f"{run_id}.json")) as f:
+            f.write(json.dumps(entry, separators=(',', ':')).encode('utf-8'))
+        self._catalog = None
+        return entry
+
+    def catalog(self):
+        """{run_id: catalog entry}, read once per Warehouse"""
+        if self._catalog is None:
+            infos = self.fs.get_file_info(pafs.FileSelector(self.path(CATALOG_DIR), allow_not_found=True))
+            paths = sorted(info.path for info in infos if info.path.endswith('.json'))
+
+            def read(path):
+                with self.fs.open_input_stream(path) as f:
+                    return json.loads(f.read().decode('utf-8'))
+            with ThreadPoolExecutor(max_workers=CATALOG_READERS) as executor:
+                self._catalog = {entry['run_id']: entry for entry in executor.map(read, paths)}
+        return self._catalog
+
+    def partitions(self, table, runs=None, body_sites=None, ranges=None):
+        """(run_id, body_site, stats) of the partitions a query has to read"""
+        selected = []
+        for run_id, entry in sorted(self.catalog().items()):
+            if runs is not None and run_id not in runs:
+                continue
+            for site, stats in sorted(entry['tables'].get(table, {}).items()):
+                if body_sites is not None and site not in body_sites:
+                    continue
+                if matches(stats, ranges):
+                    selected.append((run_id, site, stats))
+        return selected
+
+    def dataset(self, table, runs=None, body_sites=None, ranges=None):
+        """A pyarrow dataset over the selected partitions, with run_id and body_site columns"""
+        files = [self.path(path) for _, _, stats in self.partitions(table, runs, body_sites, ranges)
+                 for path in stats['files']]
+        partitioning = ds.partitioning(pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]),
+                                       flavor='hive')
+        return ds.dataset(files, filesystem=self.fs, format='parquet', partitioning=partitioning,
+                          partition_base_dir=self.path(table))
+
+    def scan(self, table, columns=None, filter=None, runs=None, body_sites=None, ranges=None):
+        """
+        Read matching rows of a table.
+
+        Args:
+            filter: pyarrow expression pushed down to the row groups
+            ranges: {column: (low, high)} used to skip partitions by their statistics
+
+        Returns:
+            pyarrow Table
+        """
+        if not self.partitions(table, runs, body_sites, ranges):
+            return pa.table({column: pa.array([]) for column in columns or []})
+        dataset = self.dataset(table, runs, body_sites, ranges)
+        if ranges:
+            for column, (low, high) in ranges.items():
+                if low is not None:
+                    filter = (ds.field(column) >= low) if filter is None else filter & (ds.field(column) >= low)
+                if high is not None:
+                    filter = (ds.field(column) <= high) if filter is None else filter & (ds.field(column) <= high)
+        return dataset.to_table(columns=columns, filter=filter)
+
+    def species_abundance(self, species, by=('run_id', 'body_site'), runs=None, body_sites=None):
+        """
+        Mean relative abundance of a species, including samples where it was not detected.
+
+        Returns:
+            DataFrame with the `by` columns, samples, detected and mean_abundance
+        """
+        by = list(by)
+        found = self.scan('species', columns=PARTITION_COLUMNS + ['sample_id', 'relative_abundance'],
+                          filter=ds.field('species') == species, runs=runs, body_sites=body_sites).to_pandas()
+        # Sample counts come from the catalog, so absent samples count as zero
+        totals = pd.DataFrame([{'run_id': run_id, 'body_site': site, 'samples': stats['samples']}
+                               for run_id, site, stats in self.partitions('species', runs, body_sites)],
+                              columns=PARTITION_COLUMNS + ['samples'])
+        totals = totals.groupby(by, as_index=False)['samples'].sum()
+        sums = found.groupby(by, as_index=False).agg(detected=('sample_id', 'nunique'),
+                                                     total=('relative_abundance', 'sum'))
+        result = totals.merge(sums, on=by, how='left').fillna({'detected': 0, 'total': 0.0})
+        result['detected'] = result['detected'].astype(int)
+        result['mean_abundance'] = result['total'] / result['samples']
+        return result.drop(columns=['total']).sort_values(by).reset_index(drop=True)
+
+    def sql(self, query):
+        """Run SQL over every table (as a view of the same name) in DuckDB"""
+        if duckdb is None:
+            raise RuntimeError("SQL queries need DuckDB (pip install duckdb); "
+                               "use scan() or the abundance command without it")
+        connection = duckdb.connect()
+        for table in TABLES:
+            if self.partitions(table):
+                connection.register(table, self.dataset(table))
+        return connection.execute(query).df()
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-run results warehouse')
+    parser.add_argument('--warehouse', required=True, help='Warehouse location, e.g. s3://bucket/warehouse')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help="Append (or replace) a run's tables")
+    ingest_parser.add_argument('--run-id', required=True, help='Run (workflow) ID')
+    ingest_parser.add_argument('--samples', required=True, help='Sample sheet with sample_id and body_site')
+    ingest_parser.add_argument('--species', help='merge_metaphlan output (metaphlan_merged.tsv)')
+    ingest_parser.add_argument('--pathways', help='merge_humann pathway abundance table')
+    ingest_parser.add_argument('--alpha', help='diversity_analysis alpha_diversity.tsv')
+    ingest_parser.add_argument('--pcoa', help='diversity_analysis pcoa_coordinates.tsv')
+
+    abundance_parser = subparsers.add_parser('abundance', help='Mean abundance of a species across runs')
+    abundance_parser.add_argument('--species', required=True, help='Species name, e.g. Bacteroides_fragilis')
+    abundance_parser.add_argument('--by', nargs='+', default=['body_site'], choices=PARTITION_COLUMNS,
+                                  help='Columns to group by (default: body_site)')
+    abundance_parser.add_argument('--runs', nargs='+', help='Only these runs')
+    abundance_parser.add_argument('--body-sites', nargs='+', help='Only these body sites')
+
+    query_parser = subparsers.add_parser('query', help='Run SQL over the tables (needs DuckDB)')
+    query_parser.add_argument('sql', help='Query; tables: ' + ', '.join(TABLES))
+
+    subparsers.add_parser('stats', help='Runs, partitions and rows per table')
+    args = parser.parse_args()
+
+    warehouse = Warehouse(args.warehouse)
+    if args.command == 'ingest':
+        readers = {'species': (args.species, read_species), 'pathways': (args.pathways, read_pathways),
+                   'alpha_diversity': (args.alpha, read_sample_table), 'pcoa': (args.pcoa, read_sample_table)}
+        tables = {name: reader(path) for name, (path, reader) in readers.items() if path and os.path.exists(path)}
+        entry = warehouse.ingest(args.run_id, tables, read_sample_sites(args.samples))
+        for name, partitions in entry['tables'].items():
+            print(f"{name}: {sum(stats['rows'] for stats in partitions.values())} rows "
+                  f"in {len(partitions)} partitions")
+    elif args.command == 'abundance':
+        result = warehouse.species_abundance(args.species, args.by, args.runs, args.body_sites)
+        print(result.to_csv(sep='\t', index=False), end='')
+    elif args.command == 'query':
+        try:
+            print(warehouse.sql(args.sql).to_csv(sep='\t', index=False), end='')
+        except RuntimeError as e:
+            sys.exit(str(e))
+    else:
+        catalog = warehouse.catalog()
+        print(f"{len(catalog)} runs")
+        for table in TABLES:
+            partitions = warehouse.partitions(table)
+            print(f"{table}: {len(partitions)} partitions, {sum(stats['rows'] for _, _, stats in partitions)} rows")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# synthetic_cohort.py - Generate synthetic Kraken2, MetaPhlAn and HUMAnN outputs
+#
+# Writes the files the reporting stages consume (kraken_reports,
+# diversity_analysis, create_summary) for a cohort of any size, so those
+# stages can be exercised without running the profilers. Each body site has
+# its own ranking of species; abundances follow a power law over that ranking
+# with log-normal noise and prevalence falls off with rank, so profiles are
+# sparse and long-tailed like real ones.
+
+import argparse
+import json
+import math
+import os
+import random
+
+# Real lineages so that every rank of the reports is populated
+TAXONOMY = [
+    ("Firmicutes", "Clostridia", "Eubacteriales", "Oscillospiraceae", "Faecalibacterium"),
+    ("Firmicutes", "Clostridia", "Eubacteriales", "Lachnospiraceae", "Roseburia"),
+    ("Firmicutes", "Clostridia", "Eubacteriales", "Oscillospiraceae", "Ruminococcus"),
+    ("Firmicutes", "Clostridia", "Eubacteriales", "Clostridiaceae", "Clostridium"),
+    ("Firmicutes", "Bacilli", "Lactobacillales", "Streptococcaceae", "Streptococcus"),
+    ("Firmicutes", "Bacilli", "Lactobacillales", "Lactobacillaceae", "Lactobacillus"),
+    ("Firmicutes", "Bacilli", "Bacillales", "Staphylococcaceae", "Staphylococcus"),
+    ("Firmicutes", "Negativicutes", "Veillonellales", "Veillonellaceae", "Veillonella"),
+    ("Bacteroidetes", "Bacteroidia", "Bacteroidales", "Bacteroidaceae", "Bacteroides"),
+    ("Bacteroidetes", "Bacteroidia", "Bacteroidales", "Prevotellaceae", "Prevotella"),
+    ("Bacteroidetes", "Bacteroidia", "Bacteroidales", "Rikenellaceae", "Alistipes"),
+    ("Bacteroidetes", "Bacteroidia", "Bacteroidales", "Tannerellaceae", "Parabacteroides"),
+    ("Bacteroidetes", "Bacteroidia", "Bacteroidales", "Porphyromonadaceae", "Porphyromonas"),
+    ("Actinobacteria", "Actinomycetia", "Bifidobacteriales", "Bifidobacteriaceae", "Bifidobacterium"),
+    ("Actinobacteria", "Actinomycetia", "Corynebacteriales", "Corynebacteriaceae", "Corynebacterium"),
+    ("Actinobacteria", "Actinomycetia", "Propionibacteriales", "Propionibacteriaceae", "Cutibacterium"),
+    ("Actinobacteria", "Actinomycetia", "Actinomycetales", "Actinomycetaceae", "Actinomyces"),
+    ("Actinobacteria", "Actinomycetia", "Micrococcales", "Micrococcaceae", "Rothia"),
+    ("Proteobacteria", "Gammaproteobacteria", "Enterobacterales", "Enterobacteriaceae", "Escherichia"),
+    ("Proteobacteria", "Gammaproteobacteria", "Pasteurellales", "Pasteurellaceae", "Haemophilus"),
+    ("Proteobacteria", "Betaproteobacteria", "Neisseriales", "Neisseriaceae", "Neisseria"),
+    ("Proteobacteria", "Gammaproteobacteria", "Moraxellales", "Moraxellaceae", "Moraxella"),
+    ("Fusobacteria", "Fusobacteriia", "Fusobacteriales", "Fusobacteriaceae", "Fusobacterium"),
+    ("Verrucomicrobia", "Verrucomicrobiae", "Verrucomicrobiales", "Akkermansiaceae", "Akkermansia"),
+]
+RANKS = ['P', 'C', 'O', 'F', 'G', 'S']
+METAPHLAN_RANKS = ['k', 'p', 'c', 'o', 'f', 'g', 's']
+
+BODY_SITES = ['stool', 'buccal_mucosa', 'anterior_nares', 'supragingival_plaque', 'posterior_fornix',
+              'tongue_dorsum']
+
+PATHWAY_NAMES = [
+    "adenosine ribonucleotides de novo biosynthesis", "L-isoleucine biosynthesis I",
+    "pyruvate fermentation to acetate and lactate II", "UMP biosynthesis", "glycolysis III",
+    "peptidoglycan biosynthesis I", "coenzyme A biosynthesis I", "L-valine biosynthesis",
+    "superpathway of branched amino acid biosynthesis", "NAD salvage pathway II",
+]
+
+# Shape of the community model
+ABUNDANCE_EXPONENT = 1.1      # Power law of mean abundance over a site's species ranking
+ABUNDANCE_SIGMA = 1.0         # Log-normal sample-to-sample variation
+PREVALENCE_EXPONENT = 0.5     # Probability that a species is present falls off with rank
+MAX_PREVALENCE = 0.9
+METAPHLAN_DETECTION = 1e-4    # MetaPhlAn reports fewer, and noisier, species than Kraken2
+METAPHLAN_SIGMA = 0.2
+GENUS_ONLY_FRACTION = 0.15    # Share of a species' reads Kraken2 can only place at genus level
+CARRIER_PROBABILITY = 0.25    # Probability that a species encodes a non-core function
+CORE_FUNCTIONS = 0.1          # Share of functions every species encodes
+STRATIFIED_CONTRIBUTORS = 3   # Species contributions written per function and sample
+
+def build_species(species, rng):
+    """Species with lineages and NCBI-style taxon IDs, spread unevenly over the genera"""
+    weights = [1.0 / (i + 1) for i in range(len(TAXONOMY))]
+    taxids = {}
+
+    def taxid(name):
+        return taxids.setdefault(name, 100000 + len(taxids))
+
+    catalog = []
+    for index in range(species):
+        lineage = rng.choices(TAXONOMY, weights=weights)[0]
+        name = f"{lineage[-1]} sp{index + 1:04d}"
+        names = lineage + (name,)
+        catalog.append({
+            'name': name,
+            'lineage': names,
+            'taxids': [taxid(rank + '__' + '|'.join(names[:depth + 1])) for depth, rank in enumerate(RANKS)]
+        })
+    return catalog
+
+def site_names(body_sites):
+    """The first body sites of the HMP list, extended with numbered sites if more are asked for"""
+    return [BODY_SITES[i] if i < len(BODY_SITES) else f"site_{i + 1}" for i in range(body_sites)]
+
+def site_profiles(sites, species, rng):
+    """Per-site species ranking with mean abundance weights and prevalences"""
+    profiles = {}
+    for site in sites:
+        ranking = list(range(species))
+        rng.shuffle(ranking)
+        profiles[site] = [
+            (index, (rank + 1) ** -ABUNDANCE_EXPONENT, MAX_PREVALENCE * (rank + 1) ** -PREVALENCE_EXPONENT)
+            for rank, index in enumerate(ranking)
+        ]
+    return profiles
+
+def sample_community(profile, rng):
+    """Relative abundances of the species present in one sample, as {species index: fraction}"""
+    community = {}
+    for index, weight, prevalence in profile:
+        if rng.random() < prevalence:
+            community[index] = weight * rng.lognormvariate(0, ABUNDANCE_SIGMA)
+    if not community:
+        index, weight, _ = profile[0]
+        community[index] = weight
+    total = sum(community.values())
+    return {index: value / total for index, value in community.items()}
+
+def function_carriers(species, functions, rng):
+    """Per-species [(function index, copy weight)] for the functions each species encodes"""
+    core = max(1, int(functions * CORE_FUNCTIONS))
+    carriers = [[] for _ in range(species)]
+    for function in range(functions):
+        chance = 1.0 if function < core else CARRIER_PROBABILITY
+        for index in range(species):
+            if rng.random() < chance:
+                carriers[index].append((function, rng.lognormvariate(0, 0.5)))
+    return carriers
+
+def write_kraken_report(path, catalog, community, reads, classified, rng):
+    """Write a Kraken2 report with clade and direct read counts at every rank"""
+    taxon_reads = {}
+    clade_reads = {}
+    taxids = {}
+    for index, fraction in community.items():
+        count = int(round(reads * classified * fraction))
+        if count == 0:
+            continue
+        genus_only = int(count * GENUS_ONLY_FRACTION * rng.random())
+        lineage = catalog[index]['lineage']
+        taxon_reads[lineage] = taxon_reads.get(lineage, 0) + count - genus_only
+        if genus_only:
+            taxon_reads[lineage[:-1]] = taxon_reads.get(lineage[:-1], 0) + genus_only
+        for depth in range(len(lineage)):
+            clade = lineage[:depth + 1]
+            placed = count if depth < len(lineage) - 1 else count - genus_only
+            clade_reads[clade] = clade_reads.get(clade, 0) + placed
+            taxids[clade] = catalog[index]['taxids'][depth]
+    classified_reads = sum(taxon_reads.values())
+    unclassified = reads - classified_reads
+
+    # Kraken2 writes the tree depth-first with the largest clades first
+    children = {}
+    for clade in clade_reads:
+        children.setdefault(clade[:-1], []).append(clade)
+    for siblings in children.values():
+        siblings.sort(key=lambda clade: (-clade_reads[clade], clade))
+
+    def line(count, direct, rank, taxid, depth, name):
+        return f"{100.0 * count / reads:6.2f}\t{count}\t{direct}\t{rank}\t{taxid}\t{'  ' * depth}{name}\n"
+
+    with open(path, 'w') as f:
+        f.write(line(unclassified, unclassified, 'U', 0, 0, 'unclassified'))
+        f.write(line(classified_reads, 0, 'R', 1, 0, 'root'))
+        f.write(line(classified_reads, 0, 'D', 2, 1, 'Bacteria'))
+        stack = list(reversed(children.get((), [])))
+        while stack:
+            clade = stack.pop()
+            f.write(line(clade_reads[clade], taxon_reads.get(clade, 0), RANKS[len(clade) - 1],
+                         taxids[clade], len(clade) + 1, clade[-1]))
+            stack.extend(reversed(children.get(clade, [])))
+
+def metaphlan_profile(catalog, community, rng):
+    """MetaPhlAn clade abundances (percent) from a sample's community, {clade name: (taxids, percent)}"""
+    detected = {index: fraction * rng.lognormvariate(0, METAPHLAN_SIGMA)
+                for index, fraction in community.items() if fraction >= METAPHLAN_DETECTION}
+    if not detected:
+        detected = dict([max(community.items(), key=lambda item: item[1])])
+    total = sum(detected.values())
+    clades = {}
+    for index, value in detected.items():
+        entry = catalog[index]
+        names = ('Bacteria',) + entry['lineage'][:-1] + (entry['lineage'][-1].replace(' ', '_'),)
+        taxids = ['2'] + [str(taxid) for taxid in entry['taxids']]
+        for depth in range(len(names)):
+            clade = '|'.join(f"{rank}__{name}" for rank, name in zip(METAPHLAN_RANKS, names[:depth + 1]))
+            _, percent = clades.get(clade, (None, 0.0))
+            clades[clade] = ('|'.join(taxids[:depth + 1]), percent + 100.0 * value / total)
+    return clades
+
+def write_metaphlan_profile(path, sample_id, clades, reads):
+    with open(path, 'w') as f:
+        f.write("#mpa_vJan21_CHOCOPhlAnSGB_202103\n")
+        f.write(f"#metaphlan {sample_id}.fastq.gz --input_type fastq --bowtie2db metaphlan_db\n")
+        f.write(f"#{reads} reads processed\n")
+        f.write("#SampleID\tMetaphlan_Analysis\n")
+        f.write("#clade_name\tNCBI_tax_id\trelative_abundance\tadditional_species\n")
+        for clade in sorted(clades, key=lambda name: (name.count('|'), -clades[name][1], name)):
+            taxids, percent = clades[clade]
+            f.write(f"{clade}\t{taxids}\t{percent:.5f}\t\n")
+
+def functional_profile(catalog, community, carriers, labels, reads):
+    """
+    HUMAnN-style abundances: each function sums the copy-weighted abundance of
+    the species that encode it, with the largest contributors stratified.
+
+    Returns:
+        {row name: value}, community rows first and unstratified before stratified
+    """
+    contributions = {}
+    for index, fraction in community.items():
+        for function, weight in carriers[index]:
+            contributions.setdefault(function, []).append((reads * fraction * weight / 1000.0, index))
+    rows = {}
+    stratified = {}
+    for function in sorted(contributions):
+        values = contributions[function]
+        rows[labels[function]] = sum(value for value, _ in values)
+        for value, index in sorted(values, reverse=True)[:STRATIFIED_CONTRIBUTORS]:
+            genus, name = catalog[index]['lineage'][-2], catalog[index]['lineage'][-1].replace(' ', '_')
+            stratified[f"{labels[function]}|g__{genus}.s__{name}"] = value
+    rows.update(stratified)
+    return rows
+
+def write_humann_table(path, header, sample_id, community_rows, rows):
+    with open(path, 'w') as f:
+        f.write(f"# {header}\t{sample_id}_Abundance\n")
+        for name, value in list(community_rows.items()) + list(rows.items()):
+            f.write(f"{name}\t{value:.6g}\n")
+
+def write_merged(path, header, samples, tables, preamble=None):
+    """Outer-join per-sample {row: value} tables into one table, missing values as 0"""
+    names = []
+    seen = set()
+    for table in tables:
+        for name in table:
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+    with open(path, 'w') as f:
+        if preamble:
+            f.write(preamble + "\n")
+        f.write(header + "\t" + "\t".join(samples) + "\n")
+        for name in names:
+            f.write(name + "\t" + "\t".join(f"{table.get(name, 0):.6g}" for table in tables) + "\n")
+
+def alpha_metrics(percentages):
+    """Shannon (natural log), Simpson (1 - dominance) and richness of species percentages"""
+    total = sum(percentages)
+    fractions = [value / total for value in percentages if value > 0]
+    return {
+        'shannon': -sum(p * math.log(p) for p in fractions),
+        'simpson': 1.0 - sum(p * p for p in fractions),
+        'observed_species': len(fractions)
+    }
+
+def generate_cohort(output_dir, samples=50, species=500, body_sites=3, pathways=300, gene_families=1000,
+                    read_depth=1000000, seed=1):
+    """
+    Write a synthetic cohort to output_dir.
+
+    Layout (file names as the reporting stages stage them):
+        metadata.csv                           sample_id,body_site
+        reports/<sample>.kreport               Kraken2 reports (kraken_reports)
+        profiles/<sample>.metaphlan.tsv        MetaPhlAn profiles
+        humann/<sample>.humann.{genefamilies,pathabundance}.tsv
+        metaphlan_merged.tsv                   merge_metaphlan output (diversity_analysis, create_summary)
+        humann_pathabundance_relab_merged.tsv  merge_humann relab output (create_summary)
+        diversity/alpha_diversity.tsv          Reference diversity tables from the true profiles, used
+        diversity/pcoa_coordinates.tsv         when diversity_analysis cannot run (PCoA is a stand-in)
+        cohort.json                            Parameters and file sizes
+
+    Returns:
+        The cohort.json manifest
+    """
+    rng = random.Random(seed)
+    catalog = build_species(species, rng)
+    sites = site_names(body_sites)
+    profiles = site_profiles(sites, species, rng)
+    pathway_carriers = function_carriers(species, pathways, rng)
+    pathway_labels = [f"PWY-{1001 + i}: {PATHWAY_NAMES[i % len(PATHWAY_NAMES)]}" for i in range(pathways)]
+    gene_carriers = function_carriers(species, gene_families, rng)
+    gene_labels = [f"UniRef90_SYN{i + 1:06d}" for i in range(gene_families)]
+
+    for subdir in ('reports', 'profiles', 'humann', 'diversity'):
+        os.makedirs(os.path.join(output_dir, subdir), exist_ok=True)
+
+    sample_ids = [f"SYN{i + 1:05d}" for i in range(samples)]
+    sample_sites = [sites[i % len(sites)] for i in range(samples)]
+    rng.shuffle(sample_sites)
+    metaphlan_tables = []
+    relab_tables = []
+    alpha_rows = []
+    for sample_id, site in zip(sample_ids, sample_sites):
+        community = sample_community(profiles[site], rng)
+        reads = int(read_depth * rng.lognormvariate(0, 0.3))
+        classified = rng.uniform(0.6, 0.95)
+
+        write_kraken_report(os.path.join(output_dir, 'reports', f"{sample_id}.kreport"),
+                            catalog, community, reads, classified, rng)
+
+        clades = metaphlan_profile(catalog, community, rng)
+        write_metaphlan_profile(os.path.join(output_dir, 'profiles', f"{sample_id}.metaphlan.tsv"),
+                                sample_id, clades, reads)
+        metaphlan_tables.append({clade: percent for clade, (_, percent) in clades.items()})
+        alpha_rows.append(alpha_metrics([percent for clade, (_, percent) in clades.items() if '|s__' in clade]))
+
+        unmapped = reads * (1 - classified) / 1000.0
+        pathabundance = functional_profile(catalog, community, pathway_carriers, pathway_labels, reads)
+        community_rows = {'UNMAPPED': unmapped, 'UNINTEGRATED': reads * classified * 0.3 / 1000.0}
+        write_humann_table(os.path.join(output_dir, 'humann', f"{sample_id}.humann.pathabundance.tsv"),
+                           'Pathway', sample_id, community_rows, pathabundance)
+        write_humann_table(os.path.join(output_dir, 'humann', f"{sample_id}.humann.genefamilies.tsv"),
+                           'Gene Family', sample_id, {'UNMAPPED': unmapped},
+                           functional_profile(catalog, community, gene_carriers, gene_labels, reads))
+
+        # humann_renorm_table -u relab: community-level rows sum to 1
+        total = sum(community_rows.values()) + sum(value for name, value in pathabundance.items() if '|' not in name)
+        relab = dict(community_rows, **pathabundance)
+        relab_tables.append({name: value / total for name, value in relab.items()})
+
+    with open(os.path.join(output_dir, 'metadata.csv'), 'w') as f:
+        f.write("sample_id,body_site\n")
+        for sample_id, site in zip(sample_ids, sample_sites):
+            f.write(f"{sample_id},{site}\n")
+
+    write_merged(os.path.join(output_dir, 'metaphlan_merged.tsv'), 'clade_name', sample_ids, metaphlan_tables,
+                 preamble="#SampleMetadata:" + ','.join(sample_sites))
+    write_merged(os.path.join(output_dir, 'humann_pathabundance_relab_merged.tsv'), '# Pathway',
+                 [f"{sample_id}_Abundance" for sample_id in sample_ids], relab_tables)
+
+    with open(os.path.join(output_dir, 'diversity', 'alpha_diversity.tsv'), 'w') as f:
+        f.write("sample\tshannon\tsimpson\tobserved_species\tbody_site\n")
+        for sample_id, site, alpha in zip(sample_ids, sample_sites, alpha_rows):
+            f.write(f"{sample_id}\t{alpha['shannon']:.6f}\t{alpha['simpson']:.6f}\t"
+                    f"{alpha['observed_species']}\t{site}\n")
+    centroids = {site: [rng.gauss(0, 0.3) for _ in range(5)] for site in sites}
+    with open(os.path.join(output_dir, 'diversity', 'pcoa_coordinates.tsv'), 'w') as f:
+        f.write("sample\tPC1\tPC2\tPC3\tPC4\tPC5\tbody_site\n")
+        for sample_id, site in zip(sample_ids, sample_sites):
+            coordinates = '\t'.join(f"{value + rng.gauss(0, 0.1):.6f}" for value in centroids[site])
+            f.write(f"{sample_id}\t{coordinates}\t{site}\n")
+
+    files = {}
+    for root, _, names in os.walk(output_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, output_dir)] = os.path.getsize(path)
+    manifest = {
+        'samples': samples,
+        'species': species,
+        'body_sites': body_sites,
+        'pathways': pathways,
+        'gene_families': gene_families,
+        'read_depth': read_depth,
+        'seed': seed,
+        'species_per_sample': round(sum(alpha['observed_species'] for alpha in alpha_rows) / max(samples, 1), 1),
+        'input_bytes': sum(files.values()),
+        'files': dict(sorted(files.items()))
+    }
+    with open(os.path.join(output_dir, 'cohort.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic cohort of Kraken2, MetaPhlAn and HUMAnN outputs')
+    parser.add_argument('output_dir', help='Directory to write the cohort to')
+    parser.add_argument('--samples', type=int, default=50, help='Number of samples (default: 50)')
+    parser.add_argument('--species', type=int, default=500, help='Species in the catalog (default: 500)')
+    parser.add_argument('--body-sites', type=int, default=3, help='Number of body sites (default: 3)')
+    parser.add_argument('--pathways', type=int, default=300, help='MetaCyc-style pathways (default: 300)')
+    parser.add_argument('--gene-families', type=int, default=1000, help='UniRef-style gene families (default: 1000)')
+    parser.add_argument('--read-depth', type=int, default=1000000, help='Median reads per sample (default: 1000000)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    args = parser.parse_args()
+
+    manifest = generate_cohort(args.output_dir, args.samples, args.species, args.body_sites, args.pathways,
+                               args.gene_families, args.read_depth, args.seed)
+    print(f"Synthetic cohort written to: {args.output_dir} ({manifest['samples']} samples, "
+          f"{manifest['species_per_sample']} species per sample, {manifest['input_bytes'] / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
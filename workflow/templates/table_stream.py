@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# table_stream.py - Lazy, projected readers for the pipeline's tab-separated tables
+#
+# The merged abundance tables have one row per feature (species, pathway,
+# phylum) and one column per sample. The reporting steps only need a few
+# aggregates from them, so these readers work one line at a time and only
+# parse the fields that are asked for, keeping memory bounded by the output
+# rather than by the table.
+
+import math
+
+MISSING_VALUES = ('', 'nan', 'NaN', 'NA')
+
+def _skip(handle, skip_lines):
+    """Advance an open file past the first skip_lines lines"""
+    for _ in range(skip_lines):
+        if not handle.readline():
+            break
+
+def _clean_header(line, sep):
+    """Split a header line, dropping the leading '#' some tools write"""
+    columns = line.rstrip('\r\n').split(sep)
+    if columns and columns[0].startswith('#'):
+        columns[0] = columns[0][1:]
+    return columns
+
+def parse_float(value):
+    """Parse a table value, returning None for missing entries"""
+    if value in MISSING_VALUES:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return None if math.isnan(number) else number
+
+def read_header(path, skip_lines=0, sep='\t'):
+    """
+    Read only the header of a table.
+
+    Args:
+        path: Table file
+        skip_lines: Lines before the header (e.g. the #SampleMetadata line)
+        sep: Field separator
+
+    Returns:
+        List of column names, including the feature (index) column
+    """
+    with open(path, 'r', newline='') as f:
+        _skip(f, skip_lines)
+        return _clean_header(f.readline(), sep)
+
+def count_samples(path, skip_lines=0, sep='\t'):
+    """Number of sample columns, read from the header alone"""
+    return max(0, len(read_header(path, skip_lines, sep)) - 1)
+
+def iter_rows(path, skip_lines=0, sep='\t', row_filter=None, columns=None):
+    """
+    Stream (feature, values) pairs from a feature-by-sample table.
+
+    The feature name is split off first, so rows rejected by row_filter
+    are never parsed further.
+
+    Args:
+        path: Table file
+        skip_lines: Lines before the header
+        sep: Field separator
+        row_filter: Optional predicate on the feature name
+        columns: Optional sample column names to project; others are not parsed
+
+    Yields:
+        Tuples of (feature name, list of floats or None for missing values)
+    """
+    with open(path, 'r', newline='') as f:
+        _skip(f, skip_lines)
+        header = _clean_header(f.readline(), sep)
+        positions = None
+        if columns is not None:
+            lookup = {name: i - 1 for i, name in enumerate(header) if i > 0}
+            positions = [lookup[name] for name in columns]
+
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            feature, _, rest = line.partition(sep)
+            if row_filter is not None and not row_filter(feature):
+                continue
+            fields = rest.split(sep)
+            if positions is not None:
+                fields = [fields[i] for i in positions]
+            yield feature, [parse_float(value) for value in fields]
+
+def row_mean(values):
+    """Mean of the non-missing values (pandas skipna semantics), 0.0 when empty"""
+    present = [value for value in values if value is not None]
+    return sum(present) / len(present) if present else 0.0
+
+def iter_row_means(path, skip_lines=0, sep='\t', row_filter=None):
+    """Stream (feature, mean across samples) pairs"""
+    for feature, values in iter_rows(path, skip_lines, sep, row_filter):
+        yield feature, row_mean(values)
+
+def read_columns(path, columns, sep='\t', converters=None):
+    """
+    Read a few columns of a per-sample table (index column first).
+
+    Args:
+        path: Table file
+        columns: Column names to keep
+        sep: Field separator
+        converters: Optional mapping of column name to conversion function
+
+    Returns:
+        Tuple of (index values, {column: list of values})
+    """
+    converters = converters or {}
+    with open(path, 'r', newline='') as f:
+        header = _clean_header(f.readline(), sep)
+        positions = [header.index(name) for name in columns]
+        index = []
+        data = {name: [] for name in columns}
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            fields = line.split(sep)
+            index.append(fields[0])
+            for name, position in zip(columns, positions):
+                value = fields[position] if position < len(fields) else ''
+                convert = converters.get(name)
+                data[name].append(convert(value) if convert else value)
+    return index, data
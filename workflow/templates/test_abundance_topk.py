@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_abundance_topk.py - Unit tests for abundance_topk.py
+
+import unittest
+import os
+import random
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates import abundance_topk
+from templates.abundance_topk import TopKAggregator, match_sample_groups, top_k_table
+
+def reference_top(rows, k, columns=None):
+    """Top-k by a stable descending sort of skipna means"""
+    ranked = []
+    for feature, values in rows:
+        picked = values if columns is None else [values[i] for i in columns]
+        present = [v for v in picked if v is not None]
+        ranked.append((feature, sum(present) / len(present) if present else 0.0))
+    return sorted(ranked, key=lambda item: item[1], reverse=True)[:k]
+
+class TestAbundanceTopK(unittest.TestCase):
+    """Test cases for the abundance_topk.py module"""
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.groups = ['stool', 'oral', 'stool', None, 'oral', 'stool']
+        self.rows = []
+        for i in range(500):
+            values = [rng.choice([None, 0.0, 1.0, round(rng.random(), 2)]) for _ in self.groups]
+            self.rows.append((f'F{i}', values))
+
+    def check_rankings(self, chunk_size):
+        aggregator = TopKAggregator(10, self.groups)
+        for start in range(0, len(self.rows), chunk_size):
+            chunk = self.rows[start:start + chunk_size]
+            aggregator.update([f for f, _ in chunk], [v for _, v in chunk])
+
+        self.assertEqual(aggregator.features_seen, 500)
+        self.assertEqual(aggregator.top(), reference_top(self.rows, 10))
+        by_group = aggregator.top_by_group()
+        self.assertEqual(sorted(by_group), ['oral', 'stool'])
+        self.assertEqual(by_group['stool'], reference_top(self.rows, 10, [0, 2, 5]))
+        self.assertEqual(by_group['oral'], reference_top(self.rows, 10, [1, 4]))
+
+    def test_matches_stable_sort(self):
+        """Test rankings (including ties) across chunk sizes"""
+        for chunk_size in (1, 7, 64, 1000):
+            self.check_rankings(chunk_size)
+
+    def test_without_numpy(self):
+        """Test the pure Python chunk reduction"""
+        saved = abundance_topk.np
+        abundance_topk.np = None
+        try:
+            self.check_rankings(64)
+        finally:
+            abundance_topk.np = saved
+
+    def test_match_sample_groups(self):
+        """Test mapping merged table columns to sample groups"""
+        sites = {'S1': 'stool', 'S10': 'oral'}
+        self.assertEqual(
+            match_sample_groups(['S1', 'S10_Abundance', 'S1.metaphlan', 'S100_Abundance'], sites),
+            ['stool', 'oral', 'stool', None]
+        )
+
+    def test_top_k_table(self):
+        """Test streaming a MetaPhlAn-style table from disk"""
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False) as f:
+            f.write("#SampleMetadata:stool,oral\n")
+            f.write("clade_name\tS1.metaphlan\tS2.metaphlan\n")
+            f.write("k__Bacteria\t100\t100\n")
+            f.write("k__Bacteria|s__A\t10\t0\n")
+            f.write("k__Bacteria|s__B\t2\t20\n")
+            f.write("k__Bacteria|s__C\t\t3\n")
+            path = f.name
+        try:
+            aggregator = top_k_table(path, 2, skip_lines=1, row_filter=lambda name: 's__' in name,
+                                     sample_groups={'S1': 'stool', 'S2': 'oral'}, chunk_size=2)
+        finally:
+            os.unlink(path)
+
+        self.assertEqual(aggregator.features_seen, 3)
+        self.assertEqual([name for name, _ in aggregator.top()], ['k__Bacteria|s__B', 'k__Bacteria|s__A'])
+        self.assertEqual(aggregator.top('stool'), [('k__Bacteria|s__A', 10.0), ('k__Bacteria|s__B', 2.0)])
+        self.assertEqual(aggregator.top('oral'), [('k__Bacteria|s__B', 20.0), ('k__Bacteria|s__C', 3.0)])
+
+if __name__ == '__main__':
+    unittest.main()
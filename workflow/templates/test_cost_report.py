@@ -15,7 +15,12 @@ from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import the module to test
-from templates.cost_report import calculate_costs, get_nextflow_metrics, main
+from templates.cost_report import (
+    calculate_costs, get_nextflow_metrics, main, DEFAULT_RATES, BATCH_COLUMNS,
+    calculate_costs_batch, round_half_even, load_rate_catalog, run_batch,
+    attribute_costs, attribute_trace_costs, load_price_table
+)
+import numpy as np
 
 class TestCostReport(unittest.TestCase):
     """Test cases for the cost_report.py module"""
@@ -101,6 +106,10 @@ class TestCostReport(unittest.TestCase):
         mock_args.data_gb = 80.0
         mock_args.duration_minutes = 20.0
         mock_args.output = 'test_output.json'
+        mock_args.execution_metrics = None
+        mock_args.rates = None
+        mock_args.scenarios = None
+        mock_args.trace = None
         mock_parse_args.return_value = mock_args
         
         # Call the main function
@@ -127,5 +136,210 @@ class TestCostReport(unittest.TestCase):
         self.assertEqual(cost_data['metadata']['data_gb'], 80.0)
         self.assertEqual(cost_data['metadata']['duration_minutes'], 20.0)
 
+class TestCostAttribution(unittest.TestCase):
+    """Test cases for per-task cost attribution in cost_report.py"""
+
+    PRICE_TABLE = {
+        'instances': {
+            'c7g.2xlarge': {'vcpus': 8, 'spot': 0.04, 'on_demand': 0.28},
+            'g5g.2xlarge': {'vcpus': 8, 'spot': 0.50, 'on_demand': 0.56}
+        },
+        'queues': {
+            'cpu-queue': {'instance_type': 'c7g.2xlarge', 'price_model': 'spot'},
+            'gpu-queue': {'instance_type': 'g5g.2xlarge', 'price_model': 'spot'}
+        },
+        'default': {'instance_type': 'c7g.2xlarge', 'price_model': 'on_demand'}
+    }
+
+    def test_attribute_costs(self):
+        """Test cost attribution by process, sample, body site and instance"""
+        rows = [
+            # 1h on half a spot CPU instance
+            {'process': 'preprocess_reads', 'tag': 'S1', 'status': 'COMPLETED',
+             'realtime': '3600000', 'cpus': '4', 'queue': 'cpu-queue'},
+            # 2h on a whole spot GPU instance
+            {'process': 'taxonomic_classification_kraken', 'tag': 'S2', 'status': 'COMPLETED',
+             'realtime': '7200000', 'cpus': '8', 'queue': 'gpu-queue'},
+            # Unknown queue falls back to the on-demand default
+            {'process': 'create_summary', 'tag': '', 'status': 'COMPLETED',
+             'realtime': '1800000', 'cpus': '2', 'queue': 'other-queue'},
+            # Cached tasks cost nothing in this run
+            {'process': 'preprocess_reads', 'tag': 'S3', 'status': 'CACHED',
+             'realtime': '3600000', 'cpus': '4', 'queue': 'cpu-queue'},
+            # Explicit instance type without a price is reported, not guessed
+            {'process': 'preprocess_reads', 'tag': 'S4', 'status': 'FAILED',
+             'realtime': '60000', 'cpus': '4', 'machine_type': 'x9.huge'}
+        ]
+        result = attribute_costs(rows, self.PRICE_TABLE, {'S1': 'stool', 'S2': 'buccal_mucosa'})
+
+        self.assertEqual(result['tasks'], 4)
+        self.assertEqual(result['unpriced_tasks'], 1)
+        self.assertAlmostEqual(result['by_process']['preprocess_reads'], 0.02)
+        self.assertAlmostEqual(result['by_process']['taxonomic_classification_kraken'], 1.0)
+        self.assertAlmostEqual(result['by_process']['create_summary'], 0.5 * 0.28 * 0.25)
+        self.assertAlmostEqual(result['by_sample']['S1'], 0.02)
+        self.assertAlmostEqual(result['by_sample']['shared'], 0.035)
+        self.assertAlmostEqual(result['by_body_site']['buccal_mucosa'], 1.0)
+        self.assertAlmostEqual(result['by_instance_type']['c7g.2xlarge:on_demand'], 0.035)
+        self.assertAlmostEqual(result['total'], 1.055)
+
+        # Most expensive process comes first
+        self.assertEqual(list(result['by_process'])[0], 'taxonomic_classification_kraken')
+
+    def test_attribute_trace_file_with_default_price_table(self):
+        """Test streaming a trace file against the bundled price table"""
+        price_table = load_price_table(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'price_table.json'))
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('process\ttag\tstatus\trealtime\tcpus\tqueue\n')
+            for i in range(1000):
+                f.write(f'metaphlan_analysis\tS{i % 10}\tCOMPLETED\t3600000\t8\tmicrobiome-demo-queue\n')
+            trace_path = f.name
+        try:
+            result = attribute_trace_costs(trace_path, price_table)
+        finally:
+            os.unlink(trace_path)
+
+        self.assertEqual(result['tasks'], 1000)
+        self.assertAlmostEqual(result['total'], 1000 * 0.0408, places=3)
+        self.assertEqual(len(result['by_sample']), 10)
+
+    def test_attribute_untagged_and_stale_tasks(self):
+        """Test that '-' tags are shared and tasks of earlier runs are left out"""
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('process\ttag\tstatus\tsubmit\trealtime\tcpus\tqueue\n')
+            f.write('create_summary\t-\tCOMPLETED\t2000\t3600000\t4\tcpu-queue\n')
+            f.write('preprocess_reads\tS1\tCOMPLETED\t2500\t3600000\t4\tcpu-queue\n')
+            # Submitted before the run started
+            f.write('preprocess_reads\tS2\tCOMPLETED\t500\t3600000\t4\tcpu-queue\n')
+            trace_path = f.name
+        try:
+            result = attribute_trace_costs(trace_path, self.PRICE_TABLE, since=1000)
+            stale = attribute_trace_costs(trace_path, self.PRICE_TABLE, since=3000)
+        finally:
+            os.unlink(trace_path)
+
+        self.assertEqual(result['tasks'], 2)
+        self.assertEqual(set(result['by_sample']), {'S1', 'shared'})
+        self.assertAlmostEqual(result['by_sample']['shared'], 0.02)
+        self.assertEqual(stale['tasks'], 0)
+
+    @patch('argparse.ArgumentParser.parse_args')
+    def test_main_prefers_environment_when_set(self, mock_parse_args):
+        """Test that Nextflow environment metrics are only used when present"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            mock_args = MagicMock()
+            mock_args.cpu_hours = 60.0
+            mock_args.gpu_hours = 15.0
+            mock_args.data_gb = 80.0
+            mock_args.duration_minutes = 20.0
+            mock_args.output = os.path.join(tmpdir, 'report.json')
+            mock_args.execution_metrics = None
+            mock_args.rates = None
+            mock_args.scenarios = None
+            mock_args.trace = None
+            mock_parse_args.return_value = mock_args
+
+            with patch.dict(os.environ, {'NEXTFLOW_CPU_HOURS': '5'}, clear=True):
+                main()
+            with open(mock_args.output) as f:
+                self.assertEqual(json.load(f)['metadata']['cpu_hours'], 5.0)
+
+class TestCostReportBatch(unittest.TestCase):
+    """Test cases for the batched scenario engine in cost_report.py"""
+
+    def assert_row_matches_scalar(self, results, row, rates):
+        """Check one batch row against calculate_costs for the same inputs"""
+        expected = calculate_costs(
+            results['cpu_hours'][row], results['gpu_hours'][row],
+            results['data_gb'][row], results['duration_minutes'][row], rates
+        )
+        for column, path, _ in BATCH_COLUMNS:
+            value = expected
+            for key in path:
+                value = value[key]
+            self.assertEqual(results[column][row], value, f"{column} differs on row {row}")
+
+    def test_round_half_even_matches_round(self):
+        """Test vectorized rounding against the built-in round()"""
+        rng = np.random.default_rng(42)
+        values = np.concatenate([
+            rng.uniform(-1000, 1000, 20000),
+            np.array([2.675, 0.125, 0.375, 1.005, -0.001, 0.0, 2.5, -2.5, 1e-9, 123456.785])
+        ])
+        for decimals in (1, 2):
+            rounded = round_half_even(values, decimals)
+            expected = [round(v, decimals) for v in values.tolist()]
+            self.assertEqual(rounded.tolist(), expected)
+
+    def test_batch_matches_scalar(self):
+        """Test that every batch row equals the scalar calculation"""
+        rng = np.random.default_rng(7)
+        scenarios = {
+            'cpu_hours': rng.uniform(0, 500, 500),
+            'gpu_hours': rng.uniform(0, 100, 500),
+            'data_gb': rng.uniform(0, 1000, 500)
+        }
+        cheap = json.loads(json.dumps(DEFAULT_RATES))
+        cheap['optimized_aws']['graviton_spot_hour'] = 0.0312
+        catalog = {'default': DEFAULT_RATES, 'cheap': cheap}
+
+        results = calculate_costs_batch(scenarios, catalog)
+
+        self.assertEqual(len(results['total']), 1000)
+        self.assertEqual(results['rate_name'][0], 'default')
+        self.assertEqual(results['rate_name'][500], 'cheap')
+        for row in range(0, 1000, 7):
+            rates = catalog[results['rate_name'][row]]
+            self.assert_row_matches_scalar(results, row, rates)
+
+    def test_batch_accepts_arrays(self):
+        """Test (N, 4) array input and the default rate table"""
+        results = calculate_costs_batch(np.array([[50, 10, 50, 15], [0, 0, 0, 0]]))
+        self.assertEqual(results['total'][0], calculate_costs(50, 10, 50, 15)['estimated_cost']['total'])
+        self.assertEqual(results['total'][1], 0.0)
+        self.assertEqual(results['duration_minutes'][0], 15)
+
+        with self.assertRaises(ValueError):
+            calculate_costs_batch(np.zeros((2, 2)))
+
+    def test_rate_catalog_and_streaming_cli(self):
+        """Test loading a partial catalog and streaming a scenario CSV"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            catalog_path = os.path.join(tmpdir, 'rates.json')
+            with open(catalog_path, 'w') as f:
+                json.dump({'spot': {'optimized_aws': {'gpu_spot_hour': 0.40}},
+                           'on_demand': {'optimized_aws': {'gpu_spot_hour': 1.01}}}, f)
+            catalog = load_rate_catalog(catalog_path)
+            self.assertEqual(catalog['spot']['optimized_aws']['gpu_spot_hour'], 0.40)
+            self.assertEqual(catalog['spot']['on_premises'], DEFAULT_RATES['on_premises'])
+
+            scenarios_path = os.path.join(tmpdir, 'scenarios.csv')
+            with open(scenarios_path, 'w') as f:
+                f.write('cpu_hours,gpu_hours,data_gb\n')
+                for i in range(25):
+                    f.write(f'{i},{i / 2},{i * 3}\n')
+
+            output_path = os.path.join(tmpdir, 'results.csv')
+            rows = run_batch(scenarios_path, output_path, catalog, chunk_size=10)
+            self.assertEqual(rows, 50)
+
+            with open(output_path) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(len(lines), 51)
+            header = lines[0].split(',')
+            last = dict(zip(header, lines[-1].split(',')))
+            self.assertEqual(last['scenario'], '24')
+            self.assertEqual(last['rate_name'], 'on_demand')
+            expected = calculate_costs(24, 12, 72, 0, catalog['on_demand'])
+            self.assertEqual(float(last['total']), expected['estimated_cost']['total'])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.assertRaises(ValueError):
+                path = os.path.join(tmpdir, 'bad.json')
+                with open(path, 'w') as f:
+                    json.dump({'spot': {'moon_base': {}}}, f)
+                load_rate_catalog(path)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
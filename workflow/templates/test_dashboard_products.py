@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_dashboard_products.py - Unit tests for dashboard_products.py
+
+import unittest
+import copy
+import json
+import os
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.dashboard_products import (
+    build_products, changed_shards, write_products, cap_distribution, unpack_points, bin_points, point_bounds,
+    PCOA_POINT
+)
+
+def make_summary(point_count=5):
+    sites = ['stool', 'buccal_mucosa']
+    return {
+        "taxonomic_profile": {
+            "sample_count": point_count,
+            "species_count": 40,
+            "top_species": [{"name": "Bacteroides_vulgatus", "abundance": 12.5}],
+            "top_species_by_site": {"stool": [{"name": "Bacteroides_vulgatus", "abundance": 20.0}]},
+            "phylum_distribution": [{"name": f"P{i}", "abundance": float(20 - i)} for i in range(20)]
+        },
+        "functional_profile": {
+            "pathway_count": 10,
+            "top_pathways": [{"name": "PWY-1", "abundance": 0.5}],
+            "top_pathways_by_site": {"buccal_mucosa": [{"name": "PWY-2", "abundance": 0.25}]}
+        },
+        "diversity": {
+            "alpha": {"shannon": {"mean": 3.0, "std": 0.5, "min": 2.0, "max": 4.0}},
+            "beta": {
+                "pcoa": {
+                    "pc1_vs_pc2": [
+                        {"PC1": i * 0.5, "PC2": -i * 0.25, "body_site": sites[i % 2]}
+                        for i in range(point_count)
+                    ],
+                    "variance_explained": [0.32, 0.18, 0.12]
+                }
+            },
+            "by_site": {"stool": {"shannon": {"mean": 3.5}}, "buccal_mucosa": {"shannon": {"mean": 2.5}}}
+        },
+        "execution_metrics": {"cpu_hours": 1.0},
+        "cost_analysis": {"optimized_aws_cost": 38.5}
+    }
+
+class TestDashboardProducts(unittest.TestCase):
+    """Test cases for the dashboard_products.py module"""
+
+    def test_overview_is_bounded(self):
+        """Test that the overview keeps summaries and references detail shards"""
+        overview, shards = build_products(make_summary(point_count=25), page_size=10)
+
+        self.assertEqual(len(overview['taxonomic_profile']['phylum_distribution']), 12)
+        self.assertEqual(overview['taxonomic_profile']['phylum_count'], 20)
+        pcoa = overview['diversity']['beta']['pcoa']
+        self.assertNotIn('pc1_vs_pc2', pcoa)
+        self.assertEqual(pcoa['point_count'], 25)
+        self.assertEqual(pcoa['pages'], ['pcoa/points-0000.bin', 'pcoa/points-0001.bin', 'pcoa/points-0002.bin'])
+        self.assertEqual(sorted(shards), sorted(overview['shards']))
+        self.assertIn('sites/stool.json', shards)
+        self.assertEqual(json.loads(shards['sites/buccal_mucosa.json'])['top_pathways'][0]['name'], 'PWY-2')
+
+    def test_points_round_trip(self):
+        """Test the binary PCoA point encoding"""
+        summary = make_summary()
+        overview, shards = build_products(summary)
+        data = shards['pcoa/points-0000.bin']
+        self.assertEqual(len(data), 5 * PCOA_POINT.size)
+        points = unpack_points(data, overview['diversity']['beta']['pcoa']['sites'])
+        self.assertEqual(points, summary['diversity']['beta']['pcoa']['pc1_vs_pc2'])
+
+    def test_bin_points(self):
+        """Test that grid counts add up and finer levels nest in coarser ones"""
+        points = make_summary(point_count=200)['diversity']['beta']['pcoa']['pc1_vs_pc2']
+        grids = bin_points(points, point_bounds(points), levels=(4, 8))
+
+        for size, grid in grids.items():
+            self.assertEqual(sum(cell[2] for cell in grid['stool']), 100)
+            self.assertEqual(sum(cell[2] for cells in grid.values() for cell in cells), 200)
+            self.assertTrue(all(0 <= cell[0] < size and 0 <= cell[1] < size for cells in grid.values() for cell in cells))
+
+        coarse = {(site, x, y): count for site, cells in grids[4].items() for x, y, count, _, _ in cells}
+        nested = {}
+        for site, cells in grids[8].items():
+            for x, y, count, _, _ in cells:
+                nested[(site, x // 2, y // 2)] = nested.get((site, x // 2, y // 2), 0) + count
+        self.assertEqual(coarse, nested)
+
+        # Centroids are the mean of the binned points
+        single = bin_points(points[:2], point_bounds(points[:2]), levels=(1,))
+        self.assertEqual(single[1]['stool'], [[0, 0, 1, 0.0, 0.0]])
+
+    def test_exact_points_only_below_limit(self):
+        """Test that large cohorts only publish the binned grids"""
+        overview, shards = build_products(make_summary(point_count=50), exact_limit=20)
+        pcoa = overview['diversity']['beta']['pcoa']
+        self.assertFalse(pcoa['exact_points'])
+        self.assertEqual(pcoa['pages'], [])
+        self.assertFalse(any(name.endswith('.bin') for name in shards))
+        self.assertEqual([grid['size'] for grid in pcoa['grids']], [8, 16, 32, 64])
+        self.assertIn('pcoa/grid-64.json', shards)
+
+    def test_cap_distribution(self):
+        """Test that the remainder is folded into Other"""
+        entries = [{"name": "A", "abundance": 5.0}, {"name": "B", "abundance": 3.0}, {"name": "C", "abundance": 2.0}]
+        capped = cap_distribution(entries, limit=2)
+        self.assertEqual(capped, [{"name": "A", "abundance": 5.0}, {"name": "Other", "abundance": 5.0}])
+        self.assertEqual(cap_distribution(entries, limit=3), entries)
+
+    def test_only_changed_shards_differ(self):
+        """Test that hashes are stable and only changed shards are reported"""
+        summary = make_summary()
+        first, _ = build_products(summary)
+        self.assertEqual(changed_shards(first, build_products(copy.deepcopy(summary))[0]), [])
+
+        summary['diversity']['by_site']['stool']['shannon']['mean'] = 3.6
+        second, _ = build_products(summary)
+        self.assertEqual(changed_shards(first, second), ['sites/stool.json'])
+        self.assertEqual(changed_shards(None, second), sorted(second['shards']))
+
+    def test_write_products(self):
+        """Test writing the overview and shards to disk"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            overview = write_products(make_summary(), output_dir)
+            for name, entry in overview['shards'].items():
+                self.assertEqual(os.path.getsize(os.path.join(output_dir, name)), entry['bytes'])
+            with open(os.path.join(output_dir, 'overview.json')) as f:
+                self.assertEqual(json.load(f), overview)
+
+if __name__ == '__main__':
+    unittest.main()
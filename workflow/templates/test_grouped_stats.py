@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_grouped_stats.py - Unit tests for grouped_stats.py
+
+import unittest
+import math
+import os
+import random
+import sys
+
+try:
+    import pandas as pd
+except ImportError:  # Only the cross-check against pandas needs it
+    pd = None
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.grouped_stats import GroupedStats, grouped_stats, quantile_key
+
+class TestGroupedStats(unittest.TestCase):
+    """Test cases for the grouped_stats.py module"""
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.sites = [rng.choice(['gut', 'oral', 'skin']) for _ in range(200)]
+        self.columns = {
+            'shannon': [rng.gauss(3.0, 0.8) for _ in range(200)],
+            'observed_species': [float(rng.randint(20, 400)) for _ in range(200)],
+        }
+        # Missing values are skipped per metric
+        for row in range(0, 200, 17):
+            self.columns['shannon'][row] = float('nan')
+        self.columns['observed_species'][3] = None
+
+    def assertStatsEqual(self, stats, series):
+        series = series.dropna()
+        self.assertEqual(stats['count'], len(series))
+        for key, expected in (('mean', series.mean()), ('std', series.std()), ('min', series.min()),
+                              ('max', series.max()), ('q25', series.quantile(0.25)),
+                              ('median', series.median()), ('q75', series.quantile(0.75))):
+            self.assertAlmostEqual(stats[key], expected, places=9, msg=key)
+
+    @unittest.skipIf(pd is None, "pandas is not installed")
+    def test_matches_pandas(self):
+        """Test overall and per-group statistics against pandas"""
+        overall, by_site = grouped_stats(self.sites, self.columns)
+        df = pd.DataFrame(self.columns, dtype=float).assign(body_site=self.sites)
+        self.assertEqual(list(by_site), ['gut', 'oral', 'skin'])
+        for metric in self.columns:
+            self.assertStatsEqual(overall[metric], df[metric])
+            for site, rows in df.groupby('body_site'):
+                self.assertStatsEqual(by_site[site][metric], rows[metric])
+
+    def test_small_and_empty_groups(self):
+        """Test that a single value has no std and a group without values is all NaN"""
+        stats = GroupedStats(['shannon'], quantiles=(0.1, 0.5))
+        stats.add('gut', {'shannon': 2.0})
+        stats.add('skin', {'shannon': float('nan')})
+        stats.add(None, {'shannon': 4.0})
+        overall, by_site = stats.summarize()
+
+        self.assertEqual(list(by_site), ['gut', 'skin'])
+        gut = by_site['gut']['shannon']
+        self.assertEqual((gut['count'], gut['mean'], gut['min'], gut['q10'], gut['median']), (1, 2.0, 2.0, 2.0, 2.0))
+        self.assertTrue(math.isnan(gut['std']))
+        skin = by_site['skin']['shannon']
+        self.assertEqual(skin['count'], 0)
+        self.assertTrue(all(math.isnan(skin[key]) for key in ('mean', 'std', 'min', 'max', 'median')))
+        # Rows without a group still count overall
+        self.assertEqual(overall['shannon']['count'], 2)
+        self.assertAlmostEqual(overall['shannon']['std'], math.sqrt(2.0))
+        self.assertEqual(overall['shannon']['median'], 3.0)
+
+    def test_quantile_keys(self):
+        """Test the summary keys of quantiles"""
+        self.assertEqual([quantile_key(q) for q in (0.05, 0.25, 0.5, 0.975)], ['q5', 'q25', 'median', 'q97.5'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_presence_bits.py - Unit tests for presence_bits.py
+
+import unittest
+import os
+import sys
+
+import numpy as np
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.presence_bits import (
+    jaccard_distances, observed_richness, pack_presence, popcount, table_popcount
+)
+
+def reference_jaccard(matrix):
+    """Jaccard distances of the presence sets, pair by pair"""
+    sets = [set(np.flatnonzero(row > 0)) for row in matrix]
+    distances = np.zeros((len(sets), len(sets)))
+    for i, a in enumerate(sets):
+        for j, b in enumerate(sets):
+            union = len(a | b)
+            distances[i, j] = 1.0 - len(a & b) / union if union else 0.0
+    return distances
+
+class TestPresenceBits(unittest.TestCase):
+    """Test cases for the presence_bits.py module"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        # 130 species spans three words, the last one partly used
+        self.matrix = rng.random((45, 130)) * (rng.random((45, 130)) < 0.2)
+        self.matrix[3] = 0.0
+        self.matrix[4] = 0.0
+
+    def test_pack_presence(self):
+        """Test 64 species per word and that only presence is kept"""
+        bits = pack_presence(self.matrix)
+        self.assertEqual(bits.dtype, np.uint64)
+        self.assertEqual(bits.shape, (45, 3))
+        single = pack_presence(np.array([[0.0, 2.5] + [0.0] * 62 + [0.1]]))
+        self.assertEqual(single.tolist(), [[2, 1]])
+
+    def test_popcount(self):
+        """Test the lookup-table popcount against the native one"""
+        words = np.array([0, 1, 2 ** 63, 2 ** 64 - 1, 0x5555555555555555], dtype=np.uint64)
+        self.assertEqual(table_popcount(words).tolist(), [0, 1, 1, 64, 32])
+        self.assertEqual(popcount(words).tolist(), [0, 1, 1, 64, 32])
+
+    def test_observed_richness(self):
+        """Test richness read from the popcounts"""
+        self.assertEqual(observed_richness(pack_presence(self.matrix)).tolist(),
+                         (self.matrix > 0).sum(axis=1).tolist())
+
+    def test_jaccard_distances(self):
+        """Test blocked, threaded distances against the pairwise definition"""
+        expected = reference_jaccard(self.matrix)
+        bits = pack_presence(self.matrix)
+        for block, workers in ((8, 4), (7, 1), (100, 2)):
+            distances = jaccard_distances(bits, block=block, workers=workers)
+            np.testing.assert_allclose(distances, expected)
+        self.assertEqual(distances[3, 4], 0.0)
+        self.assertEqual(distances[3, 0], 1.0 if self.matrix[0].any() else 0.0)
+        np.testing.assert_array_equal(distances, distances.T)
+
+if __name__ == '__main__':
+    unittest.main()
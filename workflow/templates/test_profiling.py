@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_profiling.py - Unit tests for profiling.py
+
+import unittest
+import contextlib
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import tracemalloc
+from unittest.mock import patch
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.profiling import (
+    PROFILE_ENV, Profiler, emf_lines, profile_stage, profiled, profiled_handler, section
+)
+
+class TestProfiling(unittest.TestCase):
+    """Test cases for the profiling.py module"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_disabled(self):
+        """Test that with the flag unset nothing is traced or written"""
+        with patch.dict(os.environ, {PROFILE_ENV: ''}):
+            profiler = profile_stage('stage')
+            self.assertFalse(profiler.enabled)
+            self.assertIs(profiler.section('a'), section('b'))
+            profiler.mark('c')
+            self.assertFalse(tracemalloc.is_tracing())
+
+            calls = []
+            wrapped = profiled_handler('handler')(lambda event, context: calls.append(event) or 'ok')
+            self.assertEqual(wrapped({'x': 1}, None), 'ok')
+            self.assertIsNone(profiler.finish())
+        self.assertEqual(calls, [{'x': 1}])
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_sections_and_marks(self):
+        """Test nested, repeated and marked sections in the written profile"""
+        profiler = Profiler('stage', mode='on', output_dir=self.tmp.name).start()
+        profiler.mark('load')
+        data = [bytearray(1024 * 1024) for _ in range(4)]
+        del data
+        profiler.mark('compute')
+        for _ in range(3):
+            with section('inner'):
+                sum(range(10000))
+        result = profiler.finish()
+        self.assertFalse(tracemalloc.is_tracing())
+
+        with open(os.path.join(self.tmp.name, 'stage.profile.json')) as f:
+            self.assertEqual(json.load(f), result)
+        sections = {row['name']: row for row in result['sections']}
+        self.assertEqual(list(sections), ['load', 'inner', 'compute'])
+        self.assertEqual(sections['inner']['calls'], 3)
+        self.assertGreaterEqual(sections['load']['peak_memory_mb'], 4.0)
+        # The peak of a section is not lost to the sections after it
+        self.assertGreaterEqual(result['peak_memory_mb'], sections['load']['peak_memory_mb'])
+        self.assertLess(sections['inner']['peak_memory_mb'], 4.0)
+        self.assertGreaterEqual(sections['compute']['wall_seconds'], sections['inner']['wall_seconds'])
+        self.assertGreaterEqual(result['wall_seconds'], sections['compute']['wall_seconds'])
+        self.assertIsNone(result['cprofile'])
+
+    def test_lambda_handler_emf(self):
+        """Test EMF lines and the cProfile dump of a decorated handler"""
+        @profiled('work')
+        def work():
+            return sorted(range(1000), reverse=True)[0]
+
+        @profiled_handler('progress_handler')
+        def handler(event, context):
+            return work()
+
+        output = io.StringIO()
+        with patch.dict(os.environ, {PROFILE_ENV: 'cprofile', 'PIPELINE_PROFILE_DIR': self.tmp.name}), \
+                contextlib.redirect_stdout(output):
+            self.assertEqual(handler({}, None), 999)
+
+        documents = [json.loads(line) for line in output.getvalue().splitlines() if line.startswith('{"_aws"')]
+        self.assertEqual([doc['Section'] for doc in documents], ['total', 'work'])
+        for doc in documents:
+            metrics = doc['_aws']['CloudWatchMetrics'][0]
+            self.assertEqual(metrics['Dimensions'], [['Function', 'Section']])
+            self.assertEqual(doc['Function'], 'progress_handler')
+            for metric in metrics['Metrics']:
+                self.assertIsInstance(doc[metric['Name']], float)
+        self.assertIn('cumulative', output.getvalue())
+        stats = pstats.Stats(os.path.join(self.tmp.name, 'progress_handler.profile.prof'))
+        self.assertTrue(any(function[2] == 'work' for function in stats.stats))
+        # Outside a profiled handler the function is called directly
+        self.assertEqual(work(), 999)
+
+    def test_exception_closes_sections(self):
+        """Test that a failing stage still publishes its profile"""
+        with patch.dict(os.environ, {PROFILE_ENV: '1', 'PIPELINE_PROFILE_DIR': self.tmp.name}):
+            with self.assertRaises(RuntimeError):
+                with Profiler('failing') as profiler:
+                    profiler.mark('load')
+                    with section('step'):
+                        raise RuntimeError('boom')
+        with open(os.path.join(self.tmp.name, 'failing.profile.json')) as f:
+            result = json.load(f)
+        self.assertEqual([row['name'] for row in result['sections']], ['step', 'load'])
+        self.assertEqual(len(emf_lines(result)), 3)
+        self.assertIs(section('after'), section('again'))
+
+if __name__ == '__main__':
+    unittest.main()
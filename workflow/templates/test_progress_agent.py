@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_progress_agent.py - Unit tests for progress_agent.py
+
+import unittest
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.progress_agent import (
+    ProgressAgent, LocalBucket, EVENT_SCRIPT, INCOMING_DIR, coalesce, install_spool, parse_event, post_event
+)
+
+BUCKET = 'bucket'
+
+def event(process, status, timestamp, workflow_id='wf-1', **fields):
+    return dict({'process': process, 'status': status, 'timestamp': timestamp, 'workflow_id': workflow_id,
+                 'bucket': BUCKET, 'total_processes': 4}, **fields)
+
+class TestProgressAgent(unittest.TestCase):
+    """Test cases for the progress_agent.py module"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.spool = os.path.join(self.tmp.name, 'spool')
+        install_spool(self.spool)
+        self.bucket = LocalBucket(os.path.join(self.tmp.name, 'bucket'))
+        self.agent = ProgressAgent(self.bucket, self.spool)
+
+    def tearDown(self):
+        self.agent.executor.shutdown()
+        self.tmp.cleanup()
+
+    def read(self, key):
+        with open(os.path.join(self.tmp.name, 'bucket', BUCKET, key)) as f:
+            return json.load(f)
+
+    def test_parse_and_coalesce(self):
+        """Test event validation and keeping the last event per task"""
+        self.assertIsNone(parse_event('not json'))
+        self.assertIsNone(parse_event(json.dumps(event('p', 'started', 1, workflow_id=''))))
+        self.assertEqual(parse_event(json.dumps(event('p', None, '5')))['status'], '')
+
+        events = coalesce([event('a', 'completed', 20, started_at=10), event('a', 'started', 10),
+                           event('b', 'started', 15), event('a', 'started', 12, workflow_id='wf-2')])
+        self.assertEqual([(e['workflow_id'], e['process'], e['status']) for e in events],
+                         [('wf-2', 'a', 'started'), ('wf-1', 'b', 'started'), ('wf-1', 'a', 'completed')])
+
+    def test_event_script(self):
+        """Test that progress_event.sh queues events and carries the start time"""
+        task_dir = os.path.join(self.tmp.name, 'task')
+        os.makedirs(task_dir)
+        env = dict(os.environ, PROGRESS_AGENT_SPOOL=self.spool, PROCESS_NAME='preprocess_reads_S1',
+                   WORKFLOW_ID='wf-1', BUCKET_NAME=BUCKET, TOTAL_PROCESSES='4')
+        script = os.path.join(self.spool, EVENT_SCRIPT)
+        for status in ('started', 'completed'):
+            subprocess.run(['bash', script], cwd=task_dir, env=dict(env, PROCESS_STATUS=status), check=True)
+        self.assertFalse(os.path.exists(os.path.join(task_dir, '.progress_started_at')))
+
+        self.agent.drain_spool()
+        self.assertEqual(os.listdir(os.path.join(self.spool, INCOMING_DIR)), [])
+        started, completed = sorted(self.agent.pending, key=lambda e: e['status'] != 'started')
+        self.assertEqual(completed['started_at'], started['timestamp'])
+        self.assertIsNone(started['started_at'])
+        self.assertEqual(completed['total_processes'], 4)
+
+        # Without a spool the caller falls back to progress_tracker.sh
+        result = subprocess.run(['bash', script], cwd=task_dir,
+                                env=dict(env, PROCESS_STATUS='started', PROGRESS_AGENT_SPOOL='/nonexistent'))
+        self.assertNotEqual(result.returncode, 0)
+
+    def test_flush(self):
+        """Test one batched publish per workflow and the cached progress document"""
+        for e in (event('preprocess_reads_S1', 'started', 100), event('preprocess_reads_S2', 'started', 101),
+                  event('preprocess_reads_S1', 'completed', 160, started_at=100)):
+            self.agent.add(e)
+        self.assertEqual(self.agent.flush(), 2)
+
+        self.assertEqual(self.read('progress/wf-1/updates/160_preprocess_reads_S1_completed.json')['status'],
+                         'completed')
+        self.assertEqual(self.read('progress/wf-1/updates/101_preprocess_reads_S2_started.json')['timestamp'], 101)
+        self.assertEqual(self.read('progress/latest/latest_update.json')['process'], 'preprocess_reads_S1')
+        progress = self.read('progress/wf-1/progress.json')
+        self.assertEqual(progress['completed_count'], 1)
+        self.assertEqual(progress['percent_complete'], 25.0)
+        self.assertIn('eta_model', progress)
+        self.assertIn('estimated_remaining_range', progress)
+        # The task still running is in the document, so the ETA counts it as in flight
+        self.assertEqual(progress['running_tasks'], {'preprocess_reads_S2': 101})
+        self.assertEqual(self.read('progress/latest/progress.json'), progress)
+
+        # The next flush reuses the cached document; an empty status still ends the task
+        self.bucket.requests.clear()
+        self.agent.add(event('preprocess_reads_S2', '', 170, started_at=101))
+        self.agent.flush()
+        progress = self.read('progress/wf-1/progress.json')
+        self.assertEqual(progress['completed_count'], 2)
+        self.assertEqual(progress['running_tasks'], {})
+        self.assertEqual(self.bucket.requests['GetObject'], 1)
+        self.assertEqual(self.agent.flush(), 0)
+
+    def test_failed_flush_is_retried(self):
+        """Test that events stay queued when publishing fails"""
+        def failing_put(**kwargs):
+            raise OSError('unreachable')
+        put_object = self.bucket.put_object
+        self.bucket.put_object = failing_put
+        self.agent.add(event('preprocess_reads_S1', 'completed', 160, started_at=100))
+        self.agent.flush()
+        self.assertEqual(len(self.agent.pending), 1)
+        self.assertEqual(self.agent.counters['flush_errors'], 1)
+
+        self.bucket.put_object = put_object
+        self.agent.flush()
+        self.assertEqual(self.agent.pending, [])
+        self.assertEqual(self.read('progress/wf-1/progress.json')['completed_count'], 1)
+
+    def test_concurrent_progress_write(self):
+        """Test that a progress.json written by another node in between is merged, not overwritten"""
+        self.agent.add(event('preprocess_reads_S1', 'completed', 160, started_at=100))
+        self.agent.flush()
+
+        other = ProgressAgent(self.bucket, self.spool)
+        self.addCleanup(other.executor.shutdown)
+        load_progress = self.agent.load_progress
+
+        def interleaved(bucket, workflow_id):
+            loaded = load_progress(bucket, workflow_id)
+            if not other.counters['progress_updates']:
+                # Another node publishes after this agent read the document
+                other.flush_workflow(bucket, workflow_id, [event('preprocess_reads_S2', 'completed', 170,
+                                                                 started_at=110)])
+            return loaded
+        self.agent.load_progress = interleaved
+
+        self.agent.add(event('preprocess_reads_S3', 'completed', 180, started_at=120))
+        self.agent.flush()
+        progress = self.read('progress/wf-1/progress.json')
+        self.assertEqual(progress['completed_count'], 3)
+        self.assertEqual(self.read('progress/latest/progress.json'), progress)
+        self.assertEqual(self.agent.counters['progress_conflicts'], 1)
+        self.assertEqual(self.agent.pending, [])
+
+    def test_socket(self):
+        """Test events posted over the Unix socket and the spool fallback"""
+        self.assertEqual(post_event(event('detect_resources', 'started', 50), self.spool), 'spool')
+
+        async def scenario():
+            stop = asyncio.Event()
+            serving = asyncio.create_task(self.agent.serve(flush_interval=0.05, stop=stop))
+            while not os.path.exists(os.path.join(self.spool, 'agent.sock')):
+                await asyncio.sleep(0.01)
+            loop = asyncio.get_running_loop()
+            transport = await loop.run_in_executor(
+                None, post_event, event('detect_resources', 'completed', 80, started_at=50), self.spool)
+            await asyncio.sleep(0.2)
+            stop.set()
+            await serving
+            return transport
+
+        self.assertEqual(asyncio.run(scenario()), 'socket')
+        self.assertEqual(self.read('progress/wf-1/progress.json')['processes']['detect_resources']['status'],
+                         'completed')
+        self.assertFalse(os.path.exists(os.path.join(self.spool, 'agent.sock')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_progress_eta.py - Unit tests for progress_eta.py
+
+import unittest
+import math
+import os
+import random
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.progress_eta import (
+    DurationModel, EtaEstimator, process_type, expected_tasks, samples_from_total_processes,
+    update_progress_eta, load_trace_tasks, replay, score, fit_prior
+)
+
+DURATIONS = {'preprocess_reads': 120, 'taxonomic_classification_kraken': 600, 'metaphlan_analysis': 1800}
+
+def write_trace(path, samples=40, slots=8, seed=1):
+    """Write a raw Nextflow trace for a run with per-sample stages on a fixed number of slots"""
+    rng = random.Random(seed)
+    free_at = [0.0] * slots
+    rows = []
+    ready = {sample: 0.0 for sample in range(samples)}
+    for name, mean in DURATIONS.items():
+        for sample in range(samples):
+            slot = min(range(slots), key=lambda i: free_at[i])
+            start = max(free_at[slot], ready[sample])
+            end = start + mean * rng.uniform(0.7, 1.3)
+            free_at[slot] = ready[sample] = end
+            rows.append((f"{name} (S{sample})", start, end))
+    tail = max(free_at)
+    for name in ('kraken_reports', 'diversity_analysis', 'create_summary'):
+        rows.append((name, tail, tail + 300))
+        tail += 300
+    with open(path, 'w') as f:
+        f.write("task_id\tname\tstatus\tstart\tcomplete\trealtime\n")
+        for i, (name, start, end) in enumerate(rows):
+            f.write(f"{i}\t{name}\tCOMPLETED\t{int(start * 1000) + 10 ** 12}\t{int(end * 1000) + 10 ** 12}\t"
+                    f"{int((end - start) * 1000)}\n")
+
+class TestProgressEta(unittest.TestCase):
+    """Test cases for the progress_eta.py module"""
+
+    def test_process_type(self):
+        """Test mapping tracked names to processes"""
+        self.assertEqual(process_type("preprocess_reads_SRS_011"), "preprocess_reads")
+        self.assertEqual(process_type("create_summary"), "create_summary")
+        self.assertEqual(process_type("workflow_complete"), "workflow_complete")
+        self.assertEqual(samples_from_total_processes(7 + 3 * 25), 25)
+        self.assertEqual(expected_tasks(25)['metaphlan_analysis'], 25)
+
+    def test_duration_model(self):
+        """Test EWMA updates and conditional remaining time"""
+        model = DurationModel()
+        for duration in [100, 100, 100, 200]:
+            model.update(duration)
+        self.assertAlmostEqual(model.mean, 120.0)
+        self.assertGreater(model.variance, 0)
+        # A task running for 150s can only be one of the long ones
+        self.assertAlmostEqual(model.remaining(150), 50.0)
+        self.assertEqual(model.quantiles()['p50'], 100.0)
+
+    def test_per_process_estimate(self):
+        """Test that slow processes dominate and parallelism divides per-sample work"""
+        estimator = EtaEstimator()
+        for i, duration in enumerate([900, 1100, 900, 1100]):
+            estimator.observe(f"preprocess_reads_S{i}", 0, 10)
+            estimator.observe(f"metaphlan_analysis_S{i}", 10, 10 + duration)
+        # 4040 busy task-seconds over 1110 wall seconds
+        slots = estimator.parallelism()
+        self.assertAlmostEqual(slots, 4040 / 1110)
+
+        estimate = estimator.estimate({'preprocess_reads': 8, 'metaphlan_analysis': 8})
+        metaphlan = estimator.models['metaphlan_analysis'].mean
+        self.assertAlmostEqual(estimate['seconds'], round((4 * 10 + 4 * metaphlan) / slots, 1))
+        self.assertLess(estimate['low'], estimate['seconds'])
+        self.assertGreater(estimate['high'], estimate['seconds'])
+
+        # The slowest remaining task bounds the estimate from below
+        single = estimator.estimate({'preprocess_reads': 4, 'metaphlan_analysis': 5})
+        self.assertAlmostEqual(single['seconds'], round(metaphlan, 1))
+
+        # Nothing left except a single serial step
+        done = estimator.estimate({'preprocess_reads': 4, 'metaphlan_analysis': 4})
+        self.assertEqual(done['seconds'], 0.0)
+
+    def test_update_progress_document(self):
+        """Test the progress_tracker.sh entry point round-trips its state"""
+        progress = {'total_processes': 7 + 3 * 10, 'elapsed_seconds': 300}
+        update_progress_eta(progress, "preprocess_reads_S1", "completed", 1000, 1120)
+        update_progress_eta(progress, "preprocess_reads_S2", "completed", 1000, 1130)
+        self.assertEqual(progress['eta_model']['completed'], {'preprocess_reads': 2})
+        self.assertLessEqual(progress['estimated_remaining_low_seconds'], progress['estimated_remaining_seconds'])
+        self.assertLessEqual(progress['estimated_remaining_seconds'], progress['estimated_remaining_high_seconds'])
+        self.assertIn(' - ', progress['estimated_remaining_range'])
+
+    def test_live_estimate_counts_running_tasks(self):
+        """Test that started events make the live estimate treat tasks as in flight, as replay does"""
+        progress = {'total_processes': 7 + 3 * 4, 'elapsed_seconds': 300}
+        for sample in ('S1', 'S2', 'S3'):
+            update_progress_eta(progress, f"preprocess_reads_{sample}", "started", None, 1000)
+        # The start time comes from running_tasks when the end event has none
+        update_progress_eta(progress, "preprocess_reads_S1", "completed", None, 1120)
+        self.assertEqual(progress['running_tasks'], {'preprocess_reads_S2': 1000, 'preprocess_reads_S3': 1000})
+        self.assertEqual(progress['eta_model']['processes']['preprocess_reads']['count'], 1)
+
+        estimator = EtaEstimator.from_dict(progress['eta_model'])
+        expected = expected_tasks(4)
+        live = estimator.estimate(expected, {'preprocess_reads': [120.0, 120.0]}, elapsed=300)
+        self.assertEqual(progress['estimated_remaining_seconds'], math.ceil(live['seconds']))
+        # Without the running set both tasks would be pending at the full mean
+        self.assertNotEqual(live, estimator.estimate(expected, elapsed=300))
+
+    def test_replay_beats_legacy(self):
+        """Test the replay harness on a recorded run with very different process durations"""
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = os.path.join(tmp, 'run1.txt'), os.path.join(tmp, 'run2.txt')
+            write_trace(first, seed=1)
+            write_trace(second, seed=2)
+
+            tasks = load_trace_tasks(first)
+            self.assertEqual(len(tasks), 40 * 3 + 3)
+            self.assertEqual(tasks[0][0], 'preprocess_reads')
+
+            result = score(replay(tasks))
+            self.assertEqual(result['points'], len(tasks) - 1)
+            self.assertLess(result['mape_percent'], result['legacy_mape_percent'])
+
+            # With a prior from another run the bounds are calibrated to the target coverage
+            prior = fit_prior([first, second])
+            self.assertEqual(prior['runs'], 2)
+            calibrated = score(replay(load_trace_tasks(second), prior))
+            self.assertGreaterEqual(calibrated['coverage'], 0.8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_reporting_benchmark.py - Unit tests for reporting_benchmark.py
+
+import unittest
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.reporting_benchmark import (
+    WORKFLOW, extract_stage, render_groovy, run_scale_point, compare_runs, STAGE_VARIABLES
+)
+
+def stats(wall, rss=50.0, output=1000, status='ok'):
+    return {'status': status, 'wall_seconds': wall, 'peak_rss_mb': rss, 'output_bytes': output}
+
+def record(run_id, stages):
+    return {'run_id': run_id, 'results': [{'samples': 100, 'species': 500, 'body_sites': 3, 'pathways': 300,
+                                           'gene_families': 1000, 'seed': 1, 'stages': stages}]}
+
+class TestReportingBenchmark(unittest.TestCase):
+    """Test cases for the reporting_benchmark.py module"""
+
+    def setUp(self):
+        with open(WORKFLOW, 'r') as f:
+            self.nf_text = f.read()
+
+    def test_extract_stage(self):
+        """Test extracting heredocs from the workflow as Python the stage would run"""
+        source, templates = extract_stage(self.nf_text, 'kraken_reports')
+        self.assertIn("def parse_kraken_report", source)
+        self.assertIn("split('\\t')", source)
+        self.assertEqual(templates, ['profiling.py'])
+        compile(source, 'kraken_reports', 'exec')
+
+        source, templates = extract_stage(self.nf_text, 'create_summary', STAGE_VARIABLES['create_summary'])
+        self.assertIn("count_samples('kraken_species_counts.tsv')", source)
+        self.assertNotIn('${', source)
+        self.assertIn('abundance_topk.py', templates)
+        compile(source, 'create_summary', 'exec')
+
+        # Closing braces inside the heredoc do not end the process early
+        source, _ = extract_stage(self.nf_text, 'diversity_analysis', STAGE_VARIABLES['diversity_analysis'])
+        self.assertIn("json.dump(summary", source)
+
+        with self.assertRaises(ValueError):
+            extract_stage(self.nf_text, 'create_summary')
+        with self.assertRaises(ValueError):
+            extract_stage(self.nf_text, 'no_such_process')
+        self.assertEqual(render_groovy("a\\\\tb \\$x ${y}", {'y': 'z'}), "a\\tb $x z")
+
+    @unittest.skipUnless(importlib.util.find_spec('pandas'), "kraken_reports needs pandas")
+    def test_scale_point(self):
+        """Test a small end-to-end run through the reporting stages"""
+        with tempfile.TemporaryDirectory() as tmp:
+            result = run_scale_point(tmp, samples=8, species=120, pathways=30)
+            kraken = result['stages']['kraken_reports']
+            self.assertEqual(kraken['status'], 'ok')
+            self.assertIn('kraken_species_counts.tsv', kraken['outputs'])
+            self.assertTrue(any(name.startswith('kraken_summary/rank=S/') for name in kraken['outputs']))
+            self.assertGreater(kraken['peak_rss_mb'], 0)
+
+            summary_stage = result['stages']['create_summary']
+            self.assertEqual(summary_stage['status'], 'ok')
+            self.assertEqual(summary_stage['inputs']['kraken_species_counts.tsv'], 'kraken_reports')
+            self.assertIn('dashboard/overview.json', summary_stage['outputs'])
+            self.assertEqual(summary_stage['output_bytes'], sum(summary_stage['outputs'].values()))
+
+            with open(os.path.join(tmp, 'create_summary.0', 'microbiome_summary.json')) as f:
+                summary = json.load(f)
+            self.assertEqual(summary['taxonomic_profile']['sample_count'], 8)
+            self.assertEqual(len(summary['taxonomic_profile']['top_species_by_site']), 3)
+
+    def test_compare_runs(self):
+        """Test regression thresholds, noise floors and failed stages"""
+        baseline = record('a', {'kraken_reports': stats(2.0), 'create_summary': stats(0.05),
+                                'diversity_analysis': stats(1.0)})
+        current = record('b', {'kraken_reports': stats(3.0, rss=52.0), 'create_summary': stats(0.12),
+                               'diversity_analysis': stats(None, status='failed')})
+        rows = {(row['stage'], row['metric']): row for row in compare_runs(baseline, current)}
+        self.assertTrue(rows[('kraken_reports', 'wall_seconds')]['regression'])
+        self.assertEqual(rows[('kraken_reports', 'wall_seconds')]['change'], 0.5)
+        self.assertFalse(rows[('kraken_reports', 'peak_rss_mb')]['regression'])
+        # More than double, but below the noise floor
+        self.assertFalse(rows[('create_summary', 'wall_seconds')]['regression'])
+        self.assertTrue(rows[('diversity_analysis', 'status')]['regression'])
+        self.assertFalse(any(row['regression'] for row in compare_runs(baseline, baseline)))
+
+if __name__ == '__main__':
+    unittest.main()
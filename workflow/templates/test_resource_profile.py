@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_resource_profile.py - Unit tests for resource_profile.py
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.resource_profile import (
+    fit_linear, quantile, collect_observations, build_profile, recommend, load_task_inputs, GB
+)
+
+def trace_row(process, tag, input_gb, peak_rss_gb, cpu_percent, status='COMPLETED', queue='microbiome-demo-queue'):
+    """Build a raw trace row as the Nextflow trace would write it"""
+    return {
+        'process': process,
+        'tag': tag,
+        'status': status,
+        'rchar': str(int(input_gb * GB)),
+        'peak_rss': str(int(peak_rss_gb * GB)),
+        '%cpu': str(cpu_percent),
+        'queue': queue
+    }
+
+class TestResourceProfile(unittest.TestCase):
+    """Test cases for the resource_profile.py module"""
+
+    def test_fit_linear(self):
+        """Test least-squares fitting and slope clamping"""
+        intercept, slope = fit_linear([1, 2, 3], [3, 5, 7])
+        self.assertAlmostEqual(intercept, 1.0)
+        self.assertAlmostEqual(slope, 2.0)
+
+        # Negative relationships are clamped to a flat requirement
+        intercept, slope = fit_linear([1, 2, 3], [7, 5, 3])
+        self.assertEqual(slope, 0.0)
+
+        # Identical inputs fall back to the mean
+        intercept, slope = fit_linear([2, 2], [4, 6])
+        self.assertEqual((intercept, slope), (5.0, 0.0))
+
+    def test_quantile(self):
+        """Test nearest-rank quantiles"""
+        self.assertEqual(quantile([], 0.9), 0.0)
+        self.assertEqual(quantile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 0.9), 9)
+        self.assertEqual(quantile([5], 0.5), 5)
+
+    def test_build_profile_scales_with_input(self):
+        """Test that memory grows with input size and cpus follow usage"""
+        rows = [
+            trace_row('preprocess_reads', f'S{i}', input_gb=i, peak_rss_gb=1 + 0.5 * i, cpu_percent=280)
+            for i in range(1, 6)
+        ]
+        # Failed tasks must not influence the profile
+        rows.append(trace_row('preprocess_reads', 'S9', input_gb=1, peak_rss_gb=100, cpu_percent=50, status='FAILED'))
+
+        task_inputs = {('preprocess', f'S{i}'): i * GB for i in range(1, 6)}
+        profile = build_profile(collect_observations(rows, task_inputs))
+        learned = profile['processes']['preprocess']
+
+        self.assertEqual(profile['tasks_analyzed'], 5)
+        self.assertEqual(learned['cpus'], 3)
+        self.assertAlmostEqual(learned['memory_per_input_gb'], 0.5, places=3)
+        self.assertAlmostEqual(learned['memory_intercept_gb'], 1.0, places=3)
+
+        small = recommend(profile, 'preprocess', 1 * GB)
+        large = recommend(profile, 'preprocess', 20 * GB)
+        self.assertLess(small['memory_gb'], large['memory_gb'])
+        self.assertEqual(large['memory_gb'], 13)  # ceil((1 + 0.5 * 20) * 1.1)
+
+        self.assertIsNone(recommend(profile, 'metaphlan', GB))
+
+    def test_kraken_without_gpu_uses_cpu_key(self):
+        """Test that CPU-only Kraken tasks learn the kraken_cpu entry"""
+        rows = [
+            trace_row('taxonomic_classification_kraken', 'S1', 1, 30, 790),
+            trace_row('taxonomic_classification_kraken', 'S2', 1, 12, 390, queue='microbiome-demo-gpu-queue'),
+            trace_row('taxonomic_classification_kraken', 'S3', 1, 12, 390, queue='microbiome-demo-gpu-queue'),
+            trace_row('diversity_analysis', '', 0.1, 2, 100)
+        ]
+        # The key getResourceConfig recorded wins over the queue the task ran on
+        task_inputs = {('kraken_cpu', 'S1'): GB, ('kraken', 'S2'): GB, ('kraken_cpu', 'S3'): GB}
+        observations = collect_observations(rows, task_inputs)
+        self.assertEqual(len(observations['kraken_cpu']), 2)
+        self.assertEqual(len(observations['kraken']), 1)
+        self.assertIn('reporting', observations)
+
+    def test_task_inputs_replace_bytes_read(self):
+        """Test that recorded input sizes are used instead of rchar and unsized tasks are skipped"""
+        rows = [
+            trace_row('metaphlan_analysis', 'S1', input_gb=1, peak_rss_gb=8, cpu_percent=700),
+            trace_row('metaphlan_analysis', 'S2', input_gb=30, peak_rss_gb=9, cpu_percent=700),
+            trace_row('merge_humann', '', input_gb=5, peak_rss_gb=3, cpu_percent=100)
+        ]
+        skipped = {}
+        # metaphlan is sized by the trimmed reads; the FASTQ size of preprocess does not apply
+        task_inputs = {('metaphlan', 'S1'): 4 * GB, ('preprocess', 'S2'): 9 * GB}
+        observations = collect_observations(rows, task_inputs, skipped)
+        self.assertEqual([point[0] for point in observations['metaphlan']], [4.0])
+        self.assertEqual(skipped, {'metaphlan': 1})
+        # getResourceConfig queries humann without an input size
+        self.assertEqual(observations['humann'][0][0], 0.0)
+        self.assertNotIn('metaphlan', collect_observations(rows))
+
+    def test_unsized_processes_are_ignored(self):
+        """Test that processes which never query getResourceConfig are not learned"""
+        rows = [
+            trace_row(process, '', 0.1, 2, 100)
+            for process in ('detect_resources', 'cache_lookup', 'cache_store', 'upload_results', 'ingest_results')
+        ]
+        self.assertEqual(collect_observations(rows), {})
+
+    def test_load_task_inputs(self):
+        """Test reading the task_inputs.tsv the pipeline publishes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'task_inputs.tsv')
+            with open(path, 'w') as f:
+                f.write("resource_key\ttag\tinput_bytes\npreprocess\tS1\t1024\nkraken_cpu\tS1\t512\n")
+            self.assertEqual(load_task_inputs(path), {('preprocess', 'S1'): 1024.0, ('kraken_cpu', 'S1'): 512.0})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_resource_sampler.py - Unit tests for resource_sampler.py
+
+import unittest
+import gzip
+import json
+import os
+import sys
+import tempfile
+from unittest.mock import MagicMock
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.resource_sampler import (
+    Sampler, RingBuffer, Downsampler, UtilizationSeries, cpu_limit, memory_usage,
+    publish_documents, write_documents, run
+)
+
+def write_tree(root, files):
+    """Create a fake procfs/cgroup tree"""
+    for path, content in files.items():
+        full_path = os.path.join(root, path.lstrip('/'))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as f:
+            f.write(content)
+
+class FakeClock:
+    def __init__(self, start=1000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+class TestResourceSampler(unittest.TestCase):
+    """Test cases for the resource_sampler.py module"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        write_tree(self.root, {
+            '/proc/meminfo': "MemTotal:       16384000 kB\nMemFree:         2048000 kB\nMemAvailable:    8192000 kB\n",
+            '/proc/stat': "cpu  100 0 100 800 0 0 0 0 0 0\ncpu0 50 0 50 400 0\ncpu1 50 0 50 400 0\n"
+        })
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cgroup_v2(self):
+        """Test CPU and memory from cgroup v2 files"""
+        write_tree(self.root, {
+            '/sys/fs/cgroup/cpu.max': "200000 100000\n",
+            '/sys/fs/cgroup/cpu.stat': "usage_usec 10000000\nuser_usec 8000000\n",
+            '/sys/fs/cgroup/memory.current': str(2 * 1024 ** 3),
+            '/sys/fs/cgroup/memory.max': str(8 * 1024 ** 3)
+        })
+        clock = FakeClock()
+        sampler = Sampler(self.root, gpu_reader=lambda: None, clock=clock)
+        self.assertEqual(sampler.cpus, 2.0)
+
+        first = sampler.sample()
+        self.assertIsNone(first['cpu'])
+        self.assertAlmostEqual(first['memory'], 25.0)
+
+        # 3 CPU-seconds over 2 wall seconds on 2 CPUs = 75%
+        clock.now += 2
+        write_tree(self.root, {'/sys/fs/cgroup/cpu.stat': "usage_usec 13000000\n"})
+        self.assertAlmostEqual(sampler.sample()['cpu'], 75.0)
+
+    def test_cgroup_v1_unlimited_memory(self):
+        """Test cgroup v1 files with no memory limit set"""
+        write_tree(self.root, {
+            '/sys/fs/cgroup/cpu/cpu.cfs_quota_us': "-1\n",
+            '/sys/fs/cgroup/memory/memory.usage_in_bytes': str(4096000 * 1024),
+            '/sys/fs/cgroup/memory/memory.limit_in_bytes': "9223372036854771712\n"
+        })
+        self.assertEqual(cpu_limit(self.root), 2.0)
+        used, limit = memory_usage(self.root)
+        self.assertEqual(limit, 16384000 * 1024)
+        self.assertEqual(used / limit, 0.25)
+
+    def test_procfs_fallback(self):
+        """Test /proc/stat and /proc/meminfo when no cgroup files exist"""
+        clock = FakeClock()
+        sampler = Sampler(self.root, gpu_reader=lambda: 40.0, clock=clock)
+        sampler.sample()
+        clock.now += 5
+        # 100 busy of 200 new jiffies
+        write_tree(self.root, {'/proc/stat': "cpu  150 0 150 900 0 0 0 0 0 0\ncpu0 75 0 75 450 0\ncpu1 75 0 75 450 0\n"})
+        sample = sampler.sample()
+        self.assertAlmostEqual(sample['cpu'], 50.0)
+        self.assertAlmostEqual(sample['memory'], 50.0)
+        self.assertEqual(sample['gpu'], 40.0)
+
+    def test_ring_buffer_overwrites_oldest(self):
+        """Test fixed capacity and chronological order"""
+        ring = RingBuffer(3)
+        for t in range(5):
+            ring.append(t, {'cpu': t * 10.0, 'memory': None})
+        times, columns = ring.columns_in_order()
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(times, [2.0, 3.0, 4.0])
+        self.assertEqual(columns['cpu'], [20.0, 30.0, 40.0])
+        self.assertEqual(columns['memory'], [None, None, None])
+
+    def test_downsampler_buckets(self):
+        """Test averaging into aligned buckets, including the open bucket"""
+        downsampler = Downsampler(60, capacity=2)
+        for t, cpu in [(0, 10.0), (30, 30.0), (60, 50.0), (125, 70.0), (150, None)]:
+            downsampler.add(t, {'cpu': cpu})
+        times, columns = downsampler.columns_in_order()
+        self.assertEqual(times, [60.0, 120.0])
+        self.assertEqual(columns['cpu'], [50.0, 70.0])
+
+    def test_series_documents(self):
+        """Test one compact document per window"""
+        series = UtilizationSeries(interval=5)
+        for i in range(30):
+            series.add({'time': 3600.0 + i * 5, 'cpu': 50.0, 'memory': 25.0, 'gpu': None})
+        documents = series.documents('node-1', cpus=8)
+        self.assertEqual(sorted(documents), ['1h', '1m', '5m', 'raw'])
+        self.assertEqual(len(documents['raw']['time']), 30)
+        self.assertEqual(documents['1m']['time'], [3600, 3660, 3720])
+        self.assertEqual(documents['1h']['cpu'], [50.0])
+        self.assertEqual(documents['5m']['gpu'], [None])
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            write_documents(documents, output_dir)
+            with open(os.path.join(output_dir, '1m.json')) as f:
+                self.assertEqual(json.load(f)['resolution_seconds'], 60)
+
+        client = MagicMock()
+        publish_documents(client, 'bucket', 'monitoring/utilization/node-1', documents)
+        self.assertEqual(client.put_object.call_count, 4)
+        kwargs = client.put_object.call_args.kwargs
+        self.assertEqual(kwargs['ContentEncoding'], 'gzip')
+        self.assertIn(json.loads(gzip.decompress(kwargs['Body']))['window'], documents)
+
+    def test_run_publishes_periodically(self):
+        """Test the sampling loop against the fake tree"""
+        clock = FakeClock()
+        sampler = Sampler(self.root, gpu_reader=lambda: None, clock=clock)
+        series = UtilizationSeries(interval=5)
+        publishes = []
+
+        def sleep(seconds):
+            clock.now += seconds
+
+        run(sampler, series, 5, 20, lambda: publishes.append(clock.now), iterations=10, sleep=sleep)
+        self.assertEqual(len(series.windows['raw'][1]), 10)
+        self.assertEqual(publishes, [1000.0, 1020.0, 1040.0, 1045.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_result_cache.py - Unit tests for result_cache.py
+
+import unittest
+import hashlib
+import io
+import os
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.result_cache import (
+    CACHED_FILES, CACHED_PROCESSES, ResultCache, lookup, process_fingerprint
+)
+
+CACHE = 's3://bucket/cache/results'
+WORKFLOW = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'microbiome_main.nf')
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+class FakeS3:
+    """In-memory S3 with the conditional writes the index relies on"""
+
+    def __init__(self):
+        self.objects = {}
+        self.requests = {}
+
+    def count(self, operation):
+        self.requests[operation] = self.requests.get(operation, 0) + 1
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self.count('PutObject')
+        body = Body if isinstance(Body, bytes) else Body.read()
+        current = self.objects.get((Bucket, Key))
+        if (IfNoneMatch == '*' and current) or (IfMatch and (not current or current['ETag'] != IfMatch)):
+            raise ClientError('PreconditionFailed')
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        self.objects[(Bucket, Key)] = dict(kwargs, Body=body, ETag=etag)
+        return {'ETag': etag}
+
+    def get_object(self, Bucket, Key):
+        self.count('GetObject')
+        if (Bucket, Key) not in self.objects:
+            raise ClientError('NoSuchKey')
+        stored = self.objects[(Bucket, Key)]
+        return dict(stored, Body=io.BytesIO(stored['Body']))
+
+    def list_objects_v2(self, Bucket, Prefix, **kwargs):
+        self.count('ListObjectsV2')
+        return {'Contents': [{'Key': key, 'ETag': stored['ETag'], 'Size': len(stored['Body'])}
+                             for (bucket, key), stored in sorted(self.objects.items())
+                             if bucket == Bucket and key.startswith(Prefix)]}
+
+    def delete_objects(self, Bucket, Delete):
+        self.count('DeleteObjects')
+        for item in Delete['Objects']:
+            self.objects.pop((Bucket, item['Key']), None)
+
+class TestResultCache(unittest.TestCase):
+    """Test cases for the result_cache.py module"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.s3 = FakeS3()
+        with open(WORKFLOW, 'r') as f:
+            self.nf_text = f.read()
+        self.samples = []
+        for sample_id in ('S1', 'S2', 'S3'):
+            for read in (1, 2):
+                self.s3.put_object(Bucket='data', Key=f"reads/{sample_id}_R{read}.fastq.gz",
+                                   Body=f"{sample_id}{read}".encode('utf-8'))
+            self.samples.append({'sample_id': sample_id, 'body_site': 'gut',
+                                 'fastq_1': f"s3://data/reads/{sample_id}_R1.fastq.gz",
+                                 'fastq_2': f"s3://data/reads/{sample_id}_R2.fastq.gz"})
+        self.s3.put_object(Bucket='data', Key='db/kraken/hash.k2d', Body=b'kraken')
+        self.databases = {'kraken': 's3://data/db/kraken'}
+        self.tools = {'kraken2': '2.1.3'}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def lookup(self, samples=None, tools=None):
+        return lookup(self.s3, CACHE, samples or self.samples, self.nf_text, self.databases, tools or self.tools)
+
+    def store(self, key, sample_id):
+        files = {}
+        for name in CACHED_FILES:
+            path = os.path.join(self.tmp.name, f"{sample_id}.{name}")
+            with open(path, 'w') as f:
+                f.write(f"{name} of {sample_id}\n")
+            files[name] = path
+        return ResultCache(self.s3, CACHE).store(key, sample_id, files)
+
+    def test_keys(self):
+        """Test that keys change with inputs, tools and databases only"""
+        rows = self.lookup()
+        self.assertEqual(len({row['cache_key'] for row in rows}), 3)
+        self.assertEqual([row['hit'] for row in rows], ['false'] * 3)
+        self.assertEqual(self.lookup(), rows)
+
+        self.assertNotEqual(self.lookup(tools={'kraken2': '2.1.4'})[0]['cache_key'], rows[0]['cache_key'])
+        self.s3.put_object(Bucket='data', Key='reads/S2_R2.fastq.gz', Body=b'changed')
+        changed = self.lookup()
+        self.assertEqual(changed[0]['cache_key'], rows[0]['cache_key'])
+        self.assertNotEqual(changed[1]['cache_key'], rows[1]['cache_key'])
+        self.s3.put_object(Bucket='data', Key='db/kraken/taxo.k2d', Body=b'taxonomy')
+        self.assertNotEqual(self.lookup()[0]['cache_key'], rows[0]['cache_key'])
+
+        # Inputs that cannot be read are never cached
+        missing = dict(self.samples[0], fastq_2='s3://data/reads/missing.fastq.gz')
+        self.assertEqual(self.lookup([missing])[0]['cache_key'], '')
+
+    def test_lookup_is_batched(self):
+        """Test one index read and one listing per input directory"""
+        many = [dict(self.samples[i % 3], sample_id=f"S{i}") for i in range(300)]
+        self.s3.requests.clear()
+        self.lookup(many)
+        self.assertEqual(self.s3.requests['GetObject'], 1)
+        # Reads directory and database
+        self.assertEqual(self.s3.requests['ListObjectsV2'], 2)
+
+    def test_store_and_restore(self):
+        """Test that a stored sample is a hit on the next run and restores under its names"""
+        rows = self.lookup()
+        cache = ResultCache(self.s3, CACHE)
+        entry = self.store(rows[0]['cache_key'], 'S1')
+        cache.update_index([entry])
+
+        hits = self.lookup()
+        self.assertEqual([row['hit'] for row in hits], ['true', 'false', 'false'])
+        refreshed = lookup(self.s3, CACHE, self.samples, self.nf_text, self.databases, self.tools, refresh=True)
+        self.assertEqual([row['hit'] for row in refreshed], ['false'] * 3)
+        self.assertEqual(refreshed[0]['cache_key'], rows[0]['cache_key'])
+        output_dir = os.path.join(self.tmp.name, 'restored')
+        os.makedirs(output_dir)
+        index = cache.load_index()
+        paths = cache.restore(rows[0]['cache_key'], index['entries'][rows[0]['cache_key']], 'S1', output_dir)
+        self.assertEqual(sorted(os.path.basename(path) for path in paths),
+                         sorted(name.format(sample_id='S1') for name in CACHED_FILES.values()))
+        with open(os.path.join(output_dir, 'S1.kreport')) as f:
+            self.assertEqual(f.read(), 'kreport of S1\n')
+
+    def test_eviction(self):
+        """Test eviction by age and then by size, least recently used first"""
+        cache = ResultCache(self.s3, CACHE)
+        entries = [self.store(f"key{i}", f"S{i}") for i in range(3)]
+        cache.update_index(entries, now=1000)
+        cache.update_index(used=['key0'], now=2000)
+        size = entries[0]['bytes']
+
+        index, evicted = cache.update_index(max_bytes=2 * size, now=3000)
+        self.assertEqual(evicted, ['key1'])
+        self.assertEqual(sorted(index['entries']), ['key0', 'key2'])
+        self.assertFalse(any('/key1/' in key for _, key in self.s3.objects))
+
+        index, evicted = cache.update_index(max_age_days=1, now=1000 + 86400 + 1)
+        self.assertEqual(evicted, ['key2'])
+        self.assertEqual(list(index['entries']), ['key0'])
+
+    def test_concurrent_index_write(self):
+        """Test that an index write lost to another run is retried on the new index"""
+        cache = ResultCache(self.s3, CACHE)
+        cache.update_index([self.store('key0', 'S0')])
+        other = ResultCache(self.s3, CACHE)
+        save_index = cache.save_index
+
+        def interleaved(index):
+            # Another run writes between our read and our write
+            cache.save_index = save_index
+            other.update_index([self.store('key1', 'S1')])
+            save_index(index)
+        cache.save_index = interleaved
+        index, _ = cache.update_index([self.store('key2', 'S2')])
+        self.assertEqual(sorted(index['entries']), ['key0', 'key1', 'key2'])
+
+    def test_process_fingerprints(self):
+        """Test that every cached process is found in the workflow"""
+        fingerprints = {process: process_fingerprint(self.nf_text, process) for process in CACHED_PROCESSES}
+        self.assertEqual(len(set(fingerprints.values())), len(CACHED_PROCESSES))
+        with self.assertRaises(ValueError):
+            process_fingerprint(self.nf_text, 'no_such_process')
+
+if __name__ == '__main__':
+    unittest.main()
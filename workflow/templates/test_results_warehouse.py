@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_results_warehouse.py - Unit tests for results_warehouse.py
+
+import unittest
+import os
+import sys
+import tempfile
+
+import pyarrow.dataset as ds
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.results_warehouse import (
+    Warehouse, duckdb, read_pathways, read_sample_sites, read_sample_table, read_species, species_name
+)
+from templates.synthetic_cohort import generate_cohort
+
+class TestResultsWarehouse(unittest.TestCase):
+    """Test cases for the results_warehouse.py module"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cohorts = tempfile.TemporaryDirectory()
+        cls.runs = {}
+        for run_id, seed in (('run-a', 1), ('run-b', 2)):
+            directory = os.path.join(cls.cohorts.name, run_id)
+            generate_cohort(directory, samples=12, species=40, body_sites=3, pathways=20, gene_families=20,
+                            seed=seed)
+            cls.runs[run_id] = directory
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cohorts.cleanup()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.warehouse = Warehouse(os.path.join(self.tmp.name, 'warehouse'))
+        for run_id in self.runs:
+            self.ingest(run_id)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ingest(self, run_id, warehouse=None):
+        directory = self.runs[run_id]
+        tables = {
+            'species': read_species(os.path.join(directory, 'metaphlan_merged.tsv')),
+            'pathways': read_pathways(os.path.join(directory, 'humann_pathabundance_relab_merged.tsv')),
+            'alpha_diversity': read_sample_table(os.path.join(directory, 'diversity', 'alpha_diversity.tsv')),
+            'pcoa': read_sample_table(os.path.join(directory, 'diversity', 'pcoa_coordinates.tsv')),
+        }
+        return (warehouse or self.warehouse).ingest(run_id, tables,
+                                                    read_sample_sites(os.path.join(directory, 'metadata.csv')))
+
+    def test_readers(self):
+        """Test the long tables read from the merged outputs"""
+        self.assertEqual(species_name('k__Bacteria|p__Firmicutes|s__Faecalibacterium_prausnitzii'),
+                         'Faecalibacterium_prausnitzii')
+        self.assertIsNone(species_name('k__Bacteria|p__Firmicutes'))
+        species = read_species(os.path.join(self.runs['run-a'], 'metaphlan_merged.tsv'))
+        self.assertEqual(species['sample_id'].nunique(), 12)
+        self.assertTrue((species['relative_abundance'] > 0).all())
+        pathways = read_pathways(os.path.join(self.runs['run-a'], 'humann_pathabundance_relab_merged.tsv'))
+        self.assertFalse(pathways['pathway'].str.contains('|', regex=False).any())
+        self.assertEqual(sorted(pathways['sample_id'].unique())[0], 'SYN00001')
+
+    def test_catalog(self):
+        """Test partitions by run and body site with their statistics"""
+        catalog = Warehouse(self.warehouse.location).catalog()
+        self.assertEqual(sorted(catalog), ['run-a', 'run-b'])
+        species = catalog['run-a']['tables']['species']
+        self.assertEqual(len(species), 3)
+        self.assertEqual(sum(stats['samples'] for stats in species.values()), 12)
+        low, high = species[sorted(species)[0]]['columns']['relative_abundance']
+        self.assertTrue(0 < low <= high <= 100)
+        self.assertTrue(os.path.exists(os.path.join(self.warehouse.root, species[sorted(species)[0]]['files'][0])))
+
+    def test_species_abundance(self):
+        """Test a cross-run species query against the source tables"""
+        species = read_species(os.path.join(self.runs['run-b'], 'metaphlan_merged.tsv'))
+        name = species['species'].value_counts().index[0]
+        sites = read_sample_sites(os.path.join(self.runs['run-b'], 'metadata.csv'))
+
+        result = self.warehouse.species_abundance(name)
+        self.assertEqual(list(result.columns), ['run_id', 'body_site', 'samples', 'detected', 'mean_abundance'])
+        self.assertEqual(len(result), 6)
+        site = sorted(set(sites.values()))[0]
+        row = result[(result['run_id'] == 'run-b') & (result['body_site'] == site)].iloc[0]
+        in_site = [sample for sample, body_site in sites.items() if body_site == site]
+        expected = species[(species['species'] == name) & species['sample_id'].isin(in_site)]
+        self.assertEqual(row['samples'], len(in_site))
+        self.assertAlmostEqual(row['mean_abundance'], expected['relative_abundance'].sum() / len(in_site))
+
+        by_site = self.warehouse.species_abundance(name, by=['body_site'])
+        self.assertEqual(by_site['samples'].sum(), 24)
+        self.assertEqual(self.warehouse.species_abundance('No_such_species')['detected'].sum(), 0)
+
+    def test_pruning(self):
+        """Test that runs, body sites and column ranges skip partitions"""
+        site = sorted(self.warehouse.catalog()['run-a']['tables']['alpha_diversity'])[0]
+        self.assertEqual(len(self.warehouse.partitions('alpha_diversity', runs=['run-a'], body_sites=[site])), 1)
+        self.assertEqual(self.warehouse.partitions('alpha_diversity', ranges={'shannon': (1e9, None)}), [])
+        table = self.warehouse.scan('alpha_diversity', runs=['run-a'], body_sites=[site],
+                                    filter=ds.field('shannon') > 0)
+        self.assertEqual(set(table.column('run_id').to_pylist()), {'run-a'})
+        self.assertEqual(set(table.column('body_site').to_pylist()), {site})
+
+    def test_reingest_replaces_run(self):
+        """Test that ingesting a run again replaces its partitions"""
+        self.ingest('run-a')
+        self.assertEqual(len(self.warehouse.scan('pcoa', runs=['run-a'])), 12)
+        self.assertEqual(len(self.warehouse.scan('pcoa')), 24)
+
+    @unittest.skipIf(duckdb is None, "DuckDB is not installed")
+    def test_sql(self):
+        """Test SQL over the partitioned tables"""
+        result = self.warehouse.sql("SELECT run_id, count(*) AS n FROM alpha_diversity GROUP BY run_id ORDER BY 1")
+        self.assertEqual(result['n'].tolist(), [12, 12])
+
+if __name__ == '__main__':
+    unittest.main()
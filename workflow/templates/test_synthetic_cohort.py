@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_synthetic_cohort.py - Unit tests for synthetic_cohort.py
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.synthetic_cohort import generate_cohort, alpha_metrics, site_names
+
+def read_rows(path, skip_lines=0):
+    with open(path, 'r') as f:
+        lines = f.read().splitlines()[skip_lines:]
+    return [line.split('\t') for line in lines]
+
+class TestSyntheticCohort(unittest.TestCase):
+    """Test cases for the synthetic_cohort.py module"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cohort = os.path.join(self.tmp.name, 'cohort')
+        self.manifest = generate_cohort(self.cohort, samples=12, species=200, body_sites=3, pathways=40,
+                                        gene_families=60, read_depth=100000, seed=7)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_kraken_report(self):
+        """Test the report columns and that clade counts add up through the tree"""
+        rows = read_rows(os.path.join(self.cohort, 'reports', 'SYN00001.kreport'))
+        self.assertTrue(all(len(row) == 6 for row in rows))
+        self.assertEqual([row[3] for row in rows[:3]], ['U', 'R', 'D'])
+        classified = int(rows[1][1])
+        self.assertEqual(sum(int(row[2]) for row in rows[1:]), classified)
+        self.assertEqual(sum(int(row[1]) for row in rows if row[3] == 'P'), classified)
+        species = [row for row in rows if row[3] == 'S']
+        self.assertTrue(species)
+        self.assertTrue(all(row[1] == row[2] for row in species))
+        # Names are indented two spaces per level under the domain
+        self.assertTrue(species[0][5].startswith(' ' * 14))
+
+    def test_sparse_long_tailed_profiles(self):
+        """Test that samples carry a minority of the catalog with a few dominant species"""
+        rows = read_rows(os.path.join(self.cohort, 'metaphlan_merged.tsv'))
+        self.assertTrue(rows[0][0].startswith('#SampleMetadata:'))
+        self.assertEqual(rows[1], ['clade_name'] + [f"SYN{i:05d}" for i in range(1, 13)])
+        species = [row for row in rows[2:] if '|s__' in row[0]]
+        for column in range(1, 13):
+            values = sorted((float(row[column]) for row in species), reverse=True)
+            self.assertAlmostEqual(sum(values), 100.0, places=2)
+            present = [value for value in values if value > 0]
+            self.assertLess(len(present), 200 / 2)
+            self.assertGreater(sum(present[:len(present) // 5 + 1]), 50.0)
+        self.assertLess(self.manifest['species_per_sample'], 100)
+
+    def test_humann_tables(self):
+        """Test per-sample HUMAnN files and the relab-normalized merged table"""
+        rows = read_rows(os.path.join(self.cohort, 'humann', 'SYN00003.humann.pathabundance.tsv'))
+        self.assertEqual(rows[0], ['# Pathway', 'SYN00003_Abundance'])
+        self.assertEqual([row[0] for row in rows[1:3]], ['UNMAPPED', 'UNINTEGRATED'])
+        self.assertTrue(any('|g__' in row[0] for row in rows))
+        self.assertTrue(os.path.exists(os.path.join(self.cohort, 'humann', 'SYN00003.humann.genefamilies.tsv')))
+
+        merged = read_rows(os.path.join(self.cohort, 'humann_pathabundance_relab_merged.tsv'))
+        self.assertEqual(merged[0][1], 'SYN00001_Abundance')
+        community = [row for row in merged[1:] if '|' not in row[0]]
+        self.assertAlmostEqual(sum(float(row[1]) for row in community), 1.0, places=3)
+
+    def test_reference_diversity(self):
+        """Test the alpha diversity and PCoA tables used in place of diversity_analysis"""
+        alpha = read_rows(os.path.join(self.cohort, 'diversity', 'alpha_diversity.tsv'))
+        self.assertEqual(alpha[0], ['sample', 'shannon', 'simpson', 'observed_species', 'body_site'])
+        self.assertEqual(len(alpha), 13)
+        self.assertTrue(set(row[4] for row in alpha[1:]) <= set(site_names(3)))
+        pcoa = read_rows(os.path.join(self.cohort, 'diversity', 'pcoa_coordinates.tsv'))
+        self.assertEqual(pcoa[0][:3], ['sample', 'PC1', 'PC2'])
+
+        metrics = alpha_metrics([50.0, 50.0, 0.0])
+        self.assertAlmostEqual(metrics['simpson'], 0.5)
+        self.assertEqual(metrics['observed_species'], 2)
+
+    def test_deterministic(self):
+        """Test that a seed reproduces the cohort byte for byte"""
+        again = generate_cohort(os.path.join(self.tmp.name, 'again'), samples=12, species=200, body_sites=3,
+                                pathways=40, gene_families=60, read_depth=100000, seed=7)
+        self.assertEqual(again['files'], self.manifest['files'])
+        with open(os.path.join(self.cohort, 'metaphlan_merged.tsv')) as first, \
+                open(os.path.join(self.tmp.name, 'again', 'metaphlan_merged.tsv')) as second:
+            self.assertEqual(first.read(), second.read())
+        self.assertEqual(site_names(8)[-1], 'site_8')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_table_stream.py - Unit tests for table_stream.py
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.table_stream import (
+    read_header, count_samples, iter_rows, iter_row_means, row_mean, read_columns, parse_float
+)
+
+METAPHLAN_TABLE = (
+    "#SampleMetadata:stool,stool,buccal_mucosa\n"
+    "#clade_name\tS1\tS2\tS3\n"
+    "k__Bacteria\t100.0\t100.0\t100.0\n"
+    "k__Bacteria|p__Firmicutes|s__Faecalibacterium_prausnitzii\t10.0\t20.0\t0.0\n"
+    "k__Bacteria|p__Bacteroidetes|s__Bacteroides_vulgatus\t30.0\t\t6.0\n"
+    "\n"
+)
+
+class TestTableStream(unittest.TestCase):
+    """Test cases for the table_stream.py module"""
+
+    def setUp(self):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False)
+        handle.write(METAPHLAN_TABLE)
+        handle.close()
+        self.path = handle.name
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_header_only(self):
+        """Test header parsing and sample counting"""
+        self.assertEqual(read_header(self.path, skip_lines=1), ['clade_name', 'S1', 'S2', 'S3'])
+        self.assertEqual(count_samples(self.path, skip_lines=1), 3)
+
+    def test_iter_rows_filter_and_projection(self):
+        """Test row filtering and column projection"""
+        rows = list(iter_rows(self.path, skip_lines=1, row_filter=lambda name: 's__' in name))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1], ('k__Bacteria|p__Bacteroidetes|s__Bacteroides_vulgatus', [30.0, None, 6.0]))
+
+        projected = list(iter_rows(self.path, skip_lines=1, columns=['S3']))
+        self.assertEqual([values for _, values in projected], [[100.0], [0.0], [6.0]])
+
+    def test_row_means_skip_missing(self):
+        """Test that missing values are skipped like pandas mean()"""
+        means = dict(iter_row_means(self.path, skip_lines=1))
+        self.assertEqual(means['k__Bacteria|p__Bacteroidetes|s__Bacteroides_vulgatus'], 18.0)
+        self.assertEqual(row_mean([None, None]), 0.0)
+        self.assertIsNone(parse_float('nan'))
+        self.assertIsNone(parse_float('n/a'))
+
+    def test_read_columns(self):
+        """Test reading a subset of columns from a per-sample table"""
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False) as f:
+            f.write("sample\tshannon\tsimpson\tbody_site\n")
+            f.write("S1\t3.5\t0.9\tstool\n")
+            f.write("S2\t2.5\t0.8\tbuccal_mucosa\n")
+            path = f.name
+        try:
+            index, data = read_columns(path, ['body_site', 'shannon'], converters={'shannon': float})
+        finally:
+            os.unlink(path)
+
+        self.assertEqual(index, ['S1', 'S2'])
+        self.assertEqual(data['shannon'], [3.5, 2.5])
+        self.assertEqual(data['body_site'], ['stool', 'buccal_mucosa'])
+        self.assertNotIn('simpson', data)
+
+if __name__ == '__main__':
+    unittest.main()
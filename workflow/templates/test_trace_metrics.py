@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# test_trace_metrics.py - Unit tests for trace_metrics.py
+
+import unittest
+import os
+import sys
+import io
+import json
+import shutil
+import subprocess
+import tempfile
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from templates.trace_metrics import (
+    parse_duration, parse_size, parse_percent, aggregate_tasks, read_trace, run_rows, update_summary
+)
+
+TEMPLATES = os.path.dirname(os.path.abspath(__file__))
+
+RAW_TRACE = (
+    "task_id\tprocess\tname\tstatus\tsubmit\tcomplete\trealtime\tcpus\t%cpu\tpeak_rss\trchar\twchar\tqueue\n"
+    "1\tpreprocess_reads\tpreprocess_reads (S1)\tCOMPLETED\t0\t600000\t1800000\t4\t350.0\t2147483648\t1073741824\t536870912\tmicrobiome-demo-queue\n"
+    "2\ttaxonomic_classification_kraken\ttaxonomic_classification_kraken (S1)\tCOMPLETED\t600000\t4200000\t3600000\t8\t100.0\t34359738368\t2147483648\t1073741824\tmicrobiome-demo-gpu-queue\n"
+    "3\tpreprocess_reads\tpreprocess_reads (S2)\tFAILED\t0\t300000\t900000\t4\t200.0\t1073741824\t1073741824\t0\tmicrobiome-demo-queue\n"
+)
+
+class TestTraceMetrics(unittest.TestCase):
+    """Test cases for the trace_metrics.py module"""
+
+    def test_parse_values(self):
+        """Test parsing of raw and human readable trace values"""
+        self.assertEqual(parse_duration('1800000'), 1800.0)
+        self.assertEqual(parse_duration('1h 2m 3s'), 3723.0)
+        self.assertEqual(parse_duration('850ms'), 0.85)
+        self.assertEqual(parse_duration('-'), 0.0)
+
+        self.assertEqual(parse_size('1024'), 1024.0)
+        self.assertEqual(parse_size('1.5 GB'), 1.5 * 1024 ** 3)
+        self.assertEqual(parse_size(''), 0.0)
+
+        self.assertEqual(parse_percent('95.3%'), 95.3)
+        self.assertEqual(parse_percent('-'), 0.0)
+
+    def test_aggregate_tasks(self):
+        """Test aggregation by process and instance type"""
+        metrics = aggregate_tasks(read_trace(io.StringIO(RAW_TRACE)))
+
+        self.assertEqual(metrics['task_count'], 3)
+        self.assertEqual(metrics['failed_tasks'], 1)
+
+        # 0.5h at 350% + 0.25h at 200% on CPU, 1h at 100% on GPU
+        self.assertAlmostEqual(metrics['cpu_hours'], 0.5 * 3.5 + 1.0 * 1.0 + 0.25 * 2.0, places=4)
+        self.assertAlmostEqual(metrics['gpu_hours'], 1.0, places=4)
+        self.assertAlmostEqual(metrics['data_processed_gb'], 4.0, places=3)
+        self.assertAlmostEqual(metrics['wall_clock_minutes'], 70.0, places=2)
+
+        preprocess = metrics['by_process']['preprocess_reads']
+        self.assertEqual(preprocess['tasks'], 2)
+        self.assertEqual(preprocess['failed'], 1)
+        self.assertAlmostEqual(preprocess['peak_rss_gb'], 2.0, places=3)
+
+        self.assertIn('microbiome-demo-gpu-queue', metrics['by_instance_type'])
+
+        # Kraken has the longest runtime and should lead the hotspots
+        self.assertEqual(metrics['hotspots'][0]['process'], 'taxonomic_classification_kraken')
+        self.assertAlmostEqual(metrics['hotspots'][0]['share_percent'], 57.1, places=1)
+
+    def test_run_rows(self):
+        """Test that tasks submitted before the run started are dropped"""
+        rows = list(run_rows(read_trace(io.StringIO(RAW_TRACE)), since=600000))
+        self.assertEqual([row['task_id'] for row in rows], ['2'])
+        self.assertEqual(len(list(run_rows(read_trace(io.StringIO(RAW_TRACE)), None))), 3)
+        # A previous run's trace has no rows of this run
+        self.assertEqual(aggregate_tasks(run_rows(read_trace(io.StringIO(RAW_TRACE)), 10 ** 13))['task_count'], 0)
+        # Formatted timestamps cannot be placed in the run
+        formatted = RAW_TRACE.replace('\t600000\t4200000', '\t2025-01-01 10:00:00.000\t4200000')
+        rows = list(run_rows(read_trace(io.StringIO(formatted)), since=0))
+        self.assertEqual([row['task_id'] for row in rows], ['1', '3'])
+
+    def test_update_summary(self):
+        """Test that measured metrics replace the summary's estimates"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'microbiome_summary.json')
+            with open(path, 'w') as f:
+                json.dump({'execution_metrics': {'source': 'estimate', 'cpu_hours': 1.0, 'samples_processed': 2}}, f)
+            metrics = aggregate_tasks(read_trace(io.StringIO(RAW_TRACE)))
+            self.assertEqual(update_summary(path, metrics), 2)
+            with open(path) as f:
+                execution_metrics = json.load(f)['execution_metrics']
+        self.assertEqual(execution_metrics['source'], 'trace')
+        self.assertEqual(execution_metrics['cpu_hours'], metrics['cpu_hours'])
+        self.assertEqual(execution_metrics['hotspots'], metrics['hotspots'])
+        self.assertEqual(execution_metrics['samples_processed'], 2)
+
+    @unittest.skipUnless(shutil.which('bash'), "publish_run_metrics.sh needs bash")
+    def test_publish_run_metrics(self):
+        """Test that a finished run publishes measured, not estimated, metrics"""
+        with tempfile.TemporaryDirectory() as tmp:
+            # What create_summary published while the run was going
+            output = os.path.join(tmp, 'results')
+            os.makedirs(os.path.join(output, 'summary'))
+            with open(os.path.join(output, 'summary', 'microbiome_summary.json'), 'w') as f:
+                json.dump({'taxonomic_profile': {'sample_count': 2},
+                           'execution_metrics': {'source': 'estimate', 'cpu_hours': 1.0, 'gpu_hours': 0.2,
+                                                 'samples_processed': 2}}, f)
+            # The head node's trace once the run has ended; task 1 and 3 belong to an earlier run
+            trace = os.path.join(tmp, 'nextflow_trace.txt')
+            with open(trace, 'w') as f:
+                f.write(RAW_TRACE)
+            task_inputs = os.path.join(tmp, 'task_inputs.tsv')
+            with open(task_inputs, 'w') as f:
+                f.write("resource_key\ttag\tinput_bytes\nkraken\tS1\t1024\n")
+            samples = os.path.join(tmp, 'sample_list.csv')
+            with open(samples, 'w') as f:
+                f.write("sample_id,body_site,fastq_1,fastq_2\nS1,gut,a.fq,b.fq\n")
+
+            result = subprocess.run(
+                ['bash', os.path.join(TEMPLATES, 'publish_run_metrics.sh'), trace, '600000', output, task_inputs,
+                 samples],
+                capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+
+            with open(os.path.join(output, 'reports', 'execution_metrics.json')) as f:
+                metrics = json.load(f)
+            with open(os.path.join(output, 'summary', 'dashboard', 'overview.json')) as f:
+                overview = json.load(f)
+            with open(os.path.join(output, 'summary', 'microbiome_summary.json')) as f:
+                summary = json.load(f)
+            with open(os.path.join(output, 'reports', 'cost_report.json')) as f:
+                cost_report = json.load(f)
+            # resource_profile.py learns from these two
+            self.assertTrue(os.path.exists(os.path.join(output, 'reports', 'nextflow_trace.txt')))
+            self.assertTrue(os.path.exists(os.path.join(output, 'reports', 'task_inputs.tsv')))
+
+        self.assertEqual(metrics['source'], 'trace')
+        self.assertEqual(metrics['task_count'], 1)
+        self.assertEqual(metrics['samples_processed'], 2)
+        self.assertAlmostEqual(metrics['gpu_hours'], 1.0, places=4)
+        for execution_metrics in (summary['execution_metrics'], overview['execution_metrics']):
+            self.assertEqual(execution_metrics['source'], 'trace')
+            self.assertAlmostEqual(execution_metrics['gpu_hours'], 1.0, places=4)
+        # The cost report charges this run's task, not the earlier run's
+        self.assertEqual(cost_report['metadata']['gpu_hours'], 1.0)
+        self.assertEqual(cost_report['attribution']['tasks'], 1)
+        self.assertIn('taxonomic_classification_kraken', cost_report['attribution']['by_process'])
+
+    def test_aggregate_empty_trace(self):
+        """Test that an empty trace produces zeroed metrics"""
+        metrics = aggregate_tasks([])
+        self.assertEqual(metrics['task_count'], 0)
+        self.assertEqual(metrics['cpu_hours'], 0.0)
+        self.assertEqual(metrics['hotspots'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright 2025 Scott Friedman. All Rights Reserved.
+#
+# trace_metrics.py - Aggregate Nextflow trace records into execution metrics
+
+import argparse
+import csv
+import json
+import re
+import sys
+
+# Processes that run on the GPU queue when an accelerator is available
+GPU_QUEUE_MARKER = 'gpu'
+
+# Number of processes reported in the hotspot list
+DEFAULT_HOTSPOTS = 5
+
+# Measured fields that replace the estimates in a microbiome summary's execution_metrics
+SUMMARY_FIELDS = ('cpu_hours', 'gpu_hours', 'wall_clock_minutes', 'data_processed_gb', 'hotspots', 'source')
+
+DURATION_UNITS = {
+    'ms': 0.001,
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400
+}
+
+SIZE_UNITS = {
+    'B': 1,
+    'KB': 1024,
+    'MB': 1024 ** 2,
+    'GB': 1024 ** 3,
+    'TB': 1024 ** 4
+}
+
+def parse_duration(value):
+    """
+    Convert a trace duration to seconds.
+
+    Accepts raw milliseconds (trace.raw = true) or the human readable
+    form Nextflow writes by default, e.g. "1h 2m 3s" or "850ms".
+    """
+    if value is None:
+        return 0.0
+    value = value.strip()
+    if not value or value == '-':
+        return 0.0
+    if re.fullmatch(r'\d+(\.\d+)?', value):
+        return float(value) / 1000.0
+
+    seconds = 0.0
+    for amount, unit in re.findall(r'(\d+(?:\.\d+)?)\s*(ms|s|m|h|d)', value):
+        seconds += float(amount) * DURATION_UNITS[unit]
+    return seconds
+
+def parse_size(value):
+    """
+    Convert a trace memory/IO value to bytes.
+
+    Accepts raw byte counts or the human readable form, e.g. "1.5 GB".
+    """
+    if value is None:
+        return 0.0
+    value = value.strip()
+    if not value or value == '-':
+        return 0.0
+    if re.fullmatch(r'\d+(\.\d+)?', value):
+        return float(value)
+
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([KMGT]?B)', value)
+    if not match:
+        return 0.0
+    return float(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+def parse_percent(value):
+    """Convert a trace percentage such as "95.3%" to a float"""
+    if value is None:
+        return 0.0
+    value = value.strip().rstrip('%')
+    if not value or value == '-':
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+def process_name(row):
+    """Get the process name, stripping the tag from the task name if needed"""
+    name = row.get('process') or row.get('name') or 'unknown'
+    return name.split(' (')[0].strip()
+
+def is_gpu_task(row):
+    """Check whether a trace row ran on a GPU"""
+    accelerator = (row.get('accelerator') or '').strip()
+    if accelerator and accelerator not in ('-', '0'):
+        return True
+    return GPU_QUEUE_MARKER in (row.get('queue') or '').lower()
+
+def instance_type(row):
+    """
+    Get the instance type a task ran on, falling back to its queue.
+
+    The trace fields configured in microbiome_nextflow.config do not include
+    machine_type, so in pipeline runs this is the Batch queue name and
+    by_instance_type is a per-queue breakdown.
+    """
+    for field in ('machine_type', 'instance_type', 'queue'):
+        value = (row.get(field) or '').strip()
+        if value and value != '-':
+            return value
+    return 'unknown'
+
+def parse_task(row):
+    """
+    Convert one trace row to the numeric fields used for aggregation.
+
+    Args:
+        row: Dictionary of trace fields as strings
+
+    Returns:
+        Dictionary with parsed task metrics
+    """
+    realtime_hours = parse_duration(row.get('realtime')) / 3600.0
+    cpu_percent = parse_percent(row.get('%cpu'))
+    try:
+        cpus = int(row.get('cpus') or 1)
+    except ValueError:
+        cpus = 1
+    gpu = is_gpu_task(row)
+
+    return {
+        'process': process_name(row),
+        'instance_type': instance_type(row),
+        'status': (row.get('status') or '').strip(),
+        'realtime_hours': realtime_hours,
+        'cpu_hours': realtime_hours * cpu_percent / 100.0,
+        'gpu_hours': realtime_hours if gpu else 0.0,
+        'core_hours_allocated': realtime_hours * cpus,
+        'cpu_percent': cpu_percent,
+        'peak_rss': parse_size(row.get('peak_rss') or row.get('rss')),
+        'rchar': parse_size(row.get('rchar')),
+        'wchar': parse_size(row.get('wchar')),
+        'submit': parse_timestamp(row.get('submit')),
+        'complete': parse_timestamp(row.get('complete'))
+    }
+
+def parse_timestamp(value):
+    """Parse a raw epoch-millisecond trace timestamp, ignoring formatted dates"""
+    if value is None:
+        return None
+    value = value.strip()
+    if re.fullmatch(r'\d+', value):
+        return int(value)
+    return None
+
+def new_bucket():
+    """Create an empty aggregation bucket"""
+    return {
+        'tasks': 0,
+        'failed': 0,
+        'realtime_hours': 0.0,
+        'cpu_hours': 0.0,
+        'gpu_hours': 0.0,
+        'core_hours_allocated': 0.0,
+        'cpu_percent_total': 0.0,
+        'peak_rss': 0.0,
+        'rchar': 0.0,
+        'wchar': 0.0
+    }
+
+def add_to_bucket(bucket, task):
+    """Add one parsed task to an aggregation bucket"""
+    bucket['tasks'] += 1
+    if task['status'] and task['status'] not in ('COMPLETED', 'CACHED'):
+        bucket['failed'] += 1
+    for field in ('realtime_hours', 'cpu_hours', 'gpu_hours', 'core_hours_allocated', 'rchar', 'wchar'):
+        bucket[field] += task[field]
+    bucket['cpu_percent_total'] += task['cpu_percent']
+    bucket['peak_rss'] = max(bucket['peak_rss'], task['peak_rss'])
+
+def finalize_bucket(bucket):
+    """Round an aggregation bucket and convert bytes to GB"""
+    tasks = bucket['tasks']
+    return {
+        'tasks': tasks,
+        'failed': bucket['failed'],
+        'realtime_hours': round(bucket['realtime_hours'], 4),
+        'cpu_hours': round(bucket['cpu_hours'], 4),
+        'gpu_hours': round(bucket['gpu_hours'], 4),
+        'core_hours_allocated': round(bucket['core_hours_allocated'], 4),
+        'mean_cpu_percent': round(bucket['cpu_percent_total'] / tasks, 1) if tasks else 0.0,
+        'peak_rss_gb': round(bucket['peak_rss'] / SIZE_UNITS['GB'], 3),
+        'read_gb': round(bucket['rchar'] / SIZE_UNITS['GB'], 3),
+        'written_gb': round(bucket['wchar'] / SIZE_UNITS['GB'], 3)
+    }
+
+def aggregate_tasks(rows, hotspots=DEFAULT_HOTSPOTS):
+    """
+    Aggregate trace rows by process and instance type in a single pass.
+
+    Args:
+        rows: Iterable of trace rows (dictionaries of strings)
+        hotspots: Number of processes to report as hotspots
+
+    Returns:
+        Dictionary with totals, per-process and per-instance-type metrics
+    """
+    totals = new_bucket()
+    by_process = {}
+    by_instance_type = {}
+    first_submit = None
+    last_complete = None
+
+    for row in rows:
+        task = parse_task(row)
+        add_to_bucket(totals, task)
+        add_to_bucket(by_process.setdefault(task['process'], new_bucket()), task)
+        add_to_bucket(by_instance_type.setdefault(task['instance_type'], new_bucket()), task)
+
+        if task['submit'] is not None:
+            first_submit = task['submit'] if first_submit is None else min(first_submit, task['submit'])
+        if task['complete'] is not None:
+            last_complete = task['complete'] if last_complete is None else max(last_complete, task['complete'])
+
+    if first_submit is not None and last_complete is not None:
+        wall_clock_minutes = (last_complete - first_submit) / 60000.0
+    else:
+        # Without raw timestamps the sum of task runtimes is the best upper bound
+        wall_clock_minutes = totals['realtime_hours'] * 60
+
+    process_metrics = {name: finalize_bucket(bucket) for name, bucket in by_process.items()}
+    total_realtime = totals['realtime_hours']
+    ranked = sorted(process_metrics.items(), key=lambda item: item[1]['realtime_hours'], reverse=True)
+    hotspot_list = [
+        {
+            'process': name,
+            'realtime_hours': metrics['realtime_hours'],
+            'share_percent': round(metrics['realtime_hours'] / total_realtime * 100, 1) if total_realtime else 0.0,
+            'mean_cpu_percent': metrics['mean_cpu_percent'],
+            'peak_rss_gb': metrics['peak_rss_gb']
+        }
+        for name, metrics in ranked[:hotspots]
+    ]
+
+    summary = finalize_bucket(totals)
+    return {
+        'source': 'trace',
+        'task_count': summary['tasks'],
+        'failed_tasks': summary['failed'],
+        'cpu_hours': summary['cpu_hours'],
+        'gpu_hours': summary['gpu_hours'],
+        'core_hours_allocated': summary['core_hours_allocated'],
+        'wall_clock_minutes': round(wall_clock_minutes, 2),
+        'data_processed_gb': summary['read_gb'],
+        'data_written_gb': summary['written_gb'],
+        'peak_rss_gb': summary['peak_rss_gb'],
+        'by_process': process_metrics,
+        'by_instance_type': {name: finalize_bucket(bucket) for name, bucket in by_instance_type.items()},
+        'hotspots': hotspot_list
+    }
+
+def read_trace(handle):
+    """Yield rows from a tab-separated Nextflow trace file"""
+    return csv.DictReader(handle, delimiter='\t')
+
+def run_rows(rows, since):
+    """
+    Keep the rows of tasks submitted at or after since.
+
+    A trace can hold tasks of earlier runs (a resumed run lists the cached
+    tasks with their original submit times, and traces kept from past runs
+    may be concatenated). Filtering on the run's start time drops those rows;
+    rows without a raw submit timestamp cannot be placed and are dropped too.
+
+    Args:
+        rows: Iterable of trace rows
+        since: Run start as epoch milliseconds, or None to keep every row
+    """
+    if since is None:
+        yield from rows
+        return
+    for row in rows:
+        submit = parse_timestamp(row.get('submit'))
+        if submit is not None and submit >= since:
+            yield row
+
+def collect_metrics(trace_path, hotspots=DEFAULT_HOTSPOTS, since=None):
+    """Read a trace file and return aggregated execution metrics"""
+    if trace_path == '-':
+        return aggregate_tasks(run_rows(read_trace(sys.stdin), since), hotspots)
+    with open(trace_path, 'r', newline='') as f:
+        return aggregate_tasks(run_rows(read_trace(f), since), hotspots)
+
+def update_summary(summary_path, metrics):
+    """
+    Replace the per-sample estimates in a microbiome summary with measured metrics.
+
+    create_summary runs while the last tasks are still going, so it can only
+    estimate; once the run has ended the trace holds every task.
+
+    Returns:
+        The samples_processed count of the summary, or None
+    """
+    with open(summary_path, 'r') as f:
+        summary = json.load(f)
+    execution_metrics = summary.setdefault('execution_metrics', {})
+    execution_metrics.update({field: metrics[field] for field in SUMMARY_FIELDS})
+    # Compact like create_summary: the summary is polled by the dashboard
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, separators=(',', ':'))
+    return execution_metrics.get('samples_processed')
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate Nextflow trace data into execution metrics')
+    parser.add_argument('trace', help='Nextflow trace file (tab-separated, "-" for stdin)')
+    parser.add_argument('--output', default='execution_metrics.json',
+                      help='Output JSON file (default: execution_metrics.json)')
+    parser.add_argument('--hotspots', type=int, default=DEFAULT_HOTSPOTS,
+                      help=f'Number of hotspot processes to report (default: {DEFAULT_HOTSPOTS})')
+    parser.add_argument('--since', type=int,
+                      help='Only count tasks submitted at or after this time (epoch ms, e.g. the run start)')
+    parser.add_argument('--summary',
+                      help='microbiome_summary.json whose execution_metrics are replaced with the measured values')
+
+    args = parser.parse_args()
+
+    metrics = collect_metrics(args.trace, args.hotspots, args.since)
+    if args.since is not None and metrics['task_count'] == 0:
+        # Writing nothing leaves the summary's estimates in place
+        print(f"No tasks of this run in {args.trace}; not writing {args.output}")
+        return
+
+    if args.summary:
+        samples_processed = update_summary(args.summary, metrics)
+        if samples_processed is not None:
+            metrics['samples_processed'] = samples_processed
+        print(f"Measured execution metrics written to: {args.summary}")
+
+    with open(args.output, 'w') as f:
+        json.dump(metrics, f, indent=2)
+
+    print(f"Execution metrics written to: {args.output}")
+    print(f"Tasks: {metrics['task_count']}, CPU hours: {metrics['cpu_hours']}, GPU hours: {metrics['gpu_hours']}")
+    for hotspot in metrics['hotspots']:
+        print(f"  {hotspot['process']}: {hotspot['realtime_hours']}h ({hotspot['share_percent']}%)")
+
+if __name__ == "__main__":
+    main()